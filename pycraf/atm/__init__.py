@@ -27,3 +27,4 @@ reasons, but this should be considered as deprecated.
 '''
 
 from .atm import *
+from .cache import *
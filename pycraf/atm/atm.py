@@ -14,7 +14,12 @@ from astropy import units as apu
 from astropy.utils.data import get_pkg_data_filename
 from .. import conversions as cnv
 from .. import utils
-from .atm_helper import path_helper_cython, path_endpoint_cython
+from . import cache
+from .atm_helper import (
+    path_helper_cython, path_endpoint_cython,
+    atten_specific_annex1_layers_cython, atten_slant_annex1_cython,
+    path_atten_tebb_cython, ray_atlas_cython, find_elevation_atlas_cython,
+    )
 
 
 __all__ = [
@@ -32,7 +37,8 @@ __all__ = [
     'atten_specific_annex1',
     'atten_terrestrial', 'atm_layers',
     'raytrace_path', 'path_endpoint', 'find_elevation',
-    'atten_slant_annex1',
+    'ray_atlas', 'find_elevation_atlas',
+    'atten_slant_annex1', 'atten_slant_annex1_grid',
     'atten_specific_annex2',
     'atten_slant_annex2',
     'equivalent_height_dry', 'equivalent_height_wet',
@@ -62,6 +68,14 @@ resonances_water = np.genfromtxt(
     fname_water, dtype=water_dtype, delimiter=';'
     )
 
+# resonance tables as plain (n, 7) arrays for the compiled Annex 1 kernel
+_lines_oxygen = np.ascontiguousarray(np.column_stack([
+    resonances_oxygen[n] for n in oxygen_dtype.names
+    ]))
+_lines_water = np.ascontiguousarray(np.column_stack([
+    resonances_water[n] for n in water_dtype.names
+    ]))
+
 
 AtmHeightProfile = collections.namedtuple(
     'AtmHeightProfile',
@@ -1594,6 +1608,26 @@ def _atten_specific_annex1(
     return atten_o2 * 0.182 * freq_grid, atten_h2o * 0.182 * freq_grid
 
 
+def _atten_specific_annex1_layers(freq_grid, press_dry, press_w, temp):
+    '''
+    As `_atten_specific_annex1`, but for many layers at once.
+
+    `press_dry`, `press_w`, and `temp` are 1D arrays (one entry per layer);
+    returns dry and wet specific attenuation with shape (n_layers, n_freq).
+    The calculation is done in compiled (parallelized) code, without
+    materializing (lines x frequencies) intermediates.
+    '''
+
+    freq_grid, press_dry, press_w, temp = (
+        np.ascontiguousarray(np.atleast_1d(a), dtype=np.float64)
+        for a in (freq_grid, press_dry, press_w, temp)
+        )
+
+    return atten_specific_annex1_layers_cython(
+        freq_grid, press_dry, press_w, temp, _lines_oxygen, _lines_water,
+        )
+
+
 @utils.ranged_quantity_input(
     freq_grid=(1.e-30, 1000, apu.GHz),
     press_dry=(1.e-30, None, apu.hPa),
@@ -1678,7 +1712,9 @@ def atm_layers(freq_grid, profile_func, heights=None):
 
     This can be used to cache layer-profile data. Since it is only dependent
     on frequency, one can re-use it to save computing time when doing batch
-    jobs (e.g., atmospheric dampening for each pixel in a map).
+    jobs (e.g., atmospheric dampening for each pixel in a map). The
+    specific attenuations can also be stored on disk, see
+    `~pycraf.atm.AtmCacheConf`.
 
     Parameters
     ----------
@@ -1829,17 +1865,33 @@ def atm_layers(freq_grid, profile_func, heights=None):
     adict['press_w'] = press_w = atm_hprof.pressure_water.to(apu.hPa).value
     adict['ref_index'] = ref_index
 
-    atten_dry_db = np.zeros((heights.size, freq_grid.size), dtype=np.float64)
-    atten_wet_db = np.zeros((heights.size, freq_grid.size), dtype=np.float64)
+    def compute():
 
-    for idx in range(1, space_i):
-        atten_dry_db[idx], atten_wet_db[idx] = _atten_specific_annex1(
-            freq_grid, press[idx], press_w[idx], temp[idx]
+        atten_dry_db = np.zeros(
+            (heights.size, freq_grid.size), dtype=np.float64
+            )
+        atten_wet_db = np.zeros(
+            (heights.size, freq_grid.size), dtype=np.float64
             )
 
-    adict['atten_dry_db'] = atten_dry_db
-    adict['atten_wet_db'] = atten_wet_db
-    adict['atten_db'] = atten_dry_db + atten_wet_db
+        # all layers in one go (compiled), instead of a Python loop
+        (
+            atten_dry_db[1:space_i], atten_wet_db[1:space_i]
+            ) = _atten_specific_annex1_layers(
+            freq_grid, press[1:space_i], press_w[1:space_i], temp[1:space_i]
+            )
+
+        return {
+            'atten_dry_db': atten_dry_db,
+            'atten_wet_db': atten_wet_db,
+            'atten_db': atten_dry_db + atten_wet_db,
+            }
+
+    # the attenuations only depend on the frequencies, layers, and the
+    # atmospheric profile (see AtmCacheConf)
+    adict.update(cache._cached(
+        (freq_grid, heights, temp, press, press_w), compute
+        ))
 
     return adict
 
@@ -2299,6 +2351,9 @@ def find_elevation(
     the elevation angle at the observer. This in turns means that there is
     only the possibility of using stochastic optimization algorithms to
     get an approximate solution to the problem.
+
+    For many targets, `~pycraf.atm.find_elevation_atlas` is much faster
+    (and deterministic).
     '''
 
     return _find_elevation(
@@ -2309,6 +2364,182 @@ def find_elevation(
         )
 
 
+@utils.ranged_quantity_input(
+    obs_alt=(0, None, apu.km),
+    strip_input_units=True, output_unit=None
+    )
+def ray_atlas(obs_alt, atm_layers_cache, n_elev=8001):
+    '''
+    Ray-trace the paths for a dense grid of elevations ("ray atlas").
+
+    The ray atlas contains the (full) path records of an observer for
+    elevations between -90 deg and 90 deg. It is used by
+    `~pycraf.atm.find_elevation_atlas` to find the path elevations
+    for many targets. The grid is densest close to the horizon, where
+    the path geometry changes fastest.
+
+    Parameters
+    ----------
+    obs_alt : `~astropy.units.Quantity`, scalar
+        Height of observer above sea-level [km]
+    atm_layers_cache : dict
+        Pre-computed physical parameters for each atmopheric layer as
+        returned by the `~pycraf.atm.atm_layers` function.
+    n_elev : int, optional
+        Number of elevations in the grid (default: 8001)
+
+        Close to the horizon, the endpoint heights of the paths are
+        discontinuous in elevation (see Notes of
+        `~pycraf.atm.find_elevation_atlas`). Targets that can only be
+        reached by path branches narrower than the grid spacing may
+        be missed, if the grid is too coarse.
+
+    Returns
+    -------
+    ray_atlas : dict
+        Elevation grid, path records (concatenated heights and arc lengths
+        of the crossing points), and the atmospheric-layers data that is
+        needed to refine the solutions.
+    '''
+
+    if not isinstance(obs_alt, numbers.Real):
+        raise TypeError('obs_alt must be a scalar float')
+    if n_elev < 2:
+        raise ValueError('n_elev must be at least 2')
+
+    radii = np.ascontiguousarray(atm_layers_cache['radii'], dtype=np.float64)
+    heights = atm_layers_cache['heights']
+    ref_index = np.ascontiguousarray(
+        atm_layers_cache['ref_index'], dtype=np.float64
+        )
+    space_i = atm_layers_cache['space_i']
+    max_i = atm_layers_cache['max_i']
+
+    # same as in _raytrace_path
+    obs_alt = max([1.e-9, obs_alt])
+    start_i = np.searchsorted(heights, obs_alt)
+    if heights[start_i] == obs_alt:
+        start_i += 1
+        obs_alt += 1e-9
+
+    # finest sampling around the horizon (~0.0007 deg for n_elev = 8001)
+    elevations = 90. * np.sinh(6. * np.linspace(-1., 1., n_elev)) / np.sinh(6.)
+    elevations = np.clip(elevations, -90., 90.)
+
+    offsets, delta_n, h_n = ray_atlas_cython(
+        elevations, start_i, obs_alt, space_i, max_i, radii, ref_index,
+        )
+
+    return {
+        'obs_alt': obs_alt,
+        'start_i': start_i,
+        'elevations': elevations,
+        'offsets': offsets,
+        'delta_n': delta_n,
+        'h_n': h_n,
+        'space_i': space_i,
+        'max_i': max_i,
+        'radii': radii,
+        'ref_index': ref_index,
+        }
+
+
+@utils.ranged_quantity_input(
+    target_alt=(0, None, apu.km),
+    arc_length=(1.e-30, 180., apu.deg),
+    strip_input_units=True, output_unit=(apu.deg, apu.km)
+    )
+def find_elevation_atlas(target_alt, arc_length, ray_atlas):
+    '''
+    Finds the optimal path elevation angles from an observer to reach targets.
+
+    This is a deterministic, array-valued alternative to
+    `~pycraf.atm.find_elevation`. For each target, the solution is
+    bracketed using a pre-computed ray atlas (see `~pycraf.atm.ray_atlas`)
+    and then refined with exact ray-tracing, using the Illinois variant of
+    regula falsi. Brackets are tried in the order of their distance to the
+    geometric elevation, until one converges. If no bracket converges, a
+    golden-section search around the best atlas path is used instead. The
+    targets are processed in parallel.
+
+    Parameters
+    ----------
+    target_alt : `~astropy.units.Quantity`
+        Heights of targets above sea-level [km]
+    arc_length : `~astropy.units.Quantity`
+        Arc-lengths (true angular distance) between observer and targets
+        [deg]
+
+        `target_alt` and `arc_length` must be broadcastable against each
+        other.
+    ray_atlas : dict
+        Ray atlas of the observer as returned by the `~pycraf.atm.ray_atlas`
+        function.
+
+    Returns
+    -------
+    elevation : `~astropy.units.Quantity`
+        (Apparent) elevations of paths at the observer [deg]
+    h : `~astropy.units.Quantity`
+        Heights of the path endpoints [km]
+
+        These can differ from `target_alt` if a target cannot be reached.
+
+    Notes
+    -----
+    Because of the approximation of Earth's atmosphere with layers of discrete
+    refractive indices, caustics are generated (see `~pycraf` manual), i.e.,
+    there are certains target points that cannot be reached, regardless of
+    the elevation angle at the observer. For these (and for targets below
+    the horizon) an approximate solution is returned, i.e., a path that
+    ends close to the target (using the same objective function as
+    `~pycraf.atm.find_elevation`). If several elevations reach a target,
+    the one closest to the geometric elevation (neglecting refraction) is
+    returned.
+
+    The caustics also make the endpoint height of the paths discontinuous
+    in elevation. A sign change of the misfit between two paths can thus
+    be a jump instead of a solution; such brackets are discarded. Targets
+    that can only be reached by path branches narrower than the grid
+    spacing of the ray atlas may be missed; a denser atlas (see `n_elev`
+    in `~pycraf.atm.ray_atlas`) helps in this case.
+    '''
+
+    target_alt, arc_length = np.broadcast_arrays(
+        np.asarray(target_alt, dtype=np.float64),
+        np.asarray(arc_length, dtype=np.float64),
+        )
+    shape = target_alt.shape
+    target_alt = np.ascontiguousarray(target_alt.ravel())
+    arc_length = np.ascontiguousarray(arc_length.ravel())
+
+    # geometric elevations (as elev_init in _find_elevation)
+    a_e = EARTH_RADIUS
+    arc_rad = np.radians(arc_length)
+    x1, y1 = 0., a_e + ray_atlas['obs_alt']
+    x2, y2 = (
+        np.sin(arc_rad) * (a_e + target_alt),
+        np.cos(arc_rad) * (a_e + target_alt),
+        )
+    elev_init = np.degrees(np.arctan2(y2 - y1, x2 - x1))
+
+    elev, h = find_elevation_atlas_cython(
+        target_alt, arc_length, elev_init,
+        ray_atlas['elevations'],
+        ray_atlas['offsets'],
+        ray_atlas['delta_n'],
+        ray_atlas['h_n'],
+        ray_atlas['start_i'],
+        ray_atlas['obs_alt'],
+        ray_atlas['space_i'],
+        ray_atlas['max_i'],
+        ray_atlas['radii'],
+        ray_atlas['ref_index'],
+        )
+
+    return elev.reshape(shape), h.reshape(shape)
+
+
 @utils.ranged_quantity_input(
     elevation=(-90, 90, apu.deg),
     obs_alt=(0, None, apu.km),
@@ -2388,8 +2619,6 @@ def atten_slant_annex1(
 
     adict = atm_layers_dict
 
-    tebb = np.ones(adict['freq_grid'].shape, dtype=np.float64) * t_bg
-
     path_params, refraction, is_space_path = _raytrace_path(
         elevation, obs_alt,
         adict,
@@ -2398,34 +2627,136 @@ def atten_slant_annex1(
 
     # do backward raytracing (to allow tebb calculation); this makes only
     # sense if we have a path that goes to space!
-    # need to skip first entry in path record, as it is just the starting
-    # point
-    atten_db = adict['atten_db']
-    temp = adict['temp']
-    total_atten_db = np.sum(
-        atten_db[path_params.layer_idx[1:]] *
-        path_params.a_n[1:, np.newaxis],
-        axis=0,
-        )
-
-    # TODO: do the following in cython?
-    if is_space_path and do_tebb:
-        for idx, lidx in list(enumerate(path_params.layer_idx))[:0:-1]:
-            if lidx >= adict['space_i']:
-                continue
-            # need to calculate (linear) atten per layer for tebb
-            atten_tot_lin = 10 ** (
-                -atten_db[lidx] * path_params.a_n[idx] / 10.
-                )
-            tebb *= atten_tot_lin
-            tebb += (1. - atten_tot_lin) * temp[lidx]
-
-    else:
-        tebb[...] = np.nan
+    total_atten_db, tebb = path_atten_tebb_cython(
+        np.ascontiguousarray(path_params.layer_idx, dtype=np.int32),
+        np.ascontiguousarray(path_params.a_n, dtype=np.float64),
+        adict['space_i'],
+        np.ascontiguousarray(adict['atten_db'], dtype=np.float64),
+        np.ascontiguousarray(adict['temp'], dtype=np.float64),
+        t_bg,
+        is_space_path and do_tebb,
+        )
 
     return total_atten_db, refraction, tebb
 
 
+@utils.ranged_quantity_input(
+    elevation=(-90, 90, apu.deg),
+    obs_alt=(0, None, apu.km),
+    t_bg=(1.e-30, None, apu.K),
+    max_arc_length=(1.e-30, 180., apu.deg),
+    max_path_length=(1.e-30, None, apu.km),
+    strip_input_units=True, output_unit=(cnv.dB, apu.deg, apu.K)
+    )
+def atten_slant_annex1_grid(
+        elevation, obs_alt, atm_layers_dict, do_tebb=True,
+        t_bg=2.73 * apu.K,
+        max_arc_length=180. * apu.deg,
+        max_path_length=1000. * apu.km,
+        ):
+    '''
+    Path attenuation for many slant paths through full atmosphere according
+    to `ITU-R P.676-11 <https://www.itu.int/rec/R-REC-P.676-11-201609-I/en>`_
+    Eq (17-20).
+
+    This is an array-valued version of `~pycraf.atm.atten_slant_annex1`
+    (with identical results), e.g., to calculate sky-brightness maps. The
+    paths are ray-traced in compiled code (in parallel).
+
+    Parameters
+    ----------
+    elevation : `~astropy.units.Quantity`
+        (Apparent) elevations of source as seen from observer [deg]
+    obs_alt : `~astropy.units.Quantity`
+        Heights of observer above sea-level [km]
+
+        `elevation` and `obs_alt` must be broadcastable against each other.
+    atm_layers_cache : dict
+        Pre-computed physical parameters for each atmopheric layer as
+        returned by the `~pycraf.atm.atm_layers` function.
+    do_tebb : boolean, optional
+        Whether to calculate the equivalent blackbody brightness temperature
+        of the (full) Earth's atmosphere. (default: True)
+    t_bg : `~astropy.units.Quantity`, scalar, optional
+        Background temperature, i.e. temperature just after the outermost
+        layer (default: 2.73 K)
+    max_path_length : `~astropy.units.Quantity`, scalar
+        Maximal length of paths before stopping iteration [km]
+
+        (default: 1000 km; useful for terrestrial paths)
+    max_arc_length : `~astropy.units.Quantity`, scalar
+        Maximal arc-length (true angular distance between observer and source/
+        target) of paths before stopping iteration [deg]
+
+        (default: 180 deg; useful for terrestrial paths)
+
+    Returns
+    -------
+    total_atten : `~astropy.units.Quantity`
+        Total attenuation along paths [dB]; shape (..., n_freq), where
+        "..." is the broadcasted shape of `elevation` and `obs_alt`
+    Refraction : `~astropy.units.Quantity`
+        Offset with respect to a hypothetical straight path, i.e., the
+        correction between real and apparent source elevation [deg];
+        shape (...)
+    t_ebb (K) : `~astropy.units.Quantity`
+        Equivalent black body temperature of the atmosphere (accounting
+        for any outside contribution, e.g., from CMB) [K]; shape
+        (..., n_freq)
+
+        Will be NaN for paths that do not go to space, or if
+        `do_tebb == False`.
+    '''
+
+    if not isinstance(t_bg, numbers.Real):
+        raise TypeError('t_bg must be a scalar float')
+    if not isinstance(max_path_length, numbers.Real):
+        raise TypeError('max_path_length must be a scalar float')
+    if not isinstance(max_arc_length, numbers.Real):
+        raise TypeError('max_arc_length must be a scalar float')
+
+    adict = atm_layers_dict
+    heights = adict['heights']
+
+    elevation, obs_alt = np.broadcast_arrays(
+        np.asarray(elevation, dtype=np.float64),
+        np.asarray(obs_alt, dtype=np.float64),
+        )
+    shape = elevation.shape
+
+    # same as in _raytrace_path: the algorithm fails, if the observer is
+    # *on* the smallest height or on any layer height
+    obs_alt = np.maximum(1.e-9, obs_alt.ravel())
+    start_i = np.searchsorted(heights, obs_alt)
+    on_layer = heights[np.minimum(start_i, len(heights) - 1)] == obs_alt
+    start_i[on_layer] += 1
+    obs_alt[on_layer] += 1e-9
+
+    total_atten_db, refraction, tebb = atten_slant_annex1_cython(
+        np.ascontiguousarray(start_i, dtype=np.int32),
+        np.ascontiguousarray(elevation.ravel()),
+        obs_alt,
+        adict['space_i'],
+        adict['max_i'],
+        max_path_length,
+        max_arc_length,
+        adict['radii'],
+        adict['ref_index'],
+        np.ascontiguousarray(adict['atten_db'], dtype=np.float64),
+        np.ascontiguousarray(adict['temp'], dtype=np.float64),
+        t_bg,
+        do_tebb,
+        )
+
+    nfreq = total_atten_db.shape[1]
+
+    return (
+        total_atten_db.reshape(shape + (nfreq, )),
+        refraction.reshape(shape),
+        tebb.reshape(shape + (nfreq, )),
+        )
+
+
 def _phi_helper(r_p, r_t, args):
     '''
     Helper function according to `ITU-R P.676-10
@@ -10,16 +10,24 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 cimport cython
+from cython.parallel import prange, parallel
 cimport numpy as np
 from numpy cimport PyArray_MultiIter_DATA as Py_Iter_DATA
+from libc.stdlib cimport abort, malloc, free
 from libc.math cimport (
-    exp, sqrt, fabs, M_PI, M_PI_2, NAN, sin, cos, tan, asin, acos, atan2, fmod
+    exp, sqrt, pow, fabs, fmin, fmax, M_PI, M_PI_2, NAN, INFINITY, sin, cos,
+    tan, asin, acos, atan2, fmod
     )
 import numpy as np
 
 np.import_array()
 
-__all__ = ['path_helper_cython', 'path_endpoint_cython']
+__all__ = [
+    'path_helper_cython', 'path_endpoint_cython',
+    'atten_specific_annex1_layers_cython', 'atten_slant_annex1_cython',
+    'path_atten_tebb_cython', 'ray_atlas_cython',
+    'find_elevation_atlas_cython',
+    ]
 
 
 cdef double DEG2RAD = M_PI / 180.
@@ -198,10 +206,12 @@ cdef (
     # calculate alpha_n
     v1_norm = sqrt(x ** 2 + y ** 2)
     v2_norm = sqrt((x - x_old) ** 2 + (y - y_old) ** 2)
-    alpha_n = acos(
+    # (for very long steps, e.g., in outer space, rounding errors can
+    # push the cosine beyond 1)
+    alpha_n = acos(fmin(fmax(
         x / v1_norm * (x - x_old) / v2_norm +
-        y / v1_norm * (y - y_old) / v2_norm
-        )
+        y / v1_norm * (y - y_old) / v2_norm,
+        -1.), 1.))
 
     if alpha_n > M_PI_2:
         beta_n = M_PI - asin(
@@ -243,19 +253,8 @@ def path_helper_cython(
     '''
 
     cdef:
-        int i, di, counter = 0
+        Py_ssize_t counter
         bint is_space_path = 0  # path goes into space? (i.e. above max layer)
-        bint first_iter = 1
-        bint do_break = 0
-
-        double path_length = 0
-        double delta_n = 0
-        double max_delta_n_rad = DEG2RAD * max_delta_n
-        double alpha_n = NAN
-        double beta_0 = DEG2RAD * (90. - elev)
-        double beta_n = beta_0
-        double r_n = EARTH_RADIUS + obs_alt
-        double h_n, a_n, x_n, y_n
         double refraction = 0.
 
         double[::1] _a_n = A_N
@@ -270,104 +269,16 @@ def path_helper_cython(
         int[::1] _layer_edge_left_idx = LAYER_EDGE_LEFT_IDX
         int[::1] _layer_edge_right_idx = LAYER_EDGE_RIGHT_IDX
 
-    # the first point is not related to anything, but it is still
-    # useful to have it here (e.g., if one wants to plot the full path)
-    # it must be neglected from attenuation/Tebb calculations
-    _a_n[counter] = 0.
-    _r_n[counter] = r_n
-    _h_n[counter] = obs_alt
-    _x_n[counter] = x_n = 0.
-    _y_n[counter] = y_n = r_n
-    _alpha_n[counter] = NAN
-    _beta_n[counter] = NAN
-    _delta_n[counter] = 0.
-    _layer_idx[counter] = -1000
-    _layer_edge_left_idx[counter] = -1000
-    _layer_edge_right_idx[counter] = -1000
-    counter += 1
-
-    i = start_i
-    while i > 0 and i < max_i:
-
-        # beta_n is the path angle on the left
-        _beta_n[counter] = beta_n
-
-        if first_iter:
-
-            (
-                di, x_n, y_n, delta_n, a_n, alpha_n, beta_n, do_break
-                ) = propagate_path(
-                r_n, radii[i - 1], radii[i],
-                ref_index[i - 1], ref_index[i],
-                ref_index[i], ref_index[i + 1],
-                beta_n, delta_n, path_length,
-                x_n, y_n, first_iter,
-                max_delta_n_rad, max_path_length,
-                )
-            _layer_edge_left_idx[counter] = -1000
-            _layer_idx[counter] = i
-            first_iter = 0
-
-        else:
-
-            (
-                di, x_n, y_n, delta_n, a_n, alpha_n, beta_n, do_break
-                ) = propagate_path(
-                radii[i], radii[i - 1], radii[i + 1],
-                ref_index[i - 1], ref_index[i],
-                ref_index[i + 1], ref_index[i + 2],
-                beta_n, delta_n, path_length,
-                x_n, y_n, first_iter,
-                max_delta_n_rad, max_path_length,
-                )
-            _layer_edge_left_idx[counter] = i
-            # to determine the correct atm layer index, we need to
-            # account for the type of propagation (up, down, same)
-            # (mind that layer n is directly above layer_edge n)
-            if di == 1:
-                # up
-                _layer_idx[counter] = i + 1
-            elif di == 0:
-                # same
-                _layer_idx[counter] = i
-            elif di == -1:
-                # down
-                _layer_idx[counter] = i
-            else:
-                raise RuntimeError('Something went wrong with raytracing')
-
-        # print(counter, i, di, x_n, y_n, delta_n, a_n, alpha_n, beta_n)
-
-        path_length += a_n
-        r_n = sqrt(x_n ** 2 + y_n ** 2)
-        h_n = r_n - EARTH_RADIUS
-
-        _a_n[counter] = a_n
-        # the following four numbers are the coordinates of the right
-        # crossing point, as the left point is already in the list!
-        _r_n[counter] = r_n
-        _h_n[counter] = h_n
-        _x_n[counter] = x_n
-        _y_n[counter] = y_n
-        # alpha_n is the angle on the right edge
-        _alpha_n[counter] = alpha_n
-        # _beta_n[counter] = beta_n
-        # delta_n is the arc length of the sector
-        _delta_n[counter] = delta_n
-        _layer_edge_right_idx[counter] = i + di
-
-        counter += 1
-
-        if do_break:
-            break
-        else:
-            i += di
-
-        if i == space_i:
-            is_space_path = 1
-
-    refraction = -RAD2DEG * (beta_n + delta_n - beta_0)
-    # _beta_n[counter - 1] = NAN
+    counter = _trace_path(
+        start_i, space_i, max_i, elev, obs_alt,
+        max_path_length, DEG2RAD * max_delta_n, radii, ref_index,
+        MAX_COUNT, &_a_n[0], &_layer_idx[0], &_h_n[0], &_delta_n[0],
+        &refraction, &is_space_path,
+        &_r_n[0], &_x_n[0], &_y_n[0], &_alpha_n[0], &_beta_n[0],
+        &_layer_edge_left_idx[0], &_layer_edge_right_idx[0],
+        )
+    if counter < 0:
+        raise RuntimeError('Ray path exceeds the pre-allocated buffers')
 
     return (
         np.core.records.fromarrays(
@@ -483,3 +394,1209 @@ cpdef (
         refraction,
         is_space_path,
         )
+
+
+cdef Py_ssize_t _trace_path(
+        int start_i,
+        int space_i,
+        int max_i,
+        double elev,  # deg
+        double obs_alt,  # km
+        double max_path_length,  # km
+        double max_delta_n_rad,  # rad
+        const double[::1] radii,
+        const double[::1] ref_index,
+        Py_ssize_t max_count,
+        double *_a_n,
+        int *_layer_idx,
+        double *_h_n,
+        double *_delta_n,
+        double *refraction,
+        bint *is_space_path,
+        double *_r_n=NULL,
+        double *_x_n=NULL,
+        double *_y_n=NULL,
+        double *_alpha_n=NULL,
+        double *_beta_n=NULL,
+        int *_layer_edge_left_idx=NULL,
+        int *_layer_edge_right_idx=NULL,
+        ) nogil:
+    '''
+    Ray-tracing on caller-provided buffers (one per thread). Always records
+    a_n and layer_idx; all other path parameters (see `path_helper_cython`)
+    are only recorded, if their buffers are not NULL.
+
+    Returns the number of path entries or -1, if the buffers are too small.
+    '''
+
+    cdef:
+        int i, di
+        Py_ssize_t counter = 0
+        bint first_iter = 1
+        bint do_break = 0
+
+        double path_length = 0
+        double delta_n = 0
+        double alpha_n = NAN
+        double beta_0 = DEG2RAD * (90. - elev)
+        double beta_n = beta_0
+        double r_n = EARTH_RADIUS + obs_alt
+        double a_n, x_n = 0., y_n = r_n
+
+    is_space_path[0] = 0
+
+    # the first point is not related to anything, but it is still
+    # useful to have it here (e.g., if one wants to plot the full path)
+    # it must be neglected from attenuation/Tebb calculations
+    _a_n[counter] = 0.
+    _layer_idx[counter] = -1000
+    if _h_n != NULL:
+        _h_n[counter] = obs_alt
+    if _delta_n != NULL:
+        _delta_n[counter] = 0.
+    if _r_n != NULL:
+        _r_n[counter] = r_n
+    if _x_n != NULL:
+        _x_n[counter] = x_n
+    if _y_n != NULL:
+        _y_n[counter] = y_n
+    if _alpha_n != NULL:
+        _alpha_n[counter] = NAN
+    if _beta_n != NULL:
+        _beta_n[counter] = NAN
+    if _layer_edge_left_idx != NULL:
+        _layer_edge_left_idx[counter] = -1000
+    if _layer_edge_right_idx != NULL:
+        _layer_edge_right_idx[counter] = -1000
+    counter += 1
+
+    i = start_i
+    while i > 0 and i < max_i:
+
+        if counter >= max_count:
+            return -1
+
+        # beta_n is the path angle on the left
+        if _beta_n != NULL:
+            _beta_n[counter] = beta_n
+
+        if first_iter:
+
+            (
+                di, x_n, y_n, delta_n, a_n, alpha_n, beta_n, do_break
+                ) = propagate_path(
+                r_n, radii[i - 1], radii[i],
+                ref_index[i - 1], ref_index[i],
+                ref_index[i], ref_index[i + 1],
+                beta_n, delta_n, path_length,
+                x_n, y_n, first_iter,
+                max_delta_n_rad, max_path_length,
+                )
+            _layer_idx[counter] = i
+            if _layer_edge_left_idx != NULL:
+                _layer_edge_left_idx[counter] = -1000
+            first_iter = 0
+
+        else:
+
+            (
+                di, x_n, y_n, delta_n, a_n, alpha_n, beta_n, do_break
+                ) = propagate_path(
+                radii[i], radii[i - 1], radii[i + 1],
+                ref_index[i - 1], ref_index[i],
+                ref_index[i + 1], ref_index[i + 2],
+                beta_n, delta_n, path_length,
+                x_n, y_n, first_iter,
+                max_delta_n_rad, max_path_length,
+                )
+            # to determine the correct atm layer index, we need to
+            # account for the type of propagation (up, down, same)
+            # (mind that layer n is directly above layer_edge n)
+            if di == 1:
+                _layer_idx[counter] = i + 1
+            else:
+                _layer_idx[counter] = i
+            if _layer_edge_left_idx != NULL:
+                _layer_edge_left_idx[counter] = i
+
+        path_length += a_n
+        r_n = sqrt(x_n ** 2 + y_n ** 2)
+
+        _a_n[counter] = a_n
+        # the following numbers are the coordinates of the right
+        # crossing point, as the left point is already in the list!
+        if _h_n != NULL:
+            _h_n[counter] = r_n - EARTH_RADIUS
+        if _r_n != NULL:
+            _r_n[counter] = r_n
+        if _x_n != NULL:
+            _x_n[counter] = x_n
+        if _y_n != NULL:
+            _y_n[counter] = y_n
+        # alpha_n is the angle on the right edge
+        if _alpha_n != NULL:
+            _alpha_n[counter] = alpha_n
+        # delta_n is the arc length of the sector
+        if _delta_n != NULL:
+            _delta_n[counter] = delta_n
+        if _layer_edge_right_idx != NULL:
+            _layer_edge_right_idx[counter] = i + di
+        counter += 1
+
+        if do_break:
+            break
+        else:
+            i += di
+
+        if i == space_i:
+            is_space_path[0] = 1
+
+    refraction[0] = -RAD2DEG * (beta_n + delta_n - beta_0)
+
+    return counter
+
+
+cdef void _accumulate_path(
+        const int *layer_idx,
+        const double *a_n,
+        Py_ssize_t counter,
+        int space_i,
+        const double[:, ::1] atten_db,
+        const double[::1] temp,
+        double t_bg,
+        bint do_tebb,
+        Py_ssize_t j0,
+        Py_ssize_t j1,
+        double *total_atten,
+        double *tebb,
+        ) nogil:
+    '''
+    Total attenuation and Tebb of a path for frequencies j0 ... j1 - 1.
+
+    The path record (`layer_idx`, `a_n`) is as in `path_helper_cython`.
+    Results are written to total_atten[j0:j1] and tebb[j0:j1]. The
+    summation order is the same as in earlier (NumPy) versions of
+    `~pycraf.atm.atten_slant_annex1`, such that results are identical.
+    '''
+
+    cdef:
+        Py_ssize_t n, j
+        int lidx
+        double _a_n, atten_lin
+
+    for j in range(j0, j1):
+        total_atten[j] = 0.
+
+    # need to skip first entry in path record, as it is just the
+    # starting point
+    for n in range(1, counter):
+        lidx = layer_idx[n]
+        _a_n = a_n[n]
+        for j in range(j0, j1):
+            total_atten[j] += atten_db[lidx, j] * _a_n
+
+    # backward raytracing (only meaningful for paths to space)
+    if not do_tebb:
+        for j in range(j0, j1):
+            tebb[j] = NAN
+        return
+
+    for j in range(j0, j1):
+        tebb[j] = t_bg
+
+    for n in range(counter - 1, 0, -1):
+        lidx = layer_idx[n]
+        if lidx >= space_i:
+            continue
+        _a_n = a_n[n]
+        for j in range(j0, j1):
+            # need to calculate (linear) atten per layer for tebb
+            atten_lin = pow(10., -atten_db[lidx, j] * _a_n / 10.)
+            tebb[j] = tebb[j] * atten_lin
+            tebb[j] = tebb[j] + (1. - atten_lin) * temp[lidx]
+
+
+def path_atten_tebb_cython(
+        const int[::1] layer_idx,
+        const double[::1] a_n,
+        int space_i,
+        const double[:, ::1] atten_db,
+        const double[::1] temp,
+        double t_bg,
+        bint do_tebb,
+        ):
+    '''
+    Total attenuation and Tebb (P.676-11 Annex 1) along a ray-traced path.
+
+    The frequency axis is split into blocks, which are processed in
+    parallel. Each block runs through the path record once forward (total
+    attenuation) and once backward (Tebb); the per-block results stay in
+    cache.
+
+    Parameters
+    ----------
+    layer_idx, a_n - Path record as returned by `path_helper_cython`
+    space_i - Index of first layer in space
+    atten_db - Specific attenuation of layers [dB / km]; shape
+        (n_layers, n_freq)
+    temp - Temperature of layers [K]; shape (>= space_i, )
+    t_bg - Background temperature [K]
+    do_tebb - Whether to calculate Tebb (should only be set for paths
+        to space)
+
+    Returns
+    -------
+    (total_atten, tebb) - Total attenuation [dB] and Tebb [K]; shape
+        (n_freq, ). Tebb is NaN, if `do_tebb` is False.
+    '''
+
+    cdef:
+        Py_ssize_t counter = layer_idx.shape[0]
+        Py_ssize_t nfreq = atten_db.shape[1]
+        Py_ssize_t chunk = _FREQ_CHUNK
+        Py_ssize_t nchunks = (nfreq + chunk - 1) // chunk
+        Py_ssize_t k, j0, j1
+
+        double[::1] _total_atten, _tebb
+
+    assert a_n.shape[0] == counter, (
+        'layer_idx and a_n must have the same length'
+        )
+    assert temp.shape[0] >= space_i
+
+    total_atten = np.zeros((nfreq, ), dtype=np.float64)
+    tebb = np.zeros((nfreq, ), dtype=np.float64)
+    if nfreq == 0:
+        return total_atten, tebb
+
+    _total_atten = total_atten
+    _tebb = tebb
+
+    for k in prange(nchunks, nogil=True, schedule='dynamic'):
+
+        j0 = k * chunk
+        j1 = j0 + chunk
+        if j1 > nfreq:
+            j1 = nfreq
+
+        _accumulate_path(
+            &layer_idx[0], &a_n[0], counter, space_i, atten_db, temp,
+            t_bg, do_tebb, j0, j1, &_total_atten[0], &_tebb[0],
+            )
+
+    return total_atten, tebb
+
+
+def atten_slant_annex1_cython(
+        const int[::1] start_i,
+        const double[::1] elev,  # deg
+        const double[::1] obs_alt,  # km
+        int space_i,
+        int max_i,
+        double max_path_length,  # km
+        double max_delta_n,  # deg
+        const double[::1] radii,
+        const double[::1] ref_index,
+        const double[:, ::1] atten_db,
+        const double[::1] temp,
+        double t_bg,
+        bint do_tebb,
+        ):
+    '''
+    Path attenuation and Tebb (P.676-11 Annex 1) for many paths at once.
+
+    The paths are ray-traced in parallel, each thread using its own
+    path buffers. Attenuation and Tebb are accumulated as in
+    `path_atten_tebb_cython`.
+
+    Parameters
+    ----------
+    start_i - Index of first layer above observer; shape (n, )
+    elev - (Apparent) elevation of paths [deg]; shape (n, )
+    obs_alt - Height of observer [km]; shape (n, )
+    space_i, max_i, radii, ref_index - as in `path_helper_cython`
+    max_path_length - Maximal length of paths [km]
+    max_delta_n - Maximal arc length of paths [deg]
+    atten_db - Specific attenuation of layers [dB / km]; shape
+        (n_layers, n_freq)
+    temp - Temperature of layers [K]; shape (>= space_i, )
+    t_bg - Background temperature [K]
+    do_tebb - Whether to calculate Tebb
+
+    Returns
+    -------
+    (total_atten, refraction, tebb) - Total attenuation [dB], refraction
+        [deg], and Tebb [K]; shapes (n, n_freq), (n, ), and (n, n_freq).
+        Tebb is NaN for non-space paths (or if `do_tebb` is False).
+    '''
+
+    cdef:
+        Py_ssize_t npaths = elev.shape[0]
+        Py_ssize_t nfreq = atten_db.shape[1]
+        Py_ssize_t max_count = MAX_COUNT
+        double max_delta_n_rad = DEG2RAD * max_delta_n
+        Py_ssize_t k, counter
+        int nfailed = 0
+
+        double *_a_n
+        int *_layer_idx
+        bint is_space_path
+
+        double[:, ::1] _total_atten, _tebb
+        double[::1] _refraction
+
+    assert start_i.shape[0] == npaths and obs_alt.shape[0] == npaths, (
+        'start_i, elev, and obs_alt must have the same length'
+        )
+    # temperatures are only needed below space_i
+    assert temp.shape[0] >= space_i and atten_db.shape[0] >= max_i
+
+    total_atten = np.zeros((npaths, nfreq), dtype=np.float64)
+    refraction = np.zeros((npaths, ), dtype=np.float64)
+    tebb = np.zeros((npaths, nfreq), dtype=np.float64)
+    _total_atten = total_atten
+    _refraction = refraction
+    _tebb = tebb
+
+    with nogil, parallel():
+
+        _a_n = <double *> malloc(max_count * sizeof(double))
+        _layer_idx = <int *> malloc(max_count * sizeof(int))
+        if _a_n == NULL or _layer_idx == NULL:
+            abort()
+
+        for k in prange(npaths, schedule='dynamic'):
+
+            is_space_path = 0
+            counter = _trace_path(
+                start_i[k], space_i, max_i, elev[k], obs_alt[k],
+                max_path_length, max_delta_n_rad, radii, ref_index,
+                max_count, _a_n, _layer_idx, NULL, NULL,
+                &_refraction[k], &is_space_path,
+                )
+            if counter < 0:
+                nfailed += 1
+                continue
+
+            _accumulate_path(
+                _layer_idx, _a_n, counter, space_i, atten_db, temp, t_bg,
+                is_space_path and do_tebb, 0, nfreq,
+                &_total_atten[k, 0], &_tebb[k, 0],
+                )
+
+        free(_a_n)
+        free(_layer_idx)
+
+    if nfailed > 0:
+        raise RuntimeError(
+            'Path buffers too small (MAX_COUNT = {})'.format(MAX_COUNT)
+            )
+
+    return total_atten, refraction, tebb
+
+
+# number of frequencies that are processed in one work item of
+# atten_specific_annex1_layers_cython and path_atten_tebb_cython
+_FREQ_CHUNK = 1024
+
+
+cdef void _line_params_oxygen(
+        const double[:, ::1] lines,
+        double press_dry, double press_w, double temp,
+        double *S, double *Delta_f, double *delta,
+        ) nogil:
+    # line strengths, widths and shape corrections of the oxygen lines,
+    # P.676-11 Eq. (3), (6a/b), and (7); columns of lines: f0, a1, ..., a6
+
+    cdef:
+        Py_ssize_t i
+        double theta = 300. / temp
+        double factor = 1.e-7 * press_dry * pow(theta, 3)
+        double theta_08 = pow(theta, 0.8)
+        double df
+
+    for i in range(lines.shape[0]):
+
+        S[i] = lines[i, 1] * factor * exp(lines[i, 2] * (1. - theta))
+
+        df = lines[i, 3] * 1.e-4 * (
+            press_dry * pow(theta, 0.8 - lines[i, 4]) +
+            1.1 * press_w * theta
+            )
+        Delta_f[i] = sqrt(df * df + 2.25e-6)
+
+        delta[i] = (
+            (lines[i, 5] + lines[i, 6] * theta) * 1.e-4 *
+            (press_dry + press_w) * theta_08
+            )
+
+
+cdef void _line_params_water(
+        const double[:, ::1] lines,
+        double press_dry, double press_w, double temp,
+        double *S, double *Delta_f, double *delta,
+        ) nogil:
+    # line strengths, widths and shape corrections of the water lines,
+    # P.676-11 Eq. (3) and (6a/b); columns of lines: f0, b1, ..., b6
+
+    cdef:
+        Py_ssize_t i
+        double theta = 300. / temp
+        double factor = 1.e-1 * press_w * pow(theta, 3.5)
+        double df
+
+    for i in range(lines.shape[0]):
+
+        S[i] = lines[i, 1] * factor * exp(lines[i, 2] * (1. - theta))
+
+        df = lines[i, 3] * 1.e-4 * (
+            press_dry * pow(theta, lines[i, 4]) +
+            lines[i, 5] * press_w * pow(theta, lines[i, 6])
+            )
+        Delta_f[i] = 0.535 * df + sqrt(
+            0.217 * (df * df) +
+            2.1316e-12 * (lines[i, 0] * lines[i, 0]) / theta
+            )
+
+        delta[i] = 0.
+
+
+cdef inline double _line_sum(
+        double freq,
+        const double[:, ::1] lines,
+        double *S, double *Delta_f, double *delta,
+        ) nogil:
+    # sum of line strengths times line shapes, P.676-11 Eq. (5)
+
+    cdef:
+        Py_ssize_t i
+        double f_i, df_plus, df_minus, sum_1, sum_2
+        double atten = 0.
+
+    for i in range(lines.shape[0]):
+
+        f_i = lines[i, 0]
+        df_plus = f_i + freq
+        df_minus = f_i - freq
+
+        sum_1 = (Delta_f[i] - delta[i] * df_minus) / (
+            df_minus * df_minus + Delta_f[i] * Delta_f[i]
+            )
+        sum_2 = (Delta_f[i] - delta[i] * df_plus) / (
+            df_plus * df_plus + Delta_f[i] * Delta_f[i]
+            )
+        atten += S[i] * (freq / f_i * (sum_1 + sum_2))
+
+    return atten
+
+
+cdef inline double _N_D_prime2(
+        double freq, double press_dry, double press_w, double temp
+        ) nogil:
+    # dry air continuum absorption, P.676-11 Eq. (8/9)
+
+    cdef:
+        double theta = 300. / temp
+        double d = 5.6e-4 * (press_dry + press_w) * pow(theta, 0.8)
+        double q = freq / d
+        double sum_1, sum_2
+
+    sum_1 = 6.14e-5 / d / (1 + q * q)
+    sum_2 = 1.4e-12 * press_dry * pow(theta, 1.5) / (
+        1 + 1.9e-5 * pow(freq, 1.5)
+        )
+
+    return freq * press_dry * pow(theta, 2) * (sum_1 + sum_2)
+
+
+def atten_specific_annex1_layers_cython(
+        const double[::1] freq_grid,
+        const double[::1] press_dry,
+        const double[::1] press_w,
+        const double[::1] temp,
+        const double[:, ::1] lines_oxygen,
+        const double[:, ::1] lines_water,
+        ):
+    '''
+    Specific attenuation (P.676-11 Annex 1) of many layers at once.
+
+    The work is split into (layer, frequency-chunk) items, which are
+    processed in parallel. For each item, the line parameters of the
+    layer are computed once, such that no (lines x frequencies)
+    intermediate arrays are necessary.
+
+    Parameters
+    ----------
+    freq_grid - Frequencies [GHz]; shape (n_freq, )
+    press_dry - Dry air (=Oxygen) pressure of layers [hPa]; shape (n_layers, )
+    press_w - Water vapor partial pressure of layers [hPa]; shape (n_layers, )
+    temp - Temperature of layers [K]; shape (n_layers, )
+    lines_oxygen - Oxygen resonances (columns f0, a1, ..., a6); shape (n, 7)
+    lines_water - Water resonances (columns f0, b1, ..., b6); shape (n, 7)
+
+    Returns
+    -------
+    (atten_dry, atten_wet) - Dry-air and wet-air specific attenuation
+        [dB / km]; shape (n_layers, n_freq)
+    '''
+
+    cdef:
+        Py_ssize_t nlayers = press_dry.shape[0]
+        Py_ssize_t nfreq = freq_grid.shape[0]
+        Py_ssize_t n_o2 = lines_oxygen.shape[0]
+        Py_ssize_t n_h2o = lines_water.shape[0]
+        Py_ssize_t chunk = _FREQ_CHUNK
+        Py_ssize_t nchunks = (nfreq + chunk - 1) // chunk
+        Py_ssize_t k, l, j, j0, j1
+
+        double *params
+        double freq, atten_o2
+
+        double[:, ::1] _atten_dry, _atten_wet
+
+    assert press_w.shape[0] == nlayers and temp.shape[0] == nlayers, (
+        'press_dry, press_w, and temp must have the same length'
+        )
+    assert lines_oxygen.shape[1] == 7 and lines_water.shape[1] == 7
+
+    atten_dry = np.zeros((nlayers, nfreq), dtype=np.float64)
+    atten_wet = np.zeros((nlayers, nfreq), dtype=np.float64)
+    _atten_dry = atten_dry
+    _atten_wet = atten_wet
+
+    with nogil, parallel():
+
+        # line parameters (S, Delta_f, delta) of oxygen and water lines
+        params = <double *> malloc(3 * (n_o2 + n_h2o) * sizeof(double))
+        if params == NULL:
+            abort()
+
+        for k in prange(nlayers * nchunks, schedule='dynamic'):
+
+            l = k // nchunks
+            j0 = (k % nchunks) * chunk
+            j1 = j0 + chunk
+            if j1 > nfreq:
+                j1 = nfreq
+
+            _line_params_oxygen(
+                lines_oxygen, press_dry[l], press_w[l], temp[l],
+                params, params + n_o2, params + 2 * n_o2,
+                )
+            _line_params_water(
+                lines_water, press_dry[l], press_w[l], temp[l],
+                params + 3 * n_o2,
+                params + 3 * n_o2 + n_h2o,
+                params + 3 * n_o2 + 2 * n_h2o,
+                )
+
+            for j in range(j0, j1):
+
+                freq = freq_grid[j]
+
+                atten_o2 = _line_sum(
+                    freq, lines_oxygen,
+                    params, params + n_o2, params + 2 * n_o2,
+                    )
+                atten_o2 = atten_o2 + _N_D_prime2(
+                    freq, press_dry[l], press_w[l], temp[l]
+                    )
+                _atten_dry[l, j] = atten_o2 * 0.182 * freq
+
+                _atten_wet[l, j] = _line_sum(
+                    freq, lines_water,
+                    params + 3 * n_o2,
+                    params + 3 * n_o2 + n_h2o,
+                    params + 3 * n_o2 + 2 * n_h2o,
+                    ) * 0.182 * freq
+
+        free(params)
+
+    return atten_dry, atten_wet
+
+
+# paths of the ray atlas are only limited by arc length and outermost layer
+cdef double ATLAS_MAX_PATH_LENGTH = 1.e30
+# misfit below which a bracket is accepted as converged (1 mm)
+cdef double ATLAS_TOLERANCE = 1.e-6
+
+
+def ray_atlas_cython(
+        const double[::1] elevs,  # deg
+        int start_i,
+        double obs_alt,  # km
+        int space_i,
+        int max_i,
+        const double[::1] radii,
+        const double[::1] ref_index,
+        ):
+    '''
+    Ray-trace the full paths for a grid of elevations (in parallel).
+
+    Parameters
+    ----------
+    elevs - Elevations of the paths [deg]; shape (n, )
+    start_i, obs_alt, space_i, max_i, radii, ref_index - as in
+        `path_helper_cython`
+
+    Returns
+    -------
+    (offsets, delta_n, h_n) - The path records (arc length [rad] and
+        height [km] of all crossing points) are concatenated;
+        path k is delta_n[offsets[k]:offsets[k + 1]].
+    '''
+
+    cdef:
+        Py_ssize_t nelevs = elevs.shape[0]
+        Py_ssize_t max_count = MAX_COUNT
+        Py_ssize_t k, counter
+        int nfailed = 0
+
+        double *_a_n
+        int *_layer_idx
+        double *_buf_h_n
+        double *_buf_delta_n
+        double refraction
+        bint is_space_path
+
+        np.int64_t[::1] _counts, _offsets
+        double[::1] _delta_n, _h_n
+
+    counts = np.zeros((nelevs, ), dtype=np.int64)
+    _counts = counts
+
+    # first pass: determine number of path entries
+    with nogil, parallel():
+
+        _a_n = <double *> malloc(max_count * sizeof(double))
+        _layer_idx = <int *> malloc(max_count * sizeof(int))
+        if _a_n == NULL or _layer_idx == NULL:
+            abort()
+
+        for k in prange(nelevs, schedule='dynamic'):
+
+            is_space_path = 0
+            counter = _trace_path(
+                start_i, space_i, max_i, elevs[k], obs_alt,
+                ATLAS_MAX_PATH_LENGTH, M_PI, radii, ref_index,
+                max_count, _a_n, _layer_idx, NULL, NULL,
+                &refraction, &is_space_path,
+                )
+            if counter < 0:
+                nfailed += 1
+                continue
+
+            _counts[k] = counter
+
+        free(_a_n)
+        free(_layer_idx)
+
+    if nfailed > 0:
+        raise RuntimeError(
+            'Path buffers too small (MAX_COUNT = {})'.format(MAX_COUNT)
+            )
+
+    offsets = np.zeros((nelevs + 1, ), dtype=np.int64)
+    offsets[1:] = np.cumsum(counts)
+    delta_n = np.empty((offsets[nelevs], ), dtype=np.float64)
+    h_n = np.empty((offsets[nelevs], ), dtype=np.float64)
+    _offsets = offsets
+    _delta_n = delta_n
+    _h_n = h_n
+    if offsets[nelevs] == 0:
+        return offsets, delta_n, h_n
+
+    # second pass: write path records directly into the output arrays
+    with nogil, parallel():
+
+        _a_n = <double *> malloc(max_count * sizeof(double))
+        _layer_idx = <int *> malloc(max_count * sizeof(int))
+        if _a_n == NULL or _layer_idx == NULL:
+            abort()
+
+        for k in prange(nelevs, schedule='dynamic'):
+
+            is_space_path = 0
+            _buf_h_n = &_h_n[_offsets[k]]
+            _buf_delta_n = &_delta_n[_offsets[k]]
+            _trace_path(
+                start_i, space_i, max_i, elevs[k], obs_alt,
+                ATLAS_MAX_PATH_LENGTH, M_PI, radii, ref_index,
+                _counts[k], _a_n, _layer_idx, _buf_h_n, _buf_delta_n,
+                &refraction, &is_space_path,
+                )
+
+        free(_a_n)
+        free(_layer_idx)
+
+    return offsets, delta_n, h_n
+
+
+cdef double _atlas_misfit(
+        const double[::1] delta_n,
+        const double[::1] h_n,
+        Py_ssize_t i0,
+        Py_ssize_t i1,
+        double obs_alt,  # km
+        double target_alt,  # km
+        double arc_rad,  # rad
+        ) nogil:
+    '''
+    Signed misfit (see `_elev_misfit`) of an atlas path, which is stored
+    in delta_n[i0:i1], h_n[i0:i1].
+
+    Within a layer, the path is a straight line between the crossing
+    points, which is intersected with the direction of the target.
+    '''
+
+    cdef:
+        Py_ssize_t lo = i0, hi = i1, mid
+        double d, misfit, t
+        double r1, r2, x1, y1, dx, dy, ux, uy
+
+    # first entry with delta_n >= arc_rad (delta_n is non-decreasing)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if delta_n[mid] < arc_rad:
+            lo = mid + 1
+        else:
+            hi = mid
+
+    if lo == i1:
+        # path ends before reaching the arc length
+        d = h_n[i1 - 1] - target_alt
+        misfit = fabs(d) + RAD2DEG * (arc_rad - delta_n[i1 - 1])
+        if h_n[i1 - 1] > obs_alt:
+            return misfit
+        return -misfit
+    elif lo == i0:
+        d = h_n[i0] - target_alt
+        misfit = fabs(d)
+    else:
+        r1 = EARTH_RADIUS + h_n[lo - 1]
+        r2 = EARTH_RADIUS + h_n[lo]
+        x1 = r1 * sin(delta_n[lo - 1])
+        y1 = r1 * cos(delta_n[lo - 1])
+        dx = r2 * sin(delta_n[lo]) - x1
+        dy = r2 * cos(delta_n[lo]) - y1
+        ux = sin(arc_rad)
+        uy = cos(arc_rad)
+        t = (y1 * ux - x1 * uy) / (dx * uy - dy * ux)
+        d = sqrt((x1 + t * dx) ** 2 + (y1 + t * dy) ** 2) - EARTH_RADIUS
+        d -= target_alt
+        misfit = fabs(d)
+
+    if d > 0:
+        return misfit
+    return -misfit
+
+
+cdef double _elev_misfit(
+        int start_i,
+        int space_i,
+        int max_i,
+        double elev,  # deg
+        double obs_alt,  # km
+        double target_alt,  # km
+        double arc_length,  # deg
+        double max_path_length,  # km
+        const double[::1] radii,
+        const double[::1] ref_index,
+        Py_ssize_t max_count,
+        double *_a_n,
+        int *_layer_idx,
+        double *_h_n,
+        double *_delta_n,
+        double *h_end,
+        ) nogil:
+    '''
+    Signed misfit of the endpoint of a path with given elevation.
+
+    The magnitude is the objective function of `find_elevation`, i.e.,
+    the height difference [km] to the target plus the missing arc
+    length [deg] (if the path ends early). The sign is that of the
+    height difference, such that roots can be bracketed. Paths that end
+    early (at the ground or at the outermost layer) are always too low
+    or too high, respectively; for these, the sign is not determined by
+    the (numerically noisy) height difference. Returns NaN, if the
+    buffers are too small.
+    '''
+
+    cdef:
+        Py_ssize_t counter
+        double refraction, d, misfit
+        bint is_space_path = 0
+
+    counter = _trace_path(
+        start_i, space_i, max_i, elev, obs_alt,
+        max_path_length, DEG2RAD * arc_length, radii, ref_index,
+        max_count, _a_n, _layer_idx, _h_n, _delta_n,
+        &refraction, &is_space_path,
+        )
+    if counter < 0:
+        h_end[0] = NAN
+        return NAN
+
+    h_end[0] = _h_n[counter - 1]
+    d = h_end[0] - target_alt
+    misfit = fabs(d) + fabs(RAD2DEG * _delta_n[counter - 1] - arc_length)
+
+    if RAD2DEG * _delta_n[counter - 1] < arc_length * (1. - 1.e-9):
+        # path ends early
+        if h_end[0] > obs_alt:
+            return misfit
+        return -misfit
+
+    if d > 0:
+        return misfit
+    return -misfit
+
+
+cdef double _refine_bracket(
+        int start_i,
+        int space_i,
+        int max_i,
+        double lo,  # deg
+        double hi,  # deg
+        double g_lo,
+        double g_hi,
+        double obs_alt,  # km
+        double target_alt,  # km
+        double arc_length,  # deg
+        const double[::1] radii,
+        const double[::1] ref_index,
+        Py_ssize_t max_count,
+        double *_a_n,
+        int *_layer_idx,
+        double *_h_n,
+        double *_delta_n,
+        double *elev,
+        ) nogil:
+    '''
+    Refine a bracket [lo, hi] (with misfits g_lo, g_hi of different sign)
+    with the Illinois variant of regula falsi.
+
+    As the endpoint height is discontinuous in elevation (caustics), the
+    sign change can also be a jump, in which case the bracket converges
+    onto the jump. Returns the smallest absolute misfit found (the
+    elevation of the corresponding path is stored in `elev`).
+    '''
+
+    cdef:
+        Py_ssize_t it
+        int side = 0
+        double mid, g_mid, g_best, h_end
+
+    if fabs(g_lo) <= fabs(g_hi):
+        elev[0] = lo
+        g_best = fabs(g_lo)
+    else:
+        elev[0] = hi
+        g_best = fabs(g_hi)
+
+    for it in range(200):
+        if g_best <= 1.e-12 or hi - lo <= 1.e-13:
+            break
+
+        mid = (lo * g_hi - hi * g_lo) / (g_hi - g_lo)
+        if not (mid > lo and mid < hi):
+            mid = 0.5 * (lo + hi)
+            if mid <= lo or mid >= hi:
+                break
+
+        g_mid = _elev_misfit(
+            start_i, space_i, max_i, mid, obs_alt,
+            target_alt, arc_length, ATLAS_MAX_PATH_LENGTH,
+            radii, ref_index,
+            max_count, _a_n, _layer_idx, _h_n, _delta_n,
+            &h_end,
+            )
+        if g_mid != g_mid:
+            break
+        if fabs(g_mid) < g_best:
+            elev[0] = mid
+            g_best = fabs(g_mid)
+
+        if (g_mid > 0) == (g_lo > 0):
+            lo = mid
+            g_lo = g_mid
+            if side == -1:
+                g_hi = 0.5 * g_hi
+            side = -1
+        else:
+            hi = mid
+            g_hi = g_mid
+            if side == 1:
+                g_lo = 0.5 * g_lo
+            side = 1
+
+    return g_best
+
+
+def find_elevation_atlas_cython(
+        const double[::1] target_alt,  # km
+        const double[::1] arc_length,  # deg
+        const double[::1] elev_init,  # deg
+        const double[::1] elevs,  # deg
+        const np.int64_t[::1] offsets,
+        const double[::1] delta_n,
+        const double[::1] h_n,
+        int start_i,
+        double obs_alt,  # km
+        int space_i,
+        int max_i,
+        const double[::1] radii,
+        const double[::1] ref_index,
+        ):
+    '''
+    Find path elevations to reach many targets (in parallel).
+
+    For each target, the (approximate) misfit of all atlas paths
+    (see `ray_atlas_cython`) is calculated. Neighboring atlas paths with
+    misfits of different sign bracket a solution. Starting with the
+    bracket closest to `elev_init`, brackets (confirmed by exact
+    ray-tracing) are refined with the Illinois variant of regula falsi,
+    until one converges, i.e., the misfit is below `ATLAS_TOLERANCE`.
+    (Because of the caustics, the endpoint height is discontinuous in
+    elevation, such that a bracket can also contain a jump instead of a
+    root.) If no bracket converges (e.g., the target lies in a caustic),
+    the misfit is minimized with golden-section search around the best
+    atlas path.
+
+    Parameters
+    ----------
+    target_alt - Heights of targets [km]; shape (n, )
+    arc_length - Arc lengths between observer and targets [deg]; shape (n, )
+    elev_init - Geometric elevations of targets [deg]; shape (n, )
+    elevs, offsets, delta_n, h_n - Ray atlas as returned by
+        `ray_atlas_cython`
+    start_i, obs_alt, space_i, max_i, radii, ref_index - as in
+        `ray_atlas_cython`
+
+    Returns
+    -------
+    (elev, h) - Path elevations [deg] and endpoint heights [km] (which
+        can differ from target_alt, if a target cannot be reached);
+        shape (n, )
+    '''
+
+    cdef:
+        Py_ssize_t ntargets = target_alt.shape[0]
+        Py_ssize_t nelevs = elevs.shape[0]
+        Py_ssize_t max_count = MAX_COUNT
+        Py_ssize_t k, j, best_j, last_j, it
+
+        double *_a_n
+        int *_layer_idx
+        double *_buf_h_n
+        double *_buf_delta_n
+        double *_g
+
+        double arc_rad, h_end, dist, best_dist, last_dist
+        double g_lo, g_hi, g, g_best, elev_best
+        double best_g_lo, best_g_hi
+        double a, b, c, d, fc, fd
+        double invphi = (sqrt(5.) - 1.) / 2.
+
+        double[::1] _elev, _h
+
+    assert arc_length.shape[0] == ntargets
+    assert elev_init.shape[0] == ntargets
+    assert offsets.shape[0] == nelevs + 1 and nelevs >= 2
+
+    elev = np.full((ntargets, ), np.nan, dtype=np.float64)
+    h = np.full((ntargets, ), np.nan, dtype=np.float64)
+    _elev = elev
+    _h = h
+
+    with nogil, parallel():
+
+        _a_n = <double *> malloc(max_count * sizeof(double))
+        _layer_idx = <int *> malloc(max_count * sizeof(int))
+        _buf_h_n = <double *> malloc(max_count * sizeof(double))
+        _buf_delta_n = <double *> malloc(max_count * sizeof(double))
+        _g = <double *> malloc(nelevs * sizeof(double))
+        if (
+                _a_n == NULL or _layer_idx == NULL or _buf_h_n == NULL or
+                _buf_delta_n == NULL or _g == NULL
+                ):
+            abort()
+
+        for k in prange(ntargets, schedule='dynamic'):
+
+            h_end = NAN
+
+            if arc_length[k] < 1.e-6:
+                # (almost) vertical path, as in _find_elevation
+                if obs_alt <= target_alt[k]:
+                    _elev[k] = 90.
+                else:
+                    _elev[k] = -90.
+                _elev_misfit(
+                    start_i, space_i, max_i, _elev[k], obs_alt,
+                    target_alt[k], arc_length[k],
+                    fabs(target_alt[k] - obs_alt), radii, ref_index,
+                    max_count, _a_n, _layer_idx, _buf_h_n, _buf_delta_n,
+                    &h_end,
+                    )
+                _h[k] = h_end
+                continue
+
+            arc_rad = DEG2RAD * arc_length[k]
+            for j in range(nelevs):
+                _g[j] = _atlas_misfit(
+                    delta_n, h_n, offsets[j], offsets[j + 1],
+                    obs_alt, target_alt[k], arc_rad,
+                    )
+
+            # try brackets in the order of their distance to the
+            # geometric elevation, until one converges
+            g_best = INFINITY
+            elev_best = NAN
+            last_j = -1
+            last_dist = -1.
+            while g_best > ATLAS_TOLERANCE:
+
+                best_j = -1
+                best_dist = INFINITY
+                for j in range(nelevs - 1):
+                    if (_g[j] > 0) == (_g[j + 1] > 0):
+                        continue
+
+                    dist = fabs(
+                        0.5 * (elevs[j] + elevs[j + 1]) - elev_init[k]
+                        )
+                    if dist < last_dist or (
+                            dist == last_dist and j <= last_j
+                            ):
+                        # already tried
+                        continue
+                    if dist < best_dist:
+                        best_j = j
+                        best_dist = dist
+
+                if best_j < 0:
+                    break
+
+                last_j = best_j
+                last_dist = best_dist
+
+                # atlas is only approximate; confirm with exact paths
+                g_lo = _elev_misfit(
+                    start_i, space_i, max_i, elevs[best_j], obs_alt,
+                    target_alt[k], arc_length[k], ATLAS_MAX_PATH_LENGTH,
+                    radii, ref_index,
+                    max_count, _a_n, _layer_idx, _buf_h_n, _buf_delta_n,
+                    &h_end,
+                    )
+                g_hi = _elev_misfit(
+                    start_i, space_i, max_i, elevs[best_j + 1], obs_alt,
+                    target_alt[k], arc_length[k], ATLAS_MAX_PATH_LENGTH,
+                    radii, ref_index,
+                    max_count, _a_n, _layer_idx, _buf_h_n, _buf_delta_n,
+                    &h_end,
+                    )
+                if g_lo != g_lo or g_hi != g_hi:
+                    continue
+                if (g_lo > 0) == (g_hi > 0):
+                    continue
+
+                g = _refine_bracket(
+                    start_i, space_i, max_i,
+                    elevs[best_j], elevs[best_j + 1], g_lo, g_hi,
+                    obs_alt, target_alt[k], arc_length[k],
+                    radii, ref_index,
+                    max_count, _a_n, _layer_idx, _buf_h_n, _buf_delta_n,
+                    &_elev[k],
+                    )
+                if g < g_best:
+                    g_best = g
+                    elev_best = _elev[k]
+
+            _elev[k] = elev_best
+
+            if g_best > ATLAS_TOLERANCE:
+
+                # no solution; minimize misfit around best atlas path
+                best_j = 0
+                for j in range(1, nelevs):
+                    if fabs(_g[j]) < fabs(_g[best_j]):
+                        best_j = j
+
+                a = elevs[best_j - 1] if best_j > 0 else elevs[0]
+                b = (
+                    elevs[best_j + 1] if best_j < nelevs - 1
+                    else elevs[nelevs - 1]
+                    )
+                c = b - invphi * (b - a)
+                d = a + invphi * (b - a)
+                fc = fabs(_elev_misfit(
+                    start_i, space_i, max_i, c, obs_alt,
+                    target_alt[k], arc_length[k], ATLAS_MAX_PATH_LENGTH,
+                    radii, ref_index,
+                    max_count, _a_n, _layer_idx, _buf_h_n, _buf_delta_n,
+                    &h_end,
+                    ))
+                fd = fabs(_elev_misfit(
+                    start_i, space_i, max_i, d, obs_alt,
+                    target_alt[k], arc_length[k], ATLAS_MAX_PATH_LENGTH,
+                    radii, ref_index,
+                    max_count, _a_n, _layer_idx, _buf_h_n, _buf_delta_n,
+                    &h_end,
+                    ))
+
+                for it in range(200):
+                    if b - a <= 1.e-12:
+                        break
+
+                    if fc < fd:
+                        b = d
+                        d = c
+                        fd = fc
+                        c = b - invphi * (b - a)
+                        fc = fabs(_elev_misfit(
+                            start_i, space_i, max_i, c, obs_alt,
+                            target_alt[k], arc_length[k],
+                            ATLAS_MAX_PATH_LENGTH, radii, ref_index,
+                            max_count, _a_n, _layer_idx,
+                            _buf_h_n, _buf_delta_n,
+                            &h_end,
+                            ))
+                    else:
+                        a = c
+                        c = d
+                        fc = fd
+                        d = a + invphi * (b - a)
+                        fd = fabs(_elev_misfit(
+                            start_i, space_i, max_i, d, obs_alt,
+                            target_alt[k], arc_length[k],
+                            ATLAS_MAX_PATH_LENGTH, radii, ref_index,
+                            max_count, _a_n, _layer_idx,
+                            _buf_h_n, _buf_delta_n,
+                            &h_end,
+                            ))
+
+                # (keep the best path of the brackets, if it is better)
+                if fc < fd:
+                    if fc < g_best:
+                        _elev[k] = c
+                elif fd < g_best:
+                    _elev[k] = d
+
+            # endpoint of final path
+            _elev_misfit(
+                start_i, space_i, max_i, _elev[k], obs_alt,
+                target_alt[k], arc_length[k], ATLAS_MAX_PATH_LENGTH,
+                radii, ref_index,
+                max_count, _a_n, _layer_idx, _buf_h_n, _buf_delta_n,
+                &h_end,
+                )
+            _h[k] = h_end
+
+        free(_a_n)
+        free(_layer_idx)
+        free(_buf_h_n)
+        free(_buf_delta_n)
+        free(_g)
+
+    return elev, h
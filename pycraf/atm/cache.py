@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+On-disk cache for atmospheric layer data (see `AtmCacheConf`).
+
+The storage format is provided by `pycraf.utils.diskcache`: each entry is
+a directory (named after the hash of all inputs) with one ".npy" file per
+array, which are loaded as (copy-on-write) memory maps.
+'''
+
+from __future__ import (
+    absolute_import, unicode_literals, division, print_function
+    )
+
+import os
+from collections import namedtuple
+from ..utils import diskcache
+
+
+__all__ = ['AtmCacheConf', 'atm_cache_info', 'clear_atm_cache']
+
+
+# increase, if the format of the entries (or of the cached data) changes
+_CACHE_FORMAT = 1
+
+
+class AtmCacheConf(diskcache.CacheConf):
+    '''
+    Provide a global state to configure the atmospheric-layers cache.
+
+    The specific attenuations calculated by `~pycraf.atm.atm_layers`
+    (the most expensive part of it) can be stored on disk, such that
+    repeated calls with the same inputs (e.g., at the start of each
+    batch job) don't need to compute them again. The cache is disabled
+    by default. It is enabled by setting a cache directory, either with
+    the `PYCRAF_ATM_CACHE` environment variable or during run-time::
+
+        from pycraf.atm import AtmCacheConf
+        AtmCacheConf.set(cache_dir='/path/to/cachedir')
+
+    A temporary change is possible with a context manager::
+
+        with AtmCacheConf.set(cache_dir='/path/to/cachedir'):
+            # do stuff
+
+    The cache entries are identified by a hash of the frequency grid, the
+    layer heights, and the atmospheric profile, i.e., the temperatures and
+    pressures that `profile_func` returns for the layers. (As the profile
+    function is always evaluated, also user-defined profile functions are
+    handled correctly.)
+
+    The total size of the cache is limited to `max_bytes` (default: 4 GiB).
+    If the limit is exceeded, the least recently used entries are removed.
+    Entries larger than `max_bytes` are not stored::
+
+        AtmCacheConf.set(max_bytes=20 * 1024 ** 3)
+
+    Cached arrays ("atten_dry_db", "atten_wet_db", and "atten_db") are
+    returned as copy-on-write memory maps. Several processes that use the
+    same entry thus share one copy in (physical) memory.
+
+    See also `~pycraf.atm.atm_cache_info` and
+    `~pycraf.atm.clear_atm_cache`.
+    '''
+
+    _attributes = ('cache_dir', 'max_bytes')
+
+    cache_dir = os.environ.get('PYCRAF_ATM_CACHE', None)
+    max_bytes = 4 * 1024 ** 3
+
+
+AtmCacheInfo = namedtuple(
+    'AtmCacheInfo', 'hits misses entries nbytes max_bytes'
+    )
+
+_STATS = diskcache.CacheStats()
+
+
+def _cache_key(args):
+
+    from .. import __version__
+
+    return diskcache.make_key((_CACHE_FORMAT, __version__), tuple(args))
+
+
+def _cached(args, compute):
+    '''
+    Return cached result of `compute()` (a dict), if the cache is enabled.
+
+    `args` are all inputs which the result depends on.
+    '''
+
+    return diskcache.conf_cached(
+        AtmCacheConf, lambda: _cache_key(args), compute, _STATS,
+        )
+
+
+def atm_cache_info():
+    '''
+    Statistics of the atmospheric-layers cache.
+
+    Returns
+    -------
+    info : `AtmCacheInfo` namedtuple
+        Number of cache hits and misses (in this process), the number of
+        entries in the cache directory, their total size and the maximum
+        allowed size (`~pycraf.atm.AtmCacheConf.max_bytes`) in bytes.
+    '''
+
+    return diskcache.conf_info(AtmCacheConf, _STATS, AtmCacheInfo)
+
+
+def clear_atm_cache():
+    '''
+    Remove all entries from the atmospheric-layers cache directory.
+    '''
+
+    diskcache.conf_clear(AtmCacheConf)
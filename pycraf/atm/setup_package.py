@@ -19,19 +19,36 @@ PYXDIR = os.path.relpath(os.path.dirname(__file__))
 def get_extensions():
 
     comp_args = {
-        'extra_compile_args': ['-O3'],
+        'extra_compile_args': ['-fopenmp', '-O3'],
+        'extra_link_args': ['-fopenmp'],
+        'libraries': ['m'],
         'include_dirs': ['numpy'],
         }
 
     if platform.system().lower() == 'windows':
 
         comp_args = {
+            'extra_compile_args': ['/openmp'],
             'include_dirs': ['numpy'],
             }
 
     elif 'darwin' in platform.system().lower():
 
-        comp_args['extra_compile_args'].append('-mmacosx-version-min=10.7')
+        from subprocess import getoutput
+
+        extra_compile_args = ['-O3', '-mmacosx-version-min=10.7']
+
+        if ('clang' in getoutput('gcc -v')) and all(
+                'command not found' in getoutput('gcc-{:d} -v'.format(d))
+                for d in [6, 7, 8]
+                ):
+            extra_compile_args += ['-fopenmp=libomp', ]
+            comp_args['extra_link_args'].append('-fopenmp=libomp')
+        else:
+            extra_compile_args += ['-fopenmp', ]
+            comp_args['extra_link_args'].append('-fopenmp')
+
+        comp_args['extra_compile_args'] = extra_compile_args
 
     ext_module_pathprof_atm_helper = Extension(
         name='pycraf.atm.atm_helper',
@@ -531,6 +531,34 @@ def test_atten_specific_annex1():
         )
 
 
+def test_atten_specific_annex1_layers(monkeypatch):
+
+    # small chunks, such that layers are split into several work items
+    monkeypatch.setattr(atm.atm_helper, '_FREQ_CHUNK', 7)
+
+    freq_grid = np.logspace(0, 3, 50)
+    press_dry = np.array([1013., 500., 1.e-3])
+    press_w = np.array([10., 1., 1.e-6])
+    temp = np.array([290., 250., 220.])
+
+    atten_dry, atten_wet = atm.atm._atten_specific_annex1_layers(
+        freq_grid, press_dry, press_w, temp
+        )
+    assert atten_dry.shape == atten_wet.shape == (3, 50)
+
+    for idx in range(3):
+        expected_dry, expected_wet = atm.atm._atten_specific_annex1(
+            freq_grid, press_dry[idx], press_w[idx], temp[idx]
+            )
+        assert_allclose(atten_dry[idx], expected_dry, rtol=1.e-12)
+        assert_allclose(atten_wet[idx], expected_wet, rtol=1.e-12)
+
+    atten_dry, atten_wet = atm.atm._atten_specific_annex1_layers(
+        freq_grid, press_dry[:0], press_w[:0], temp[:0]
+        )
+    assert atten_dry.shape == atten_wet.shape == (0, 50)
+
+
 def test_atten_terrestrial():
 
     args_list = [
@@ -578,6 +606,48 @@ def test_atm_layers():
         assert_quantity_allclose(atm_layers_cache_act[k], atm_layers_cache[k])
 
 
+def test_atm_cache(tmpdir):
+
+    freq_grid = [1, 22, 60, 200] * apu.GHz
+    expected = atm.atm_layers(freq_grid, atm.profile_standard)
+
+    with atm.AtmCacheConf.set(cache_dir=str(tmpdir)):
+
+        info = atm.atm_cache_info()
+        for i in range(2):
+            atm_layers_cache = atm.atm_layers(freq_grid, atm.profile_standard)
+            assert sorted(atm_layers_cache) == sorted(expected)
+            for k in expected:
+                assert_equal(atm_layers_cache[k], expected[k])
+
+        new_info = atm.atm_cache_info()
+        assert new_info.misses - info.misses == 1
+        assert new_info.hits - info.hits == 1
+        assert new_info.entries == 1
+
+        # cached arrays are (shared) copy-on-write memory maps
+        assert isinstance(atm_layers_cache['atten_db'], np.memmap)
+
+        # other frequencies, heights, or profiles => new entries
+        atm.atm_layers(freq_grid[:2], atm.profile_standard)
+        atm.atm_layers(
+            freq_grid, atm.profile_standard,
+            heights=np.linspace(0, 80, 101) * apu.km,
+            )
+        atm.atm_layers(freq_grid, atm.profile_lowlat)
+        atm.atm_layers(
+            freq_grid,
+            lambda height: atm.profile_standard(height + 1 * apu.m),
+            )
+        assert atm.atm_cache_info().entries == 5
+
+        atm.clear_atm_cache()
+        assert atm.atm_cache_info().entries == 0
+
+    with pytest.raises(ValueError):
+        atm.AtmCacheConf.set(max_bytes=-1)
+
+
 def test_atten_slant_annex1_space():
 
     freq_grid = np.logspace(1, 2, 5) * apu.GHz
@@ -639,6 +709,92 @@ def test_atten_slant_annex1_nonspace():
         )
 
 
+@pytest.mark.parametrize('elev, obs_alt, max_plen', [
+    (30, 0.4, 1000), (5, 0.01, 10), (-1, 3, 1000),
+    ])
+def test_path_atten_tebb(monkeypatch, elev, obs_alt, max_plen):
+
+    # small frequency blocks to test the block-wise processing
+    monkeypatch.setattr(atm.atm_helper, '_FREQ_CHUNK', 7)
+
+    freq_grid = np.linspace(1, 100, 50) * apu.GHz
+    atm_layers_cache = atm.atm_layers(freq_grid, atm.profile_standard)
+    atten_db = atm_layers_cache['atten_db']
+    temp = atm_layers_cache['temp']
+
+    path_params, refraction, is_space_path = atm.raytrace_path(
+        elev * apu.deg, obs_alt * apu.km, atm_layers_cache,
+        max_path_length=max_plen * apu.km,
+        )
+
+    # reference: summation order as in the former NumPy implementation
+    layer_idx, a_n = path_params.layer_idx, path_params.a_n
+    total_atten = np.sum(atten_db[layer_idx[1:]] * a_n[1:, None], axis=0)
+    tebb = np.full(len(freq_grid), 2.73)
+    if is_space_path:
+        for idx in range(len(layer_idx) - 1, 0, -1):
+            lidx = layer_idx[idx]
+            if lidx >= atm_layers_cache['space_i']:
+                continue
+            atten_lin = 10 ** (-atten_db[lidx] * a_n[idx] / 10.)
+            tebb *= atten_lin
+            tebb += (1. - atten_lin) * temp[lidx]
+    else:
+        tebb[...] = np.nan
+
+    _total_atten, _refraction, _tebb = atm.atten_slant_annex1(
+        elev * apu.deg, obs_alt * apu.km, atm_layers_cache,
+        max_path_length=max_plen * apu.km,
+        )
+
+    assert_equal(_total_atten.to_value(cnv.dB), total_atten)
+    assert_equal(_refraction.to_value(apu.deg), refraction.value)
+    assert_equal(_tebb.to_value(apu.K), tebb)
+
+
+def test_atten_slant_annex1_grid():
+
+    freq_grid = np.logspace(1, 2, 5) * apu.GHz
+    atm_layers_cache = atm.atm_layers(freq_grid, atm.profile_standard)
+
+    # includes observers on a layer height and paths not going to space
+    elevs = np.array([-10., -0.5, 0., 5., 30., 90.])[:, np.newaxis]
+    obs_alts = np.array([0., 0.01, 0.4, 2., 100.])[np.newaxis]
+
+    atten, refract, tebb = atm.atten_slant_annex1_grid(
+        elevs * apu.deg, obs_alts * apu.km, atm_layers_cache,
+        max_path_length=100 * apu.km
+        )
+
+    assert atten.shape == (6, 5, 5)
+    assert refract.shape == (6, 5)
+    assert tebb.shape == (6, 5, 5)
+
+    for i, elev in enumerate(elevs[:, 0]):
+        for j, obs_alt in enumerate(obs_alts[0]):
+            _atten, _refract, _tebb = atm.atten_slant_annex1(
+                elev * apu.deg, obs_alt * apu.km, atm_layers_cache,
+                max_path_length=100 * apu.km
+                )
+            assert_equal(atten[i, j].value, _atten.value)
+            assert_equal(refract[i, j].value, _refract.value)
+            assert_equal(tebb[i, j].value, _tebb.value)
+
+    # scalar inputs
+    atten, refract, tebb = atm.atten_slant_annex1_grid(
+        30 * apu.deg, 400 * apu.m, atm_layers_cache, do_tebb=False
+        )
+    _atten, _refract, _ = atm.atten_slant_annex1(
+        30 * apu.deg, 400 * apu.m, atm_layers_cache
+        )
+
+    assert atten.shape == (5, )
+    assert refract.shape == ()
+    assert_equal(atten.value, _atten.value)
+    assert_equal(refract.value, _refract.value)
+    assert np.all(np.isnan(tebb))
+
+
 PATH_CASES_A = [
     # elev, obs_alt, max_plen, actual_plen, a_n, delta_n, h_n, refraction
     # first check vertical paths
@@ -836,6 +992,62 @@ def test_find_elevation():
         assert_quantity_allclose(actual_p, desired_p, rtol=1.e-6, atol=1.e-6)
 
 
+def test_find_elevation_atlas():
+
+    freq_grid = [1] * apu.GHz  # frequency not important here
+    atm_layers_cache = atm.atm_layers(freq_grid, atm.profile_standard)
+
+    for p in PATH_CASES_C:
+        obs_alt, target_alt, arc_len = p[:3]
+        desired_p = p[3:]
+        ray_atlas = atm.ray_atlas(obs_alt * apu.m, atm_layers_cache)
+        elev_opt, h_opt = atm.find_elevation_atlas(
+            target_alt * apu.m, arc_len * apu.deg, ray_atlas,
+            )
+
+        actual_p = (elev_opt.to(apu.deg).value, h_opt.to(apu.m).value)
+        print('{:.8f}, {:.8f}'.format(*actual_p))
+        assert_quantity_allclose(actual_p, desired_p, rtol=1.e-6, atol=1.e-6)
+
+    # array-valued
+    ray_atlas = atm.ray_atlas(50 * apu.m, atm_layers_cache)
+    target_alt = np.array([0., 0.5, 10.])[:, np.newaxis] * apu.km
+    # (all targets are above the horizon)
+    arc_len = np.array([0.0001, 0.05, 0.1, 0.2])[np.newaxis] * apu.deg
+    elev_opt, h_opt = atm.find_elevation_atlas(
+        target_alt, arc_len, ray_atlas
+        )
+    assert elev_opt.shape == h_opt.shape == (3, 4)
+    assert_quantity_allclose(
+        h_opt, target_alt * np.ones((1, 4)), atol=1 * apu.mm
+        )
+
+    for i, j in [(0, 0), (1, 2), (2, 3)]:
+        _elev_opt, _h_opt = atm.find_elevation_atlas(
+            target_alt[i, 0], arc_len[0, j], ray_atlas
+            )
+        assert_equal(_elev_opt.value, elev_opt[i, j].value)
+        assert_equal(_h_opt.value, h_opt[i, j].value)
+
+    # close to the horizon, the endpoint height is discontinuous in
+    # elevation (caustics); sign changes of the misfit, which are jumps,
+    # must not be returned as solution, if the target can be reached
+    ray_atlas = atm.ray_atlas(0.1 * apu.km, atm_layers_cache)
+    target_alt = [0.5, 0.555, 1.45, 0.531] * apu.km
+    arc_len = [1., 1.045, 1.603, 0.828] * apu.deg
+    elev_opt, h_opt = atm.find_elevation_atlas(
+        target_alt, arc_len, ray_atlas
+        )
+    assert_quantity_allclose(h_opt, target_alt, atol=1 * apu.mm)
+
+    # targets on path branches narrower than the atlas grid spacing
+    ray_atlas = atm.ray_atlas(1 * apu.km, atm_layers_cache)
+    elev_opt, h_opt = atm.find_elevation_atlas(
+        0.915 * apu.km, 1.631 * apu.deg, ray_atlas
+        )
+    assert_quantity_allclose(h_opt, 0.915 * apu.km, atol=1 * apu.mm)
+
+
 def test_atten_specific_annex2():
 
     args_list = [
@@ -8,6 +8,7 @@ Geoid - so-called geodesics -, and perform path propagation/attenuation
 estimation.
 '''
 
+from .cache import *
 from .cyprop import *
 from .geodesics import *
 from .gis import *
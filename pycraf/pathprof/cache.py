@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+On-disk cache for height-profile data (see `HprofCacheConf`).
+
+The storage format is provided by `pycraf.utils.diskcache`: each entry is
+a directory (named after the hash of all inputs) with one ".npy" file per
+array, which are loaded as (copy-on-write) memory maps.
+'''
+
+from __future__ import (
+    absolute_import, unicode_literals, division, print_function
+    )
+
+import os
+from collections import namedtuple
+from . import srtm
+from ..utils import diskcache
+
+
+__all__ = ['HprofCacheConf', 'hprof_cache_info', 'clear_hprof_cache']
+
+
+# increase, if the format of the entries (or of the cached data) changes
+_CACHE_FORMAT = 1
+
+
+class HprofCacheConf(diskcache.CacheConf):
+    '''
+    Provide a global state to configure the height-profile cache.
+
+    The results of `~pycraf.pathprof.height_map_data`,
+    `~pycraf.pathprof.height_path_data`, and
+    `~pycraf.pathprof.height_path_data_generic` can be stored on disk,
+    such that repeated calls with the same inputs (e.g., in batch jobs
+    at the same sites) don't need to extract the terrain data again.
+    The cache is disabled by default. It is enabled by setting a cache
+    directory, either with the `PYCRAF_HPROF_CACHE` environment variable
+    or during run-time::
+
+        from pycraf.pathprof import HprofCacheConf
+        HprofCacheConf.set(cache_dir='/path/to/cachedir')
+
+    As with `~pycraf.pathprof.SrtmConf`, a temporary change is possible
+    with a context manager::
+
+        with HprofCacheConf.set(cache_dir='/path/to/cachedir'):
+            # do stuff
+
+    The cache entries are identified by a hash of all function inputs,
+    the terrain-related `~pycraf.pathprof.SrtmConf` options (SRTM
+    directory or mosaic, download and interpolation settings, pyramid
+    usage) and the version of the terrain data (i.e., the paths, sizes
+    and modification times of all tiles). If tiles are added or changed,
+    new entries are thus created automatically.
+
+    The total size of the cache is limited to `max_bytes` (default: 4 GiB).
+    If the limit is exceeded, the least recently used entries are removed.
+    Entries larger than `max_bytes` are not stored::
+
+        HprofCacheConf.set(max_bytes=20 * 1024 ** 3)
+
+    Cached arrays are returned as copy-on-write memory maps, i.e., they
+    are only read from disk when accessed, and they can be modified
+    without changing the cache entry.
+
+    See also `~pycraf.pathprof.hprof_cache_info` and
+    `~pycraf.pathprof.clear_hprof_cache`.
+    '''
+
+    _attributes = ('cache_dir', 'max_bytes')
+
+    cache_dir = os.environ.get('PYCRAF_HPROF_CACHE', None)
+    max_bytes = 4 * 1024 ** 3
+
+
+HprofCacheInfo = namedtuple(
+    'HprofCacheInfo', 'hits misses entries nbytes max_bytes'
+    )
+
+_STATS = diskcache.CacheStats()
+
+
+def _cache_key(func_name, args, terrain):
+
+    from .. import __version__
+
+    parts = [(_CACHE_FORMAT, __version__, func_name)]
+    if terrain:
+        parts.append(srtm._terrain_state())
+    parts.append(tuple(args))
+
+    return diskcache.make_key(*parts)
+
+
+def _cached(func_name, args, compute, terrain=True):
+    '''
+    Return cached result of `compute()` (a dict), if the cache is enabled.
+
+    `args` are all inputs (besides the terrain data) which the result
+    depends on; if `terrain` is True, the result also depends on the
+    terrain data. In this case, the result is not stored, if the terrain
+    data (or the `~pycraf.pathprof.SrtmConf` options) changed during
+    `compute()`, as it may be based on a mix of old and new terrain data.
+    '''
+
+    def key_func():
+        return _cache_key(func_name, args, terrain)
+
+    return diskcache.conf_cached(
+        HprofCacheConf, key_func, compute, _STATS, check_key=terrain,
+        )
+
+
+def hprof_cache_info():
+    '''
+    Statistics of the height-profile cache.
+
+    Returns
+    -------
+    info : `HprofCacheInfo` namedtuple
+        Number of cache hits and misses (in this process), the number of
+        entries in the cache directory, their total size and the maximum
+        allowed size (`~pycraf.pathprof.HprofCacheConf.max_bytes`) in
+        bytes.
+    '''
+
+    return diskcache.conf_info(HprofCacheConf, _STATS, HprofCacheInfo)
+
+
+def clear_hprof_cache():
+    '''
+    Remove all entries from the height-profile cache directory.
+    '''
+
+    diskcache.conf_clear(HprofCacheConf)
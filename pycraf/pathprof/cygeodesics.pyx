@@ -599,6 +599,95 @@ def regrid1d_with_x(
             y_new[i] = ssum / norm
 
 
+cdef void _regrid1d_regular(
+        const double *x, const double *y, Py_ssize_t length,
+        const double *x_new, double *y_new, Py_ssize_t length_new,
+        double width,
+        ) nogil:
+    # same as regrid1d_with_x (with regular=True), but for raw pointers
+
+    cdef:
+
+        double this_x, kv, ssum, norm, dx
+        Py_ssize_t i, j, s, e
+
+    dx = fabs(x[0] - x[length - 1]) / length
+
+    for i in range(length_new):
+
+        this_x = x_new[i]
+
+        if length < 2:
+            s = 0
+            e = length
+        else:
+            s = <Py_ssize_t> ((this_x - 5. * width) / dx - 0.5)
+            e = <Py_ssize_t> ((this_x + 5. * width) / dx + 1.5)
+            if s < 0:
+                s = 0
+            if e >= length:
+                e = length
+
+        norm = 0.
+        ssum = 0.
+        for j in range(s, e):
+            kv = gauss1d(x[j] - this_x, width)
+            ssum = ssum + kv * y[j]
+            norm = norm + kv
+
+        if fabs(norm) < 1.e-12:
+            y_new[i] = 0.
+        else:
+            y_new[i] = ssum / norm
+
+
+def regrid1d_regular_batch(
+        double[::1] x not None,
+        double[::1] y not None,
+        np.int64_t[::1] offsets not None,
+        double[::1] x_new not None,
+        double[::1] y_new not None,  # output
+        np.int64_t[::1] offsets_new not None,
+        double width,
+        ):
+    '''
+    Regrid many (concatenated) arrays at once; parallelized.
+
+    The i-th array is stored in `x[offsets[i]:offsets[i + 1]]` (and `y`,
+    respectively) and is regridded to `x_new[offsets_new[i]:offsets_new[i +
+    1]]`. For each array, the result is the same as with
+    `regrid1d_with_x(..., regular=True)`, i.e., `x` must be regularly
+    spaced and ascending.
+    '''
+
+    cdef:
+
+        Py_ssize_t n = offsets.shape[0] - 1
+        Py_ssize_t i, o, o_new
+
+    assert x.shape[0] == y.shape[0], 'x and y must have equal size'
+    assert x_new.shape[0] == y_new.shape[0], (
+        'x_new and y_new must have equal size'
+        )
+    assert offsets_new.shape[0] == n + 1, (
+        'offsets and offsets_new must have equal size'
+        )
+    assert offsets[n] <= x.shape[0] and offsets_new[n] <= x_new.shape[0]
+
+    for i in prange(n, nogil=True, schedule='guided'):
+
+        o = offsets[i]
+        o_new = offsets_new[i]
+        if offsets[i + 1] == o:
+            continue
+
+        _regrid1d_regular(
+            &x[o], &y[o], offsets[i + 1] - o,
+            &x_new[o_new], &y_new[o_new], offsets_new[i + 1] - o_new,
+            width,
+            )
+
+
 def regrid2d_with_x(
         cython.floating[:] x not None,
         cython.floating[:, :] y not None,
@@ -15,15 +15,15 @@ from libc.stdlib cimport abort, malloc, free
 cimport numpy as np
 cimport openmp
 from libc.math cimport (
-    exp, log, log10, sqrt, fabs, M_PI, floor, pow as cpower,
-    sin, cos, tan, asin, acos, atan, atan2, tanh
+    exp, log, log10, sqrt, fabs, fmod, isnan, M_PI, floor, pow as cpower,
+    sin, cos, tan, asin, acos, atan, atan2, tanh, INFINITY
     )
 import numpy as np
 from astropy import units as apu
+from astropy.utils.data import get_pkg_data_filename
 from . import heightprofile
 from . import srtm
 from . import cygeodesics
-from . import helper
 from .. import conversions as cnv
 from .. import utils
 
@@ -342,6 +342,61 @@ cdef struct ppstruct:
     double nu_rbeta  # dimless
     int i_r50  # dimless
 
+    # specific gaseous attenuation (P.676 Annex 2); only depends on
+    # freq, pressure, temperature, and omega, see _update_gas_attenuation
+    double gamma_g  # dB / km; rho_water from omega
+    double gamma_g_bs  # dB / km; rho_water = 3 g / m^3 (troposcatter)
+    double gas_freq  # GHz; parameters for which gamma_g* are valid
+    double gas_pressure  # hPa
+    double gas_temperature  # K
+    double gas_omega  # percent
+
+
+cdef enum:
+    # number of profile samples in the leaves of a height-profile tree
+    PROF_BLOCK = 16
+
+
+cdef struct proftree:
+    int nleaves  # number of leaves (power of two)
+    double *hmax  # max. height of each node (2 * nleaves entries; root: 1)
+
+
+cdef struct profindex:
+    # index of a height profile, which allows to process all prefixes
+    # profile[0:i + 1] without scanning the full prefix for each i
+    # (see _build_profindex); it must be built for the longest prefix
+    int max_size  # capacity
+    proftree htree  # tree for the heights
+    proftree ztree  # tree for the zero heights
+    double *nu_1  # running sums, see _smooth_earth_heights
+    double *nu_2
+
+
+cdef enum SCAN:
+    # profile quantities, of which the maximum is needed in _process_path;
+    # (x0, y0) and (x1, y1) are the terminals (distance and height)
+    SCAN_CLEAR = 0  # clearance w.r.t. line x0-x1 (incl. earth curvature)
+    SCAN_CLEAR_T = 1  # clearance / (d_i - x0)
+    SCAN_CLEAR_R = 2  # clearance / (x1 - d_i)
+    SCAN_SLOPE_T = 3  # slope as seen from x0 (incl. earth curvature)
+    SCAN_SLOPE_R = 4  # slope as seen from x1 (incl. earth curvature)
+    SCAN_NU = 5  # diffraction parameter
+    SCAN_THETA_T = 6  # elevation angle as seen from x0
+    SCAN_THETA_R = 7  # elevation angle as seen from x1
+    SCAN_HEIGHT_M = 8  # height above smooth-earth surface (ducting)
+
+
+cdef struct scanparams:
+    int kind  # SCAN
+    double x0, y0  # km, m
+    double x1, y1  # km, m
+    double C  # m / km^2; earth curvature term, 500 / a_e
+    double a_e  # km; SCAN_THETA_T/R only
+    double zeta  # dimless; SCAN_NU only
+    double lam  # m; SCAN_NU only
+    double m  # m / km; SCAN_HEIGHT_M only (y0 is h_st)
+
 
 def set_num_threads(int nthreads):
     '''
@@ -503,14 +558,14 @@ cdef class _PathProp(object):
             self._pp.lon_mid = 0.5 * (lon_t + lon_r)
             self._pp.lat_mid = 0.5 * (lat_t + lat_r)
 
-        # TODO: cythonize _radiomet_data_for_pathcenter
         if delta_N is None:
-            delta_N, N0 = helper._DN_N0_from_map(
-                self._pp.lon_mid, self._pp.lat_mid
+            _DN_N0_from_map(
+                self._pp.lon_mid, self._pp.lat_mid,
+                &self._pp.delta_N, &self._pp.N0,
                 )
-
-        self._pp.delta_N = delta_N
-        self._pp.N0 = N0
+        else:
+            self._pp.delta_N = delta_N
+            self._pp.N0 = N0
 
         beta0 = _beta_from_DN_N0(
             self._pp.lat_mid,
@@ -520,6 +575,9 @@ cdef class _PathProp(object):
 
         self._pp.beta0 = beta0
 
+        self._pp.gas_freq = NAN
+        _update_gas_attenuation(&self._pp)
+
         _process_path(
             &self._pp,
             # lons,
@@ -596,6 +654,448 @@ def beta_from_DN_N0(
         )
 
 
+# radiometeorological maps (ΔN and N_0) shipped with P.452
+_refract_data = np.load(get_pkg_data_filename(
+    'itudata/p.452-16/refract_map.npz', package='pycraf'
+    ))
+
+# for the look-up, lon/lat grids are ascending, values have shape
+# (nlon, nlat)
+cdef:
+    double[::1] _RM_LONS = np.ascontiguousarray(
+        _refract_data['lons'][0], dtype=np.float64
+        )
+    double[::1] _RM_LATS = np.ascontiguousarray(
+        _refract_data['lats'][::-1, 0], dtype=np.float64
+        )
+    double[:, ::1] _RM_DN = np.ascontiguousarray(
+        _refract_data['dn50'][::-1].T, dtype=np.float64
+        )
+    double[:, ::1] _RM_N0 = np.ascontiguousarray(
+        _refract_data['n050'][::-1].T, dtype=np.float64
+        )
+
+
+cdef inline Py_ssize_t _grid_index(double[::1] grid, double x) nogil:
+    # index i of the grid cell containing x, such that
+    # grid[i] < x <= grid[i + 1] (clipped to valid cells); this is the
+    # same as in scipy's RegularGridInterpolator
+
+    cdef Py_ssize_t lo = 0, hi = grid.shape[0], mid
+
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if grid[mid] < x:
+            lo = mid + 1
+        else:
+            hi = mid
+
+    if lo < 1:
+        return 0
+    if lo > grid.shape[0] - 1:
+        return grid.shape[0] - 2
+
+    return lo - 1
+
+
+cdef void _DN_N0_from_map(
+        double lon, double lat, double *delta_N, double *N0
+        ) nogil:
+    # bilinear interpolation of the radiometeorological maps; results are
+    # identical to scipy's RegularGridInterpolator (for lat in [-90, 90])
+
+    cdef:
+        Py_ssize_t i, j
+        double ylon, ylat, w00, w01, w10, w11
+
+    lon = fmod(lon, 360.)
+    if lon < 0:
+        lon += 360.
+
+    i = _grid_index(_RM_LONS, lon)
+    j = _grid_index(_RM_LATS, lat)
+    ylon = (lon - _RM_LONS[i]) / (_RM_LONS[i + 1] - _RM_LONS[i])
+    ylat = (lat - _RM_LATS[j]) / (_RM_LATS[j + 1] - _RM_LATS[j])
+
+    w00 = (1. - ylon) * (1. - ylat)
+    w01 = (1. - ylon) * ylat
+    w10 = ylon * (1. - ylat)
+    w11 = ylon * ylat
+
+    delta_N[0] = (
+        _RM_DN[i, j] * w00 + _RM_DN[i, j + 1] * w01 +
+        _RM_DN[i + 1, j] * w10 + _RM_DN[i + 1, j + 1] * w11
+        )
+    N0[0] = (
+        _RM_N0[i, j] * w00 + _RM_N0[i, j + 1] * w01 +
+        _RM_N0[i + 1, j] * w10 + _RM_N0[i + 1, j + 1] * w11
+        )
+
+
+def _radiomet_data_cython(lon, lat, d_tm=None, d_lm=None):
+    '''
+    Query ΔN, N_0 (and β_0) for path centers from the P.452 maps.
+
+    Parameters
+    ----------
+    lon, lat : array_like
+        Geographic longitude and latitude of path centers [deg]
+    d_tm, d_lm : array_like or None, optional
+        Longest continuous land (inland + coastal) and inland sections of
+        the paths [km]. If None, β_0 is not calculated.
+
+    Returns
+    -------
+    delta_N, N0 : `~numpy.ndarray`
+        If `d_tm` and `d_lm` are None.
+    delta_N, beta0, N0 : `~numpy.ndarray`
+        Otherwise.
+
+    Notes
+    -----
+    All inputs are broadcasted against each other. The look-up is done
+    in parallel, without holding the GIL (see `_DN_N0_from_map`, which
+    can also be used in other nogil kernels).
+    '''
+
+    cdef:
+        bint with_beta = d_tm is not None or d_lm is not None
+        Py_ssize_t i, size
+        const double[::1] lon_v, lat_v, d_tm_v, d_lm_v
+        double[::1] delta_N_v, beta0_v, N0_v
+
+    if with_beta:
+        args = np.broadcast_arrays(lon, lat, d_tm, d_lm)
+    else:
+        args = np.broadcast_arrays(lon, lat, 0., 0.)
+    shape = args[0].shape
+
+    lon_v, lat_v, d_tm_v, d_lm_v = [
+        np.ascontiguousarray(a, dtype=np.float64).ravel() for a in args
+        ]
+    size = lon_v.shape[0]
+
+    if not np.all(np.isfinite(lon_v)) or not np.all(
+            (np.asarray(lat_v) >= -90.) & (np.asarray(lat_v) <= 90.)
+            ):
+        raise ValueError(
+            'Longitudes must be finite and latitudes within [-90, 90] deg'
+            )
+
+    delta_N = np.empty(size, dtype=np.float64)
+    beta0 = np.empty(size, dtype=np.float64)
+    N0 = np.empty(size, dtype=np.float64)
+    delta_N_v, beta0_v, N0_v = delta_N, beta0, N0
+
+    with nogil:
+        for i in prange(size, schedule='static'):
+            _DN_N0_from_map(lon_v[i], lat_v[i], &delta_N_v[i], &N0_v[i])
+            if with_beta:
+                beta0_v[i] = _beta_from_DN_N0(
+                    lat_v[i], delta_N_v[i], N0_v[i], d_tm_v[i], d_lm_v[i]
+                    )
+
+    if with_beta:
+        return (
+            delta_N.reshape(shape), beta0.reshape(shape), N0.reshape(shape)
+            )
+
+    return delta_N.reshape(shape), N0.reshape(shape)
+
+
+cdef int _init_profindex(profindex *pidx, int max_size) nogil:
+    # allocate memory for profiles with up to max_size samples;
+    # returns -1 on failure (_free_profindex must be called nevertheless)
+
+    cdef:
+        int nleaves = 1
+
+    max_size = max(max_size, 1)
+    while nleaves * PROF_BLOCK < max_size:
+        nleaves *= 2
+
+    pidx.max_size = max_size
+    pidx.htree.hmax = <double *> malloc(2 * nleaves * sizeof(double))
+    pidx.ztree.hmax = <double *> malloc(2 * nleaves * sizeof(double))
+    pidx.nu_1 = <double *> malloc(max_size * sizeof(double))
+    pidx.nu_2 = <double *> malloc(max_size * sizeof(double))
+
+    if (
+            pidx.htree.hmax == NULL or pidx.ztree.hmax == NULL or
+            pidx.nu_1 == NULL or pidx.nu_2 == NULL
+            ):
+        return -1
+
+    return 0
+
+
+cdef void _free_profindex(profindex *pidx) nogil:
+
+    free(pidx.htree.hmax)
+    free(pidx.ztree.hmax)
+    free(pidx.nu_1)
+    free(pidx.nu_2)
+
+
+cdef void _build_proftree(proftree *tree, double[::1] h_v) nogil:
+
+    cdef:
+        int i, k, size = h_v.shape[0]
+        double hmax
+
+    tree.nleaves = 1
+    while tree.nleaves * PROF_BLOCK < size:
+        tree.nleaves *= 2
+
+    for k in range(tree.nleaves):
+        hmax = -INFINITY
+        for i in range(k * PROF_BLOCK, min((k + 1) * PROF_BLOCK, size)):
+            hmax = f_max(hmax, h_v[i])
+        tree.hmax[tree.nleaves + k] = hmax
+
+    for k in range(tree.nleaves - 1, 0, -1):
+        tree.hmax[k] = f_max(tree.hmax[2 * k], tree.hmax[2 * k + 1])
+
+
+cdef void _build_profindex(
+        profindex *pidx,
+        double[::1] d_v,
+        double[::1] h_v,
+        double[::1] zh_v,
+        ) nogil:
+    # d_v, h_v, zh_v must have the same size, which must not exceed
+    # pidx.max_size
+
+    cdef:
+        int i, size = d_v.shape[0]
+
+    _build_proftree(&pidx.htree, h_v)
+    _build_proftree(&pidx.ztree, zh_v)
+
+    # same order of summation as in _smooth_earth_heights
+    pidx.nu_1[0] = 0.
+    pidx.nu_2[0] = 0.
+    for i in range(1, size):
+        pidx.nu_1[i] = pidx.nu_1[i - 1] + (d_v[i] - d_v[i - 1]) * (
+            h_v[i] + h_v[i - 1]
+            )
+        pidx.nu_2[i] = pidx.nu_2[i - 1] + (d_v[i] - d_v[i - 1]) * (
+            h_v[i] * (2 * d_v[i] + d_v[i - 1]) +
+            h_v[i - 1] * (d_v[i] + 2 * d_v[i - 1])
+            )
+
+
+cdef inline double _scan_clearance(
+        const scanparams *q, double d_i, double h_i
+        ) nogil:
+
+    return (
+        h_i + q.C * (d_i - q.x0) * (q.x1 - d_i) -
+        (q.y0 * (q.x1 - d_i) + q.y1 * (d_i - q.x0)) / (q.x1 - q.x0)
+        )
+
+
+cdef inline double _scan_value(
+        const scanparams *q, double d_i, double h_i
+        ) nogil:
+    # Note: the expressions must be identical to the original formulae
+    # (with x0 = 0), such that exactly the same numbers are produced
+
+    if q.kind == SCAN_CLEAR:
+        return _scan_clearance(q, d_i, h_i)
+    elif q.kind == SCAN_CLEAR_T:
+        return _scan_clearance(q, d_i, h_i) / (d_i - q.x0)
+    elif q.kind == SCAN_CLEAR_R:
+        return _scan_clearance(q, d_i, h_i) / (q.x1 - d_i)
+    elif q.kind == SCAN_SLOPE_T:
+        return (
+            h_i + q.C * (d_i - q.x0) * (q.x1 - d_i) - q.y0
+            ) / (d_i - q.x0)
+    elif q.kind == SCAN_SLOPE_R:
+        return (
+            h_i + q.C * (d_i - q.x0) * (q.x1 - d_i) - q.y1
+            ) / (q.x1 - d_i)
+    elif q.kind == SCAN_NU:
+        return q.zeta * _scan_clearance(q, d_i, h_i) * sqrt(
+            0.002 * (q.x1 - q.x0) / q.lam / (d_i - q.x0) / (q.x1 - d_i)
+            )
+    elif q.kind == SCAN_THETA_T:
+        return 1000. * atan(
+            (h_i - q.y0) / 1.e3 / (d_i - q.x0) - (d_i - q.x0) / 2. / q.a_e
+            )
+    elif q.kind == SCAN_THETA_R:
+        return 1000. * atan(
+            (h_i - q.y1) / 1.e3 / (q.x1 - d_i) - (q.x1 - d_i) / 2. / q.a_e
+            )
+    else:  # SCAN_HEIGHT_M
+        return h_i - (q.y0 + q.m * d_i)
+
+
+cdef inline double _ratio_bound(double u, double dmin, double dmax) nogil:
+    # upper bound of u' / d for all u' <= u and 0 < dmin <= d <= dmax
+
+    return u / dmin if u >= 0. else u / dmax
+
+
+cdef double _scan_bound(
+        const scanparams *q, double a, double b, double hmax
+        ) nogil:
+    # upper bound of _scan_value for all samples with a <= d_i <= b and
+    # h_i <= hmax (where x0 < a and b < x1)
+
+    cdef:
+        double xm, p_min, p_max, l_min, u
+
+    if q.kind == SCAN_HEIGHT_M:
+        return hmax - q.y0 - f_min(q.m * a, q.m * b)
+    elif q.kind == SCAN_THETA_T:
+        return 1000. * atan(
+            _ratio_bound(hmax - q.y0, a - q.x0, b - q.x0) / 1.e3 +
+            f_max(-(a - q.x0) / 2. / q.a_e, -(b - q.x0) / 2. / q.a_e)
+            )
+    elif q.kind == SCAN_THETA_R:
+        return 1000. * atan(
+            _ratio_bound(hmax - q.y1, q.x1 - b, q.x1 - a) / 1.e3 +
+            f_max(-(q.x1 - a) / 2. / q.a_e, -(q.x1 - b) / 2. / q.a_e)
+            )
+    elif q.kind == SCAN_SLOPE_T or q.kind == SCAN_CLEAR_T:
+        u = (
+            _ratio_bound(hmax - q.y0, a - q.x0, b - q.x0) +
+            f_max(q.C * (q.x1 - a), q.C * (q.x1 - b))
+            )
+        if q.kind == SCAN_CLEAR_T:
+            u -= (q.y1 - q.y0) / (q.x1 - q.x0)
+        return u
+    elif q.kind == SCAN_SLOPE_R or q.kind == SCAN_CLEAR_R:
+        u = (
+            _ratio_bound(hmax - q.y1, q.x1 - b, q.x1 - a) +
+            f_max(q.C * (a - q.x0), q.C * (b - q.x0))
+            )
+        if q.kind == SCAN_CLEAR_R:
+            u += (q.y1 - q.y0) / (q.x1 - q.x0)
+        return u
+
+    # SCAN_CLEAR, SCAN_NU; (d_i - x0) * (x1 - d_i) is maximal at the
+    # center of the path
+    xm = f_min(f_max(0.5 * (q.x0 + q.x1), a), b)
+    p_max = (xm - q.x0) * (q.x1 - xm)
+    p_min = f_min((a - q.x0) * (q.x1 - a), (b - q.x0) * (q.x1 - b))
+    l_min = f_min(
+        q.y0 * (q.x1 - a) + q.y1 * (a - q.x0),
+        q.y0 * (q.x1 - b) + q.y1 * (b - q.x0),
+        ) / (q.x1 - q.x0)
+    u = hmax + f_max(q.C * p_min, q.C * p_max) - l_min
+
+    if q.kind == SCAN_CLEAR:
+        return u
+
+    return q.zeta * u * sqrt(
+        0.002 * (q.x1 - q.x0) / q.lam / (p_min if u >= 0. else p_max)
+        )
+
+
+cdef (double, int) _scan_max(
+        const scanparams *q,
+        double[::1] d_v,
+        double[::1] h_v,
+        const proftree *tree,
+        int lo, int hi,
+        ) nogil:
+    # maximum of the scan quantity for the samples lo <= i < hi and its
+    # (first) index; returns (-1.e31, -1) if there are no samples;
+    # if a tree is given, branch-and-bound is used (with the node bounds
+    # from _scan_bound), which gives the same result as the linear scan
+
+    cdef:
+        int i, j, k, l, r, top = 0
+        double v, vmax = -1.e31, bound
+        int imax = -1
+
+        # children of the current node
+        int ks[2]
+        int lbs[2]
+        int rbs[2]
+        double bounds[2]
+
+        # DFS stack: node, leaf range, and bound
+        int stack_k[64]
+        int stack_l[64]
+        int stack_r[64]
+        double stack_b[64]
+
+    if tree == NULL:
+        for i in range(lo, hi):
+            v = _scan_value(q, d_v[i], h_v[i])
+            if v > vmax:
+                vmax = v
+                imax = i
+
+        return vmax, imax
+
+    stack_k[0] = 1
+    stack_l[0] = 0
+    stack_r[0] = tree.nleaves
+    stack_b[0] = INFINITY
+    top = 1
+
+    while top > 0:
+
+        top -= 1
+        k = stack_k[top]
+        bound = stack_b[top]
+
+        # add some margin for round-off errors
+        if bound + 1.e-6 * (1. + fabs(bound)) < vmax:
+            continue
+
+        if stack_r[top] - stack_l[top] == 1:
+
+            l = max(stack_l[top] * PROF_BLOCK, lo)
+            r = min(stack_r[top] * PROF_BLOCK, hi)
+            for i in range(l, r):
+                v = _scan_value(q, d_v[i], h_v[i])
+                if v > vmax or (v == vmax and i < imax):
+                    vmax = v
+                    imax = i
+
+            continue
+
+        ks[0] = 2 * k
+        ks[1] = 2 * k + 1
+        lbs[0] = stack_l[top]
+        rbs[0] = lbs[1] = (stack_l[top] + stack_r[top]) // 2
+        rbs[1] = stack_r[top]
+
+        for j in range(2):
+            l = max(lbs[j] * PROF_BLOCK, lo)
+            r = min(rbs[j] * PROF_BLOCK, hi)
+            if l < r:
+                bounds[j] = _scan_bound(
+                    q, d_v[l], d_v[r - 1], tree.hmax[ks[j]]
+                    )
+            else:
+                # nothing to do
+                ks[j] = 0
+                bounds[j] = -INFINITY
+
+        # push the more promising child last (i.e., process it first)
+        if bounds[0] > bounds[1]:
+            ks[0], ks[1] = ks[1], ks[0]
+            lbs[0], lbs[1] = lbs[1], lbs[0]
+            rbs[0], rbs[1] = rbs[1], rbs[0]
+            bounds[0], bounds[1] = bounds[1], bounds[0]
+
+        for j in range(2):
+            if ks[j] > 0:
+                stack_k[top] = ks[j]
+                stack_l[top] = lbs[j]
+                stack_r[top] = rbs[j]
+                stack_b[top] = bounds[j]
+                top += 1
+
+    return vmax, imax
+
+
 cdef void _process_path(
         ppstruct *pp,
         # double[::1] lons_view,
@@ -606,14 +1106,25 @@ cdef void _process_path(
         # double bearing,
         # double back_bearing,
         # double distance,
+        const profindex *pidx=NULL,
         ) nogil:
 
     # TODO: write down, which entries "pp" MUST have already
 
+    # if the profile index, pidx, is given (which must have been built
+    # for the full profile, of which the views are a prefix), the
+    # results are the same, but the profile doesn't need to be scanned
+
     cdef:
 
         int diff_edge_idx
         int hsize = distances_view.shape[0]
+        const proftree *htree = NULL
+        const proftree *ztree = NULL
+
+    if pidx != NULL:
+        htree = &pidx.htree
+        ztree = &pidx.ztree
 
     # import time
     # _time = time.time()
@@ -626,7 +1137,7 @@ cdef void _process_path(
 
     # smooth-earth height profile
     pp.h_st, pp.h_sr = _smooth_earth_heights(
-        pp.distance, distances_view, heights_view,
+        pp.distance, distances_view, heights_view, pidx,
         )
 
     # print('_smooth_earth_heights', time.time() - _time)
@@ -637,7 +1148,8 @@ cdef void _process_path(
         pp.distance,
         distances_view, heights_view,
         pp.h_ts, pp.h_rs,
-        pp.h_st, pp.h_sr
+        pp.h_st, pp.h_sr,
+        htree,
         )
 
     # print('_effective_antenna_heights', time.time() - _time)
@@ -666,6 +1178,7 @@ cdef void _process_path(
             distances_view, heights_view,
             pp.h_ts, pp.h_rs,
             pp.wavelen,
+            htree,
             )
 
         (
@@ -677,6 +1190,7 @@ cdef void _process_path(
             distances_view, heights_view,
             pp.h_ts, pp.h_rs,
             pp.wavelen,
+            htree,
             )
 
         # similarly, we have to repeat the game with heights set to zero
@@ -690,6 +1204,7 @@ cdef void _process_path(
             distances_view, zheights_view,
             pp.h_ts - pp.h_std, pp.h_rs - pp.h_srd,
             pp.wavelen,
+            ztree,
             )
 
         (
@@ -701,6 +1216,7 @@ cdef void _process_path(
             distances_view, zheights_view,
             pp.h_ts - pp.h_std, pp.h_rs - pp.h_srd,
             pp.wavelen,
+            ztree,
             )
 
     if pp.version == 14:
@@ -720,6 +1236,7 @@ cdef void _process_path(
             distances_view, heights_view,
             pp.h_ts, pp.h_rs,
             pp.wavelen,
+            htree,
             )
 
     # print('_diffraction_helpers', time.time() - _time)
@@ -743,6 +1260,7 @@ cdef void _process_path(
         distances_view, heights_view,
         pp.h_ts, pp.h_rs, pp.h_st,
         diff_edge_idx, pp.duct_slope,
+        htree,
         )
 
     # print('_path_geometry_helper', time.time() - _time)
@@ -755,6 +1273,7 @@ cdef (double, double) _smooth_earth_heights(
         double distance,
         double[::1] d_v,
         double[::1] h_v,
+        const profindex *pidx=NULL,
         ) nogil:
 
     cdef:
@@ -764,15 +1283,19 @@ cdef (double, double) _smooth_earth_heights(
 
     dsize = d_v.shape[0]
 
-    nu_1 = 0.
-    nu_2 = 0.
-    for i in range(1, dsize):
-
-        nu_1 += (d_v[i] - d_v[i - 1]) * (h_v[i] + h_v[i - 1])
-        nu_2 += (d_v[i] - d_v[i - 1]) * (
-            h_v[i] * (2 * d_v[i] + d_v[i - 1]) +
-            h_v[i - 1] * (d_v[i] + 2 * d_v[i - 1])
-            )
+    if pidx != NULL:
+        nu_1 = pidx.nu_1[dsize - 1]
+        nu_2 = pidx.nu_2[dsize - 1]
+    else:
+        nu_1 = 0.
+        nu_2 = 0.
+        for i in range(1, dsize):
+
+            nu_1 += (d_v[i] - d_v[i - 1]) * (h_v[i] + h_v[i - 1])
+            nu_2 += (d_v[i] - d_v[i - 1]) * (
+                h_v[i] * (2 * d_v[i] + d_v[i - 1]) +
+                h_v[i - 1] * (d_v[i] + 2 * d_v[i - 1])
+                )
 
     h_st = (2 * nu_1 * d - nu_2) / d ** 2
     h_sr = (nu_2 - nu_1 * d) / d ** 2
@@ -786,36 +1309,33 @@ cdef (double, double) _effective_antenna_heights(
         double[::1] h_v,
         double h_ts, double h_rs,
         double h_st, double h_sr,
+        const proftree *tree=NULL,
         ) nogil:
 
     cdef:
         int i, dsize
         double d = distance, h0, hn
 
-        double H_i, h_obs = -1.e31, alpha_obt = -1.e31, alpha_obr = -1.e31
-        double tmp_alpha_obt, tmp_alpha_obr
+        double h_obs, alpha_obt, alpha_obr
 
         double h_stp, h_srp, g_t, g_r
         double h_std, h_srd
 
+        scanparams q
+
     dsize = d_v.shape[0]
     h0 = h_v[0]
     hn = h_v[dsize - 1]
 
-    for i in range(1, dsize - 1):
-
-        H_i = h_v[i] - (h_ts * (d - d_v[i]) + h_rs * d_v[i]) / d
-        tmp_alpha_obt = H_i / d_v[i]
-        tmp_alpha_obr = H_i / (d - d_v[i])
+    # H_i = h_v[i] - (h_ts * (d - d_v[i]) + h_rs * d_v[i]) / d
+    q.x0, q.y0, q.x1, q.y1, q.C = 0., h_ts, d, h_rs, 0.
 
-        if H_i > h_obs:
-            h_obs = H_i
-
-        if tmp_alpha_obt > alpha_obt:
-            alpha_obt = tmp_alpha_obt
-
-        if tmp_alpha_obr > alpha_obr:
-            alpha_obr = tmp_alpha_obr
+    q.kind = SCAN_CLEAR
+    h_obs = _scan_max(&q, d_v, h_v, tree, 1, dsize - 1)[0]
+    q.kind = SCAN_CLEAR_T
+    alpha_obt = _scan_max(&q, d_v, h_v, tree, 1, dsize - 1)[0]
+    q.kind = SCAN_CLEAR_R
+    alpha_obr = _scan_max(&q, d_v, h_v, tree, 1, dsize - 1)[0]
 
     if h_obs < 0.:
         h_stp = h_st
@@ -849,6 +1369,7 @@ cdef (
         double[::1] h_v,
         double h_ts, double h_rs,
         double wavelen,
+        const proftree *tree=NULL,
         ) nogil:
 
     cdef:
@@ -856,23 +1377,24 @@ cdef (
         double d = distance, lam = wavelen, C_e500 = 500. / a_p
         int path_type
 
-        double slope_i, slope_j, S_tim = -1.e31, S_tr, S_rim = -1.e31
+        double S_tim, S_tr, S_rim
 
         int nu_bull_idx
-        double d_bp, nu_bull = -1.e31, nu_i
-        double h_bp, h_eff, h_eff_i
+        double d_bp, nu_bull
+        double h_bp, h_eff
         double x, y  # temporary vars
 
-    dsize = d_v.shape[0]
+        scanparams q
 
-    for i in range(1, dsize - 1):
+    dsize = d_v.shape[0]
 
-        slope_i = (
-            h_v[i] + C_e500 * d_v[i] * (d - d_v[i]) - h_ts
-            ) / d_v[i]
+    q.x0, q.y0, q.x1, q.y1, q.C = 0., h_ts, d, h_rs, C_e500
 
-        if slope_i > S_tim:
-            S_tim = slope_i
+    # slope_i = (
+    #     h_v[i] + C_e500 * d_v[i] * (d - d_v[i]) - h_ts
+    #     ) / d_v[i]
+    q.kind = SCAN_SLOPE_T
+    S_tim = _scan_max(&q, d_v, h_v, tree, 1, dsize - 1)[0]
 
     S_tr = (h_rs - h_ts) / d
 
@@ -884,13 +1406,11 @@ cdef (
     if path_type == 1:
         # transhorizon
         # find Bullington point, etc.
-        for i in range(1, dsize - 1):
-            slope_j = (
-                h_v[i] + C_e500 * d_v[i] * (d - d_v[i]) - h_rs
-                ) / (d - d_v[i])
-
-            if slope_j > S_rim:
-                S_rim = slope_j
+        # slope_j = (
+        #     h_v[i] + C_e500 * d_v[i] * (d - d_v[i]) - h_rs
+        #     ) / (d - d_v[i])
+        q.kind = SCAN_SLOPE_R
+        S_rim = _scan_max(&q, d_v, h_v, tree, 1, dsize - 1)[0]
 
         d_bp = x = (h_rs - h_ts + S_rim * d) / (S_tim + S_rim)
         y = a_p + h_ts / 1000 + d_bp * (S_tim / 1000 - d / 2 / a_p)
@@ -916,19 +1436,19 @@ cdef (
         S_rim = NAN
 
         # diffraction parameter
-        for i in range(1, dsize - 1):
-            h_eff_i = (
-                h_v[i] +
-                C_e500 * d_v[i] * (d - d_v[i]) -
-                (h_ts * (d - d_v[i]) + h_rs * d_v[i]) / d
-                )
-            nu_i = h_eff_i * sqrt(
-                0.002 * d / lam / d_v[i] / (d - d_v[i])
-                )
-            if nu_i > nu_bull:
-                nu_bull = nu_i
-                nu_bull_idx = i
-                h_eff = h_eff_i
+        # h_eff_i = (
+        #     h_v[i] +
+        #     C_e500 * d_v[i] * (d - d_v[i]) -
+        #     (h_ts * (d - d_v[i]) + h_rs * d_v[i]) / d
+        #     )
+        # nu_i = h_eff_i * sqrt(
+        #     0.002 * d / lam / d_v[i] / (d - d_v[i])
+        #     )
+        q.kind = SCAN_NU
+        q.zeta = 1.
+        q.lam = lam
+        nu_bull, nu_bull_idx = _scan_max(&q, d_v, h_v, tree, 1, dsize - 1)
+        h_eff = _scan_clearance(&q, d_v[nu_bull_idx], h_v[nu_bull_idx])
 
         d_bp = x = d_v[nu_bull_idx]
         y = a_p + h_ts / 1000 + d_bp * (S_tr / 1000 - d / 2 / a_p)
@@ -950,6 +1470,7 @@ cdef (
         double[::1] h_v,
         double h_ts, double h_rs,
         double wavelen,
+        const proftree *tree=NULL,
         ) nogil:
 
     cdef:
@@ -958,7 +1479,9 @@ cdef (
         double C_e500 = 500. / a_e_50
         double C_b500 = 500. / a_e_beta
 
-        double H_i, nu_i
+        double H_i
+
+        scanparams q
 
         double zeta_m = NAN, zeta_t = NAN, zeta_r = NAN
         int i_m50 = -1, i_t50 = -1, i_r50 = -1
@@ -988,20 +1511,20 @@ cdef (
     # Eq 14-15
     zeta_m = cos(atan(1.e-3 * (h_rs - h_ts) / d))
 
-    nu_m50 = -1.e31
-    for i in range(1, dsize - 1):
-
-        H_i = (
-            h_v[i] + C_e500 * d_v[i] * (d - d_v[i]) -
-            (h_ts * (d - d_v[i]) + h_rs * d_v[i]) / d
-            )
-        nu_i = zeta_m * H_i * sqrt(
-            0.002 * d / lam / d_v[i] / (d - d_v[i])
-            )
-        if nu_i > nu_m50:
-            H50 = H_i
-            nu_m50 = nu_i
-            i_m50 = i
+    # H_i = (
+    #     h_v[i] + C_e500 * d_v[i] * (d - d_v[i]) -
+    #     (h_ts * (d - d_v[i]) + h_rs * d_v[i]) / d
+    #     )
+    # nu_i = zeta_m * H_i * sqrt(
+    #     0.002 * d / lam / d_v[i] / (d - d_v[i])
+    #     )
+    q.kind = SCAN_NU
+    q.x0, q.y0, q.x1, q.y1, q.C = 0., h_ts, d, h_rs, C_e500
+    q.zeta = zeta_m
+    q.lam = lam
+    nu_m50, i_m50 = _scan_max(&q, d_v, h_v, tree, 1, dsize - 1)
+    if i_m50 >= 0:
+        H50 = _scan_clearance(&q, d_v[i_m50], h_v[i_m50])
 
     h50 = h_v[i_m50]
     d50 = d_v[i_m50]
@@ -1030,20 +1553,18 @@ cdef (
 
         # Eq 17-18
         zeta_t = cos(atan(1.e-3 * (h50 - h_ts) / d50))
-        nu_t50 = -1.e31
-        for i in range(1, i_m50):
-
-            H_i = (
-                h_v[i] + C_e500 * d_v[i] * (d50 - d_v[i]) -
-                (h_ts * (d50 - d_v[i]) + h50 * d_v[i]) / d50
-                )
-            nu_i = zeta_t * H_i * sqrt(
-                0.002 * d50 / lam / d_v[i] / (d50 - d_v[i])
-                )
-            if nu_i > nu_t50:
-                Ht50 = H_i
-                nu_t50 = nu_i
-                i_t50 = i
+        # H_i = (
+        #     h_v[i] + C_e500 * d_v[i] * (d50 - d_v[i]) -
+        #     (h_ts * (d50 - d_v[i]) + h50 * d_v[i]) / d50
+        #     )
+        # nu_i = zeta_t * H_i * sqrt(
+        #     0.002 * d50 / lam / d_v[i] / (d50 - d_v[i])
+        #     )
+        q.x0, q.y0, q.x1, q.y1 = 0., h_ts, d50, h50
+        q.zeta = zeta_t
+        nu_t50, i_t50 = _scan_max(&q, d_v, h_v, tree, 1, i_m50)
+        if i_t50 >= 0:
+            Ht50 = _scan_clearance(&q, d_v[i_t50], h_v[i_t50])
 
         ht50 = h_v[i_t50]
         dt50 = d_v[i_t50]
@@ -1067,20 +1588,18 @@ cdef (
 
         # Eq 20-21
         zeta_r = cos(atan(1.e-3 * (h_rs - h50) / (d - d50)))
-        nu_r50 = -1.e31
-        for i in range(i_m50 + 1, dsize - 1):
-
-            H_i = (
-                h_v[i] + C_e500 * (d_v[i] - d50) * (d - d_v[i]) -
-                (h50 * (d - d_v[i]) + h_rs * (d_v[i] - d50)) / (d - d50)
-                )
-            nu_i = zeta_r * H_i * sqrt(
-                0.002 * (d - d50) / lam / (d_v[i] - d50) / (d - d_v[i])
-                )
-            if nu_i > nu_r50:
-                Hr50 = H_i
-                nu_r50 = nu_i
-                i_r50 = i
+        # H_i = (
+        #     h_v[i] + C_e500 * (d_v[i] - d50) * (d - d_v[i]) -
+        #     (h50 * (d - d_v[i]) + h_rs * (d_v[i] - d50)) / (d - d50)
+        #     )
+        # nu_i = zeta_r * H_i * sqrt(
+        #     0.002 * (d - d50) / lam / (d_v[i] - d50) / (d - d_v[i])
+        #     )
+        q.x0, q.y0, q.x1, q.y1 = d50, h50, d, h_rs
+        q.zeta = zeta_r
+        nu_r50, i_r50 = _scan_max(&q, d_v, h_v, tree, i_m50 + 1, dsize - 1)
+        if i_r50 >= 0:
+            Hr50 = _scan_clearance(&q, d_v[i_r50], h_v[i_r50])
 
         hr50 = h_v[i_r50]
         dr50 = d_v[i_r50]
@@ -1098,11 +1617,11 @@ cdef (
         if nu_r50 < -0.78:
             nu_rbeta = -1.
 
-        return (
-            zeta_m, i_m50, d50, h50, H50, nu_m50, nu_mbeta,
-            zeta_t, i_t50, dr50, hr50, Hr50, nu_t50, nu_tbeta,
-            zeta_r, i_r50, dt50, ht50, Ht50, nu_r50, nu_rbeta,
-            )
+    return (
+        zeta_m, i_m50, d50, h50, H50, nu_m50, nu_mbeta,
+        zeta_t, i_t50, dr50, hr50, Hr50, nu_t50, nu_tbeta,
+        zeta_r, i_r50, dt50, ht50, Ht50, nu_r50, nu_rbeta,
+        )
 
 
 cdef (int, double, double, double, double, double, double, double, double) _path_geometry_helper(
@@ -1112,6 +1631,7 @@ cdef (int, double, double, double, double, double, double, double, double) _path
         double[::1] h_v,
         double h_ts, double h_rs, double h_st,
         int nu_bull_idx, double duct_slope,
+        const proftree *tree=NULL,
         ) nogil:
 
     cdef:
@@ -1119,25 +1639,26 @@ cdef (int, double, double, double, double, double, double, double, double) _path
         double d = distance, m = duct_slope
         int path_type
 
-        double theta_i, theta_j, theta_t, theta_r, theta
-        double theta_i_max = -1.e31, theta_j_max = -1.e31, theta_td
+        double theta_t, theta_r, theta
+        double theta_i_max, theta_j_max, theta_td
         double eps_pt, eps_pr
 
         int lt_idx, lr_idx
         double d_lt, d_lr
 
-        double h_m_i, h_m = -1.e31
+        double h_m
 
-    dsize = d_v.shape[0]
+        scanparams q
 
-    for i in range(1, dsize - 1):
+    dsize = d_v.shape[0]
 
-        theta_i = 1000. * atan(
-            (h_v[i] - h_ts) / 1.e3 / d_v[i] - d_v[i] / 2. / a_e
-            )
-        if theta_i > theta_i_max:
-            theta_i_max = theta_i
-            lt_idx = i
+    # theta_i = 1000. * atan(
+    #     (h_v[i] - h_ts) / 1.e3 / d_v[i] - d_v[i] / 2. / a_e
+    #     )
+    q.kind = SCAN_THETA_T
+    q.x0, q.y0, q.x1, q.y1 = 0., h_ts, d, h_rs
+    q.a_e = a_e
+    theta_i_max, lt_idx = _scan_max(&q, d_v, h_v, tree, 1, dsize - 1)
 
     theta_td = 1000. * atan(
         (h_rs - h_ts) / 1.e3 / d - d / 2. / a_e
@@ -1154,14 +1675,12 @@ cdef (int, double, double, double, double, double, double, double, double) _path
         theta_t = theta_i_max
         d_lt = d_v[lt_idx]
 
-        for i in range(1, dsize - 1):
-            theta_j = 1000. * atan(
-                (h_v[i] - h_rs) / 1.e3 / (d - d_v[i]) -
-                (d - d_v[i]) / 2. / a_e
-                )
-            if theta_j > theta_j_max:
-                theta_j_max = theta_j
-                lr_idx = i
+        # theta_j = 1000. * atan(
+        #     (h_v[i] - h_rs) / 1.e3 / (d - d_v[i]) -
+        #     (d - d_v[i]) / 2. / a_e
+        #     )
+        q.kind = SCAN_THETA_R
+        theta_j_max, lr_idx = _scan_max(&q, d_v, h_v, tree, 1, dsize - 1)
 
         theta_r = theta_j_max
         d_lr = d - d_v[lr_idx]
@@ -1173,11 +1692,11 @@ cdef (int, double, double, double, double, double, double, double, double) _path
         eps_pr = theta_r * 1.e-3 * 180. / M_PI
 
         # calc h_m
-        for i in range(lt_idx, lr_idx + 1):
-            h_m_i = h_v[i] - (h_st + m * d_v[i])
-
-            if h_m_i > h_m:
-                h_m = h_m_i
+        # h_m_i = h_v[i] - (h_st + m * d_v[i])
+        q.kind = SCAN_HEIGHT_M
+        q.y0 = h_st
+        q.m = m
+        h_m = _scan_max(&q, d_v, h_v, tree, lt_idx, lr_idx + 1)[0]
 
     else:
         # LOS
@@ -1214,22 +1733,55 @@ cdef (int, double, double, double, double, double, double, double, double) _path
         )
 
 
+cdef inline (double, double) _gas_attenuation(
+        double freq, double pressure, double temperature, double omega
+        ) nogil:
+
+    cdef:
+        (double, double) atten_dB, atten_dB_bs
+
+    atten_dB = _specific_attenuation_annex2(
+        freq, pressure, 7.5 + 2.5 * omega / 100., temperature
+        )
+    atten_dB_bs = _specific_attenuation_annex2(
+        freq, pressure, 3., temperature
+        )
+
+    return atten_dB[0] + atten_dB[1], atten_dB_bs[0] + atten_dB_bs[1]
+
+
+cdef inline void _update_gas_attenuation(ppstruct *pp) nogil:
+    # The specific gaseous attenuation is the same for all pixels/paths
+    # sharing freq, pressure, temperature, and omega, which is usually the
+    # case for a whole map; only re-compute it if one of these changed.
+    # (Set pp.gas_freq to NAN to force an update.)
+
+    if (
+            pp.freq == pp.gas_freq and
+            pp.pressure == pp.gas_pressure and
+            pp.temperature == pp.gas_temperature and
+            pp.omega == pp.gas_omega
+            ):
+        return
+
+    pp.gamma_g, pp.gamma_g_bs = _gas_attenuation(
+        pp.freq, pp.pressure, pp.temperature, pp.omega
+        )
+    pp.gas_freq = pp.freq
+    pp.gas_pressure = pp.pressure
+    pp.gas_temperature = pp.temperature
+    pp.gas_omega = pp.omega
+
+
 cdef (double, double, double) _free_space_loss_bfsg(
         ppstruct pp,
         ) nogil:
     # Better make this a member function?
 
     cdef:
-        double rho_water
-        (double, double) atten_dB
-
         double A_g, L_bfsg, E_sp, E_sbeta
 
-    rho_water = 7.5 + 2.5 * pp.omega / 100.
-    atten_dB = _specific_attenuation_annex2(
-        pp.freq, pp.pressure, rho_water, pp.temperature
-        )
-    A_g = (atten_dB[0] + atten_dB[1]) * pp.distance
+    A_g = pp.gamma_g * pp.distance
 
     L_bfsg = 92.5 + 20 * log10(pp.freq) + 20 * log10(pp.distance)
     L_bfsg += A_g
@@ -1288,15 +1840,9 @@ cdef double _tropospheric_scatter_loss_bs(
 
     cdef:
 
-        (double, double) atten_dB
-
         double A_g, L_f, L_c, L_bs
 
-    atten_dB = _specific_attenuation_annex2(
-        pp.freq, pp.pressure, 3., pp.temperature
-        )
-
-    A_g = (atten_dB[0] + atten_dB[1]) * pp.distance
+    A_g = pp.gamma_g_bs * pp.distance
     L_f = 25 * log10(pp.freq) - 2.5 * log10(0.5 * pp.freq) ** 2
 
     # TODO: why is toposcatter depending on gains towards horizon???
@@ -1347,9 +1893,6 @@ cdef double _ducting_loss_ba(
 
     cdef:
 
-        double rho_water
-        (double, double) atten_dB
-
         double A_g, A_lf, A_st, A_sr, A_ct, A_cr, A_p, A_d, L_ba
 
         double theta_t_prime, theta_r_prime, theta_t_prime2, theta_r_prime2
@@ -1357,12 +1900,7 @@ cdef double _ducting_loss_ba(
 
         double gamma_d, tau, eps, alpha, beta, mu_2, mu_3, d_I, Gamma
 
-    rho_water = 7.5 + 2.5 * pp.omega / 100.
-    atten_dB = _specific_attenuation_annex2(
-        pp.freq, pp.pressure, rho_water, pp.temperature
-        )
-
-    A_g = (atten_dB[0] + atten_dB[1]) * pp.distance
+    A_g = pp.gamma_g * pp.distance
 
     if pp.theta_t <= 0.1 * pp.d_lt:
         theta_t_prime = pp.theta_t
@@ -1833,11 +2371,33 @@ def diffraction_loss_complete_cython(
     return _diffraction_loss_complete(pathprop._pp)
 
 
+# sub-models of _path_attenuation_complete, which can be skipped if their
+# results are not needed (the complete loss needs all of them)
+cdef enum MODEL:
+    MODEL_B0P = 1  # free-space loss
+    MODEL_BD = 2  # diffraction loss
+    MODEL_BS = 4  # troposcatter loss
+    MODEL_BA = 8  # ducting loss
+    MODEL_ALL = 15
+
+
+# the sub-models needed for each (float-valued) result layer of the
+# fast map/path functions; the geometric quantities are always calculated
+_LAYER_MODELS = [
+    MODEL_B0P, MODEL_BD, MODEL_BS, MODEL_BA, MODEL_ALL, MODEL_ALL,
+    0, 0, 0, 0,
+    ]
+
+
 cdef (double, double, double, double, double, double, double) _path_attenuation_complete(
         ppstruct pp,
         double G_t, double G_r,
+        int models=MODEL_ALL,
         ) nogil:
 
+    # if not all models are requested, only the associated losses are
+    # calculated; all others (including the complete loss) are NaN
+
     cdef:
 
         double _THETA = 0.3  # mrad
@@ -1856,6 +2416,22 @@ cdef (double, double, double, double, double, double, double) _path_attenuation_
 
         double A_ht = 0., A_hr = 0.
 
+    if models != MODEL_ALL:
+
+        L_b0p = L_bd = L_bs = L_ba = NAN
+
+        if models & MODEL_B0P:
+            L_bfsg, E_sp, E_sbeta = _free_space_loss_bfsg(pp)
+            L_b0p = L_bfsg + E_sp
+        if models & MODEL_BS:
+            L_bs = _tropospheric_scatter_loss_bs(pp, G_t, G_r)
+        if models & MODEL_BA:
+            L_ba = _ducting_loss_ba(pp)
+        if models & MODEL_BD:
+            L_bd = _diffraction_loss_complete(pp)[3]
+
+        return L_b0p, L_bd, L_bs, L_ba, NAN, NAN, NAN
+
     if pp.zone_t != CLUTTER.UNKNOWN:
         A_ht = _clutter_correction(
             pp.h_tg_in, pp.zone_t, pp.freq
@@ -2004,63 +2580,462 @@ def clutter_correction_cython(
 # ############################################################################
 
 
-# TODO: d_tm, d_lm, d_ct, and d_cr need to be calculated for each pixel!
-# Likewise for clutter zones.
-def height_map_data_cython(
-        double lon_t, double lat_t,
-        double map_size_lon, double map_size_lat,
-        double map_resolution=3. / 3600.,
-        int do_cos_delta=1,
-        int zone_t=CLUTTER.UNKNOWN, int zone_r=CLUTTER.UNKNOWN,
-        d_tm=None, d_lm=None,
-        d_ct=None, d_cr=None,
-        omega=None,
-        ):
+def _select_layers(layers, dtype):
+    # layer indices (see atten_map_fast_cython), the sub-models needed
+    # for these, and whether single precision is to be used
 
-    '''
-    Calculate height profiles and auxillary maps needed for atten_map_fast.
+    if layers is None:
+        layers = range(len(_LAYER_MODELS))
 
-    This can be used to cache height-profile data. Since it is independent
-    of frequency, timepercent, Tx and Rx heights, etc., one can re-use
-    it to save computing time when doing batch jobs.
+    layers = np.array(layers, dtype=np.intc).ravel()
+    if np.any((layers < 0) | (layers >= len(_LAYER_MODELS))):
+        raise ValueError('Invalid layer index in {}'.format(layers))
 
-    Parameters
-    ----------
-    lon_t, lat_t : double
-        Geographic longitude/latitude of transmitter [deg]
-    map_size_lon, map_size_lat : double
-        Map size in longitude/latitude[deg]
-    map_resolution : double, optional
-        Pixel resolution of map [deg] (default: 3 arcsec)
-    do_cos_delta : int, optional
-        If True, divide `map_size_lon` by `cos(lat_t)` to produce a more
-        square-like map. (default: True)
-    zone_t, zone_r : CLUTTER enum, optional
-        Clutter type for transmitter/receiver terminal.
-        (default: CLUTTER.UNKNOWN)
-    d_tm : double, optional
-        longest continuous land (inland + coastal) section of the
-        great-circle path [km]
-        (default: distance between Tx and Rx)
-    d_lm : double, optional
-        longest continuous inland section of the great-circle path [km]
-        (default: distance between Tx and Rx)
-    d_ct, d_cr : double, optional
-        Distance over land from transmitter/receiver antenna to the coast
-        along great circle interference path [km]
-        (default: 50000 km)
-    omega : double, optional
-        Fraction of the path over water [%] (see Table 3)
-        (default: 0%)
+    dtype = np.dtype(dtype)
+    if dtype != np.float32 and dtype != np.float64:
+        raise ValueError('dtype must be float32 or float64')
 
-    Returns
-    -------
-    hprof_data : dict
-        Dictionary with height profiles and auxillary data as
-        calculated with `~pycraf.pathprof.height_map_data`.
+    models = 0
+    for layer in layers:
+        models |= _LAYER_MODELS[layer]
 
-        The dictionary contains the following entities (the map dimension
-        is mx * my):
+    return layers, models, dtype == np.float32
+
+
+cdef inline void _store_layers(
+        void *res, bint single,
+        const int *layers, int nlayers,
+        Py_ssize_t offset, Py_ssize_t stride,
+        const ppstruct *pp,
+        double L_b0p, double L_bd, double L_bs, double L_ba,
+        double L_b, double L_b_corr,
+        ) nogil:
+    # write the requested layers to the (float32 or float64) results
+    # array; layer n is stored at res[offset + n * stride]
+
+    cdef:
+        int n
+        double v
+
+    for n in range(nlayers):
+
+        if layers[n] == 0:
+            v = L_b0p
+        elif layers[n] == 1:
+            v = L_bd
+        elif layers[n] == 2:
+            v = L_bs
+        elif layers[n] == 3:
+            v = L_ba
+        elif layers[n] == 4:
+            v = L_b
+        elif layers[n] == 5:
+            v = L_b_corr
+        elif layers[n] == 6:
+            v = pp.eps_pt
+        elif layers[n] == 7:
+            v = pp.eps_pr
+        elif layers[n] == 8:
+            v = pp.d_lt
+        else:
+            v = pp.d_lr
+
+        if single:
+            (<float *> res)[offset + n * stride] = <float> v
+        else:
+            (<double *> res)[offset + n * stride] = v
+
+
+def _map_geometry(
+        double lon_t, double lat_t,
+        double map_size_lon, double map_size_lat,
+        double map_resolution, int do_cos_delta,
+        ):
+    # map coordinates and radial grid (start bearings and distances)
+    # as used by height_map_data_cython
+
+    cdef:
+
+        # need 3x better resolution than map_resolution
+        double hprof_step = map_resolution * 3600. / 1. * 30. / 3.
+        double cosdelta
+        double max_distance, min_pa_res
+        double lon_t_rad, lat_t_rad
+
+        int i
+
+    # print('using hprof_step = {:.1f} m'.format(hprof_step))
+
+    cosdelta = 1. / cos(DEG2RAD * lat_t) if do_cos_delta else 1.
+
+    # construction map arrays
+    xcoords = np.arange(
+        lon_t - cosdelta * map_size_lon / 2,
+        lon_t + cosdelta * map_size_lon / 2 + 1.e-6,
+        cosdelta * map_resolution,
+        )
+    ycoords = np.arange(
+        lat_t - map_size_lat / 2,
+        lat_t + map_size_lat / 2 + 1.e-6,
+        map_resolution,
+        )
+    lon_t_rad, lat_t_rad = DEG2RAD * lon_t, DEG2RAD * lat_t
+    xcoords_rad = np.radians(xcoords)
+    ycoords_rad = np.radians(ycoords)
+    # print(
+    #     xcoords[0], xcoords[len(xcoords) - 1],
+    #     ycoords[0], ycoords[len(ycoords) - 1]
+    #     )
+
+    # find max distance (will be one of the edges)
+    max_distance = max([
+        cygeodesics.inverse_cython(
+            lon_t_rad, lat_t_rad, xcoords_rad[i], ycoords_rad[j],
+            )[0]
+        for i, j in [
+            (0, 0),
+            (0, ycoords_rad.size - 1),
+            (xcoords_rad.size - 1, 0),
+            (xcoords_rad.size - 1, ycoords_rad.size - 1)
+            ]
+        ])  # m
+    # print('max distance (to corner coords)', max_distance / 1000, 'km')
+
+    # find necessary position angle resolution (again, using edges)
+    min_pa_res = min([
+        fabs(
+            cygeodesics.inverse_cython(
+                lon_t_rad, lat_t_rad, xcoords_rad[i], ycoords_rad[k],
+                )[1] -
+            cygeodesics.inverse_cython(
+                lon_t_rad, lat_t_rad, xcoords_rad[j], ycoords_rad[k],
+                )[1]
+            )
+        for i, j, k in [
+            (0, 1, 0),
+            (0, 1, ycoords_rad.size - 1),
+            (xcoords_rad.size - 1, xcoords_rad.size - 2, 0),
+            (xcoords_rad.size - 1, xcoords_rad.size - 2, ycoords_rad.size - 1)
+            ]
+        ]) / 2  # rad
+    # print('min pos angle resolution (at corner coords)', min_pa_res)
+
+    # generate start bearings:
+    start_bearings = np.arange(0, 2 * np.pi, min_pa_res)
+
+    # path positions
+    distances = np.arange(0, max_distance + hprof_step, hprof_step)  # m
+
+    return {
+        'lon_t': lon_t,
+        'lat_t': lat_t,
+        'map_size_lon': map_size_lon,
+        'map_size_lat': map_size_lat,
+        'map_resolution': map_resolution,
+        'do_cos_delta': do_cos_delta,
+        'hprof_step': hprof_step,
+        'cosdelta': cosdelta,
+        'xcoords': xcoords,
+        'ycoords': ycoords,
+        'max_distance': max_distance,
+        'start_bearings': start_bearings,
+        'distances': distances,
+        }
+
+
+def _map_radials(geom, bearings, int dstart, int dstop):
+    # positions and back-bearings [deg] along the radials with the
+    # given start bearings [rad]; only the samples dstart ... dstop - 1
+
+    lons_rad, lats_rad, back_bearings_rad = cygeodesics.direct_cython(
+        DEG2RAD * geom['lon_t'], DEG2RAD * geom['lat_t'],
+        bearings[:, np.newaxis],
+        geom['distances'][np.newaxis, dstart:dstop]
+        )
+
+    return (
+        np.degrees(lons_rad), np.degrees(lats_rad),
+        np.degrees(back_bearings_rad),
+        )
+
+
+def _map_heights(geom, bearings, lons, lats):
+    # terrain heights along the radials (see _map_radials)
+
+    nbearings, nsamples = lons.shape
+
+    # for truncated radials, only the smoothing kernel must be
+    # covered beyond the last sample
+    max_distance = min(
+        geom['max_distance'],
+        geom['distances'][nsamples - 1] + 3 * geom['hprof_step']
+        )
+
+    return heightprofile._path_heights(
+        DEG2RAD * geom['lon_t'], DEG2RAD * geom['lat_t'], bearings,
+        np.full(nbearings, max_distance), geom['hprof_step'],
+        lons, lats, np.tile(geom['distances'][:nsamples], nbearings),
+        np.arange(nbearings + 1, dtype=np.int64) * nsamples,
+        coarse=True,
+        )
+
+
+def _block_bearings(geom, int y0, int y1, int x0, int x1):
+    # find the radials, which can have samples in the map block
+    # [y0:y1, x0:x1]; returns the (ascending) indices into the start
+    # bearings and the range of distance samples needed
+    # as the samples are assigned to the pixels by rounding and clipping,
+    # blocks at the map edges also receive the samples beyond the edges
+
+    cdef:
+        double lon_t_rad = DEG2RAD * geom['lon_t']
+        double lat_t_rad = DEG2RAD * geom['lat_t']
+        double dx = geom['cosdelta'] * geom['map_resolution']
+        double dy = geom['map_resolution']
+        double xlo, xhi, ylo, yhi, cx, cy, pad, blo, bspan
+        int nx, ny, dstart, dstop
+        bint at_edge
+
+    xcoords, ycoords = geom['xcoords'], geom['ycoords']
+    start_bearings, distances = geom['start_bearings'], geom['distances']
+    nx, ny = xcoords.size, ycoords.size
+    dstart, dstop = 0, distances.size
+
+    # extent of all samples (in pixel coordinates)
+    clons_rad, clats_rad, _ = cygeodesics.direct_cython(
+        lon_t_rad, lat_t_rad,
+        np.linspace(0, 2 * np.pi, 721), distances[dstop - 1],
+        )
+    cpx = (np.degrees(clons_rad) - xcoords[0]) / dx
+    cpy = (np.degrees(clats_rad) - ycoords[0]) / dy
+
+    xlo = x0 - 0.51 if x0 > 0 else min(cpx.min(), -0.5) - 2
+    xhi = x1 - 0.49 if x1 < nx else max(cpx.max(), nx - 0.5) + 2
+    ylo = y0 - 0.51 if y0 > 0 else min(cpy.min(), -0.5) - 2
+    yhi = y1 - 0.49 if y1 < ny else max(cpy.max(), ny - 0.5) + 2
+    at_edge = x0 == 0 or x1 == nx or y0 == 0 or y1 == ny
+
+    # block boundary (counter-clockwise)
+    t = np.linspace(0, 1, 64, endpoint=False)
+    bx = np.concatenate([
+        xlo + t * (xhi - xlo), np.full_like(t, xhi),
+        xhi - t * (xhi - xlo), np.full_like(t, xlo),
+        ])
+    by = np.concatenate([
+        np.full_like(t, ylo), ylo + t * (yhi - ylo),
+        np.full_like(t, yhi), yhi - t * (yhi - ylo),
+        ])
+    bdists, bbearings, _ = cygeodesics.inverse_cython(
+        lon_t_rad, lat_t_rad,
+        np.radians(xcoords[0] + bx * dx), np.radians(ycoords[0] + by * dy),
+        )
+
+    if not at_edge:
+        dstop = min(
+            dstop,
+            np.searchsorted(distances, bdists.max() * (1 + 1.e-6)) + 2
+            )
+
+    cx = (geom['lon_t'] - xcoords[0]) / dx
+    cy = (geom['lat_t'] - ycoords[0]) / dy
+    if xlo - 1 <= cx <= xhi + 1 and ylo - 1 <= cy <= yhi + 1:
+        return np.arange(start_bearings.size), dstart, dstop
+
+    # the center is outside of the block, so the closest point is on
+    # the boundary (between two boundary points, the distance can be
+    # slightly smaller)
+    dstart = max(
+        0,
+        np.searchsorted(distances, bdists.min() * (1 - 1.e-6)) - 3
+        )
+
+    # the bearings of all points in the block lie within the (smallest)
+    # arc covering the bearings of the boundary points; between the
+    # boundary points, the bearing can slightly exceed this arc
+    bbearings = np.mod(bbearings, 2 * np.pi)
+    dbearings = np.diff(np.append(bbearings, bbearings[0]))
+    pad = np.abs(
+        np.mod(dbearings + np.pi, 2 * np.pi) - np.pi
+        ).max() + 2 * (start_bearings[1] - start_bearings[0])
+
+    bsorted = np.sort(bbearings)
+    gaps = np.diff(np.append(bsorted, bsorted[0] + 2 * np.pi))
+    i = np.argmax(gaps)
+    blo = bsorted[(i + 1) % bsorted.size] - pad
+    bspan = 2 * np.pi - gaps[i] + 2 * pad
+
+    bidx = np.flatnonzero(np.mod(start_bearings - blo, 2 * np.pi) <= bspan)
+
+    return bidx, dstart, dstop
+
+
+# number of radial samples processed at once by _assign_map_pixels
+# (determines the size of its scratch arrays: 12 bytes per sample)
+_ASSIGN_CHUNK_SAMPLES = 2 ** 22
+
+
+cdef void _assign_map_pixels(
+        np.float64_t[::1] xcoords, np.float64_t[::1] ycoords,
+        double cosdelta, double map_resolution,
+        int x0, int y0,
+        int dstart,
+        np.float64_t[::1] distances,
+        np.float64_t[::1] start_bearings,
+        np.float64_t[:, ::1] lons,
+        np.float64_t[:, ::1] lats,
+        np.float64_t[:, ::1] back_bearings,
+        np.int32_t[:, ::1] path_idx_map,
+        np.int32_t[:, ::1] dist_end_idx_map,
+        np.float64_t[:, ::1] pix_dist_map,
+        np.float64_t[:, ::1] dist_map,
+        np.float64_t[:, ::1] bearing_map,
+        np.float64_t[:, ::1] backbearing_map,
+        np.int32_t[:, ::1] sample_pix,
+        np.float64_t[:, ::1] sample_dist,
+        ) nogil:
+    # find for each map pixel the closest sample of all radials; the
+    # maps can be a block of the full map, starting at pixel (x0, y0);
+    # only samples falling into this block are considered
+    # the radial positions (lons, lats, back_bearings) start with
+    # sample dstart
+    #
+    # the radials are processed in chunks of sample_pix.shape[0]; for
+    # each chunk, the (flat) pixel indices and distances of all samples
+    # are computed in parallel and stored in sample_pix/sample_dist;
+    # afterwards, the maps are updated serially (in the same order as
+    # a fully serial loop), such that ties are resolved identically
+
+    cdef:
+        int bidx, didx, xidx, yidx, b0, b1, pix
+        int nbear = start_bearings.shape[0], ndist = lons.shape[1]
+        int chunk = sample_pix.shape[0]
+        int xlen = path_idx_map.shape[1], ylen = path_idx_map.shape[0]
+        double refx = xcoords[0], refy = ycoords[0]
+        double lon_r, lat_r, pdist
+
+    b0 = 0
+    while b0 < nbear:
+
+        b1 = min(b0 + chunk, nbear)
+
+        for bidx in prange(b0, b1, schedule='guided'):
+
+            for didx in range(ndist):
+
+                lon_r = lons[bidx, didx]
+                lat_r = lats[bidx, didx]
+
+                # need to find closest pixel index in map
+                xidx = int((lon_r - refx) / cosdelta / map_resolution + 0.5)
+                yidx = int((lat_r - refy) / map_resolution + 0.5)
+
+                if xidx < 0:
+                    xidx = 0
+                if xidx >= xcoords.shape[0]:
+                    xidx = xcoords.shape[0] - 1
+                if yidx < 0:
+                    yidx = 0
+                if yidx >= ycoords.shape[0]:
+                    yidx = ycoords.shape[0] - 1
+
+                if (
+                        xidx < x0 or xidx >= x0 + xlen or
+                        yidx < y0 or yidx >= y0 + ylen
+                        ):
+                    sample_pix[bidx - b0, didx] = -1
+                    continue
+
+                sample_pix[bidx - b0, didx] = (yidx - y0) * xlen + xidx - x0
+                sample_dist[bidx - b0, didx] = true_angular_distance(
+                    xcoords[xidx], ycoords[yidx], lon_r, lat_r
+                    )
+
+        for bidx in range(b0, b1):
+
+            for didx in range(ndist):
+
+                pix = sample_pix[bidx - b0, didx]
+                if pix < 0:
+                    continue
+
+                yidx = pix // xlen
+                xidx = pix % xlen
+                pdist = sample_dist[bidx - b0, didx]
+
+                if pdist < pix_dist_map[yidx, xidx]:
+                    pix_dist_map[yidx, xidx] = pdist
+                    path_idx_map[yidx, xidx] = bidx
+                    dist_end_idx_map[yidx, xidx] = didx + dstart
+                    dist_map[yidx, xidx] = distances[didx + dstart]
+                    bearing_map[yidx, xidx] = start_bearings[bidx]
+                    backbearing_map[yidx, xidx] = back_bearings[bidx, didx]
+
+        b0 = b1
+
+
+# TODO: d_tm, d_lm, d_ct, and d_cr need to be calculated for each pixel!
+# Likewise for clutter zones.
+def height_map_data_cython(
+        double lon_t, double lat_t,
+        double map_size_lon, double map_size_lat,
+        double map_resolution=3. / 3600.,
+        int do_cos_delta=1,
+        int zone_t=CLUTTER.UNKNOWN, int zone_r=CLUTTER.UNKNOWN,
+        d_tm=None, d_lm=None,
+        d_ct=None, d_cr=None,
+        omega=None,
+        block=None,
+        ):
+
+    '''
+    Calculate height profiles and auxillary maps needed for atten_map_fast.
+
+    This can be used to cache height-profile data. Since it is independent
+    of frequency, timepercent, Tx and Rx heights, etc., one can re-use
+    it to save computing time when doing batch jobs.
+
+    Parameters
+    ----------
+    lon_t, lat_t : double
+        Geographic longitude/latitude of transmitter [deg]
+    map_size_lon, map_size_lat : double
+        Map size in longitude/latitude[deg]
+    map_resolution : double, optional
+        Pixel resolution of map [deg] (default: 3 arcsec)
+    do_cos_delta : int, optional
+        If True, divide `map_size_lon` by `cos(lat_t)` to produce a more
+        square-like map. (default: True)
+    zone_t, zone_r : CLUTTER enum, optional
+        Clutter type for transmitter/receiver terminal.
+        (default: CLUTTER.UNKNOWN)
+    d_tm : double, optional
+        longest continuous land (inland + coastal) section of the
+        great-circle path [km]
+        (default: distance between Tx and Rx)
+    d_lm : double, optional
+        longest continuous inland section of the great-circle path [km]
+        (default: distance between Tx and Rx)
+    d_ct, d_cr : double, optional
+        Distance over land from transmitter/receiver antenna to the coast
+        along great circle interference path [km]
+        (default: 50000 km)
+    omega : double, optional
+        Fraction of the path over water [%] (see Table 3)
+        (default: 0%)
+    block : tuple of two slices, optional
+        If given, only calculate the data for the map pixels
+        `[block[0], block[1]]` (row and column slices; step must be 1).
+        Only the radials passing this block are computed; they are
+        truncated after the last sample used. (default: None)
+
+    Returns
+    -------
+    hprof_data : dict
+        Dictionary with height profiles and auxillary data as
+        calculated with `~pycraf.pathprof.height_map_data`.
+
+        The dictionary contains the following entities (the map dimension
+        is mx * my):
 
         - "lon_t", "lat_t" : float
 
@@ -2155,216 +3130,137 @@ def height_map_data_cython(
     -----
     - Path attenuation is completely symmetric, i.e., it doesn't matter if
       the transmitter or the receiver is situated in the map center.
+    - For a `block`, all maps (and "xcoords", "ycoords") only cover the
+      block. "path_idx_map" refers to the rows of "height_profs", which
+      only contains the radials used in the block. The per-pixel data is
+      the same as for the full map.
     '''
 
     cdef:
 
-        # need 3x better resolution than map_resolution
-        double hprof_step = map_resolution * 3600. / 1. * 30. / 3.
+        int x0, x1, y0, y1, dstart, dstop, step
         double cosdelta
-        double max_distance, min_pa_res
-
-        int xi, yi, i, xidx, yidx, mid_idx
-        int bidx, didx
-        double refx, refy
-        double lon_t_rad, lat_t_rad, lon_r, lat_r
-        double pdist
 
         # need views on all relevant numpy arrays for faster access
         np.float64_t[::1] _xcoords, _ycoords
         np.float64_t[::1] _distances, _start_bearings
         np.float64_t[:, ::1] _lons, _lats, _back_bearings
-        np.float64_t[:, ::1] _heights
         np.int32_t[:, ::1] _path_idx_map, _dist_end_idx_map
         np.float64_t[:, ::1] _pix_dist_map
-        np.float64_t[:, ::1] _lon_mid_map, _lat_mid_map
         np.float64_t[:, ::1] _dist_map
         np.float64_t[:, ::1] _bearing_map, _backbearing_map
+        np.int32_t[:, ::1] _sample_pix
+        np.float64_t[:, ::1] _sample_dist
 
-    # print('using hprof_step = {:.1f} m'.format(hprof_step))
+    geom = _map_geometry(
+        lon_t, lat_t, map_size_lon, map_size_lat,
+        map_resolution, do_cos_delta,
+        )
+    _xcoords = xcoords = geom['xcoords']
+    _ycoords = ycoords = geom['ycoords']
+    start_bearings = geom['start_bearings']
+    cosdelta = geom['cosdelta']
 
-    cosdelta = 1. / cos(DEG2RAD * lat_t) if do_cos_delta else 1.
+    if block is None:
 
-    # construction map arrays
-    _xcoords = xcoords = np.arange(
-        lon_t - cosdelta * map_size_lon / 2,
-        lon_t + cosdelta * map_size_lon / 2 + 1.e-6,
-        cosdelta * map_resolution,
-        )
-    _ycoords = ycoords = np.arange(
-        lat_t - map_size_lat / 2,
-        lat_t + map_size_lat / 2 + 1.e-6,
-        map_resolution,
-        )
-    lon_t_rad, lat_t_rad = DEG2RAD * lon_t, DEG2RAD * lat_t
-    xcoords_rad = np.radians(xcoords)
-    ycoords_rad = np.radians(ycoords)
-    # print(
-    #     xcoords[0], xcoords[len(xcoords) - 1],
-    #     ycoords[0], ycoords[len(ycoords) - 1]
-    #     )
+        y0, y1, x0, x1 = 0, ycoords.size, 0, xcoords.size
+        dstart, dstop = 0, geom['distances'].size
 
-    # find max distance (will be one of the edges)
-    max_distance = max([
-        cygeodesics.inverse_cython(
-            lon_t_rad, lat_t_rad, xcoords_rad[i], ycoords_rad[j],
-            )[0]
-        for i, j in [
-            (0, 0),
-            (0, ycoords_rad.size - 1),
-            (xcoords_rad.size - 1, 0),
-            (xcoords_rad.size - 1, ycoords_rad.size - 1)
-            ]
-        ])  # m
-    # print('max distance (to corner coords)', max_distance / 1000, 'km')
+    else:
 
-    # find necessary position angle resolution (again, using edges)
-    min_pa_res = min([
-        fabs(
-            cygeodesics.inverse_cython(
-                lon_t_rad, lat_t_rad, xcoords_rad[i], ycoords_rad[k],
-                )[1] -
-            cygeodesics.inverse_cython(
-                lon_t_rad, lat_t_rad, xcoords_rad[j], ycoords_rad[k],
-                )[1]
-            )
-        for i, j, k in [
-            (0, 1, 0),
-            (0, 1, ycoords_rad.size - 1),
-            (xcoords_rad.size - 1, xcoords_rad.size - 2, 0),
-            (xcoords_rad.size - 1, xcoords_rad.size - 2, ycoords_rad.size - 1)
-            ]
-        ]) / 2  # rad
-    # print('min pos angle resolution (at corner coords)', min_pa_res)
+        y0, y1, step = block[0].indices(ycoords.size)
+        if step != 1 or y1 <= y0:
+            raise ValueError('Invalid block (rows)')
+        x0, x1, step = block[1].indices(xcoords.size)
+        if step != 1 or x1 <= x0:
+            raise ValueError('Invalid block (columns)')
 
+        # only radials passing the block are needed (and only the
+        # samples, which can fall into the block)
+        bidx, dstart, dstop = _block_bearings(geom, y0, y1, x0, x1)
+        start_bearings = start_bearings[bidx]
+
+    # obtain all path's height profiles
+    lons, lats, back_bearings = _map_radials(
+        geom, start_bearings, dstart, dstop
+        )
+    _start_bearings = start_bearings
+    _lons, _lats, _back_bearings = lons, lats, back_bearings
+
+    if block is None:
+        heights = _map_heights(geom, start_bearings, lons, lats)
+
+    _distances = distances = geom['distances'][:dstop] * 1e-3  # to km
 
     # path_idx_map stores the index of the edge-path that is closest
     # to any given map pixel
     _path_idx_map = path_idx_map = np.zeros(
-        (ycoords.size, xcoords.size), dtype=np.int32
+        (y1 - y0, x1 - x0), dtype=np.int32
         )
 
     # to define and find closest paths, we store the true angular distance
     # in pix_dist_map; Note, since distances are small, it is ok to do
     # this on the sphere (and not on geoid)
     _pix_dist_map = pix_dist_map = np.full(
-        (ycoords.size, xcoords.size), 1.e30, dtype=np.float64
+        (y1 - y0, x1 - x0), 1.e30, dtype=np.float64
         )
 
     # dist_end_idx_map stores the (distance) index in the height profile
     # of the closest edge path, such that one can use a slice (0, end_idx)
     # to get a height profile approximately valid for any given pixel
     _dist_end_idx_map = dist_end_idx_map = np.zeros(
-        (ycoords.size, xcoords.size), dtype=np.int32
+        (y1 - y0, x1 - x0), dtype=np.int32
         )
 
-    # store lon_mid, lat_mid,
-    _lon_mid_map = lon_mid_map = np.zeros(
-        (ycoords.size, xcoords.size), dtype=np.float64
-        )
-    _lat_mid_map = lat_mid_map = np.zeros(
-        (ycoords.size, xcoords.size), dtype=np.float64
-        )
-    _dist_map = dist_map = np.zeros(
-        (ycoords.size, xcoords.size), dtype=np.float64
-        )
+    _dist_map = dist_map = np.zeros((y1 - y0, x1 - x0), dtype=np.float64)
 
     # store bearings
     _bearing_map = bearing_map = np.zeros(
-        (ycoords.size, xcoords.size), dtype=np.float64
+        (y1 - y0, x1 - x0), dtype=np.float64
         )
     _backbearing_map = backbearing_map = np.zeros(
-        (ycoords.size, xcoords.size), dtype=np.float64
-        )
-
-    # obtain all path's height profiles
-    # generate start bearings:
-    _start_bearings = start_bearings = np.arange(0, 2 * np.pi, min_pa_res)
-
-    # calculate path positions
-    _distances = distances = np.arange(
-        0, max_distance + hprof_step, hprof_step
+        (y1 - y0, x1 - x0), dtype=np.float64
         )
 
-    lons_rad, lats_rad, back_bearings_rad = cygeodesics.direct_cython(
-        lon_t_rad, lat_t_rad,
-        start_bearings[:, np.newaxis],
-        distances[np.newaxis]
-        )
-    _lons, _lats = lons, lats = np.degrees(lons_rad), np.degrees(lats_rad)
-    _back_bearings = back_bearings = np.degrees(back_bearings_rad)
-
-    # print(xcoords, ycoords)
-    # print(lons.min(), lons.max(), lats.min(), lats.max())
-
-    if hprof_step > srtm.SrtmConf.hgt_res / 1.5:
-        hdistances = np.arange(
-            0, max_distance + hprof_step / 3, hprof_step / 3
-            )
-
-        hlons_rad, hlats_rad, _ = cygeodesics.direct_cython(
-            lon_t_rad, lat_t_rad,
-            start_bearings[:, np.newaxis],
-            hdistances[np.newaxis]
-            )
-
-        hheights = srtm._srtm_height_data(
-            np.degrees(hlons_rad), np.degrees(hlats_rad)
-            ).astype(np.float64)
-        heights = np.empty_like(lons_rad)
-        # now smooth/interpolate this to the desired step width
-        cygeodesics.regrid2d_with_x(
-            hdistances, hheights, distances, heights,
-            hprof_step / 2.35, regular=True
-            )
-
-    else:
-
-        heights = srtm._srtm_height_data(lons, lats).astype(np.float64)
-
-    _heights = heights
-    distances *= 1e-3  # convert to km
-    _distances = distances
-
-    refx, refy = _xcoords[0], _ycoords[0]
+    # scratch space for the parallel part of _assign_map_pixels
+    chunk = max(1, min(
+        len(start_bearings), _ASSIGN_CHUNK_SAMPLES // max(1, lons.shape[1])
+        ))
+    _sample_pix = np.empty((chunk, lons.shape[1]), dtype=np.int32)
+    _sample_dist = np.empty((chunk, lons.shape[1]), dtype=np.float64)
 
     with nogil:
-        for bidx in range(_start_bearings.shape[0]):
-
-            for didx in range(_distances.shape[0]):
+        _assign_map_pixels(
+            _xcoords, _ycoords, cosdelta, map_resolution, x0, y0, dstart,
+            _distances, _start_bearings, _lons, _lats, _back_bearings,
+            _path_idx_map, _dist_end_idx_map, _pix_dist_map,
+            _dist_map, _bearing_map, _backbearing_map,
+            _sample_pix, _sample_dist,
+            )
 
-                lon_r, lat_r = _lons[bidx, didx], _lats[bidx, didx]
+    if block is not None:
+        # only keep the radials (and samples), which are actually used;
+        # path indices refer to the remaining radials
+        del lons, lats, back_bearings, _lons, _lats, _back_bearings
 
-                # need to find closest pixel index in map
-                xidx = int((lon_r - refx) / cosdelta / map_resolution + 0.5)
-                yidx = int((lat_r - refy) / map_resolution + 0.5)
-
-                if xidx < 0:
-                    xidx = 0
-                if xidx >= _xcoords.shape[0]:
-                    xidx = _xcoords.shape[0] - 1
-                if yidx < 0:
-                    yidx = 0
-                if yidx >= _ycoords.shape[0]:
-                    yidx = _ycoords.shape[0] - 1
+        rows, path_idx = np.unique(path_idx_map, return_inverse=True)
+        path_idx_map = path_idx.reshape(path_idx_map.shape).astype(np.int32)
+        dstop = dist_end_idx_map.max() + 1
 
-                pdist = true_angular_distance(
-                    _xcoords[xidx], _ycoords[yidx], lon_r, lat_r
-                    )
+        start_bearings = start_bearings[rows]
+        distances = distances[:dstop]
+        lons, lats, _ = _map_radials(geom, start_bearings, 0, dstop)
+        heights = _map_heights(geom, start_bearings, lons, lats)
 
-                if pdist < _pix_dist_map[yidx, xidx]:
-                    _pix_dist_map[yidx, xidx] = pdist
-                    _path_idx_map[yidx, xidx] = bidx
-                    _dist_end_idx_map[yidx, xidx] = didx
-                    mid_idx = didx // 2
-                    _lon_mid_map[yidx, xidx] = _lons[bidx, mid_idx]
-                    _lat_mid_map[yidx, xidx] = _lats[bidx, mid_idx]
-                    _dist_map[yidx, xidx] = _distances[didx]
-                    _bearing_map[yidx, xidx] = _start_bearings[bidx]
-                    _backbearing_map[yidx, xidx] = _back_bearings[bidx, didx]
+    # store lon_mid, lat_mid,
+    lon_mid_map = np.zeros((y1 - y0, x1 - x0), dtype=np.float64)
+    lat_mid_map = np.zeros((y1 - y0, x1 - x0), dtype=np.float64)
+    mask = pix_dist_map < 1.e30
+    lon_mid_map[mask] = lons[path_idx_map[mask], dist_end_idx_map[mask] // 2]
+    lat_mid_map[mask] = lats[path_idx_map[mask], dist_end_idx_map[mask] // 2]
 
     # store delta_N, beta0, N0
-    delta_N_map, beta0_map, N0_map = helper._radiomet_data_for_pathcenter(
+    delta_N_map, beta0_map, N0_map = _radiomet_data_cython(
         lon_mid_map, lat_mid_map, dist_map, dist_map
         )
 
@@ -2405,11 +3301,11 @@ def height_map_data_cython(
     hprof_data = {}
     hprof_data['lon_t'] = lon_t
     hprof_data['lat_t'] = lat_t
-    hprof_data['xcoords'] = xcoords
-    hprof_data['ycoords'] = ycoords
+    hprof_data['xcoords'] = xcoords[x0:x1]
+    hprof_data['ycoords'] = ycoords[y0:y1]
     hprof_data['map_size_lon'] = map_size_lon
     hprof_data['map_size_lat'] = map_size_lat
-    hprof_data['hprof_step'] = hprof_step
+    hprof_data['hprof_step'] = geom['hprof_step']
     hprof_data['map_resolution'] = map_resolution
     hprof_data['do_cos_delta'] = do_cos_delta
 
@@ -2442,6 +3338,30 @@ def height_map_data_cython(
     return hprof_data
 
 
+def _radial_order(path_idx_map, dist_end_idx_map):
+    # order the map pixels by radial (path_idx_map) and, within each
+    # radial, by distance (dist_end_idx_map); pixels closer than five
+    # profile steps to the center are skipped
+    # returns the flat pixel indices and the offsets of each radial
+    # into these
+
+    eidx = np.ravel(path_idx_map)
+    didx = np.ravel(dist_end_idx_map)
+
+    pixels = np.flatnonzero(didx >= 4)
+    pixels = pixels[np.lexsort((didx[pixels], eidx[pixels]))]
+
+    eidx = eidx[pixels]
+    offsets = np.concatenate((
+        [0], np.flatnonzero(eidx[1:] != eidx[:-1]) + 1, [len(pixels)]
+        )) if len(pixels) else np.zeros(1, dtype=np.int64)
+
+    return (
+        np.ascontiguousarray(pixels, dtype=np.int64),
+        np.ascontiguousarray(offsets, dtype=np.int64),
+        )
+
+
 def atten_map_fast_cython(
         double freq,
         double temperature,
@@ -2451,6 +3371,9 @@ def atten_map_fast_cython(
         object hprof_data not None,  # dict_like
         int polarization=0,
         int version=16,
+        layers=None,
+        bint path_type=True,
+        dtype=np.float64,
         ):
     '''
     Calculate attenuation maps using a fast method.
@@ -2475,6 +3398,15 @@ def atten_map_fast_cython(
         Allowed values are: 0 - horizontal, 1 - vertical
     version : int, optional
         ITU-R Rec. P.452 version. Allowed values are: 14, 16
+    layers : sequence of int, optional
+        Indices of the float results to calculate (see below). Losses,
+        which are not needed for these, are not calculated at all.
+        (default: all)
+    path_type : bool, optional
+        Whether to return the path type (default: True)
+    dtype : numpy.dtype, optional
+        Data type of the float results; float64 or float32. Calculations
+        are always done with double precision. (default: float64)
 
     Returns
     -------
@@ -2507,40 +3439,364 @@ def atten_map_fast_cython(
 
         As `float_results` but for integer-typed values:
 
-        0) path_type - Regular path type (0 - LoS, 1 - Trans-horizon)
+        0) path_type - Regular path type (0 - LoS, 1 - Trans-horizon)
+
+    If only some `layers` are requested, the first axis of
+    `float_results` refers to these (in the given order). Without
+    `path_type`, the first axis of `int_results` has length zero.
+
+    Notes
+    -----
+    - The diffraction-loss algorithm was changed between ITU-R P.452
+      version 14 and 15. The former used a Deygout method, the new one
+      is based on a Bullington calculation with correction terms.
+    - The pixels are processed radial by radial (sorted by distance).
+      All paths on a radial are prefixes of the same height profile,
+      such that the profile only needs to be indexed once per radial.
+    '''
+
+    # TODO: implement map-based clutter handling; currently, only a single
+    # clutter zone type is possible for each of Tx and Rx
+
+    assert time_percent <= 50.
+    assert version == 14 or version == 16
+
+    cdef:
+        # must set gains to zero, because gain is direction dependent
+        double G_t = 0., G_r = 0.
+        ppstruct *pp
+        profindex *pidx
+        int xi, yi, xlen, ylen
+        int eidx, didx
+        Py_ssize_t r, j, p, nradials, plane
+
+        int[::1] layers_v
+        const int *layers_p = NULL
+        int nlayers, models
+        bint single
+        void *res
+
+        double[:, ::1] clutter_data_v = CLUTTER_DATA
+
+        double L_b0p, L_bd, L_bs, L_ba, L_b, L_b_corr, L_dummy
+
+    xcoords, ycoords = hprof_data['xcoords'], hprof_data['ycoords']
+
+    layers_v, models, single = _select_layers(layers, dtype)
+    nlayers = layers_v.shape[0]
+    if nlayers > 0:
+        layers_p = &layers_v[0]
+
+    float_res = np.zeros(
+        (nlayers, len(ycoords), len(xcoords)),
+        dtype=np.float32 if single else np.float64,
+        )
+    int_res = np.zeros(
+        (1 if path_type else 0, len(ycoords), len(xcoords)), dtype=np.int32
+        )
+    res = np.PyArray_DATA(float_res)
+
+    cdef:
+        int[:, :, :] int_res_v = int_res
+
+        # since we allow all dict_like objects for hprof_data,
+        # we have to make sure, that arrays are numpy and contiguous
+        # (have in mind, that one might use hdf5 data sets)
+
+        _cf = np.ascontiguousarray
+
+        double[::1] xcoords_v = _cf(hprof_data['xcoords'])
+        double[::1] ycoords_v = _cf(hprof_data['ycoords'])
+        double lon_t = np.double(hprof_data['lon_t'])
+        double lat_t = np.double(hprof_data['lat_t'])
+        double hprof_step = np.double(hprof_data['hprof_step'])
+
+        int[:, :] path_idx_map_v = _cf(hprof_data['path_idx_map'])
+        int[:, :] dist_end_idx_map_v = _cf(hprof_data['dist_end_idx_map'])
+        double[:, :] dist_map_v = _cf(hprof_data['dist_map'])
+        double[:, :] delta_N_map_v = _cf(hprof_data['delta_N_map'])
+        double[:, :] beta0_map_v = _cf(hprof_data['beta0_map'])
+        double[:, :] N0_map_v = _cf(hprof_data['N0_map'])
+
+        int[:, :] zone_t_map_v = _cf(hprof_data['zone_t_map'])
+        int[:, :] zone_r_map_v = _cf(hprof_data['zone_r_map'])
+        double[:, :] d_tm_map_v = _cf(hprof_data['d_tm_map'])
+        double[:, :] d_lm_map_v = _cf(hprof_data['d_lm_map'])
+        double[:, :] d_ct_map_v = _cf(hprof_data['d_ct_map'])
+        double[:, :] d_cr_map_v = _cf(hprof_data['d_cr_map'])
+        double[:, :] omega_map_v = _cf(hprof_data['omega_map'])
+
+        double[::1] dist_prof_v = _cf(hprof_data['dist_prof'])
+        double[:, ::1] height_profs_v = _cf(hprof_data['height_profs'])
+        double[::1] zheight_prof_v = _cf(hprof_data['zheight_prof'])
+
+        np.int64_t[::1] pixels_v, offsets_v
+
+    xlen = len(xcoords)
+    ylen = len(ycoords)
+    plane = xlen * ylen
+
+    pixels_v, offsets_v = _radial_order(
+        hprof_data['path_idx_map'], hprof_data['dist_end_idx_map']
+        )
+    nradials = offsets_v.shape[0] - 1
+
+    with nogil, parallel():
+
+        pp = <ppstruct *> malloc(sizeof(ppstruct))
+        if pp == NULL:
+            abort()
+        pp.gas_freq = NAN
+
+        pp.version = version
+        pp.freq = freq
+        pp.wavelen = 0.299792458 / freq
+        pp.temperature = temperature
+        pp.pressure = pressure
+        pp.lon_t = lon_t
+        pp.lat_t = lat_t
+        pp.h_tg = h_tg
+        pp.h_rg = h_rg
+        pp.h_tg_in = h_tg
+        pp.h_rg_in = h_rg
+
+        pp.hprof_step = hprof_step
+        pp.time_percent = time_percent
+        # TODO: add functionality to produce the following
+        # five parameters programmatically (using some kind of Geo-Data)
+        pp.polarization = polarization
+
+        pidx = <profindex *> malloc(sizeof(profindex))
+        if pidx == NULL:
+            abort()
+        if _init_profindex(pidx, height_profs_v.shape[1]) < 0:
+            abort()
+
+        for r in prange(nradials, schedule='guided'):
+
+            # the last pixel has the longest path on the radial
+            p = pixels_v[offsets_v[r + 1] - 1]
+            yi = p // xlen
+            xi = p % xlen
+            eidx = path_idx_map_v[yi, xi]
+            didx = dist_end_idx_map_v[yi, xi]
+
+            _build_profindex(
+                pidx,
+                dist_prof_v[0:didx + 1],
+                height_profs_v[eidx, 0:didx + 1],
+                zheight_prof_v[0:didx + 1],
+                )
+
+            for j in range(offsets_v[r], offsets_v[r + 1]):
+
+                p = pixels_v[j]
+                yi = p // xlen
+                xi = p % xlen
+                didx = dist_end_idx_map_v[yi, xi]
+
+                pp.lon_r = xcoords_v[xi]
+                pp.lat_r = ycoords_v[yi]
+                pp.zone_t = zone_t_map_v[yi, xi]
+                pp.zone_r = zone_r_map_v[yi, xi]
+
+                if pp.zone_t == CLUTTER.UNKNOWN:
+                    pp.h_tg = h_tg
+                else:
+                    pp.h_tg = f_max(clutter_data_v[pp.zone_t, 0], h_tg)
+
+                if pp.zone_r == CLUTTER.UNKNOWN:
+                    pp.h_rg = h_rg
+                else:
+                    pp.h_rg = f_max(clutter_data_v[pp.zone_r, 0], h_rg)
+
+                pp.d_tm = d_tm_map_v[yi, xi]
+                pp.d_lm = d_lm_map_v[yi, xi]
+                pp.d_ct = d_ct_map_v[yi, xi]
+                pp.d_cr = d_cr_map_v[yi, xi]
+                pp.omega = omega_map_v[yi, xi]
+
+                pp.distance = dist_map_v[yi, xi]
+
+                pp.delta_N = delta_N_map_v[yi, xi]
+                pp.beta0 = beta0_map_v[yi, xi]
+                pp.N0 = N0_map_v[yi, xi]
+
+                # assigning not possible in prange, but can use directly below
+                # dists_v = dist_prof_v[0:didx + 1]
+                # heights_v = height_profs_v[eidx, 0:didx + 1]
+                # zheights_v = zheight_prof_v[0:didx + 1]
+
+                _process_path(
+                    pp,
+                    # dists_v,
+                    # heights_v,
+                    # zheights_v,
+                    dist_prof_v[0:didx + 1],
+                    height_profs_v[eidx, 0:didx + 1],
+                    zheight_prof_v[0:didx + 1],
+                    pidx,
+                    )
+
+                if models:
+                    _update_gas_attenuation(pp)
+                    (
+                        L_b0p, L_bd, L_bs, L_ba, L_b, L_b_corr, L_dummy
+                        ) = _path_attenuation_complete(
+                            pp[0], G_t, G_r, models
+                            )
+
+                _store_layers(
+                    res, single, layers_p, nlayers, p, plane, pp,
+                    L_b0p, L_bd, L_bs, L_ba, L_b, L_b_corr,
+                    )
+
+                if path_type:
+                    int_res_v[0, yi, xi] = pp.path_type
+
+        _free_profindex(pidx)
+        free(pidx)
+        free(pp)
+
+    return float_res, int_res
+
+
+def atten_map_fast_cube_cython(
+        freq,
+        temperature,
+        pressure,
+        h_tg, h_rg,
+        time_percent,
+        geom_idx,
+        object hprof_data not None,  # dict_like
+        int polarization=0,
+        int version=16,
+        layers=None,
+        bint path_type=True,
+        dtype=np.float64,
+        ):
+    '''
+    Calculate attenuation maps for many parameter sets at once.
+
+    As `atten_map_fast_cython`, but `freq`, `temperature`, `pressure`,
+    `h_tg`, `h_rg`, and `time_percent` can be 1D arrays (which are
+    broadcasted against each other). The map pixels are only processed
+    once; for each pixel, the results for all parameter sets are
+    computed. The parameter sets are processed grouped by `geom_idx`,
+    such that the path geometry is only computed once for each distinct
+    combination of `freq`, `h_tg`, and `h_rg`. As in
+    `atten_map_fast_cython`, the pixels are processed radial by radial.
+
+    Parameters
+    ----------
+    freq : double or 1D array
+        Frequency of radiation [GHz]
+    temperature : double or 1D array
+        Temperature (K)
+    pressure : double or 1D array
+        Pressure (hPa)
+    h_tg, h_rg : double or 1D array
+        Transmitter/receiver heights over ground [m]
+    timepercent : double or 1D array
+        Time percentage [%] (maximal 50%)
+    geom_idx : 1D array of int
+        Index of the path geometry of each (broadcasted) parameter set,
+        i.e., parameter sets with the same `freq`, `h_tg`, and `h_rg`
+        must have the same index (e.g., the inverse indices returned by
+        `numpy.unique`).
+    hprof_data : dict, dict-like
+        Dictionary with height profiles and auxillary maps as
+        calculated with `~pycraf.pathprof.height_map_data`.
+    polarization : int, optional
+        Polarization (default: 0)
+        Allowed values are: 0 - horizontal, 1 - vertical
+    version : int, optional
+        ITU-R Rec. P.452 version. Allowed values are: 14, 16
+    layers, path_type, dtype : optional
+        See `atten_map_fast_cython`.
+
+    Returns
+    -------
+    float_results : 4D `~numpy.ndarray`
+        As for `atten_map_fast_cython`, but with an additional (first)
+        axis for the parameter sets, i.e., the shape is
+        `(n_params, n_layers, ny, nx)`.
 
-    Notes
-    -----
-    - The diffraction-loss algorithm was changed between ITU-R P.452
-      version 14 and 15. The former used a Deygout method, the new one
-      is based on a Bullington calculation with correction terms.
+    int_results : 4D `~numpy.ndarray`
+        As for `atten_map_fast_cython`, with shape `(n_params, 1, ny, nx)`.
     '''
 
-    # TODO: implement map-based clutter handling; currently, only a single
-    # clutter zone type is possible for each of Tx and Rx
-
-    assert time_percent <= 50.
-    assert version == 14 or version == 16
-
     cdef:
         # must set gains to zero, because gain is direction dependent
         double G_t = 0., G_r = 0.
         ppstruct *pp
-        int xi, yi, xlen, ylen
+        profindex *pidx
+        int xi, yi, xlen, ylen, k, kk, nparams
         int eidx, didx
+        Py_ssize_t r, j, p, nradials, plane
+        double *gas_tab
+
+        int[::1] layers_v
+        const int *layers_p = NULL
+        int nlayers, models
+        bint single
+        void *res
 
         double[:, ::1] clutter_data_v = CLUTTER_DATA
 
         double L_b0p, L_bd, L_bs, L_ba, L_b, L_b_corr, L_dummy
 
+        double[::1] _freq, _temp, _press, _h_tg, _h_rg, _time_percent
+
+    (
+        _freq, _temp, _press, _h_tg, _h_rg, _time_percent
+        ) = [
+        # need to copy, as broadcasted arrays are read-only
+        np.array(a, dtype=np.float64, order='C')
+        for a in np.broadcast_arrays(
+            np.atleast_1d(freq), np.atleast_1d(temperature),
+            np.atleast_1d(pressure), np.atleast_1d(h_tg),
+            np.atleast_1d(h_rg), np.atleast_1d(time_percent),
+            )
+        ]
+
+    assert _freq.ndim == 1, 'parameters must be scalars or 1D arrays'
+    assert np.all(np.asarray(_time_percent) <= 50.)
+    assert version == 14 or version == 16
+
+    nparams = _freq.shape[0]
+
+    geom_idx = np.ascontiguousarray(geom_idx, dtype=np.intc)
+    assert geom_idx.shape == (nparams, ), (
+        'geom_idx must have one entry per parameter set'
+        )
+
+    cdef:
+        const int[::1] geom_idx_v = geom_idx
+        # processing order of the parameter sets (grouped by geometry)
+        const int[::1] order_v = np.argsort(
+            geom_idx, kind='stable'
+            ).astype(np.intc)
+
     xcoords, ycoords = hprof_data['xcoords'], hprof_data['ycoords']
 
-    float_res = np.zeros((10, len(ycoords), len(xcoords)), dtype=np.float64)
-    int_res = np.zeros((1, len(ycoords), len(xcoords)), dtype=np.int32)
+    layers_v, models, single = _select_layers(layers, dtype)
+    nlayers = layers_v.shape[0]
+    if nlayers > 0:
+        layers_p = &layers_v[0]
+
+    float_res = np.zeros(
+        (nparams, nlayers, len(ycoords), len(xcoords)),
+        dtype=np.float32 if single else np.float64,
+        )
+    int_res = np.zeros(
+        (nparams, 1 if path_type else 0, len(ycoords), len(xcoords)),
+        dtype=np.int32,
+        )
+    res = np.PyArray_DATA(float_res)
 
     cdef:
-        double[:, :, :] float_res_v = float_res
-        int[:, :, :] int_res_v = int_res
+        int[:, :, :, :] int_res_v = int_res
 
         # since we allow all dict_like objects for hprof_data,
         # we have to make sure, that arrays are numpy and contiguous
@@ -2573,58 +3829,72 @@ def atten_map_fast_cython(
         double[:, ::1] height_profs_v = _cf(hprof_data['height_profs'])
         double[::1] zheight_prof_v = _cf(hprof_data['zheight_prof'])
 
+        np.int64_t[::1] pixels_v, offsets_v
+
     xlen = len(xcoords)
     ylen = len(ycoords)
+    plane = xlen * ylen
+
+    pixels_v, offsets_v = _radial_order(
+        hprof_data['path_idx_map'], hprof_data['dist_end_idx_map']
+        )
+    nradials = offsets_v.shape[0] - 1
 
     with nogil, parallel():
 
         pp = <ppstruct *> malloc(sizeof(ppstruct))
         if pp == NULL:
             abort()
+        pp.gas_freq = NAN
 
         pp.version = version
-        pp.freq = freq
-        pp.wavelen = 0.299792458 / freq
-        pp.temperature = temperature
-        pp.pressure = pressure
         pp.lon_t = lon_t
         pp.lat_t = lat_t
-        pp.h_tg = h_tg
-        pp.h_rg = h_rg
-        pp.h_tg_in = h_tg
-        pp.h_rg_in = h_rg
 
         pp.hprof_step = hprof_step
-        pp.time_percent = time_percent
-        # TODO: add functionality to produce the following
-        # five parameters programmatically (using some kind of Geo-Data)
         pp.polarization = polarization
 
-        for yi in prange(ylen, schedule='guided', chunksize=10):
+        # gaseous attenuation for all parameter sets (and the omega, for
+        # which they were computed, in the last slot)
+        gas_tab = <double *> malloc((2 * nparams + 1) * sizeof(double))
+        if gas_tab == NULL:
+            abort()
+        gas_tab[2 * nparams] = NAN
+
+        pidx = <profindex *> malloc(sizeof(profindex))
+        if pidx == NULL:
+            abort()
+        if _init_profindex(pidx, height_profs_v.shape[1]) < 0:
+            abort()
 
-            for xi in range(xlen):
+        for r in prange(nradials, schedule='guided'):
 
-                eidx = path_idx_map_v[yi, xi]
-                didx = dist_end_idx_map_v[yi, xi]
+            # the last pixel has the longest path on the radial
+            p = pixels_v[offsets_v[r + 1] - 1]
+            yi = p // xlen
+            xi = p % xlen
+            eidx = path_idx_map_v[yi, xi]
+            didx = dist_end_idx_map_v[yi, xi]
 
-                if didx < 4:
-                    continue
+            _build_profindex(
+                pidx,
+                dist_prof_v[0:didx + 1],
+                height_profs_v[eidx, 0:didx + 1],
+                zheight_prof_v[0:didx + 1],
+                )
+
+            for j in range(offsets_v[r], offsets_v[r + 1]):
+
+                p = pixels_v[j]
+                yi = p // xlen
+                xi = p % xlen
+                didx = dist_end_idx_map_v[yi, xi]
 
                 pp.lon_r = xcoords_v[xi]
                 pp.lat_r = ycoords_v[yi]
                 pp.zone_t = zone_t_map_v[yi, xi]
                 pp.zone_r = zone_r_map_v[yi, xi]
 
-                if pp.zone_t == CLUTTER.UNKNOWN:
-                    pp.h_tg = h_tg
-                else:
-                    pp.h_tg = f_max(clutter_data_v[pp.zone_t, 0], h_tg)
-
-                if pp.zone_r == CLUTTER.UNKNOWN:
-                    pp.h_rg = h_rg
-                else:
-                    pp.h_rg = f_max(clutter_data_v[pp.zone_r, 0], h_rg)
-
                 pp.d_tm = d_tm_map_v[yi, xi]
                 pp.d_lm = d_lm_map_v[yi, xi]
                 pp.d_ct = d_ct_map_v[yi, xi]
@@ -2637,38 +3907,74 @@ def atten_map_fast_cython(
                 pp.beta0 = beta0_map_v[yi, xi]
                 pp.N0 = N0_map_v[yi, xi]
 
-                # assigning not possible in prange, but can use directly below
-                # dists_v = dist_prof_v[0:didx + 1]
-                # heights_v = height_profs_v[eidx, 0:didx + 1]
-                # zheights_v = zheight_prof_v[0:didx + 1]
-
-                _process_path(
-                    pp,
-                    # dists_v,
-                    # heights_v,
-                    # zheights_v,
-                    dist_prof_v[0:didx + 1],
-                    height_profs_v[eidx, 0:didx + 1],
-                    zheight_prof_v[0:didx + 1],
-                    )
-
-                (
-                    L_b0p, L_bd, L_bs, L_ba, L_b, L_b_corr, L_dummy
-                    ) = _path_attenuation_complete(pp[0], G_t, G_r)
-
-                float_res_v[0, yi, xi] = L_b0p
-                float_res_v[1, yi, xi] = L_bd
-                float_res_v[2, yi, xi] = L_bs
-                float_res_v[3, yi, xi] = L_ba
-                float_res_v[4, yi, xi] = L_b
-                float_res_v[5, yi, xi] = L_b_corr
-                float_res_v[6, yi, xi] = pp.eps_pt
-                float_res_v[7, yi, xi] = pp.eps_pr
-                float_res_v[8, yi, xi] = pp.d_lt
-                float_res_v[9, yi, xi] = pp.d_lr
+                if pp.omega != gas_tab[2 * nparams]:
+                    for k in range(nparams):
+                        gas_tab[2 * k], gas_tab[2 * k + 1] = _gas_attenuation(
+                            _freq[k], _press[k], _temp[k], pp.omega
+                            )
+                    gas_tab[2 * nparams] = pp.omega
+
+                for kk in range(nparams):
+
+                    k = order_v[kk]
+                    # path geometry only depends on freq, h_tg, and h_rg
+                    if (
+                            kk == 0 or
+                            geom_idx_v[k] != geom_idx_v[order_v[kk - 1]]
+                            ):
+
+                        pp.freq = _freq[k]
+                        pp.wavelen = 0.299792458 / pp.freq
+                        pp.h_tg_in = _h_tg[k]
+                        pp.h_rg_in = _h_rg[k]
+
+                        if pp.zone_t == CLUTTER.UNKNOWN:
+                            pp.h_tg = _h_tg[k]
+                        else:
+                            pp.h_tg = f_max(
+                                clutter_data_v[pp.zone_t, 0], _h_tg[k]
+                                )
+
+                        if pp.zone_r == CLUTTER.UNKNOWN:
+                            pp.h_rg = _h_rg[k]
+                        else:
+                            pp.h_rg = f_max(
+                                clutter_data_v[pp.zone_r, 0], _h_rg[k]
+                                )
+
+                        _process_path(
+                            pp,
+                            dist_prof_v[0:didx + 1],
+                            height_profs_v[eidx, 0:didx + 1],
+                            zheight_prof_v[0:didx + 1],
+                            pidx,
+                            )
+
+                    pp.temperature = _temp[k]
+                    pp.pressure = _press[k]
+                    pp.time_percent = _time_percent[k]
+                    pp.gamma_g = gas_tab[2 * k]
+                    pp.gamma_g_bs = gas_tab[2 * k + 1]
+
+                    if models:
+                        (
+                            L_b0p, L_bd, L_bs, L_ba, L_b, L_b_corr, L_dummy
+                            ) = _path_attenuation_complete(
+                                pp[0], G_t, G_r, models
+                                )
+
+                    _store_layers(
+                        res, single, layers_p, nlayers,
+                        k * nlayers * plane + p, plane, pp,
+                        L_b0p, L_bd, L_bs, L_ba, L_b, L_b_corr,
+                        )
 
-                int_res_v[0, yi, xi] = pp.path_type
+                    if path_type:
+                        int_res_v[k, 0, yi, xi] = pp.path_type
 
+        _free_profindex(pidx)
+        free(pidx)
+        free(gas_tab)
         free(pp)
 
     return float_res, int_res
@@ -2683,6 +3989,9 @@ def atten_path_fast_cython(
         object hprof_data not None,  # dict_like
         int polarization=0,
         int version=16,
+        layers=None,
+        bint path_type=True,
+        dtype=np.float64,
         ):
 
     '''
@@ -2708,6 +4017,8 @@ def atten_path_fast_cython(
         Allowed values are: 0 - horizontal, 1 - vertical
     version : int, optional
         ITU-R Rec. P.452 version. Allowed values are: 14, 16
+    layers, path_type, dtype : optional
+        See `atten_map_fast_cython`.
 
     Returns
     -------
@@ -2781,11 +4092,29 @@ def atten_path_fast_cython(
 
         int i, max_path_length = distances_v.size
 
-    float_res = np.zeros((10, max_path_length), dtype=np.float64)
-    int_res = np.zeros((1, max_path_length), dtype=np.int32)
+        profindex pidx
+
+        int[::1] layers_v
+        const int *layers_p = NULL
+        int nlayers, models
+        bint single
+        void *res
+
+    layers_v, models, single = _select_layers(layers, dtype)
+    nlayers = layers_v.shape[0]
+    if nlayers > 0:
+        layers_p = &layers_v[0]
+
+    float_res = np.zeros(
+        (nlayers, max_path_length),
+        dtype=np.float32 if single else np.float64,
+        )
+    int_res = np.zeros(
+        (1 if path_type else 0, max_path_length), dtype=np.int32
+        )
+    res = np.PyArray_DATA(float_res)
 
     cdef:
-        double[:, :] float_res_v = float_res
         int[:, :] int_res_v = int_res
 
     assert (
@@ -2798,11 +4127,20 @@ def atten_path_fast_cython(
     assert np.all(hprof_data['zone_r'] >= -1)
     assert np.all(hprof_data['zone_r'] <= 11)
 
+    # all paths are prefixes of the full profile; with the profile index,
+    # each path can be processed without scanning the full prefix
+    if _init_profindex(&pidx, max_path_length) < 0:
+        _free_profindex(&pidx)
+        raise MemoryError()
+
+    _build_profindex(&pidx, distances_v, heights_v, zheights_v)
+
     with nogil, parallel():
 
         pp = <ppstruct *> malloc(sizeof(ppstruct))
         if pp == NULL:
             abort()
+        pp.gas_freq = NAN
 
         pp.version = version
         pp.freq = freq
@@ -2852,27 +4190,27 @@ def atten_path_fast_cython(
                 distances_v[0:i + 1],
                 heights_v[0:i + 1],
                 zheights_v[0:i + 1],
+                &pidx,
                 )
 
-            (
-                L_b0p, L_bd, L_bs, L_ba, L_b, L_b_corr, L_dummy
-                ) = _path_attenuation_complete(pp[0], G_t, G_r)
-
-            float_res_v[0, i] = L_b0p
-            float_res_v[1, i] = L_bd
-            float_res_v[2, i] = L_bs
-            float_res_v[3, i] = L_ba
-            float_res_v[4, i] = L_b
-            float_res_v[5, i] = L_b_corr
-            float_res_v[6, i] = pp.eps_pt
-            float_res_v[7, i] = pp.eps_pr
-            float_res_v[8, i] = pp.d_lt
-            float_res_v[9, i] = pp.d_lr
-
-            int_res_v[0, i] = pp.path_type
+            if models:
+                _update_gas_attenuation(pp)
+                (
+                    L_b0p, L_bd, L_bs, L_ba, L_b, L_b_corr, L_dummy
+                    ) = _path_attenuation_complete(pp[0], G_t, G_r, models)
+
+            _store_layers(
+                res, single, layers_p, nlayers, i, max_path_length, pp,
+                L_b0p, L_bd, L_bs, L_ba, L_b, L_b_corr,
+                )
+
+            if path_type:
+                int_res_v[0, i] = pp.path_type
 
         free(pp)
 
+    _free_profindex(&pidx)
+
     return float_res, int_res
 
 
@@ -2901,17 +4239,17 @@ def losses_complete_cython(
         ):
 
     cdef:
-        # work arrays (for inner loop of nditer)
-        np.ndarray[double] _freq, _temp, _press
-        np.ndarray[double] _h_tg, _h_rg, _G_t, _G_r
-        np.ndarray[double] _time_percent, _omega
-        np.ndarray[double] _d_tm, _d_lm, _d_ct, _d_cr
-        np.ndarray[int] _zone_t, _zone_r, _polarization, _version
+        # work arrays
+        double[::1] _freq, _temp, _press
+        double[::1] _h_tg, _h_rg, _G_t, _G_r
+        double[::1] _time_percent, _omega
+        double[::1] _d_tm, _d_lm, _d_ct, _d_cr
+        int[::1] _zone_t, _zone_r, _polarization, _version
 
         # output arrays
-        np.ndarray[double] _L_b0p, _L_bd, _L_bs, _L_ba, _L_b, _L_b_corr
-        np.ndarray[double] _eps_pt, _eps_pr, _d_lt, _d_lr
-        np.ndarray[int] _path_type
+        double[::1] _L_b0p, _L_bd, _L_bs, _L_ba, _L_b, _L_b_corr
+        double[::1] _eps_pt, _eps_pr, _d_lt, _d_lr
+        int[::1] _path_type
 
         # other
 
@@ -2923,20 +4261,21 @@ def losses_complete_cython(
 
         int hsize, mid_idx
 
+        # path geometries (one per unique geometry key)
+        np.int64_t[::1] _geom_first, _geom_idx, _order
+        ppstruct *geoms
+        ppstruct *gp
         ppstruct *pp
 
         double[:, ::1] _clut_data = CLUTTER_DATA
 
         double L_dummy
 
-        double *last_freq
-        double *last_h_tg
-        double *last_h_rg
-        int *last_version
-        int *last_zone_t
-        int *last_zone_r
+        double gamma_g, gamma_g_bs
+        double gas_freq, gas_pressure, gas_temperature, gas_omega
+        np.int64_t *last_geom
 
-        int i, size
+        Py_ssize_t i, j, g, size, ngeom
 
     assert np.all(time_percent <= 50.)
     assert np.all((version == 14) | (version == 16))
@@ -2993,7 +4332,7 @@ def losses_complete_cython(
         lat_mid = 0.5 * (lat_t + lat_r)
 
     if delta_N is None:
-        _delta_N, _N0 = helper._DN_N0_from_map(lon_mid, lat_mid)
+        _delta_N, _N0 = _radiomet_data_cython(lon_mid, lat_mid)
     else:
         _delta_N, _N0 = delta_N, N0
 
@@ -3025,132 +4364,140 @@ def losses_complete_cython(
         zone_r = np.array([-1])
 
 
-    # in the nditer, we first put all entities that have impact on the
-    # path geometry; this is to avoid unnecessary re-calculations
-
-    # these entities are:
-    # frequency, h_tg, h_rg, version, zone_t, zone_r
-
-    it = np.nditer(
-        [
-            frequency, h_tg, h_rg, G_t, G_r, version, zone_t, zone_r,
-            temperature, pressure, time_percent, omega,
-            d_tm, d_lm, d_ct, d_cr, polarization,
-            # L_b0p, L_bd, L_bs, L_ba, L_b, L_b_corr,
-            None, None, None, None, None, None,
-            # eps_pt, eps_pr, d_lt, d_lr, path_type
-            None, None, None, None, None,
-            ],
-        flags=['external_loop', 'buffered', 'delay_bufalloc'],
-        op_flags=[['readonly']] * 17 + [['readwrite', 'allocate']] * 11,
-        op_dtypes=(
-            ['float64'] * 5 + ['int32'] * 3 +
-            ['float64'] * 8 + ['int32'] * 1 +
-            ['float64'] * 10 + ['int32'] * 1
-            ),
-        )
-
-    it.reset()
-    for (
-            _freq, _h_tg, _h_rg, _G_t, _G_r, _version, _zone_t, _zone_r,
-            _temp, _press, _time_percent, _omega,
-            _d_tm, _d_lm, _d_ct, _d_cr, _polarization,
-            _L_b0p, _L_bd, _L_bs, _L_ba, _L_b, _L_b_corr,
-            _eps_pt, _eps_pr, _d_lt, _d_lr, _path_type,
-            ) in it:
+    # the path geometry only depends on frequency, h_tg, h_rg, version,
+    # zone_t, and zone_r; it is processed once for each unique combination
+    # of these (the "geometry key"), before the (cheap) per-element
+    # loss calculation is fanned out over all array elements
+
+    args = np.broadcast_arrays(
+        frequency, h_tg, h_rg, G_t, G_r, version, zone_t, zone_r,
+        temperature, pressure, time_percent, omega,
+        d_tm, d_lm, d_ct, d_cr, polarization,
+        )
+    shape = args[0].shape
+    (
+        _freq, _h_tg, _h_rg, _G_t, _G_r, _version, _zone_t, _zone_r,
+        _temp, _press, _time_percent, _omega,
+        _d_tm, _d_lm, _d_ct, _d_cr, _polarization,
+        ) = [
+        # need to copy, as broadcasted arrays are read-only
+        np.array(
+            a, dtype=np.int32 if idx in [5, 6, 7, 16] else np.float64,
+            order='C',
+            ).ravel()
+        for idx, a in enumerate(args)
+        ]
+    size = _freq.shape[0]
+
+    geom_keys = np.stack([
+        np.asarray(a, dtype=np.float64) for a in (
+            _freq, _h_tg, _h_rg, _version, _zone_t, _zone_r
+            )
+        ], axis=1)
+    _, geom_first, geom_idx = np.unique(
+        geom_keys, axis=0, return_index=True, return_inverse=True
+        )
+    _geom_first = geom_first.astype(np.int64)
+    _geom_idx = geom_idx.astype(np.int64).ravel()
+    # process elements with the same geometry consecutively (which also
+    # helps the gaseous-attenuation cache)
+    _order = np.argsort(_geom_idx, kind='mergesort').astype(np.int64)
+    ngeom = _geom_first.shape[0]
+
+    float_res = np.empty((10, size), dtype=np.float64)
+    int_res = np.empty((1, size), dtype=np.int32)
+    (
+        _L_b0p, _L_bd, _L_bs, _L_ba, _L_b, _L_b_corr,
+        _eps_pt, _eps_pr, _d_lt, _d_lr,
+        ) = float_res
+    _path_type = int_res[0]
+
+    geoms = <ppstruct *> malloc(max(ngeom, 1) * sizeof(ppstruct))
+    if geoms == NULL:
+        raise MemoryError()
+
+    try:
+        with nogil:
+
+            for g in prange(ngeom, schedule='dynamic'):
+
+                i = _geom_first[g]
+                gp = &geoms[g]
+
+                gp.lon_mid = lon_mid
+                gp.lat_mid = lat_mid
+                gp.hprof_step = hprof_step  # dummy
+                gp.distance = distance
+                gp.bearing = bearing
+                gp.back_bearing = back_bearing
+                gp.alpha_tr = bearing
+                gp.alpha_rt = back_bearing
+                gp.delta_N = _delta_N
+                gp.N0 = _N0
+
+                gp.version = _version[i]
+                gp.freq = _freq[i]
+                gp.wavelen = 0.299792458 / gp.freq
+                gp.zone_t = _zone_t[i]
+                gp.zone_r = _zone_r[i]
+                if gp.zone_t == CLUTTER.UNKNOWN:
+                    gp.h_tg = _h_tg[i]
+                else:
+                    gp.h_tg = f_max(_clut_data[gp.zone_t, 0], _h_tg[i])
+
+                if gp.zone_r == CLUTTER.UNKNOWN:
+                    gp.h_rg = _h_rg[i]
+                else:
+                    gp.h_rg = f_max(_clut_data[gp.zone_r, 0], _h_rg[i])
+                gp.h_tg_in = _h_tg[i]
+                gp.h_rg_in = _h_rg[i]
+
+                _process_path(
+                    gp,
+                    distances_v,
+                    heights_v,
+                    zheights_v,
+                    )
 
         with nogil, parallel():
 
-            # could not find a solution to make last_h_tg a thread-local
+            # could not find a solution to make last_geom a thread-local
             # variable; using an array does the trick (but is ugly!!!)
-            last_freq = <double *> malloc(sizeof(double))
-            if last_freq == NULL:
-                abort()
-            last_h_tg = <double *> malloc(sizeof(double))
-            if last_h_tg == NULL:
-                abort()
-            last_h_rg = <double *> malloc(sizeof(double))
-            if last_h_rg == NULL:
-                abort()
-            last_version = <int *> malloc(sizeof(int))
-            if last_version == NULL:
-                abort()
-            last_zone_t = <int *> malloc(sizeof(int))
-            if last_zone_t == NULL:
+            last_geom = <np.int64_t *> malloc(sizeof(np.int64_t))
+            if last_geom == NULL:
                 abort()
-            last_zone_r = <int *> malloc(sizeof(int))
-            if last_zone_r == NULL:
-                abort()
-
-            last_freq[0] = NAN
-            last_h_tg[0] = NAN
-            last_h_rg[0] = NAN
-            last_version[0] = -1000
-            last_zone_t[0] = -1000
-            last_zone_r[0] = -1000
+            last_geom[0] = -1
 
             pp = <ppstruct *> malloc(sizeof(ppstruct))
             if pp == NULL:
                 abort()
+            pp.gas_freq = NAN
 
-            # pp.lon_t = lon_t
-            # pp.lat_t = lat_t
-            # pp.lon_r = lon_r
-            # pp.lat_r = lat_r
-            pp.lon_mid = lon_mid
-            pp.lat_mid = lat_mid
-            pp.hprof_step = hprof_step  # dummy
-            pp.distance = distance
-            pp.bearing = bearing
-            pp.back_bearing = back_bearing
-            pp.alpha_tr = bearing
-            pp.alpha_rt = back_bearing
-            pp.delta_N = _delta_N
-            pp.N0 = _N0
-
-            size = _freq.shape[0]
-
-            for i in prange(size):
+            for j in prange(size, schedule='guided', chunksize=10):
 
-                if (
-                        _freq[i] != last_freq[0] or
-                        _h_tg[i] != last_h_tg[0] or
-                        _h_rg[i] != last_h_rg[0] or
-                        _version[i] != last_version[0] or
-                        _zone_t[i] != last_zone_t[0] or
-                        _zone_r[i] != last_zone_r[0]
-                        ):
-                    last_freq[0] = _freq[i]
-                    last_h_tg[0] = _h_tg[i]
-                    last_h_rg[0] = _h_rg[i]
-                    last_version[0] = _version[i]
-                    last_zone_t[0] = _zone_t[i]
-                    last_zone_r[0] = _zone_r[i]
-
-                    # need to re-process path geometry ...
-                    pp.version = _version[i]
-                    pp.freq = _freq[i]
-                    pp.wavelen = 0.299792458 / pp.freq
-                    pp.zone_t = _zone_t[i]
-                    pp.zone_r = _zone_r[i]
-                    if pp.zone_t == CLUTTER.UNKNOWN:
-                        pp.h_tg = _h_tg[i]
-                    else:
-                        pp.h_tg = f_max(_clut_data[pp.zone_t, 0], _h_tg[i])
-
-                    if pp.zone_r == CLUTTER.UNKNOWN:
-                        pp.h_rg = _h_rg[i]
-                    else:
-                        pp.h_rg = f_max(_clut_data[pp.zone_r, 0], _h_rg[i])
-                    pp.h_tg_in = _h_tg[i]
-                    pp.h_rg_in = _h_rg[i]
-
-                    _process_path(
-                        pp,
-                        distances_v,
-                        heights_v,
-                        zheights_v,
-                        )
+                i = _order[j]
+                g = _geom_idx[i]
+
+                if g != last_geom[0]:
+                    last_geom[0] = g
+
+                    # copy path geometry, but keep the gaseous attenuation
+                    # of this thread (see _update_gas_attenuation)
+                    gamma_g = pp.gamma_g
+                    gamma_g_bs = pp.gamma_g_bs
+                    gas_freq = pp.gas_freq
+                    gas_pressure = pp.gas_pressure
+                    gas_temperature = pp.gas_temperature
+                    gas_omega = pp.gas_omega
+
+                    pp[0] = geoms[g]
+
+                    pp.gamma_g = gamma_g
+                    pp.gamma_g_bs = gamma_g_bs
+                    pp.gas_freq = gas_freq
+                    pp.gas_pressure = gas_pressure
+                    pp.gas_temperature = gas_temperature
+                    pp.gas_omega = gas_omega
 
                 pp.temperature = _temp[i]
                 pp.pressure = _press[i]
@@ -3164,6 +4511,7 @@ def losses_complete_cython(
                 pp.beta0 = _beta_from_DN_N0(
                     pp.lat_mid, pp.delta_N, pp.N0, pp.d_tm, pp.d_lm
                     )
+                _update_gas_attenuation(pp)
 
                 (
                     _L_b0p[i],
@@ -3181,18 +4529,299 @@ def losses_complete_cython(
                 _d_lr[i] = pp.d_lr
                 _path_type[i] = pp.path_type
 
-            free(last_freq)
-            free(last_h_tg)
-            free(last_h_rg)
-            free(last_version)
-            free(last_zone_t)
-            free(last_zone_r)
+            free(last_geom)
             free(pp)
 
-    out = it.operands[17:]
+    finally:
+        free(geoms)
+
+    out = [a.reshape(shape) for a in float_res] + [int_res[0].reshape(shape)]
     return out
 
 
+def losses_complete_batch_cython(
+        frequency,
+        temperature,
+        pressure,
+        lon_t, lat_t,
+        lon_r, lat_r,
+        h_tg, h_rg,
+        double hprof_step,
+        time_percent,
+        G_t=None, G_r=None,
+        omega=None,
+        d_tm=None, d_lm=None,
+        d_ct=None, d_cr=None,
+        zone_t=None, zone_r=None,
+        polarization=0,
+        version=16,
+        # override if you don't want builtin method:
+        delta_N=None, N0=None,
+        # override if you don't want builtin method:
+        hprof_dists=None,
+        hprof_heights=None,
+        hprof_offsets=None,
+        hprof_bearing=None, hprof_backbearing=None,
+        ):
+    '''
+    As `losses_complete_cython`, but for many paths at once.
+
+    All parameters are broadcasted against each other and flattened; each
+    element of the resulting 1D arrays is one path (with its own
+    parameters). The paths are processed in parallel. Height profiles are
+    provided in concatenated form (the profile of the i-th path is
+    `hprof_dists[hprof_offsets[i]:hprof_offsets[i + 1]]`, see
+    `~pycraf.pathprof.srtm_height_profiles`). If `hprof_dists` is None,
+    the profiles are queried from SRTM data.
+    '''
+
+    cdef:
+        # work arrays
+        double[::1] _freq, _temp, _press
+        double[::1] _h_tg, _h_rg, _G_t, _G_r
+        double[::1] _time_percent, _omega
+        double[::1] _d_tm, _d_lm, _d_ct, _d_cr
+        int[::1] _zone_t, _zone_r, _polarization, _version
+        double[::1] _lon_mid, _lat_mid, _distance, _bearing, _back_bearing
+        double[::1] _delta_N, _N0
+
+        # output arrays
+        double[::1] _L_b0p, _L_bd, _L_bs, _L_ba, _L_b, _L_b_corr
+        double[::1] _eps_pt, _eps_pr, _d_lt, _d_lr
+        int[::1] _path_type
+
+        # other
+        double[::1] distances_v, heights_v, zheights_v
+        np.int64_t[::1] offsets_v
+        Py_ssize_t o, e
+
+        ppstruct *pp
+
+        double[:, ::1] _clut_data = CLUTTER_DATA
+
+        double L_dummy
+
+        int i, size
+
+    assert (delta_N is None) == (N0 is None), (
+        'delta_N and N0 must both be None or both be provided'
+        )
+
+    assert (
+        (hprof_dists is None) == (hprof_heights is None) ==
+        (hprof_offsets is None) ==
+        (hprof_bearing is None) == (hprof_backbearing is None)
+        ), (
+            'hprof_dists, hprof_heights, hprof_offsets, bearing, and '
+            'back_bearing must all be None or all be provided'
+            )
+
+    if G_t is None:
+        G_t = 0.
+
+    if G_r is None:
+        G_r = 0.
+
+    if d_ct is None:
+        d_ct = 50000.
+
+    if d_cr is None:
+        d_cr = 50000.
+
+    if omega is None:
+        omega = 0.
+
+    if zone_t is None:
+        zone_t = -1
+
+    if zone_r is None:
+        zone_r = -1
+
+    assert np.all(np.asarray(time_percent) <= 50.)
+    assert np.all((np.asarray(version) == 14) | (np.asarray(version) == 16))
+
+    assert np.all((np.asarray(zone_t) >= -1) & (np.asarray(zone_t) <= 11))
+    assert np.all((np.asarray(zone_r) >= -1) & (np.asarray(zone_r) <= 11))
+
+    if delta_N is None:
+        delta_N = N0 = NAN
+
+    if d_tm is None:
+        d_tm = NAN
+
+    if d_lm is None:
+        d_lm = NAN
+
+    if hprof_dists is None:
+        hprof_bearing = hprof_backbearing = NAN
+
+    args = np.broadcast_arrays(
+        frequency, h_tg, h_rg, G_t, G_r, version, zone_t, zone_r,
+        temperature, pressure, time_percent, omega,
+        d_tm, d_lm, d_ct, d_cr, polarization,
+        lon_t, lat_t, lon_r, lat_r, delta_N, N0,
+        hprof_bearing, hprof_backbearing,
+        )
+    (
+        _freq, _h_tg, _h_rg, _G_t, _G_r, _version, _zone_t, _zone_r,
+        _temp, _press, _time_percent, _omega,
+        _d_tm, _d_lm, _d_ct, _d_cr, _polarization,
+        ) = [
+        # need to copy, as broadcasted arrays are read-only
+        np.array(
+            a, dtype=np.int32 if idx in [5, 6, 7, 16] else np.float64,
+            order='C',
+            ).ravel()
+        for idx, a in enumerate(args[:17])
+        ]
+    (
+        lon_t, lat_t, lon_r, lat_r, delta_N, N0, bearing, back_bearing,
+        ) = [
+        np.array(a, dtype=np.float64, order='C').ravel()
+        for a in args[17:]
+        ]
+    size = _freq.shape[0]
+
+    if hprof_dists is None:
+        (
+            lons, lats, distance, distances, heights,
+            bearing, back_bearing, _, offsets,
+            ) = heightprofile._srtm_height_profiles(
+                lon_t, lat_t,
+                lon_r, lat_r,
+                hprof_step
+                )
+        mid_idx = offsets[:-1] + np.diff(offsets) // 2
+        lon_mid = lons[mid_idx]
+        lat_mid = lats[mid_idx]
+    else:
+        distances = np.ascontiguousarray(hprof_dists, dtype=np.float64)
+        heights = np.ascontiguousarray(hprof_heights, dtype=np.float64)
+        offsets = np.ascontiguousarray(hprof_offsets, dtype=np.int64)
+        assert offsets.shape == (size + 1, ), (
+            'hprof_offsets must have one more entry than there are paths'
+            )
+        assert distances.shape == heights.shape == (offsets[size], ), (
+            'hprof_dists and hprof_heights must have offsets[-1] entries'
+            )
+        distance = distances[offsets[1:] - 1]
+        lon_mid = 0.5 * (lon_t + lon_r)
+        lat_mid = 0.5 * (lat_t + lat_r)
+
+    if np.any(np.diff(offsets) < 5):
+        raise ValueError('Height profiles must have at least 5 steps.')
+
+    _d_tm = np.where(np.isnan(_d_tm), distance, _d_tm)
+    _d_lm = np.where(np.isnan(_d_lm), distance, _d_lm)
+
+    _lon_mid = np.ascontiguousarray(lon_mid, dtype=np.float64)
+    _lat_mid = np.ascontiguousarray(lat_mid, dtype=np.float64)
+    _distance = np.ascontiguousarray(distance, dtype=np.float64)
+    _bearing = np.ascontiguousarray(bearing, dtype=np.float64)
+    _back_bearing = np.ascontiguousarray(back_bearing, dtype=np.float64)
+    _delta_N = np.ascontiguousarray(delta_N, dtype=np.float64)
+    _N0 = np.ascontiguousarray(N0, dtype=np.float64)
+
+    distances_v = distances
+    heights_v = heights
+    zheights_v = np.zeros(np.max(np.diff(offsets)), dtype=np.float64)
+    offsets_v = offsets
+
+    float_res = np.empty((10, size), dtype=np.float64)
+    int_res = np.empty((1, size), dtype=np.int32)
+    (
+        _L_b0p, _L_bd, _L_bs, _L_ba, _L_b, _L_b_corr,
+        _eps_pt, _eps_pr, _d_lt, _d_lr,
+        ) = float_res
+    _path_type = int_res[0]
+
+    with nogil, parallel():
+
+        pp = <ppstruct *> malloc(sizeof(ppstruct))
+        if pp == NULL:
+            abort()
+        pp.gas_freq = NAN
+
+        pp.hprof_step = hprof_step  # dummy
+
+        for i in prange(size, schedule='guided', chunksize=10):
+
+            o = offsets_v[i]
+            e = offsets_v[i + 1]
+
+            pp.lon_mid = _lon_mid[i]
+            pp.lat_mid = _lat_mid[i]
+            pp.distance = _distance[i]
+            pp.bearing = _bearing[i]
+            pp.back_bearing = _back_bearing[i]
+            pp.alpha_tr = _bearing[i]
+            pp.alpha_rt = _back_bearing[i]
+            if isnan(_delta_N[i]) or isnan(_N0[i]):
+                _DN_N0_from_map(pp.lon_mid, pp.lat_mid, &pp.delta_N, &pp.N0)
+            else:
+                pp.delta_N = _delta_N[i]
+                pp.N0 = _N0[i]
+
+            pp.version = _version[i]
+            pp.freq = _freq[i]
+            pp.wavelen = 0.299792458 / pp.freq
+            pp.zone_t = _zone_t[i]
+            pp.zone_r = _zone_r[i]
+            if pp.zone_t == CLUTTER.UNKNOWN:
+                pp.h_tg = _h_tg[i]
+            else:
+                pp.h_tg = f_max(_clut_data[pp.zone_t, 0], _h_tg[i])
+
+            if pp.zone_r == CLUTTER.UNKNOWN:
+                pp.h_rg = _h_rg[i]
+            else:
+                pp.h_rg = f_max(_clut_data[pp.zone_r, 0], _h_rg[i])
+            pp.h_tg_in = _h_tg[i]
+            pp.h_rg_in = _h_rg[i]
+
+            # assigning not possible in prange, but can use directly below
+            _process_path(
+                pp,
+                distances_v[o:e],
+                heights_v[o:e],
+                zheights_v[0:e - o],
+                )
+
+            pp.temperature = _temp[i]
+            pp.pressure = _press[i]
+            pp.d_tm = _d_tm[i]
+            pp.d_lm = _d_lm[i]
+            pp.d_ct = _d_ct[i]
+            pp.d_cr = _d_cr[i]
+            pp.time_percent = _time_percent[i]
+            pp.polarization = _polarization[i]
+            pp.omega = _omega[i]
+            pp.beta0 = _beta_from_DN_N0(
+                pp.lat_mid, pp.delta_N, pp.N0, pp.d_tm, pp.d_lm
+                )
+            _update_gas_attenuation(pp)
+
+            (
+                _L_b0p[i],
+                _L_bd[i],
+                _L_bs[i],
+                _L_ba[i],
+                _L_b[i],
+                _L_b_corr[i],
+                L_dummy,
+                ) = _path_attenuation_complete(pp[0], _G_t[i], _G_r[i])
+
+            _eps_pt[i] = pp.eps_pt
+            _eps_pr[i] = pp.eps_pr
+            _d_lt[i] = pp.d_lt
+            _d_lr[i] = pp.d_lr
+            _path_type[i] = pp.path_type
+
+        free(pp)
+
+    return tuple(float_res) + tuple(int_res)
+
+
 # ############################################################################
 # Atmospheric attenuation (Annex 2)
 # ############################################################################
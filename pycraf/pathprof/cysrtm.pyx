@@ -0,0 +1,223 @@
+#!python
+# -*- coding: utf-8 -*-
+# cython: language_level=3
+# cython: cdivision=True, boundscheck=False, wraparound=False
+# cython: embedsignature=True
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+cimport cython
+from cython.parallel import prange
+from libc.stdlib cimport malloc, free
+from libc.math cimport floor
+cimport numpy as np
+import numpy as np
+
+np.import_array()
+
+
+__all__ = ['sample_tiles_cython']
+
+
+cdef enum INTERP:
+    NEAREST = 0
+    LINEAR = 1
+
+# SRTM tiles have 16-bit signed integers; -32768 marks voids
+cdef np.int16_t VOID = -32768
+
+
+cdef inline double _pixel_value(
+        const np.uint16_t *tile, Py_ssize_t idx, bint swap
+        ) nogil:
+
+    cdef:
+        np.uint16_t u = tile[idx]
+        np.int16_t v
+
+    if swap:
+        u = <np.uint16_t> ((u >> 8) | (u << 8))
+
+    v = <np.int16_t> u
+    if v == VOID:
+        # treat voids the same as np.nan_to_num applied to the float tile
+        return 0.
+
+    return <double> v
+
+
+cdef inline double _sample_tile(
+        const np.uint16_t *tile, Py_ssize_t nrows, Py_ssize_t ncols,
+        bint swap, double ilon, double ilat, Py_ssize_t npix,
+        Py_ssize_t x_off, Py_ssize_t y_off,
+        double lon, double lat, int method
+        ) nogil:
+
+    cdef:
+        Py_ssize_t ix, iy, row
+        double x, y, fx, fy
+        double v00, v10, v01, v11
+
+    # fractional pixel indices; note, that row 0 of the tile is the
+    # northern-most row (and the tile covers ilat .. ilat + 1)
+    # for sub-tiles (blocks), x_off/y_off is the position of the lower
+    # left pixel within the full tile
+    x = (lon - ilon) * npix - x_off
+    y = (lat - ilat) * npix - y_off
+    ix = <Py_ssize_t> floor(x)
+    iy = <Py_ssize_t> floor(y)
+    ix = 0 if ix < 0 else (ncols - 2 if ix > ncols - 2 else ix)
+    iy = 0 if iy < 0 else (nrows - 2 if iy > nrows - 2 else iy)
+    fx = x - ix
+    fy = y - iy
+
+    if method == NEAREST:
+        if fx > 0.5:
+            ix += 1
+        if fy > 0.5:
+            iy += 1
+        return _pixel_value(tile, (nrows - 1 - iy) * ncols + ix, swap)
+
+    row = (nrows - 1 - iy) * ncols
+    v00 = _pixel_value(tile, row + ix, swap)
+    v10 = _pixel_value(tile, row + ix + 1, swap)
+    row -= ncols
+    v01 = _pixel_value(tile, row + ix, swap)
+    v11 = _pixel_value(tile, row + ix + 1, swap)
+
+    return (
+        v00 * (1 - fx) * (1 - fy) + v10 * fx * (1 - fy) +
+        v01 * (1 - fx) * fy + v11 * fx * fy
+        )
+
+
+def sample_tiles_cython(
+        double[::1] lons not None,
+        double[::1] lats not None,
+        np.int64_t[::1] order not None,
+        np.int32_t[::1] slots not None,
+        list tiles not None,
+        np.int32_t[::1] tile_ilons not None,
+        np.int32_t[::1] tile_ilats not None,
+        double[::1] heights not None,  # output
+        str method='linear',
+        np.int32_t[::1] npix=None,
+        np.int32_t[::1] x_offsets=None,
+        np.int32_t[::1] y_offsets=None,
+        ):
+    '''
+    Nearest-neighbor or bi-linear interpolation of raw SRTM tile data.
+
+    Positions are processed in the given `order`, which should group all
+    positions belonging to the same tile (e.g., obtained with an argsort
+    of a tile key), such that each thread accesses the tile data in a
+    cache-friendly manner. The work is distributed over all threads
+    (OpenMP).
+
+    Parameters
+    ----------
+    lons, lats : double 1D arrays
+        Geographic longitudes/latitudes of the positions [deg]
+    order : int64 1D array
+        Processing order of the positions, i.e., position `order[k]` is
+        processed in the k-th step.
+    slots : int32 1D array
+        The tile index (into `tiles`) of the k-th processed position.
+    tiles : list of 2D int16 arrays
+        Raw tile data (north-up, as stored in the ".hgt" files). Big- and
+        little-endian data is supported (the latter is native on most
+        machines). Memory-mapped arrays will not be copied. Voids
+        (-32768) are set to zero.
+    tile_ilons, tile_ilats : int32 1D arrays
+        Longitude/latitude of the lower left corner of each tile [deg]
+    heights : double 1D array
+        Output array; interpolated heights [m]
+    method : str, optional
+        Interpolation method; 'nearest' or 'linear'. (default: 'linear')
+    npix : int32 1D array or None, optional
+        Number of pixels per degree for each tile. If None, tiles are
+        assumed to be full (square) tiles, i.e., `npix = tile_size - 1`.
+        (default: None)
+    x_offsets, y_offsets : int32 1D arrays or None, optional
+        If tiles are only parts (blocks) of a full tile, the position
+        of their lower left pixel within the full tile. The blocks must
+        overlap by one pixel (as neighboring tiles do), such that no
+        pixels of adjacent blocks are needed for interpolation.
+        (default: None)
+    '''
+
+    cdef:
+        Py_ssize_t n = lons.shape[0]
+        Py_ssize_t ntiles = len(tiles)
+        Py_ssize_t k, p, t
+        int imethod
+        const np.uint16_t **tile_ptrs
+        Py_ssize_t *tile_geom
+        bint *tile_swaps
+        np.ndarray tile
+
+    assert lats.shape[0] == n and heights.shape[0] == n
+    assert order.shape[0] == n and slots.shape[0] == n
+    assert tile_ilons.shape[0] == ntiles and tile_ilats.shape[0] == ntiles
+    assert npix is None or npix.shape[0] == ntiles
+    assert x_offsets is None or x_offsets.shape[0] == ntiles
+    assert y_offsets is None or y_offsets.shape[0] == ntiles
+
+    if method == 'nearest':
+        imethod = NEAREST
+    elif method == 'linear':
+        imethod = LINEAR
+    else:
+        raise ValueError('Method "{}" is not supported.'.format(method))
+
+    for t in range(ntiles):
+        tile = tiles[t]
+        if (
+                tile.ndim != 2 or tile.shape[0] < 2 or tile.shape[1] < 2 or
+                tile.dtype.kind != 'i' or tile.dtype.itemsize != 2 or
+                not tile.flags.c_contiguous
+                ):
+            raise ValueError(
+                'Tiles must be C-contiguous int16 arrays (at least 2x2).'
+                )
+        if npix is None and tile.shape[0] != tile.shape[1]:
+            raise ValueError('Tiles must be square, if npix is not given.')
+
+    tile_ptrs = <const np.uint16_t **> malloc(
+        ntiles * sizeof(np.uint16_t *)
+        )
+    # nrows, ncols, npix, x_off, y_off
+    tile_geom = <Py_ssize_t *> malloc(5 * ntiles * sizeof(Py_ssize_t))
+    tile_swaps = <bint *> malloc(ntiles * sizeof(bint))
+
+    try:
+        for t in range(ntiles):
+            tile = tiles[t]
+            tile_ptrs[t] = <const np.uint16_t *> np.PyArray_DATA(tile)
+            tile_geom[5 * t] = tile.shape[0]
+            tile_geom[5 * t + 1] = tile.shape[1]
+            tile_geom[5 * t + 2] = (
+                tile.shape[0] - 1 if npix is None else npix[t]
+                )
+            tile_geom[5 * t + 3] = 0 if x_offsets is None else x_offsets[t]
+            tile_geom[5 * t + 4] = 0 if y_offsets is None else y_offsets[t]
+            tile_swaps[t] = not tile.dtype.isnative
+
+        for k in prange(n, nogil=True, schedule='static'):
+            p = order[k]
+            t = slots[k]
+            heights[p] = _sample_tile(
+                tile_ptrs[t],
+                tile_geom[5 * t], tile_geom[5 * t + 1], tile_swaps[t],
+                tile_ilons[t], tile_ilats[t], tile_geom[5 * t + 2],
+                tile_geom[5 * t + 3], tile_geom[5 * t + 4],
+                lons[p], lats[p], imethod
+                )
+
+    finally:
+        free(tile_ptrs)
+        free(tile_geom)
+        free(tile_swaps)
@@ -13,10 +13,39 @@ from .. import utils
 
 
 __all__ = [
-    'srtm_height_profile', 'srtm_height_map',
+    'srtm_height_profile', 'srtm_height_profiles', 'srtm_height_map',
     ]
 
 
+def _height_sampling(step, coarse=False):
+    # how to query the terrain data for a distance step [m]; returns the
+    # pyramid level (or None), the oversampling step [m] (or None, if the
+    # heights are to be sampled directly at the path positions), and the
+    # width of the Gaussian kernel to smooth the oversampled heights with
+    # the oversampling step is a third of the terrain resolution, or of
+    # the distance step, if coarse is True (as used for height maps,
+    # which is much faster for large steps)
+
+    hgt_res = srtm.SrtmConf.hgt_res
+    if step <= hgt_res / 1.5:
+        return None, None, None
+
+    width = step / 2.35
+    # if available, use pre-smoothed terrain data (pyramid)
+    level = srtm._pyramid_level(step)
+    if level is None:
+        return None, (step if coarse else hgt_res) / 3., width
+
+    # pyramid tiles are already smoothed with a FWHM of level * hgt_res;
+    # Gaussian kernels add in quadrature, so only the remainder is needed
+    level_res = level * hgt_res
+    width = np.sqrt(max(width ** 2 - (level_res / 2.35) ** 2, 0.))
+    if width < level_res / 6.:
+        return level, None, None
+
+    return level, (step if coarse else level_res) / 3., width
+
+
 def _srtm_height_profile(lon_t, lat_t, lon_r, lat_r, step):
     # angles in rad; lengths in m
 
@@ -45,37 +74,13 @@ def _srtm_height_profile(lon_t, lat_t, lon_r, lat_r, step):
 
     back_bearings = bearing_2s % 360 - 180
 
-    # important: unless the requested resolution is super-fine, we always
-    # have to query the raw height profile data using sufficient resolution,
-    # to acquire all features
-    # only afterwards, we may smooth the data to the desired distance-step
-    # resolution
-
     # print(time.time() - t)
     # t = time.time()
 
-    hgt_res = srtm.SrtmConf.hgt_res
-    if step > hgt_res / 1.5:
-        hdistances = np.arange(
-            0., distance + hgt_res / 3., hgt_res / 3.
-            )
-        hlons, hlats, _ = cygeodesics.direct_cython(
-            lon_t_rad, lat_t_rad, bearing_1_rad, hdistances
-            )
-        hlons = np.degrees(hlons)
-        hlats = np.degrees(hlats)
-
-        hheights = srtm._srtm_height_data(hlons, hlats).astype(np.float64)
-        heights = np.empty_like(distances)
-        # now smooth/interpolate this to the desired step width
-        cygeodesics.regrid1d_with_x(
-            hdistances, hheights, distances, heights,
-            step / 2.35, regular=True
-            )
-
-    else:
-
-        heights = srtm._srtm_height_data(lons, lats).astype(np.float64)
+    heights = _path_heights(
+        lon_t_rad, lat_t_rad, bearing_1_rad, distance, step,
+        lons, lats, distances, np.array([0, distances.size]),
+        )
 
     return (
         lons, lats,
@@ -146,6 +151,180 @@ def srtm_height_profile(lon_t, lat_t, lon_r, lat_r, step):
     return _srtm_height_profile(lon_t, lat_t, lon_r, lat_r, step)
 
 
+def _path_samples(distance, step):
+    # sampling points of many paths (concatenated); for each path, the
+    # distances are the same as with np.arange(0., distance + step, step)
+
+    counts = np.ceil((distance + step) / step).astype(np.int64)
+    offsets = np.zeros(counts.size + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+
+    path_idx = np.repeat(np.arange(counts.size), counts)
+    distances = (np.arange(offsets[-1]) - offsets[path_idx]) * step
+
+    return offsets, path_idx, distances
+
+
+def _path_heights(
+        lon_t_rad, lat_t_rad, bearing_rad, distance, step,
+        lons, lats, distances, offsets, coarse=False,
+        ):
+    # terrain heights [m] at the (concatenated) path positions lons, lats
+    # [deg]; the i-th path starts at lon_t_rad, lat_t_rad with bearing
+    # bearing_rad (scalars or per path) and is sampled at the regular
+    # distances[offsets[i]:offsets[i + 1]]; terrain is only needed up to
+    # distance[i] [m] (if smoothing is applied, see below); for coarse,
+    # see _height_sampling
+
+    # important: unless the requested resolution is super-fine, we always
+    # have to query the raw height profile data using sufficient resolution,
+    # to acquire all features
+    # only afterwards, we may smooth the data to the desired distance-step
+    # resolution
+    level, hstep, width = _height_sampling(step, coarse=coarse)
+
+    if hstep is None:
+        return srtm._srtm_height_data(lons, lats, level=level)
+
+    distance = np.atleast_1d(distance)
+    hoffsets, hpath_idx, hdistances = _path_samples(distance, hstep)
+    hlon_t, hlat_t, hbearing = (
+        np.broadcast_to(a, distance.shape)[hpath_idx]
+        for a in (lon_t_rad, lat_t_rad, bearing_rad)
+        )
+    hlons, hlats, _ = cygeodesics.direct_cython(
+        hlon_t, hlat_t, hbearing, hdistances
+        )
+
+    hheights = srtm._srtm_height_data(
+        np.degrees(hlons), np.degrees(hlats), level=level
+        )
+    heights = np.empty(lons.size, dtype=np.float64)
+    # now smooth/interpolate this to the desired step width
+    cygeodesics.regrid1d_regular_batch(
+        hdistances, hheights, np.asarray(hoffsets, dtype=np.int64),
+        np.ascontiguousarray(distances, dtype=np.float64).ravel(), heights,
+        np.asarray(offsets, dtype=np.int64), width
+        )
+
+    return heights.reshape(lons.shape)
+
+
+def _srtm_height_profiles(lon_t, lat_t, lon_r, lat_r, step):
+    # angles in rad; lengths in m
+    # like _srtm_height_profile, but for many paths at once; the
+    # profiles are concatenated, offsets contains the start indices
+
+    lon_t, lat_t, lon_r, lat_r = (
+        np.ascontiguousarray(a, dtype=np.float64).ravel()
+        for a in np.broadcast_arrays(lon_t, lat_t, lon_r, lat_r)
+        )
+
+    lon_t_rad, lat_t_rad = np.radians(lon_t), np.radians(lat_t)
+    lon_r_rad, lat_r_rad = np.radians(lon_r), np.radians(lat_r)
+    distance, bearing_1_rad, bearing_2_rad = cygeodesics.inverse_cython(
+        lon_t_rad, lat_t_rad, lon_r_rad, lat_r_rad,
+        )
+    bearing_1 = np.degrees(bearing_1_rad)
+    bearing_2 = np.degrees(bearing_2_rad)
+    back_bearing = bearing_2 % 360 - 180
+
+    offsets, path_idx, distances = _path_samples(distance, step)
+
+    lons_rad, lats_rad, bearing_2s_rad = cygeodesics.direct_cython(
+        lon_t_rad[path_idx], lat_t_rad[path_idx], bearing_1_rad[path_idx],
+        distances
+        )
+    lons = np.degrees(lons_rad)
+    lats = np.degrees(lats_rad)
+    bearing_2s = np.degrees(bearing_2s_rad)
+
+    back_bearings = bearing_2s % 360 - 180
+
+    heights = _path_heights(
+        lon_t_rad, lat_t_rad, bearing_1_rad, distance, step,
+        lons, lats, distances, offsets,
+        )
+
+    return (
+        lons, lats,
+        distance * 1.e-3,
+        distances * 1.e-3, heights,
+        bearing_1, back_bearing, back_bearings,
+        offsets,
+        )
+
+
+@utils.ranged_quantity_input(
+    lon_t=(-180, 180, apu.deg),
+    lat_t=(-90, 90, apu.deg),
+    lon_r=(-180, 180, apu.deg),
+    lat_r=(-90, 90, apu.deg),
+    step=(1., 1.e5, apu.m),
+    strip_input_units=True,
+    output_unit=(
+        apu.deg, apu.deg, apu.km, apu.km, apu.m, apu.deg, apu.deg, apu.deg,
+        None
+        )
+    )
+def srtm_height_profiles(lon_t, lat_t, lon_r, lat_r, step):
+    '''
+    Extract height profiles for many paths from SRTM data.
+
+    This is much faster than calling `~pycraf.pathprof.srtm_height_profile`
+    for each path, as the geodesics and terrain heights of all paths are
+    computed at once (in parallel). The profiles are concatenated into
+    single 1D arrays; the profile of the i-th path is stored in the slice
+    `offsets[i]:offsets[i + 1]` (similar to the CSR format of sparse
+    matrices).
+
+    Parameters
+    ----------
+    lon_t, lat_t : `~astropy.units.Quantity`
+        Geographic longitudes/latitudes of start points (transmitters) [deg]
+    lon_r, lat_r : `~astropy.units.Quantity`
+        Geographic longitudes/latitudes of end points (receivers) [deg]
+    step : `~astropy.units.Quantity` scalar
+        Distance resolution of height profiles along paths [m]
+
+    Returns
+    -------
+    lons : `~astropy.units.Quantity` 1D array
+        Geographic longitudes of paths (concatenated).
+    lats : `~astropy.units.Quantity` 1D array
+        Geographic latitudes of paths (concatenated).
+    distance : `~astropy.units.Quantity` 1D array
+        Distances between start and end points of paths.
+    distances : `~astropy.units.Quantity` 1D array
+        Distances along the paths (with respect to start point;
+        concatenated).
+    heights : `~astropy.units.Quantity` 1D array
+        Terrain heights along the paths (aka Height profiles; concatenated).
+    bearing : `~astropy.units.Quantity` 1D array
+        Start bearings of paths.
+    backbearing : `~astropy.units.Quantity` 1D array
+        Back-bearings at end points of paths.
+    backbearings : `~astropy.units.Quantity` 1D array
+        Back-bearings for each point on the paths (concatenated).
+    offsets : `~numpy.ndarray` 1D array (int64)
+        Start index of each profile in the concatenated arrays. Has one
+        more element than there are paths; the last element is the total
+        number of points.
+
+    Notes
+    -----
+    - The end point coordinates are broadcasted against each other. The
+      paths are numbered in (flattened) C-order of the broadcasted arrays.
+    - The profiles are the same as those returned by
+      `~pycraf.pathprof.srtm_height_profile`.
+    - To avoid slow tile access (or downloads) during the calculation, one
+      can use `~pycraf.pathprof.prefetch_tiles` (or
+      `~pycraf.pathprof.download_tiles`) before.
+    '''
+
+    return _srtm_height_profiles(lon_t, lat_t, lon_r, lat_r, step)
+
+
 @utils.ranged_quantity_input(
     lon_c=(-180, 180, apu.deg),
     lat_c=(-90, 90, apu.deg),
@@ -9,8 +9,7 @@ from __future__ import (
 import os
 from astropy import units as apu
 import numpy as np
-from scipy.interpolate import RegularGridInterpolator
-from astropy.utils.data import get_pkg_data_filename
+from . import cyprop
 from .. import conversions as cnv
 from .. import utils
 
@@ -76,21 +75,6 @@ KML_TEMPLATE = '''<?xml version="1.0" encoding="UTF-8"?>
 </kml>
 '''
 
-_refract_data = np.load(get_pkg_data_filename(
-    '../itudata/p.452-16/refract_map.npz'
-    ))
-
-
-_DN_interpolator = RegularGridInterpolator(
-    (_refract_data['lons'][0], _refract_data['lats'][::-1, 0]),
-    _refract_data['dn50'][::-1].T
-    )
-_N0_interpolator = RegularGridInterpolator(
-    (_refract_data['lons'][0], _refract_data['lats'][::-1, 0]),
-    _refract_data['n050'][::-1].T
-    )
-
-
 @utils.ranged_quantity_input(
     p_w=(0, 100, apu.percent),
     phi=(-90, 90, apu.deg),
@@ -144,10 +128,7 @@ def annual_timepercent_from_worst_month(
 
 def _DN_N0_from_map(lon, lat):
 
-    _DN = _DN_interpolator((lon % 360, lat))
-    _N0 = _N0_interpolator((lon % 360, lat))
-
-    return _DN, _N0
+    return cyprop._radiomet_data_cython(lon, lat)
 
 
 @utils.ranged_quantity_input(
@@ -185,32 +166,8 @@ def deltaN_N0_from_map(lon, lat):
 
 
 def _radiomet_data_for_pathcenter(lon, lat, d_tm, d_lm):
-    _DN = _DN_interpolator((lon % 360, lat))
-    _N0 = _N0_interpolator((lon % 360, lat))
-
-    _tau = 1. - np.exp(-4.12e-4 * np.power(d_lm, 2.41))
-    _absphi = np.abs(lat)
-
-    _a = np.power(10, -d_tm / (16. - 6.6 * _tau))
-    _b = np.power(10, -5 * (0.496 + 0.354 * _tau))
-    _mu1 = np.power(_a + _b, 0.2)
-    _mu1 = np.where(_mu1 <= 1, _mu1, 1.)
-    _log_mu1 = np.log10(_mu1)
-
-    _phi_cond = _absphi <= 70.
-    _mu4 = np.where(
-        _phi_cond,
-        np.power(10, (-0.935 + 0.0176 * _absphi) * _log_mu1),
-        np.power(10, 0.3 * _log_mu1)
-        )
-
-    beta_0 = np.where(
-        _phi_cond,
-        np.power(10, -0.015 * _absphi + 1.67) * _mu1 * _mu4,
-        4.17 * _mu1 * _mu4
-        )
 
-    return _DN, beta_0, _N0
+    return cyprop._radiomet_data_cython(lon, lat, d_tm, d_lm)
 
 
 @utils.ranged_quantity_input(
@@ -291,7 +248,7 @@ def eff_earth_radius_factor_median(lon, lat):
       `~pycraf.pathprof.deltaN_N0_from_map`.
     '''
 
-    return 157. / (157. - _DN_interpolator((lon % 360, lat)))
+    return 157. / (157. - _DN_N0_from_map(lon, lat)[0])
 
 
 @utils.ranged_quantity_input(
@@ -319,7 +276,7 @@ def eff_earth_radius_factor_beta():
 
 def _eff_earth_radius_median(lon, lat):
 
-    return R_E_VALUE * 157. / (157. - _DN_interpolator((lon % 360, lat)))
+    return R_E_VALUE * 157. / (157. - _DN_N0_from_map(lon, lat)[0])
 
 
 @utils.ranged_quantity_input(
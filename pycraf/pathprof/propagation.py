@@ -6,9 +6,11 @@ from __future__ import (
     )
 
 # from functools import partial, lru_cache
+from collections import namedtuple
 from astropy import units as apu
 import numpy as np
 
+from . import cache
 from . import cyprop
 from . import heightprofile
 from . import helper
@@ -20,11 +22,11 @@ from .. import utils
 __all__ = [
     'PathProp',
     'loss_freespace', 'loss_troposcatter', 'loss_ducting',
-    'loss_diffraction', 'loss_complete',
+    'loss_diffraction', 'loss_complete', 'loss_complete_raw',
     'clutter_correction', 'clutter_imt',
-    'height_map_data', 'atten_map_fast',
+    'height_map_data', 'atten_map_fast', 'atten_map_tiled',
     'height_path_data', 'height_path_data_generic', 'atten_path_fast',
-    'losses_complete',
+    'losses_complete', 'losses_complete_batch',
     ]
 
 # Note, we have to curry the quantities here, because Cython produces
@@ -32,6 +34,17 @@ __all__ = [
 # ranged_quantity_input fails)
 
 
+# parameters (and their units) that PathProp exposes, per P.452 version
+_PATHPROP_PARAMS = {
+    14: cyprop.PARAMETERS_BASIC + cyprop.PARAMETERS_V14,
+    16: cyprop.PARAMETERS_BASIC + cyprop.PARAMETERS_V16,
+    }
+_PATHPROP_UNITS = {
+    version: {p[0]: p[3] for p in params}
+    for version, params in _PATHPROP_PARAMS.items()
+    }
+
+
 # This is a wrapper class to expose the ppstruct members as attributes
 # (unfortunately, one cannot do dynamical attributes on cdef-classes)
 class PathProp(cyprop._PathProp):
@@ -142,6 +155,14 @@ class PathProp(cyprop._PathProp):
       additional features such as automatic downloading of missing
       tiles or applying different interpolation methods (e.g., splines).
       For details see :ref:`working_with_srtm`.
+
+    - The path properties are available as `~astropy.units.Quantity`
+      attributes (e.g., `pprop.eps_pt`), which are only created on first
+      access. If many `PathProp` instances are needed (e.g., in Monte-Carlo
+      simulations), the unit handling can be avoided altogether with the
+      `~pycraf.pathprof.PathProp.from_raw` constructor, the
+      `~pycraf.pathprof.PathProp.raw` dictionary, and the
+      `~pycraf.pathprof.loss_complete_raw` function.
     '''
 
     @utils.ranged_quantity_input(
@@ -214,23 +235,119 @@ class PathProp(cyprop._PathProp):
             hprof_backbearing=hprof_backbearing,
             )
 
-        self.__params = list(cyprop.PARAMETERS_BASIC)  # make a copy
-        if self._pp['version'] == 14:
-            self.__params += cyprop.PARAMETERS_V14
-        elif self._pp['version'] == 16:
-            self.__params += cyprop.PARAMETERS_V16
+        self.__params = _PATHPROP_PARAMS[version]
+
+    @classmethod
+    def from_raw(
+            cls,
+            freq,
+            temperature,
+            pressure,
+            lon_t, lat_t,
+            lon_r, lat_r,
+            h_tg, h_rg,
+            hprof_step,
+            timepercent,
+            omega=0.,
+            d_tm=None, d_lm=None,
+            d_ct=None, d_cr=None,
+            zone_t=cyprop.CLUTTER.UNKNOWN, zone_r=cyprop.CLUTTER.UNKNOWN,
+            polarization=0,
+            version=16,
+            delta_N=None, N0=None,
+            hprof_dists=None, hprof_heights=None,
+            hprof_bearing=None, hprof_backbearing=None,
+            ):
+        '''
+        Create a `PathProp` instance from plain numbers (without units).
+
+        The parameters are the same as for the `PathProp` constructor, but
+        must be given as floats (`hprof_dists` and `hprof_heights` as
+        `~numpy.ndarray`) in the units, to which the `PathProp` constructor
+        converts its inputs: [GHz] (`freq`), [K] (`temperature`), [hPa]
+        (`pressure`), [deg] (`lon_t`, `lat_t`, `lon_r`, `lat_r`,
+        `hprof_bearing`, `hprof_backbearing`), [m] (`h_tg`, `h_rg`,
+        `hprof_step`, `d_tm`, `d_lm`, `d_ct`, `d_cr`, `hprof_heights`),
+        [%] (`timepercent`, `omega`), [1/km] (`delta_N`), [dimless] (`N0`),
+        and [km] (`hprof_dists`).
+
+        As the unit conversion and the range checks of the inputs are
+        skipped, this is considerably faster than the standard constructor.
+
+        Returns
+        -------
+        pprop : PathProp instance
+        '''
+
+        pprop = cls.__new__(cls)
+        cyprop._PathProp.__init__(
+            pprop,
+            freq,
+            temperature,
+            pressure,
+            lon_t, lat_t,
+            lon_r, lat_r,
+            h_tg, h_rg,
+            hprof_step,
+            timepercent,
+            omega=omega,
+            d_tm=d_tm, d_lm=d_lm,
+            d_ct=d_ct, d_cr=d_cr,
+            zone_t=zone_t, zone_r=zone_r,
+            polarization=polarization,
+            version=version,
+            delta_N=delta_N, N0=N0,
+            hprof_dists=hprof_dists,
+            hprof_heights=hprof_heights,
+            hprof_bearing=hprof_bearing,
+            hprof_backbearing=hprof_backbearing,
+            )
+        pprop.__params = _PATHPROP_PARAMS[version]
+
+        return pprop
+
+    @property
+    def raw(self):
+        '''
+        Dictionary with all path properties as plain numbers.
+
+        The units are the ones listed in `~pycraf.pathprof.PARAMETERS_BASIC`
+        and `~pycraf.pathprof.PARAMETERS_V14` or
+        `~pycraf.pathprof.PARAMETERS_V16`, respectively.
+        '''
+
+        raw = self.__dict__.get('_PathProp__raw')
+        if raw is None:
+            pp = self._pp
+            raw = {p[0]: pp[p[0]] for p in self.__params}
+            self.__raw = raw
+
+        return raw
+
+    def __getattr__(self, name):
+
+        # the Quantity attributes are created on first access; this makes
+        # the construction of PathProp instances much cheaper
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        try:
+            unit = _PATHPROP_UNITS[self.raw['version']][name]
+        except KeyError:
+            raise AttributeError(
+                "'PathProp' object has no attribute '{}'".format(name)
+                )
 
         # no need to set property, as readonly and immutable
         # can just copy to __dict__
-        # for p in self.__params:
-        #     setattr(
-        #         PathProp,
-        #         p[0],
-        #         property(lambda self: getattr(self._pp, p[0]))
-        #         )
+        value = self.raw[name] * unit
+        self.__dict__[name] = value
+
+        return value
 
-        for p in self.__params:
-            self.__dict__[p[0]] = self._pp[p[0]] * p[3]
+    def __dir__(self):
+
+        return sorted(set(super().__dir__()) | {p[0] for p in self.__params})
 
     def __repr__(self):
 
@@ -238,11 +355,12 @@ class PathProp(cyprop._PathProp):
 
     def __str__(self):
 
+        raw = self.raw
         return '\n'.join(
             '{}: {{:{}}} {}'.format(
                 '{:15s}', p[1], '{:10s}'
                 ).format(
-                p[0], self._pp[p[0]], p[2]
+                p[0], raw[p[0]], p[2]
                 )
             for p in self.__params
             )
@@ -432,6 +550,35 @@ def loss_complete(
     return cyprop.path_attenuation_complete_cython(pathprop, G_t, G_r)
 
 
+def loss_complete_raw(pathprop, G_t=0., G_r=0.):
+    '''
+    Calculate the total loss of a propagating radio wave (without units).
+
+    This is the same as `~pycraf.pathprof.loss_complete`, but the antenna
+    gains are plain floats [dBi] and the results are returned as plain
+    floats [dB]. Together with `~pycraf.pathprof.PathProp.from_raw`, this
+    avoids all unit handling, e.g., in Monte-Carlo simulations, where
+    the `~astropy.units.Quantity` overhead would exceed the costs of the
+    calculation itself.
+
+    Parameters
+    ----------
+    pathprop : `~pycraf.pathprof.PathProp` instance
+        This helper class works as a container to hold various properties
+        of the path (e.g., geometry).
+    G_t, G_r  : float
+        Antenna gain (transmitter, receiver) in the direction of the
+        horizon(!) along the great-circle interference path [dBi]
+
+    Returns
+    -------
+    (L_b0p, L_bd, L_bs, L_ba, L_b, L_b_corr, L) : tuple of float
+        Losses as returned by `~pycraf.pathprof.loss_complete` [dB]
+    '''
+
+    return cyprop.path_attenuation_complete_cython(pathprop, G_t, G_r)
+
+
 @utils.ranged_quantity_input(
     h_g=(None, None, apu.m),
     freq=(None, None, apu.GHz),
@@ -610,6 +757,7 @@ def height_map_data(
         d_tm=None, d_lm=None,
         d_ct=None, d_cr=None,
         omega_percent=0 * apu.percent,
+        block=None,
         ):
 
     '''
@@ -668,6 +816,12 @@ def height_map_data(
     omega_percent : `~astropy.units.Quantity`, optional
         Fraction of the path over water [%] (see Table 3)
         (default: 0%)
+    block : tuple of two slices, optional
+        If given, only calculate the data for a block of the map, i.e.,
+        for the pixels `[block[0], block[1]]` (row and column slices with
+        step 1). The returned maps only cover the block. This can be used
+        to process large maps with bounded memory; see also
+        `~pycraf.pathprof.atten_map_tiled`. (default: None)
 
     Returns
     -------
@@ -781,17 +935,36 @@ def height_map_data(
       additional features such as automatic downloading of missing
       tiles or applying different interpolation methods (e.g., splines).
       For details see :ref:`working_with_srtm`.
+    - If a `block` is given, only the height profiles (radials) passing
+      through the block are calculated, and "path_idx_map" refers to
+      the rows of the (reduced) "height_profs" array. All other data
+      is identical to the associated part of the full map.
+    - The results can be cached on disk, such that repeated calls with
+      the same parameters don't need to process the terrain data again;
+      see `~pycraf.pathprof.HprofCacheConf`. Cached arrays are returned
+      as (copy-on-write) memory maps.
     '''
 
-    return cyprop.height_map_data_cython(
-        lon_t, lat_t,
-        map_size_lon, map_size_lat,
-        map_resolution=map_resolution,
-        do_cos_delta=1 if do_cos_delta else 0,
-        zone_t=zone_t, zone_r=zone_r,
-        d_tm=d_tm, d_lm=d_lm,
-        d_ct=d_ct, d_cr=d_cr,
-        omega=omega_percent,
+    do_cos_delta = 1 if do_cos_delta else 0
+
+    return cache._cached(
+        'height_map_data',
+        (
+            lon_t, lat_t, map_size_lon, map_size_lat, map_resolution,
+            do_cos_delta, zone_t, zone_r, d_tm, d_lm, d_ct, d_cr,
+            omega_percent, block,
+            ),
+        lambda: cyprop.height_map_data_cython(
+            lon_t, lat_t,
+            map_size_lon, map_size_lat,
+            map_resolution=map_resolution,
+            do_cos_delta=do_cos_delta,
+            zone_t=zone_t, zone_r=zone_r,
+            d_tm=d_tm, d_lm=d_lm,
+            d_ct=d_ct, d_cr=d_cr,
+            omega=omega_percent,
+            block=block,
+            ),
         )
 
 
@@ -813,21 +986,25 @@ def atten_map_fast(
         hprof_data,  # dict_like
         polarization=0,
         version=16,
+        out=None,
+        block_size=None,
+        outputs=None,
+        dtype=np.float64,
         ):
     '''
     Calculate attenuation maps using a fast method.
 
     Parameters
     ----------
-    freq : `~astropy.units.Quantity`
+    freq : `~astropy.units.Quantity`, scalar or array
         Frequency of radiation [GHz]
-    temperature : `~astropy.units.Quantity`
+    temperature : `~astropy.units.Quantity`, scalar or array
         Temperature (K)
-    pressure : `~astropy.units.Quantity`
+    pressure : `~astropy.units.Quantity`, scalar or array
         Pressure (hPa)
-    h_tg, h_rg : `~astropy.units.Quantity`
+    h_tg, h_rg : `~astropy.units.Quantity`, scalar or array
         Transmitter/receiver heights over ground [m]
-    timepercent : `~astropy.units.Quantity`
+    timepercent : `~astropy.units.Quantity`, scalar or array
         Time percentage [%] (maximal 50%)
     hprof_data : dict, dict-like
         Dictionary with height profiles and auxillary maps
@@ -838,6 +1015,31 @@ def atten_map_fast(
         Allowed values are: 0 - horizontal, 1 - vertical
     version : int, optional
         ITU-R Rec. P.452 version. Allowed values are: 14, 16
+    out : dict-like, optional
+        If given, the results are written into this store (block by
+        block) instead of being returned as new arrays. For each of the
+        result names (see below), `out` can contain an array-like with
+        the shape of the results (e.g., a `~numpy.memmap` or a HDF5
+        dataset); missing entries are created (with `create_dataset`
+        for HDF5 groups). The values are stored without units, in the
+        units given below. (default: None)
+    block_size : int, optional
+        If given, the map is processed in blocks of (at most)
+        `block_size x block_size` pixels. For each block, only the
+        associated parts of `hprof_data` are read, such that also very
+        large (e.g., HDF5-backed) maps can be processed. If `out` is
+        given, the default is 512, otherwise the full map is processed
+        at once. (default: None)
+    outputs : list of str, optional
+        Names of the results to compute (see below). Only these are
+        allocated and returned, and parts of the P.452 model, which
+        only feed into results that are not requested, are skipped.
+        (default: None, i.e., all results)
+    dtype : `~numpy.dtype`, optional
+        Data type of the float-valued results; either `numpy.float64`
+        or `numpy.float32`. The calculation itself is always done in
+        double precision; float32 halves the memory needed for the
+        results. (default: `numpy.float64`)
 
     Returns
     -------
@@ -845,6 +1047,9 @@ def atten_map_fast(
         Results of the path attenuation calculation. Each entry
         in the dictionary is a 2D `~numpy.ndarray` containing
         the associated value for the map of dimension `(my, mx)`.
+        If some of the parameters are arrays, the entries have
+        dimension `(..., my, mx)`, where `...` is the broadcasted shape
+        of the parameters.
         The following entries are contained:
 
         - `L_b0p` - Free-space loss including focussing effects
@@ -873,37 +1078,417 @@ def atten_map_fast(
 
     Notes
     -----
+    - The parameters `freq`, `temperature`, `pressure`, `h_tg`, `h_rg`,
+      and `timepercent` can be arrays (they will be broadcasted against
+      each other). This is much faster than calling `atten_map_fast`
+      for each parameter set, as the height profiles are only processed
+      once. Likewise, the propagation path geometry, which depends on
+      `freq`, `h_tg`, and `h_rg`, is only computed once for each distinct
+      combination of these parameters (regardless of the order of the
+      broadcasting axes).
     - The diffraction-loss algorithm was changed between ITU-R P.452
       version 14 and 15. The former used a Deygout method, the new one
       is based on a Bullington calculation with correction terms.
     - In future versions, more entries may be added to the results
       dictionary.
+    - If `out` is given, `out` is returned. The results are the same as
+      for processing the full map at once.
+    - The sub-models of P.452 (LoS, diffraction, troposcatter, and
+      ducting) are only evaluated if one of the requested `outputs`
+      depends on them. E.g., the complete loss, `L_b`, needs all of
+      them, while `L_bd` only needs the LoS and diffraction models, and
+      the path geometry results (`eps_pt`, `d_lt`, `path_type`, etc.)
+      need none.
     '''
 
-    float_res, int_res = cyprop.atten_map_fast_cython(
+    params = (freq, temperature, pressure, h_tg, h_rg, timepercent)
+    selection = _atten_map_selection(outputs, dtype)
+
+    if out is None and block_size is None:
+
+        float_res, int_res = _atten_map_cython(
+            params, hprof_data, polarization, version, selection
+            )
+
+        return _atten_map_quantities(float_res, int_res, selection)
+
+    ny, nx = len(hprof_data['ycoords']), len(hprof_data['xcoords'])
+    results = _atten_map_outputs(
+        out, np.broadcast(*params).shape + (ny, nx), selection
+        )
+
+    for yslice, xslice in _map_blocks(ny, nx, block_size or 512):
+
+        float_res, int_res = _atten_map_cython(
+            params, _hprof_data_block(hprof_data, yslice, xslice),
+            polarization, version, selection,
+            )
+        _write_atten_map_block(
+            results, yslice, xslice, float_res, int_res, selection
+            )
+
+    if out is None:
+        return _atten_map_quantities(
+            [results[name] for name in selection.names],
+            [results['path_type']] if selection.path_type else [],
+            selection,
+            )
+
+    return out
+
+
+# names and units of the (float-valued) atten_map_fast results
+_ATTEN_MAP_RESULTS = [
+    ('L_b0p', cnv.dB), ('L_bd', cnv.dB), ('L_bs', cnv.dB), ('L_ba', cnv.dB),
+    ('L_b', cnv.dB), ('L_b_corr', cnv.dB),
+    ('eps_pt', apu.deg), ('eps_pr', apu.deg),
+    ('d_lt', apu.km), ('d_lr', apu.km),
+    ]
+
+# hprof_data maps needed by atten_map_fast
+_ATTEN_MAP_INPUT_MAPS = [
+    'path_idx_map', 'dist_end_idx_map', 'dist_map',
+    'delta_N_map', 'beta0_map', 'N0_map',
+    'zone_t_map', 'zone_r_map',
+    'd_tm_map', 'd_lm_map', 'd_ct_map', 'd_cr_map', 'omega_map',
+    ]
+
+
+_AttenMapSelection = namedtuple(
+    '_AttenMapSelection', ['names', 'units', 'layers', 'path_type', 'dtype']
+    )
+
+
+def _atten_map_selection(outputs, dtype):
+    # translate the requested output names into the layer indices of
+    # the cython functions (order as in _ATTEN_MAP_RESULTS)
+
+    names = [name for name, _ in _ATTEN_MAP_RESULTS]
+
+    if outputs is None:
+        outputs = names + ['path_type']
+    elif isinstance(outputs, str):
+        outputs = [outputs]
+
+    outputs = set(outputs)
+    unknown = outputs - set(names + ['path_type'])
+    if unknown:
+        raise ValueError(
+            'Unknown outputs: {}; allowed are: {}'.format(
+                ', '.join(sorted(unknown)),
+                ', '.join(names + ['path_type']),
+                ))
+
+    dtype = np.dtype(dtype)
+    if dtype != np.float32 and dtype != np.float64:
+        raise ValueError('dtype must be float32 or float64')
+
+    layers = [i for i, name in enumerate(names) if name in outputs]
+
+    return _AttenMapSelection(
+        names=[names[i] for i in layers],
+        units=[_ATTEN_MAP_RESULTS[i][1] for i in layers],
+        layers=layers,
+        path_type='path_type' in outputs,
+        dtype=dtype,
+        )
+
+
+def _atten_map_cython(params, hprof_data, polarization, version, selection):
+    # returns the float and int results with shapes (nlayers, ..., my, mx)
+    # and (1, ..., my, mx), where "..." is the broadcasted parameter shape
+    # (int_res is empty, if path_type was not requested)
+
+    kwargs = dict(
+        polarization=polarization,
+        version=version,
+        layers=selection.layers,
+        path_type=selection.path_type,
+        dtype=selection.dtype,
+        )
+
+    if all(np.ndim(p) == 0 for p in params):
+
+        float_res, int_res = cyprop.atten_map_fast_cython(
+            *params,
+            hprof_data,  # dict_like
+            **kwargs
+            )
+
+    else:
+
+        params = np.broadcast_arrays(*params)
+        shape = params[0].shape
+        params = [np.asarray(p, dtype=np.float64).ravel() for p in params]
+        # the path geometry only depends on freq, h_tg, and h_rg; it is
+        # computed once per pixel for each distinct combination
+        _, geom_idx = np.unique(
+            np.stack([params[0], params[3], params[4]], axis=1),
+            axis=0, return_inverse=True,
+            )
+        float_res, int_res = cyprop.atten_map_fast_cube_cython(
+            *params,
+            geom_idx.ravel(),
+            hprof_data,  # dict_like
+            **kwargs
+            )
+        # move parameter axes after the result type axis
+        float_res = np.moveaxis(float_res, 0, 1).reshape(
+            float_res.shape[1:2] + shape + float_res.shape[2:]
+            )
+        int_res = np.moveaxis(int_res, 0, 1).reshape(
+            int_res.shape[1:2] + shape + int_res.shape[2:]
+            )
+
+    return float_res, int_res
+
+
+def _atten_map_quantities(float_res, int_res, selection):
+
+    results = {
+        name: float_res[i] * unit
+        for i, (name, unit) in enumerate(
+            zip(selection.names, selection.units)
+            )
+        }
+    if selection.path_type:
+        results['path_type'] = int_res[0]
+
+    return results
+
+
+def _atten_map_outputs(out, shape, selection):
+    # make sure, that all requested results are present in out (dict-like)
+
+    if out is None:
+        out = {}
+
+    for name, dtype in (
+            [(name, selection.dtype) for name in selection.names] +
+            ([('path_type', np.int32)] if selection.path_type else [])
+            ):
+
+        if name in out:
+            if tuple(out[name].shape) != shape:
+                raise ValueError(
+                    'out["{}"] has shape {}, but {} is needed'.format(
+                        name, out[name].shape, shape
+                        )
+                    )
+        elif hasattr(out, 'create_dataset'):
+            out.create_dataset(name, shape=shape, dtype=dtype)
+        else:
+            out[name] = np.zeros(shape, dtype=dtype)
+
+    return out
+
+
+def _map_blocks(ny, nx, block_size):
+
+    if block_size < 1:
+        raise ValueError('block_size must be positive')
+
+    for y0 in range(0, ny, block_size):
+        for x0 in range(0, nx, block_size):
+            yield (
+                slice(y0, min(y0 + block_size, ny)),
+                slice(x0, min(x0 + block_size, nx)),
+                )
+
+
+def _hprof_data_block(hprof_data, yslice, xslice):
+    # read the parts of hprof_data (dict-like), which are needed for
+    # a block of the map; only the height profiles used in the block
+    # are read (and path_idx_map is adjusted accordingly)
+
+    block = {
+        key: np.asarray(hprof_data[key][yslice, xslice])
+        for key in _ATTEN_MAP_INPUT_MAPS
+        }
+    for key in ['lon_t', 'lat_t', 'hprof_step']:
+        block[key] = hprof_data[key]
+    block['xcoords'] = np.asarray(hprof_data['xcoords'][xslice])
+    block['ycoords'] = np.asarray(hprof_data['ycoords'][yslice])
+
+    rows, path_idx = np.unique(block['path_idx_map'], return_inverse=True)
+    block['path_idx_map'] = path_idx.reshape(
+        block['path_idx_map'].shape
+        ).astype(np.int32)
+
+    ndist = block['dist_end_idx_map'].max() + 1
+    block['dist_prof'] = np.asarray(hprof_data['dist_prof'][:ndist])
+    block['zheight_prof'] = np.asarray(hprof_data['zheight_prof'][:ndist])
+    block['height_profs'] = np.asarray(
+        hprof_data['height_profs'][rows, :ndist]
+        )
+
+    return block
+
+
+def _write_atten_map_block(
+        results, yslice, xslice, float_res, int_res, selection
+        ):
+
+    for i, name in enumerate(selection.names):
+        results[name][..., yslice, xslice] = float_res[i]
+    if selection.path_type:
+        results['path_type'][..., yslice, xslice] = int_res[0]
+
+
+@utils.ranged_quantity_input(
+    freq=(0.1, 100, apu.GHz),
+    temperature=(None, None, apu.K),
+    pressure=(None, None, apu.hPa),
+    h_tg=(None, None, apu.m),
+    h_rg=(None, None, apu.m),
+    timepercent=(0, 50, apu.percent),
+    lon_t=(-180, 180, apu.deg),
+    lat_t=(-90, 90, apu.deg),
+    map_size_lon=(0.002, 90, apu.deg),
+    map_size_lat=(0.002, 90, apu.deg),
+    map_resolution=(0.0001, 0.1, apu.deg),
+    d_tm=(None, None, apu.m),
+    d_lm=(None, None, apu.m),
+    d_ct=(None, None, apu.m),
+    d_cr=(None, None, apu.m),
+    omega_percent=(0, 100, apu.percent),
+    strip_input_units=True, allow_none=True, output_unit=None
+    )
+def atten_map_tiled(
         freq,
         temperature,
         pressure,
         h_tg, h_rg,
         timepercent,
-        hprof_data,  # dict_like
-        polarization=polarization,
-        version=version,
+        lon_t, lat_t,
+        map_size_lon, map_size_lat,
+        map_resolution=3. * apu.arcsec,
+        do_cos_delta=True,
+        zone_t=cyprop.CLUTTER.UNKNOWN, zone_r=cyprop.CLUTTER.UNKNOWN,
+        d_tm=None, d_lm=None,
+        d_ct=None, d_cr=None,
+        omega_percent=0 * apu.percent,
+        polarization=0,
+        version=16,
+        out=None,
+        block_size=512,
+        outputs=None,
+        dtype=np.float64,
+        ):
+    '''
+    Calculate attenuation maps block by block (with bounded memory).
+
+    This combines `~pycraf.pathprof.height_map_data` and
+    `~pycraf.pathprof.atten_map_fast`, but the height profiles and
+    auxillary maps are only calculated for one block of the map at a
+    time. The results of each block are written into `out`, which can
+    be backed by a file (e.g., `~numpy.memmap` arrays or a HDF5 group),
+    such that maps can be produced, which would not fit into memory.
+
+    Parameters
+    ----------
+    freq, temperature, pressure, h_tg, h_rg, timepercent
+        See `~pycraf.pathprof.atten_map_fast` (scalars or arrays).
+    lon_t, lat_t, map_size_lon, map_size_lat, map_resolution, \
+    do_cos_delta, zone_t, zone_r, d_tm, d_lm, d_ct, d_cr, omega_percent
+        See `~pycraf.pathprof.height_map_data`.
+    polarization : int, optional
+        Polarization (default: 0)
+        Allowed values are: 0 - horizontal, 1 - vertical
+    version : int, optional
+        ITU-R Rec. P.452 version. Allowed values are: 14, 16
+    out : dict-like, optional
+        Store for the results; see `~pycraf.pathprof.atten_map_fast`.
+        If None, the results are returned in a dictionary (as for
+        `~pycraf.pathprof.atten_map_fast`). (default: None)
+    block_size : int, optional
+        Maximal size of the map blocks (in pixels along each axis).
+        (default: 512)
+    outputs : list of str, optional
+        Names of the results to compute; see
+        `~pycraf.pathprof.atten_map_fast`. (default: None, i.e., all)
+    dtype : `~numpy.dtype`, optional
+        Data type of the float-valued results; see
+        `~pycraf.pathprof.atten_map_fast`. (default: `numpy.float64`)
+
+    Returns
+    -------
+    results : dict-like
+        Same entries as for `~pycraf.pathprof.atten_map_fast`, plus the
+        map coordinates, "xcoords" and "ycoords" [deg]. If `out` is
+        given, `out` is returned and all values are stored without units
+        (see `~pycraf.pathprof.atten_map_fast`).
+
+    Notes
+    -----
+    - The results are the same as for
+      `~pycraf.pathprof.atten_map_fast` applied to the output of
+      `~pycraf.pathprof.height_map_data` (for the full map). Only if
+      the SRTM data is smoothed (map resolutions coarser than about
+      6 arcsec without `~pycraf.pathprof.build_srtm_pyramid`), the
+      terrain heights at the end of the height profiles can differ
+      very slightly.
+    - Memory usage is dominated by the height profiles (radials) passing
+      a block. For blocks far from the map center, only few radials
+      are needed; blocks around the center need all radials, but only
+      up to a short distance.
+    - Radials passing several blocks are partly re-computed for each
+      block, which makes the calculation of the height profiles about
+      two to three times slower than for the full map. Therefore, the
+      blocks should be as large as the available memory permits.
+    '''
+
+    params = (freq, temperature, pressure, h_tg, h_rg, timepercent)
+    selection = _atten_map_selection(outputs, dtype)
+
+    geom = cyprop._map_geometry(
+        lon_t, lat_t, map_size_lon, map_size_lat,
+        map_resolution, 1 if do_cos_delta else 0,
         )
+    xcoords, ycoords = geom['xcoords'], geom['ycoords']
+    ny, nx = len(ycoords), len(xcoords)
 
-    return {
-        'L_b0p': float_res[0] * cnv.dB,
-        'L_bd': float_res[1] * cnv.dB,
-        'L_bs': float_res[2] * cnv.dB,
-        'L_ba': float_res[3] * cnv.dB,
-        'L_b': float_res[4] * cnv.dB,
-        'L_b_corr': float_res[5] * cnv.dB,
-        'eps_pt': float_res[6] * apu.deg,
-        'eps_pr': float_res[7] * apu.deg,
-        'd_lt': float_res[8] * apu.km,
-        'd_lr': float_res[9] * apu.km,
-        'path_type': int_res[0],
-        }
+    results = _atten_map_outputs(
+        out, np.broadcast(*params).shape + (ny, nx), selection
+        )
+
+    for yslice, xslice in _map_blocks(ny, nx, block_size):
+
+        hprof_data = cyprop.height_map_data_cython(
+            lon_t, lat_t,
+            map_size_lon, map_size_lat,
+            map_resolution=map_resolution,
+            do_cos_delta=1 if do_cos_delta else 0,
+            zone_t=zone_t, zone_r=zone_r,
+            d_tm=d_tm, d_lm=d_lm,
+            d_ct=d_ct, d_cr=d_cr,
+            omega=omega_percent,
+            block=(yslice, xslice),
+            )
+        float_res, int_res = _atten_map_cython(
+            params, hprof_data, polarization, version, selection
+            )
+        _write_atten_map_block(
+            results, yslice, xslice, float_res, int_res, selection
+            )
+
+    if out is None:
+        results = _atten_map_quantities(
+            [results[name] for name in selection.names],
+            [results['path_type']] if selection.path_type else [],
+            selection,
+            )
+        results['xcoords'] = xcoords * apu.deg
+        results['ycoords'] = ycoords * apu.deg
+        return results
+
+    for name, coords in [('xcoords', xcoords), ('ycoords', ycoords)]:
+        if name in out:
+            out[name][...] = coords
+        else:
+            out[name] = coords
+
+    return out
 
 
 @utils.ranged_quantity_input(
@@ -1021,8 +1606,21 @@ def height_path_data(
     different clutter types (in the array). You can modify the returned
     arrays in `hprof_data`, of course, before feeding into
     `~pycraf.pathprof.atten_path_fast`.
+
+    The results can be cached on disk; see `~pycraf.pathprof.HprofCacheConf`.
     '''
 
+    return cache._cached(
+        'height_path_data',
+        (lon_t, lat_t, lon_r, lat_r, step, zone_t, zone_r),
+        lambda: _height_path_data(
+            lon_t, lat_t, lon_r, lat_r, step, zone_t, zone_r
+            ),
+        )
+
+
+def _height_path_data(lon_t, lat_t, lon_r, lat_r, step, zone_t, zone_r):
+
     (
         lons, lats, distance, distances, heights,
         bearing, back_bearing, backbearings
@@ -1187,8 +1785,24 @@ def height_path_data_generic(
     different clutter types (in the array). You can modify the returned
     arrays in `hprof_data`, of course, before feeding into
     `~pycraf.pathprof.atten_path_fast`.
+
+    The results can be cached on disk; see `~pycraf.pathprof.HprofCacheConf`.
     '''
 
+    return cache._cached(
+        'height_path_data_generic',
+        (distance, step, lon_mid, lat_mid, zone_t, zone_r),
+        lambda: _height_path_data_generic(
+            distance, step, lon_mid, lat_mid, zone_t, zone_r
+            ),
+        terrain=False,
+        )
+
+
+def _height_path_data_generic(
+        distance, step, lon_mid, lat_mid, zone_t, zone_r
+        ):
+
     step /= 1000.
     distances = np.arange(0, distance + step, step)
     heights = np.zeros_like(distances)
@@ -1245,6 +1859,8 @@ def atten_path_fast(
         hprof_data,  # dict_like
         polarization=0,
         version=16,
+        outputs=None,
+        dtype=np.float64,
         ):
     '''
     Calculate attenuation along a path using a parallelized method.
@@ -1270,6 +1886,12 @@ def atten_path_fast(
         Allowed values are: 0 - horizontal, 1 - vertical
     version : int, optional
         ITU-R Rec. P.452 version. Allowed values are: 14, 16
+    outputs : list of str, optional
+        Names of the results to compute; see
+        `~pycraf.pathprof.atten_map_fast`. (default: None, i.e., all)
+    dtype : `~numpy.dtype`, optional
+        Data type of the float-valued results; see
+        `~pycraf.pathprof.atten_map_fast`. (default: `numpy.float64`)
 
     Returns
     -------
@@ -1364,6 +1986,8 @@ def atten_path_fast(
         plt.show()
     '''
 
+    selection = _atten_map_selection(outputs, dtype)
+
     float_res, int_res = cyprop.atten_path_fast_cython(
         freq,
         temperature,
@@ -1373,21 +1997,12 @@ def atten_path_fast(
         hprof_data,  # dict_like
         polarization=polarization,
         version=version,
+        layers=selection.layers,
+        path_type=selection.path_type,
+        dtype=selection.dtype,
         )
 
-    return {
-        'L_b0p': float_res[0] * cnv.dB,
-        'L_bd': float_res[1] * cnv.dB,
-        'L_bs': float_res[2] * cnv.dB,
-        'L_ba': float_res[3] * cnv.dB,
-        'L_b': float_res[4] * cnv.dB,
-        'L_b_corr': float_res[5] * cnv.dB,
-        'eps_pt': float_res[6] * apu.deg,
-        'eps_pr': float_res[7] * apu.deg,
-        'd_lt': float_res[8] * apu.km,
-        'd_lr': float_res[9] * apu.km,
-        'path_type': int_res[0],
-        }
+    return _atten_map_quantities(float_res, int_res, selection)
 
 
 @utils.ranged_quantity_input(
@@ -1586,15 +2201,12 @@ def losses_complete(
 
     Notes
     -----
-    - It is extremely important how the broadcasting axes are chosen! There
-      are six entities - `freq`, `h_tg`, `h_rg`, `version`, `zone_t`, `zone_r`
-      - that have influence on the propagation path geometry. In the
-      broadcasted arrays, the associated axes should vary as slow as
-      possible. The internal Cython routine will trigger a re-computation of
-      the path geometry if one of these parameters changes. Therefore, if the
-      axes for `frequency` and `time_percent` would have been chosen in the
-      opposite manner, the function would run about an order of magnitude
-      slower!
+    - There are six entities - `freq`, `h_tg`, `h_rg`, `version`, `zone_t`,
+      `zone_r` - that have influence on the propagation path geometry. The
+      internal Cython routine processes the path geometry only once for
+      each unique combination of these parameters, and then calculates the
+      losses for all array elements. The run time therefore doesn't depend
+      on how the broadcasting axes are chosen.
     - The diffraction-loss algorithm was changed between ITU-R P.452
       version 14 and 15. The former used a Deygout method, the new one
       is based on a Bullington calculation with correction terms.
@@ -1643,5 +2255,220 @@ def losses_complete(
         }
 
 
+@utils.ranged_quantity_input(
+    freq=(0.1, 100, apu.GHz),
+    temperature=(None, None, apu.K),
+    pressure=(None, None, apu.hPa),
+    lon_t=(-180, 180, apu.deg),
+    lat_t=(-90, 90, apu.deg),
+    lon_r=(-180, 180, apu.deg),
+    lat_r=(-90, 90, apu.deg),
+    h_tg=(None, None, apu.m),
+    h_rg=(None, None, apu.m),
+    hprof_step=(None, None, apu.m),
+    timepercent=(0, 50, apu.percent),
+    G_t=(None, None, cnv.dBi),
+    G_r=(None, None, cnv.dBi),
+    omega=(0, 100, apu.percent),
+    d_tm=(None, None, apu.m),
+    d_lm=(None, None, apu.m),
+    d_ct=(None, None, apu.m),
+    d_cr=(None, None, apu.m),
+    delta_N=(None, None, cnv.dimless / apu.km),
+    N0=(None, None, cnv.dimless),
+    hprof_dists=(None, None, apu.km),
+    hprof_heights=(None, None, apu.m),
+    hprof_bearing=(None, None, apu.deg),
+    hprof_backbearing=(None, None, apu.deg),
+    strip_input_units=True, allow_none=True, output_unit=None
+    )
+def losses_complete_batch(
+        freq,
+        temperature,
+        pressure,
+        lon_t, lat_t,
+        lon_r, lat_r,
+        h_tg, h_rg,
+        hprof_step,
+        timepercent,
+        G_t=0. * cnv.dBi, G_r=0. * cnv.dBi,
+        omega=0 * apu.percent,
+        d_tm=None, d_lm=None,
+        d_ct=None, d_cr=None,
+        zone_t=cyprop.CLUTTER.UNKNOWN, zone_r=cyprop.CLUTTER.UNKNOWN,
+        polarization=0,
+        version=16,
+        # override if you don't want builtin method:
+        delta_N=None, N0=None,
+        # override if you don't want builtin method:
+        hprof_dists=None, hprof_heights=None, hprof_offsets=None,
+        hprof_bearing=None, hprof_backbearing=None,
+        ):
+    '''
+    Calculate propagation losses for many paths using a parallelized method.
+
+    In contrast to `~pycraf.pathprof.losses_complete`, which works on a
+    single path, `losses_complete_batch` processes many paths (e.g., all
+    links between a set of transmitters and receivers) in one call. All
+    parameters, including the path end points, are broadcasted against
+    each other; each element of the broadcasted arrays defines one path.
+    The height profiles of all paths are extracted at once (see
+    `~pycraf.pathprof.srtm_height_profiles`) and the paths are processed
+    in parallel.
+
+    Parameters
+    ----------
+    freq : `~astropy.units.Quantity`
+        Frequency of radiation [GHz]
+    temperature : `~astropy.units.Quantity`
+        Ambient temperature at path midpoint [K]
+    pressure : `~astropy.units.Quantity`
+        Ambient pressure at path midpoint  [hPa]
+    lon_t, lat_t : `~astropy.units.Quantity`
+        Geographic longitude/latitude of transmitter [deg]
+    lon_r, lat_r : `~astropy.units.Quantity`
+        Geographic longitude/latitude of receiver [deg]
+    h_tg, h_rg : `~astropy.units.Quantity`
+        Transmitter/receiver height over ground [m]
+    hprof_step : `~astropy.units.Quantity`, scalar
+        Distance resolution of height profile along path [m]
+    timepercent : `~astropy.units.Quantity`
+        Time percentage [%] (maximal 50%)
+    G_t, G_r  : `~astropy.units.Quantity`, optional
+        Antenna gain (transmitter, receiver) in the direction of the
+        horizon(!) along the great-circle interference path [dBi]
+    omega : `~astropy.units.Quantity`, optional
+        Fraction of the path over water [%] (see Table 3)
+        (default: 0%)
+    d_tm : `~astropy.units.Quantity`, optional
+        longest continuous land (inland + coastal) section of the
+        great-circle path [km]
+        (default: distance between Tx and Rx)
+    d_lm : `~astropy.units.Quantity`, optional
+        longest continuous inland section of the great-circle path [km]
+        (default: distance between Tx and Rx)
+    d_ct, d_cr : `~astropy.units.Quantity`, optional
+        Distance over land from transmitter/receiver antenna to the coast
+        along great circle interference path [km]
+        (default: 50000 km)
+    zone_t, zone_r : `~numpy.ndarray` of int (aka CLUTTER enum), optional
+        Clutter type for transmitter/receiver terminal.
+        (default: CLUTTER.UNKNOWN)
+    polarization : `~numpy.ndarray` of int, optional
+        Polarization (default: 0)
+        Allowed values are: 0 - horizontal, 1 - vertical
+    version : `~numpy.ndarray` of int, optional
+        ITU-R Rec. P.452 version. Allowed values are: 14, 16
+    delta_N : `~astropy.units.Quantity`, optional
+        Average radio-refractive index lapse-rate through the lowest 1 km of
+        the atmosphere [N-units/km = 1/km]
+        (default: query `~pycraf.pathprof.deltaN_N0_from_map`)
+    N_0 : `~astropy.units.Quantity`, optional
+        Sea-level surface refractivity [N-units = dimless]
+        (default: query `~pycraf.pathprof.deltaN_N0_from_map`)
+    hprof_dists : `~astropy.units.Quantity` 1D, optional
+        Distance vectors associated with the height profiles
+        `hprof_heights` (concatenated for all paths).
+        (default: query `~pycraf.pathprof.srtm_height_profiles`)
+    hprof_heights : `~astropy.units.Quantity` 1D, optional
+        Terrain height profiles for the distances in `hprof_dists`
+        (concatenated for all paths).
+        (default: query `~pycraf.pathprof.srtm_height_profiles`)
+    hprof_offsets : `~numpy.ndarray` 1D of int, optional
+        Start index of each height profile in `hprof_dists` and
+        `hprof_heights`, plus the total number of entries as last element
+        (as returned by `~pycraf.pathprof.srtm_height_profiles`).
+        (default: query `~pycraf.pathprof.srtm_height_profiles`)
+    hprof_bearing : `~astropy.units.Quantity`, optional
+        Start bearings of the height profile paths.
+        (default: query `~pycraf.pathprof.srtm_height_profiles`)
+    hprof_backbearing : `~astropy.units.Quantity`, optional
+        Back-bearings of the height profile paths.
+        (default: query `~pycraf.pathprof.srtm_height_profiles`)
+
+    Returns
+    -------
+    results : dict
+        Results of the path attenuation calculation. Each entry
+        in the dictionary is a 1D `~astropy.units.Quantity` containing
+        the associated values for the paths (in the flattened C-order of
+        the broadcasted input parameters). The entries are the same as
+        for `~pycraf.pathprof.losses_complete`.
+
+    Examples
+    --------
+
+    A link matrix between several transmitters and receivers::
+
+        import numpy as np
+        from pycraf import pathprof
+        from astropy import units as u
+
+        lon_t = np.array([6.8836, 6.9]) * u.deg
+        lat_t = np.array([50.525, 50.6]) * u.deg
+        lon_r = np.array([7.3334, 7.2, 7.1]) * u.deg
+        lat_r = np.array([50.635, 50.7, 50.4]) * u.deg
+
+        results = pathprof.losses_complete_batch(
+            10 * u.GHz, 290 * u.K, 980 * u.hPa,
+            lon_t[:, np.newaxis], lat_t[:, np.newaxis],
+            lon_r[np.newaxis], lat_r[np.newaxis],
+            20 * u.m, 30 * u.m, 100 * u.m, 2 * u.percent,
+            )
+
+        L_b = results['L_b'].reshape((2, 3))
+
+    Notes
+    -----
+    - As opposed to `~pycraf.pathprof.losses_complete`, the path geometry
+      is computed for every element. To compute many parameter
+      combinations for the same path, `~pycraf.pathprof.losses_complete`
+      is faster.
+    - The diffraction-loss algorithm was changed between ITU-R P.452
+      version 14 and 15. The former used a Deygout method, the new one
+      is based on a Bullington calculation with correction terms.
+    '''
+
+    res = cyprop.losses_complete_batch_cython(
+        freq,
+        temperature,
+        pressure,
+        lon_t, lat_t,
+        lon_r, lat_r,
+        h_tg, h_rg,
+        hprof_step,
+        timepercent,
+        G_t=G_t,
+        G_r=G_r,
+        omega=omega,
+        d_tm=d_tm,
+        d_lm=d_lm,
+        d_ct=d_ct,
+        d_cr=d_cr,
+        zone_t=zone_t, zone_r=zone_r,
+        polarization=polarization,
+        version=version,
+        delta_N=delta_N, N0=N0,
+        hprof_dists=hprof_dists,
+        hprof_heights=hprof_heights,
+        hprof_offsets=hprof_offsets,
+        hprof_bearing=hprof_bearing,
+        hprof_backbearing=hprof_backbearing,
+        )
+    return {
+        'L_b0p': res[0] * cnv.dB,
+        'L_bd': res[1] * cnv.dB,
+        'L_bs': res[2] * cnv.dB,
+        'L_ba': res[3] * cnv.dB,
+        'L_b': res[4] * cnv.dB,
+        'L_b_corr': res[5] * cnv.dB,
+        'eps_pt': res[6] * apu.deg,
+        'eps_pr': res[7] * apu.deg,
+        'd_lt': res[8] * apu.km,
+        'd_lr': res[9] * apu.km,
+        'path_type': res[10],
+        }
+
+
 if __name__ == '__main__':
     print('This not a standalone python program! Use as module.')
@@ -63,4 +63,13 @@ def get_extensions():
         **comp_args
         )
 
-    return [ext_module_pathprof_cyprop, ext_module_pathprof_geodesics]
+    ext_module_pathprof_srtm = Extension(
+        name='pycraf.pathprof.cysrtm',
+        sources=[os.path.join(PYXDIR, 'cysrtm.pyx')],
+        **comp_args
+        )
+
+    return [
+        ext_module_pathprof_cyprop, ext_module_pathprof_geodesics,
+        ext_module_pathprof_srtm,
+        ]
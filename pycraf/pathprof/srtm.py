@@ -32,12 +32,18 @@ import shutil
 from zipfile import ZipFile
 import re
 import json
-import glob
-from functools import lru_cache
+import zlib
+import hashlib
+from collections import namedtuple, OrderedDict
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from scipy.interpolate import RegularGridInterpolator, RectBivariateSpline
+from scipy.interpolate import RectBivariateSpline
+from scipy import ndimage
 from astropy.utils.data import get_pkg_data_filename, download_file
 from astropy import units as apu
+from . import cysrtm
 from .. import utils
 
 
@@ -46,7 +52,9 @@ __all__ = [
     'TileNotAvailableOnDiskError',
     'TileNotAvailableOnDiskWarning',
     'TilesSizeError',
-    'SrtmConf', 'srtm_height_data'
+    'SrtmConf', 'srtm_height_data', 'refresh_tile_index',
+    'prefetch_tiles', 'tile_cache_info', 'clear_tile_cache',
+    'build_srtm_pyramid', 'build_srtm_mosaic', 'download_tiles',
     ]
 
 
@@ -93,7 +101,10 @@ class SrtmConf(utils.MultiState):
         SrtmConf.set(srtm_dir='/path/to/srtmdir')
 
     This will also check, if all '.hgt' files have the same size. If not
-    an error is raised.
+    an error is raised. For fast look-ups, an index of all tiles in the
+    directory (and its sub-directories) is created once. It is automatically
+    updated when the content of the directories changes, but can also be
+    refreshed manually with `~pycraf.pathprof.refresh_tile_index`.
 
     Alternatively, if only a temporary change of the config is desired,
     one can use `SrtmConf` as a context manager::
@@ -123,11 +134,17 @@ class SrtmConf(utils.MultiState):
 
             # do stuff
 
+    Missing tiles are downloaded one at a time, when they are first
+    accessed. To fetch all tiles of a larger region in advance (with
+    several concurrent downloads), use `~pycraf.pathprof.download_tiles`.
+
     Last, but not least, it is possible to use different interpolation methods.
     The default method uses bi-linear interpolation (`interp='linear'`). One
     can also have nearest-neighbor (`interp='nearest'`) or spline
-    (`interp='spline'`) interpolation. The two former internally use
-    `~scipy.interpolate.RegularGridInterpolator`, the latter employs
+    (`interp='spline'`) interpolation. The two former work directly on the
+    memory-mapped tile data (i.e., tiles are not copied into memory, such
+    that several processes working on the same tiles share the same
+    physical memory), the latter employs
     `~scipy.interpolate.RectBivariateSpline` that also allows custom
     spline degrees (`kx` and `ky`, default: 3) and smoothing factor (`s`,
     default: 0.). To change these use::
@@ -137,6 +154,35 @@ class SrtmConf(utils.MultiState):
     We refer to `~scipy.interpolate.RectBivariateSpline` description for
     further information.
 
+    Tile data (or rather the interpolator objects) are kept in a cache, which
+    uses up to `cache_bytes` of memory (default: 512 MiB). If the cache
+    is full, the least recently used tiles are discarded. Large maps or
+    many long paths may need a larger cache::
+
+        SrtmConf.set(cache_bytes=2 * 1024 ** 3)
+
+    See also `~pycraf.pathprof.tile_cache_info` and
+    `~pycraf.pathprof.prefetch_tiles`.
+
+    For long paths or large maps with coarse resolution (i.e., large
+    `hprof_step`), height profiles are usually obtained by sampling the
+    terrain with high resolution and smoothing the result afterwards. This
+    can be avoided with a terrain pyramid, i.e., pre-smoothed versions
+    of the tiles with lower resolution, see
+    `~pycraf.pathprof.build_srtm_pyramid`. If a pyramid is present in the
+    SRTM directory, it will be used automatically, unless
+    `pyramid=False` is set.
+
+    On some (e.g., cluster) file systems, opening thousands of small files
+    is slow. It is possible to convert all tiles into a single file, a
+    so-called mosaic, with `~pycraf.pathprof.build_srtm_mosaic` and use
+    this instead of the SRTM directory::
+
+        SrtmConf.set(mosaic='/path/to/srtm.mosaic')
+
+    (Automatic downloads and terrain pyramids are not supported with
+    mosaics.)
+
     Two read-only attributes are present, `tile_size` (pixels) and
     `hgt_res` (m), which are automatically inferred from the tile data.
 
@@ -149,7 +195,7 @@ class SrtmConf(utils.MultiState):
 
     _attributes = (
         'srtm_dir', 'download', 'server', 'interp', 'spline_opts',
-        'tile_size', 'hgt_res'
+        'cache_bytes', 'pyramid', 'mosaic', 'tile_size', 'hgt_res'
         )
 
     srtm_dir = os.environ.get('SRTMDATA', '.')
@@ -157,6 +203,9 @@ class SrtmConf(utils.MultiState):
     server = 'nasa_v2.1'
     interp = 'linear'
     spline_opts = (3, 0)
+    cache_bytes = 512 * 1024 ** 2
+    pyramid = True
+    mosaic = None
     tile_size = 1201
     hgt_res = 90.  # m; basic SRTM resolution (refers to 3 arcsec resolution)
 
@@ -170,6 +219,9 @@ class SrtmConf(utils.MultiState):
         - `server`:  'nasa_v2.1', 'nasa_v1.0', 'viewpano'
         - `interp`:  'nearest', 'linear', 'spline'
         - `spline_opts`:  tuple(k, s) (k = degree, s = smoothing factor)
+        - `cache_bytes`:  int (maximum size of the tile cache in bytes)
+        - `pyramid`:  bool (use terrain pyramid, if available)
+        - `mosaic`:  None or str (path to mosaic file)
 
         '''
 
@@ -181,6 +233,16 @@ class SrtmConf(utils.MultiState):
                         '"srtm_dir" option must be a string.'
                         )
 
+                if os.path.isdir(v):
+                    # build (or re-use) the tile index and check, that all
+                    # tiles have the same size
+                    tile_sizes = _get_tile_index(v).tile_sizes()
+                    if len(tile_sizes) > 1:
+                        raise TilesSizeError(
+                            'Inconsistent tile sizes found in given srtm '
+                            'path. All tiles must be the same size!'
+                            )
+
             if k == 'download':
                 if v not in ['never', 'missing', 'always']:
                     raise ValueError(
@@ -221,6 +283,28 @@ class SrtmConf(utils.MultiState):
                     raise ValueError(
                         '"spline_opts" s-value must be a float.'
                         )
+
+            if k == 'cache_bytes':
+                if not isinstance(v, int) or isinstance(v, bool) or v < 0:
+                    raise ValueError(
+                        '"cache_bytes" option must be a non-negative int.'
+                        )
+
+            if k == 'pyramid':
+                if not isinstance(v, bool):
+                    raise ValueError(
+                        '"pyramid" option must be a bool.'
+                        )
+
+            if k == 'mosaic':
+                if v is not None:
+                    if not isinstance(v, str):
+                        raise ValueError(
+                            '"mosaic" option must be None or a string.'
+                            )
+                    # raises ValueError if not a valid mosaic file
+                    _get_mosaic_reader(v)
+
             if k in ['tile_size', 'hgt_res']:
 
                 raise KeyError(
@@ -236,7 +320,7 @@ class SrtmConf(utils.MultiState):
         if 'srtm_dir' in kwargs:
             # check if srtm_dir changed and clear cache
             if kwargs['srtm_dir'] != cls.srtm_dir:
-                get_tile_interpolator.cache_clear()
+                _TILE_CACHE.clear()
 
         if 'download' in kwargs:
             # check if 'download' strategy was changed and clear cache
@@ -245,29 +329,37 @@ class SrtmConf(utils.MultiState):
             # later sets the option to download missing tiles, the reading
             # routine needs to run again
             if kwargs['download'] != cls.download:
-                get_tile_interpolator.cache_clear()
+                _TILE_CACHE.clear()
 
         if 'server' in kwargs:
             # dito
             if kwargs['server'] != cls.server:
-                get_tile_interpolator.cache_clear()
+                _TILE_CACHE.clear()
+
+        if 'mosaic' in kwargs:
+            # dito
+            if kwargs['mosaic'] != cls.mosaic:
+                _TILE_CACHE.clear()
+
+        if 'cache_bytes' in kwargs:
+            _TILE_CACHE.resize(kwargs['cache_bytes'])
 
     @classmethod
     def __repr__(cls):
         return (
             '<SrtmConf dir: {}, download: {}, server: {}, '
-            'interp: {}, spline_opts: {}>'.format(
+            'interp: {}, spline_opts: {}, cache_bytes: {}>'.format(
                 cls.srtm_dir, cls.download, cls.server,
-                cls.interp, cls.spline_opts
+                cls.interp, cls.spline_opts, cls.cache_bytes
                 ))
 
     @classmethod
     def __str__(cls):
         return (
             'SrtmConf\n  directory: {}\n  download: {}\n  server: {}\n'
-            '  interp: {}\n  spline_opts: {}'.format(
+            '  interp: {}\n  spline_opts: {}\n  cache_bytes: {}'.format(
                 cls.srtm_dir, cls.download, cls.server,
-                cls.interp, cls.spline_opts
+                cls.interp, cls.spline_opts, cls.cache_bytes
                 ))
 
 
@@ -320,35 +412,187 @@ def _check_availability(ilon, ilat):
     return None  # should not happen
 
 
+_TileEntry = namedtuple('_TileEntry', 'path size tile_size hgt_res mtime')
+
+
+def _dir_mtime(path):
+
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class _TileIndex(object):
+    '''
+    Index of all ".hgt" files in a SRTM directory (incl. sub-directories).
+
+    The directory tree is only scanned once. For each tile name, the
+    index stores path, file size, tile size (pixels) and resolution (m).
+    The modification times of all (sub-)directories are recorded as well;
+    if any of these changes (i.e., files were added, removed, or renamed),
+    the index is rebuilt on the next look-up. Use `refresh` to force
+    re-scanning.
+
+    The `fingerprint` (a hash over paths, sizes and modification times of
+    all tiles) identifies the version of the terrain data in the index.
+    '''
+
+    def __init__(self, srtm_dir):
+
+        self.srtm_dir = srtm_dir
+        self.refresh()
+
+    def refresh(self):
+
+        tiles = {}
+        # also record the root directory, if it doesn't exist (yet)
+        dir_mtimes = {self.srtm_dir: _dir_mtime(self.srtm_dir)}
+
+        # note: like glob('**'), we don't descend into hidden directories
+        for root, dirs, files in os.walk(self.srtm_dir, followlinks=True):
+
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+            dir_mtimes[root] = _dir_mtime(root)
+
+            for fname in sorted(files):
+                if not fname.endswith('.hgt'):
+                    continue
+
+                path = os.path.join(root, fname)
+                stat = os.stat(path)
+                size = stat.st_size
+                tile_size = int(np.sqrt(size / 2) + 0.5)
+                hgt_res = (
+                    90. * 1200 / (tile_size - 1) if tile_size > 1 else np.nan
+                    )
+                tiles.setdefault(fname, []).append(
+                    _TileEntry(
+                        path, size, tile_size, hgt_res, stat.st_mtime_ns
+                        )
+                    )
+
+        self._tiles = tiles
+        self._dir_mtimes = dir_mtimes
+        self._fingerprint = None
+
+    def is_stale(self):
+
+        return any(
+            _dir_mtime(d) != mtime for d, mtime in self._dir_mtimes.items()
+            )
+
+    def _check(self):
+
+        if self.is_stale():
+            self.refresh()
+
+    def lookup(self, tile_name):
+        '''List of index entries for the given tile name (can be empty).'''
+
+        self._check()
+        return self._tiles.get(tile_name, [])
+
+    def tile_names(self):
+        '''Sorted list of all tile names in the index.'''
+
+        self._check()
+        return sorted(self._tiles.keys())
+
+    def tile_sizes(self):
+        '''Set of tile sizes (pixels) of all tiles in the index.'''
+
+        self._check()
+        return set(
+            entry.tile_size
+            for entries in self._tiles.values()
+            for entry in entries
+            )
+
+    def fingerprint(self):
+        '''Hash (hex string) identifying the tiles in the index.'''
+
+        self._check()
+        if self._fingerprint is None:
+            md5 = hashlib.md5()
+            for fname in sorted(self._tiles):
+                for entry in self._tiles[fname]:
+                    md5.update('{} {} {}\n'.format(
+                        entry.path, entry.size, entry.mtime
+                        ).encode('utf-8'))
+            self._fingerprint = md5.hexdigest()
+
+        return self._fingerprint
+
+
+_TILE_INDICES = {}
+
+
+def _get_tile_index(srtm_dir=None):
+
+    if srtm_dir is None:
+        srtm_dir = SrtmConf.srtm_dir
+
+    # relative paths (e.g., the default './') depend on working directory
+    srtm_dir = os.path.abspath(srtm_dir)
+
+    try:
+        tile_index = _TILE_INDICES[srtm_dir]
+    except KeyError:
+        tile_index = _TILE_INDICES[srtm_dir] = _TileIndex(srtm_dir)
+
+    return tile_index
+
+
+def refresh_tile_index(srtm_dir=None):
+    '''
+    Re-scan SRTM directory for ".hgt" files.
+
+    To avoid expensive (recursive) file searches, `~pycraf` keeps an index
+    of all tiles found in the SRTM directory (see `~pycraf.pathprof.SrtmConf`)
+    and its sub-directories. The index is automatically rebuilt, if the
+    modification time of any of the directories changes. On some
+    (e.g., network) file systems this may not be reliable, in which case
+    the index can be refreshed manually with this function.
+
+    Parameters
+    ----------
+    srtm_dir : str or None, optional
+        SRTM directory. If `None`, the currently configured
+        `~pycraf.pathprof.SrtmConf.srtm_dir` is used. (default: None)
+    '''
+
+    _get_tile_index(srtm_dir).refresh()
+
+
 def _check_consistent_tile_sizes(srtm_dir):
 
-    all_files = glob.glob(
-        os.path.join(srtm_dir, '**', '*.hgt'),
-        recursive=True
-        )
-    file_sizes = set(os.stat(fname).st_size for fname in all_files)
+    tile_sizes = _get_tile_index(srtm_dir).tile_sizes()
 
-    if len(file_sizes) == 0:
+    if len(tile_sizes) == 0:
         raise OSError('No .hgt tiles found in given srtm path.')
-    elif len(file_sizes) > 1:
+    elif len(tile_sizes) > 1:
         raise TilesSizeError(
             'Inconsistent tile sizes found in given srtm path. '
             'All tiles must be the same size!'
             )
 
-    tile_size = int(np.sqrt(file_sizes.pop() / 2) + 0.5)
+    return tile_sizes.pop()
 
-    return tile_size
 
+# base urls of the download servers (can be changed, e.g., for a mirror)
+_SERVER_URLS = {
+    'nasa_v1.0': 'https://dds.cr.usgs.gov/srtm/version1/',
+    'nasa_v2.1': 'https://dds.cr.usgs.gov/srtm/version2_1/SRTM3/',
+    'viewpano': 'http://viewfinderpanoramas.org/dem3/',
+    }
 
-def _download(ilon, ilat):
-    # download the tile to path
+# lock files older than this are considered stale (e.g., after a crash)
+_LOCK_STALE_SECONDS = 3600.
 
-    srtm_dir = SrtmConf.srtm_dir
-    server = SrtmConf.server
 
-    tile_name = _hgt_filename(ilon, ilat)
-    tile_path = os.path.join(srtm_dir, tile_name)
+def _tile_archive(ilon, ilat):
+    # zip file (relative to server base url) that contains the tile
 
     # Unfortunately, each server has a different structure.
     # NASA stores them in sub-directories (by continents)
@@ -361,55 +605,276 @@ def _download(ilon, ilat):
     # for downloading). However, we have to figure out, in which
     # subdirectory/zip-file a tile is located.
 
+    server = SrtmConf.server
+    tile_name = _hgt_filename(ilon, ilat)
+
+    # raises TileNotAvailableOnServerError
+    archive = _check_availability(ilon, ilat)
+
     if server.startswith('nasa_v'):
+        return archive + '/' + tile_name + '.zip'
+    elif server == 'viewpano':
+        return archive
 
-        if server == 'nasa_v1.0':
-            base_url = 'https://dds.cr.usgs.gov/srtm/version1/'
-        elif server == 'nasa_v2.1':
-            base_url = 'https://dds.cr.usgs.gov/srtm/version2_1/SRTM3/'
 
-        continent = _check_availability(ilon, ilat)
+class _FileLock(object):
+    '''
+    Simple inter-process lock, based on exclusive file creation.
+
+    Works on all platforms and (most) network file systems. Lock files
+    older than `stale` seconds are removed, such that a crashed process
+    cannot block other processes forever.
+    '''
+
+    def __init__(self, path, stale=None, poll=0.1):
 
-        # downloading
-        full_url = base_url + continent + '/' + tile_name + '.zip'
-        tmp_path = download_file(full_url)
+        self.path = path
+        self.stale = _LOCK_STALE_SECONDS if stale is None else stale
+        self.poll = poll
+
+    def __enter__(self):
+
+        while True:
+            try:
+                fd = os.open(
+                    self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY
+                    )
+            except FileExistsError:
+                pass
+            else:
+                os.write(fd, '{:d}'.format(os.getpid()).encode('ascii'))
+                os.close(fd)
+                return self
 
-        # move to srtm_dir
-        shutil.move(tmp_path, tile_path + '.zip')
+            try:
+                if time.time() - os.stat(self.path).st_mtime > self.stale:
+                    os.remove(self.path)
+                    continue
+            except FileNotFoundError:
+                # lock was just released
+                continue
 
-        # unpacking
-        with ZipFile(tile_path + '.zip', 'r') as zf:
-            zf.extractall(srtm_dir)
+            time.sleep(self.poll)
+
+    def __exit__(self, *args):
 
         try:
-            os.remove(tile_path + '.zip')
-        except (FileNotFoundError, PermissionError):
-            # someone else was faster to delete or still accessing?
+            os.remove(self.path)
+        except FileNotFoundError:
             pass
 
-    elif server == 'viewpano':
 
-        base_url = 'http://viewfinderpanoramas.org/dem3/'
+def _extract_hgt_files(zip_path, srtm_dir):
+    # extract all hgt files from a zip file, atomically (via a temporary
+    # file and rename); other processes will either see the old or the
+    # new file, never a partially written one (also not, if they have
+    # the old file memory-mapped)
+
+    tmp_suffix = '.{:d}.{:d}.tmp'.format(os.getpid(), threading.get_ident())
+    hgt_names = []
+
+    with ZipFile(zip_path, 'r') as zf:
+        for info in zf.infolist():
 
-        zipfile_name = _check_availability(ilon, ilat)
-        super_tile_path = os.path.join(srtm_dir, zipfile_name)
+            parts = [p for p in info.filename.split('/') if p]
+            if not parts or not parts[-1].endswith('.hgt'):
+                continue
+            if any(p in ('.', '..') for p in parts) or ':' in parts[0]:
+                raise IOError(
+                    'Invalid file name in {}: {}'.format(
+                        zip_path, info.filename
+                        ))
 
-        # downloading
-        full_url = base_url + zipfile_name
-        tmp_path = download_file(full_url)
+            hgt_path = os.path.join(srtm_dir, *parts)
+            tmp_path = hgt_path + tmp_suffix
+            os.makedirs(os.path.dirname(hgt_path), exist_ok=True)
+            with zf.open(info) as fsrc, open(tmp_path, 'wb') as fdst:
+                shutil.copyfileobj(fsrc, fdst)
+            os.replace(tmp_path, hgt_path)
 
-        # move to srtm_dir
-        shutil.move(tmp_path, super_tile_path)
+            hgt_names.append(parts[-1])
 
-        # unpacking
-        with ZipFile(super_tile_path, 'r') as zf:
-            zf.extractall(srtm_dir)
+    return hgt_names
 
+
+def _fetch_archive(
+        archive, srtm_dir, server, tile_names=None, show_progress=True
+        ):
+    # download a zip file and extract its hgt files to srtm_dir
+    # if tile_names is given, the download is skipped if all of these
+    # tiles are already present (e.g., another process was faster)
+
+    os.makedirs(srtm_dir, exist_ok=True)
+    lock_path = os.path.join(
+        srtm_dir, '.{}.lock'.format(archive.replace('/', '_'))
+        )
+
+    with _FileLock(lock_path):
+
+        if tile_names is not None:
+            tile_index = _get_tile_index(srtm_dir)
+            tile_index.refresh()
+            if all(tile_index.lookup(t) for t in tile_names):
+                return False
+
+        tmp_path = download_file(
+            _SERVER_URLS[server] + archive, cache=False,
+            show_progress=show_progress,
+            )
         try:
-            os.remove(super_tile_path)
-        except (FileNotFoundError, PermissionError):
-            # someone else was faster to delete or still accessing?
-            pass
+            _extract_hgt_files(tmp_path, srtm_dir)
+        finally:
+            try:
+                os.remove(tmp_path)
+            except (FileNotFoundError, PermissionError):
+                pass
+
+    return True
+
+
+def _download(ilon, ilat):
+    # download the tile to path
+
+    srtm_dir = SrtmConf.srtm_dir
+
+    # with download == 'missing', the tile may have been fetched by another
+    # process (or thread), while we were waiting for the lock
+    tile_names = (
+        [_hgt_filename(ilon, ilat)]
+        if SrtmConf.download == 'missing' else None
+        )
+    _fetch_archive(
+        _tile_archive(ilon, ilat), srtm_dir, SrtmConf.server,
+        tile_names=tile_names,
+        )
+
+    # don't rely on directory mtimes (granularity may be too coarse)
+    refresh_tile_index(srtm_dir)
+
+
+def _bbox_tiles(lon_min, lon_max, lat_min, lat_max):
+    # tile coordinates (lower left corner) of all tiles in a bbox
+
+    def _irange(vmin, vmax, imax):
+        return range(int(np.floor(vmin)), min(int(np.floor(vmax)), imax) + 1)
+
+    if lon_min <= lon_max:
+        ilons = list(_irange(lon_min, lon_max, 179))
+    else:
+        ilons = list(_irange(lon_min, 180, 179)) + list(
+            _irange(-180, lon_max, 179)
+            )
+    ilats = _irange(min(lat_min, lat_max), max(lat_min, lat_max), 89)
+
+    return [(ilon, ilat) for ilat in ilats for ilon in ilons]
+
+
+def _download_tiles(tiles, max_workers=4, overwrite=False):
+    # download a set of tiles (list of (ilon, ilat)) concurrently
+
+    srtm_dir = SrtmConf.srtm_dir
+    server = SrtmConf.server
+    tile_index = _get_tile_index(srtm_dir)
+
+    # several tiles can be in the same zip file (viewpano), which has to
+    # be fetched only once
+    archives = OrderedDict()
+    for ilon, ilat in tiles:
+
+        tile_name = _hgt_filename(ilon, ilat)
+        if not overwrite and tile_index.lookup(tile_name):
+            continue
+
+        try:
+            archive = _tile_archive(ilon, ilat)
+        except TileNotAvailableOnServerError:
+            continue
+
+        archives.setdefault(archive, []).append((ilon, ilat))
+
+    if not archives:
+        return []
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(
+                _fetch_archive, archive, srtm_dir, server,
+                None if overwrite else [
+                    _hgt_filename(*tile) for tile in archive_tiles
+                    ],
+                False,
+                )
+            for archive, archive_tiles in archives.items()
+            ]
+
+    refresh_tile_index(srtm_dir)
+    # cache may contain zero tiles for the downloaded tiles
+    _TILE_CACHE.clear()
+
+    # raises the first exception, if any, but only after all workers
+    # are finished (such that all other tiles are available)
+    for future in futures:
+        future.result()
+
+    return sorted(
+        (tile for archive_tiles in archives.values() for tile in archive_tiles),
+        key=lambda t: (t[1], t[0])
+        )
+
+
+@utils.ranged_quantity_input(
+    lon_min=(-180, 180, apu.deg),
+    lon_max=(-180, 180, apu.deg),
+    lat_min=(-90, 90, apu.deg),
+    lat_max=(-90, 90, apu.deg),
+    strip_input_units=True, output_unit=None
+    )
+def download_tiles(
+        lon_min, lon_max, lat_min, lat_max, max_workers=4, overwrite=False
+        ):
+    '''
+    Download all SRTM tiles within a bounding box (concurrently).
+
+    Tiles are downloaded from the server `~pycraf.pathprof.SrtmConf.server`
+    into `~pycraf.pathprof.SrtmConf.srtm_dir`. Several zip files are
+    fetched in parallel. Tiles that are contained in the same zip file
+    (Viewfinder Panoramas) are only downloaded once.
+
+    It is safe to run this function in several processes at the same time
+    (e.g., on a cluster with a shared file system): each zip file is
+    protected by a lock file and extracted tiles are moved into place
+    atomically, such that other processes never see partial files.
+
+    Parameters
+    ----------
+    lon_min, lon_max : `~astropy.units.Quantity`
+        Longitude range of the bounding box [deg]. If `lon_min > lon_max`,
+        the box is assumed to cross the anti-meridian.
+    lat_min, lat_max : `~astropy.units.Quantity`
+        Latitude range of the bounding box [deg]
+    max_workers : int, optional
+        Maximal number of concurrent downloads. (default: 4)
+    overwrite : bool, optional
+        If True, tiles that are already present in the SRTM directory are
+        downloaded again. (default: False)
+
+    Returns
+    -------
+    tiles : list of tuple(int, int)
+        Tile coordinates (lower left corner in deg) of all downloaded
+        tiles. Tiles, which are not available on the server (e.g., ocean
+        tiles), are not contained.
+
+    Notes
+    -----
+    For many paths, use the bounding box of all paths (made somewhat
+    larger, as geodesics do not follow lines of constant latitude).
+    '''
+
+    return _download_tiles(
+        _bbox_tiles(lon_min, lon_max, lat_min, lat_max),
+        max_workers=max_workers, overwrite=overwrite,
+        )
 
 
 def _extract_hgt_coords(hgt_name):
@@ -432,17 +897,17 @@ def _get_hgt_diskpath(tile_name):
     # check, if a tile already exists in srtm directory (recursive)
 
     srtm_dir = SrtmConf.srtm_dir
-    _files = glob.glob(os.path.join(srtm_dir, '**', tile_name), recursive=True)
+    entries = _get_tile_index(srtm_dir).lookup(tile_name)
 
-    if len(_files) > 1:
+    if len(entries) > 1:
         raise IOError(
             '{} exists {} times in {} and its sub-directories'.format(
-                tile_name, len(_files), srtm_dir
+                tile_name, len(entries), srtm_dir
                 ))
-    elif len(_files) == 0:
+    elif len(entries) == 0:
         return None
     else:
-        return _files[0]
+        return entries[0].path
 
 
 def get_hgt_file(ilon, ilat):
@@ -469,69 +934,334 @@ def get_hgt_file(ilon, ilat):
     return hgt_file
 
 
-def get_tile_data(ilon, ilat):
-    # angles in deg
+def _get_tile_mmap(ilon, ilat):
+    # memory-map the raw tile (big-endian int16, north-up)
+    # no copy is made; the OS page cache is shared between processes,
+    # such that many workers accessing the same tiles only cost one set
+    # of tiles in (resident) memory
 
     try:
-        hgt_file = get_hgt_file(ilon, ilat)
-        # need to run check after get_hgt_file, because download could happen
-        _check_consistent_tile_sizes(SrtmConf.srtm_dir)
-        tile = np.fromfile(hgt_file, dtype='>i2')
-        tile_size = int(np.sqrt(tile.size) + 0.5)
-        hgt_res = 90. * 1200 / (tile_size - 1)
-        SrtmConf.set(tile_size=tile_size, _do_validate=False)
-        SrtmConf.set(hgt_res=hgt_res, _do_validate=False)
-        tile = tile.reshape((tile_size, tile_size))[::-1]
-
-        bad_mask = (tile == 32768) | (tile == -32768)
-        tile = tile.astype(np.float32)
-        tile[bad_mask] = np.nan
+        if SrtmConf.mosaic is not None:
+            # tile as (native) little-endian array
+            tile = _get_mosaic_tile(ilon, ilat)
+        else:
+            hgt_file = get_hgt_file(ilon, ilat)
+            # need to run check after get_hgt_file,
+            # because download could happen
+            tile_size = _check_consistent_tile_sizes(SrtmConf.srtm_dir)
+            _set_tile_size(tile_size)
+            tile = np.memmap(
+                hgt_file, dtype='>i2', mode='r',
+                shape=(tile_size, tile_size)
+                )
 
     except TileNotAvailableOnServerError:
         # always use very small tile size for zero tiles
         # (just enough to make spline interpolation work)
-        tile_size = 5
-        tile = np.zeros((tile_size, tile_size), dtype=np.float32)
+        tile = np.zeros((5, 5), dtype='>i2')
 
     except TileNotAvailableOnDiskError:
         # also set to zero, but raise a warning
-        tile_size = 5
-        tile = np.zeros((tile_size, tile_size), dtype=np.float32)
+        tile = np.zeros((5, 5), dtype='>i2')
 
         tile_name = _hgt_filename(ilon, ilat)
-        srtm_dir = SrtmConf.srtm_dir
+        if SrtmConf.mosaic is not None:
+            location = 'mosaic: {}'.format(SrtmConf.mosaic)
+        else:
+            location = 'directory: {}'.format(SrtmConf.srtm_dir)
         warnings.warn(
             '''
 No hgt-file found for ({}d, {}d) - was looking for file {}
-in directory: {}
+in {}
 Will set terrain heights in this area to zero. Note, you can have pycraf
 download missing tiles automatically - just use "pycraf.pathprof.SrtmConf"
-(see its documentation).'''.format(ilon, ilat, tile_name, srtm_dir),
+(see its documentation).'''.format(ilon, ilat, tile_name, location),
             category=TileNotAvailableOnDiskWarning,
             stacklevel=1,
             )
 
+    return tile
+
+
+def _set_tile_size(tile_size):
+
+    hgt_res = 90. * 1200 / (tile_size - 1)
+    SrtmConf.set(tile_size=tile_size, _do_validate=False)
+    SrtmConf.set(hgt_res=hgt_res, _do_validate=False)
+
+
+def get_tile_data(ilon, ilat):
+    # angles in deg
+
+    tile = _get_tile_mmap(ilon, ilat)
+    tile_size = tile.shape[0]
+
+    # this creates a (float) copy of the tile; for interpolation, use
+    # the memory-mapped data directly (see _MappedTileInterpolator)
+    bad_mask = tile == -32768
+    tile = tile[::-1].astype(np.float32)
+    tile[bad_mask[::-1]] = np.nan
+
     dx = dy = 1. / (tile_size - 1)
     x, y = np.ogrid[0:tile_size, 0:tile_size]
     lons, lats = x * dx + ilon, y * dy + ilat
     return lons, lats, tile
 
 
+class _MappedTileInterpolator(object):
+    '''
+    Nearest-neighbor or bi-linear interpolation on raw tile data.
+
+    Works directly on the (memory-mapped) big-endian int16 tile, as it is
+    stored in the ".hgt" files. Only the pixels needed for the requested
+    positions are read and converted to float; voids are set to zero
+    (same as `~numpy.nan_to_num` applied to the float tile). The call
+    signature is compatible with `~scipy.interpolate.RegularGridInterpolator`.
+    '''
+
+    def __init__(self, ilon, ilat, tile, method='linear'):
+
+        if method not in ['nearest', 'linear']:
+            raise ValueError('Method "{}" is not supported.'.format(method))
+
+        self.ilon, self.ilat = ilon, ilat
+        self.tile = tile
+        self.method = method
+
+    def __call__(self, xi):
+
+        lons, lats = np.broadcast_arrays(*xi)
+        shape = lons.shape
+        lons = np.ascontiguousarray(lons, dtype=np.float64).ravel()
+        lats = np.ascontiguousarray(lats, dtype=np.float64).ravel()
+        heights = np.empty(lons.size, dtype=np.float64)
+
+        cysrtm.sample_tiles_cython(
+            lons, lats,
+            np.arange(lons.size, dtype=np.int64),
+            np.zeros(lons.size, dtype=np.int32),
+            [self.tile],
+            np.array([self.ilon], dtype=np.int32),
+            np.array([self.ilat], dtype=np.int32),
+            heights,
+            method=self.method,
+            )
+
+        return heights.reshape(shape)
+
+
+TileCacheInfo = namedtuple(
+    'TileCacheInfo', 'hits misses evictions tiles nbytes max_bytes'
+    )
+
+
+def _footprint(obj):
+    # (approximate) memory footprint of cached objects in bytes
+
+    if isinstance(obj, _MappedTileInterpolator):
+        return obj.tile.nbytes
+    elif isinstance(obj, RectBivariateSpline):
+        return sum(np.asarray(a).nbytes for a in obj.tck)
+    elif isinstance(obj, np.ndarray):
+        return obj.nbytes
+
+    return 0
+
+
+class _TileCache(object):
+    '''
+    Least-recently used cache with a memory budget (in bytes).
+
+    Items are evicted (least recently used first) as long as the total
+    footprint exceeds the budget. An item larger than the budget is
+    returned, but not stored. The cache is thread-safe.
+    '''
+
+    def __init__(self, max_bytes):
+
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.RLock()
+        self._hits = self._misses = self._evictions = 0
+
+    def get(self, key, loader):
+
+        with self._lock:
+            try:
+                value, nbytes = self._items[key]
+            except KeyError:
+                pass
+            else:
+                self._items.move_to_end(key)
+                self._hits += 1
+                return value
+
+            self._misses += 1
+
+        value = loader()
+        nbytes = _footprint(value)
+
+        with self._lock:
+            if key in self._items or nbytes > self.max_bytes:
+                return value
+
+            self._items[key] = (value, nbytes)
+            self._nbytes += nbytes
+            self._evict()
+
+        return value
+
+    def _evict(self):
+
+        while self._nbytes > self.max_bytes:
+            _, (_, nbytes) = self._items.popitem(last=False)
+            self._nbytes -= nbytes
+            self._evictions += 1
+
+    def resize(self, max_bytes):
+
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+
+        with self._lock:
+            self._items.clear()
+            self._nbytes = 0
+
+    def keys(self):
+
+        with self._lock:
+            return list(self._items.keys())
+
+    def info(self):
+
+        with self._lock:
+            return TileCacheInfo(
+                self._hits, self._misses, self._evictions,
+                len(self._items), self._nbytes, self.max_bytes
+                )
+
+
+_TILE_CACHE = _TileCache(SrtmConf.cache_bytes)
+
+
+def tile_cache_info():
+    '''
+    Statistics of the SRTM tile cache.
+
+    Returns
+    -------
+    info : `TileCacheInfo` namedtuple
+        Number of cache hits, misses and evictions, the number of tiles
+        currently in the cache, the memory footprint of these tiles and the
+        maximum allowed footprint (`~pycraf.pathprof.SrtmConf.cache_bytes`)
+        in bytes.
+
+    Notes
+    -----
+    For nearest-neighbor and linear interpolation the cached tiles are
+    memory-mapped. The footprint is the size of the mapped data, which
+    is the maximal memory (page cache) used, if all pixels were accessed.
+    '''
+
+    return _TILE_CACHE.info()
+
+
+def clear_tile_cache():
+    '''
+    Remove all tiles from the SRTM tile cache.
+
+    This is usually not necessary, as changing the SRTM directory (or
+    download options) in `~pycraf.pathprof.SrtmConf` clears the cache
+    automatically.
+    '''
+
+    _TILE_CACHE.clear()
+
+
+@utils.ranged_quantity_input(
+    lon_min=(-180, 180, apu.deg),
+    lon_max=(-180, 180, apu.deg),
+    lat_min=(-90, 90, apu.deg),
+    lat_max=(-90, 90, apu.deg),
+    strip_input_units=True, output_unit=None
+    )
+def prefetch_tiles(lon_min, lon_max, lat_min, lat_max):
+    '''
+    Load all SRTM tiles within a bounding box into the tile cache.
+
+    Use this to warm the tile cache, e.g., before computing a large map
+    or many paths, such that no (slow) disk or network access happens
+    during the calculations. If `~pycraf.pathprof.SrtmConf.download` is
+    enabled, missing tiles will be downloaded.
+
+    Parameters
+    ----------
+    lon_min, lon_max : `~astropy.units.Quantity`
+        Longitude range of the bounding box [deg]. If `lon_min > lon_max`,
+        the box is assumed to cross the anti-meridian.
+    lat_min, lat_max : `~astropy.units.Quantity`
+        Latitude range of the bounding box [deg]
+
+    Returns
+    -------
+    tiles : list of tuple(int, int)
+        Tile coordinates (lower left corner in deg) of all loaded tiles.
+
+    Notes
+    -----
+    Geodesics do not follow lines of constant latitude; for paths, the
+    bounding box should be chosen somewhat larger than the box spanned
+    by the path end points.
+
+    If the tiles don't fit into the cache (see
+    `~pycraf.pathprof.SrtmConf.cache_bytes`) a warning is raised.
+    '''
+
+    interp = SrtmConf.interp
+    spl_opts = SrtmConf.spline_opts if interp == 'spline' else None
+
+    evictions = _TILE_CACHE.info().evictions
+    tiles = _bbox_tiles(lon_min, lon_max, lat_min, lat_max)
+    for ilon, ilat in tiles:
+        get_tile_interpolator(ilon, ilat, interp, spl_opts)
+
+    if _TILE_CACHE.info().evictions > evictions:
+        warnings.warn(
+            'Tile cache too small to hold all {} tiles; consider increasing '
+            '"SrtmConf.cache_bytes".'.format(len(tiles))
+            )
+
+    return tiles
+
+
 # cannot use SrtmConf inside to query interp and spline_opts, because
 # caching might cause problems
-@lru_cache(maxsize=36, typed=False)
 def get_tile_interpolator(ilon, ilat, interp, spline_opts):
     # angles in deg
 
-    lons, lats, tile = get_tile_data(ilon, ilat)
-    # have to treat NaNs in some way; set to zero for now
-    tile = np.nan_to_num(tile)
+    return _TILE_CACHE.get(
+        (ilon, ilat, interp, spline_opts),
+        lambda: _get_tile_interpolator(ilon, ilat, interp, spline_opts),
+        )
+
+
+def _get_tile_interpolator(ilon, ilat, interp, spline_opts):
+    # angles in deg
 
     if interp in ['nearest', 'linear']:
-        _tile_interpolator = RegularGridInterpolator(
-            (lons[:, 0], lats[0]), tile.T, method=interp,
+        # operate on the memory-mapped tile, no copy needed
+        _tile_interpolator = _MappedTileInterpolator(
+            ilon, ilat, _get_tile_mmap(ilon, ilat), method=interp,
             )
     elif interp == 'spline':
+        lons, lats, tile = get_tile_data(ilon, ilat)
+        # have to treat NaNs in some way; set to zero for now
+        tile = np.nan_to_num(tile)
+
         kx = ky = spline_opts[0]
         s = spline_opts[1]
         _tile_interpolator = RectBivariateSpline(
@@ -541,32 +1271,684 @@ def get_tile_interpolator(ilon, ilat, interp, spline_opts):
     return _tile_interpolator
 
 
-def _srtm_height_data(lons, lats):
+_PYRAMID_DIRNAME = '.pycraf_pyramid'
+_PYRAMID_MANIFEST = 'pyramid.json'
+
+
+def _pyramid_dir(srtm_dir=None):
+
+    if srtm_dir is None:
+        srtm_dir = SrtmConf.srtm_dir
+
+    return os.path.join(srtm_dir, _PYRAMID_DIRNAME)
+
+
+def _pyramid_tile_size(tile_size, factor):
+
+    return int(round((tile_size - 1) / factor)) + 1
+
+
+def _make_pyramid_tile(ilon, ilat, factor):
+    # smooth the tile (plus a margin from neighboring tiles) with a Gaussian
+    # (FWHM = factor pixels) and resample to the coarser grid; returns a
+    # north-up int16 tile (native byte order)
+
+    tile_size = _check_consistent_tile_sizes(SrtmConf.srtm_dir)
+    sigma = factor / 2.35
+    margin = int(np.ceil(4 * sigma)) + 1
+    npix = tile_size - 1
+
+    block = np.zeros(
+        (tile_size + 2 * margin, tile_size + 2 * margin), dtype=np.float32
+        )
+
+    # neighbors; note, adjacent tiles share their edge rows/columns
+    for dy in [-1, 0, 1]:
+        for dx in [-1, 0, 1]:
+
+            with warnings.catch_warnings():
+                if dx != 0 or dy != 0:
+                    warnings.simplefilter(
+                        'ignore', TileNotAvailableOnDiskWarning
+                        )
+                tile = _get_tile_mmap(ilon + dx, ilat - dy)
+
+            if tile.shape[0] != tile_size:
+                # zero tile
+                continue
+
+            # block coordinates of the tile's first row/column
+            r0, c0 = margin + dy * npix, margin + dx * npix
+            br0, bc0 = max(r0, 0), max(c0, 0)
+            br1 = min(r0 + tile_size, block.shape[0])
+            bc1 = min(c0 + tile_size, block.shape[1])
+            if br1 <= br0 or bc1 <= bc0:
+                continue
+
+            sub = tile[br0 - r0:br1 - r0, bc0 - c0:bc1 - c0].astype(
+                np.float32
+                )
+            sub[sub == -32768] = 0.
+            block[br0:br1, bc0:bc1] = sub
+
+    block = ndimage.gaussian_filter(block, sigma, mode='nearest')
+
+    level_size = _pyramid_tile_size(tile_size, factor)
+    coords = margin + np.arange(level_size) * npix / (level_size - 1)
+    rows, cols = np.meshgrid(coords, coords, indexing='ij')
+    level_tile = ndimage.map_coordinates(block, [rows, cols], order=1)
+
+    return np.clip(np.round(level_tile), -32767, 32767).astype(np.int16)
+
+
+def build_srtm_pyramid(levels=(3, 9, 27), overwrite=False):
+    '''
+    Create a pyramid of pre-smoothed SRTM tiles with lower resolution.
+
+    For each tile in the SRTM directory (see `~pycraf.pathprof.SrtmConf`)
+    and each pyramid level, the tile is smoothed with a Gaussian kernel,
+    whose full width at half maximum (FWHM) equals the resolution of the
+    level, and resampled to the lower resolution. The pyramid tiles are
+    stored in the (hidden) sub-directory ".pycraf_pyramid" of the SRTM
+    directory.
+
+    Profile and map extractors (e.g., `~pycraf.pathprof.srtm_height_profile`
+    or `~pycraf.pathprof.height_map_data`) automatically use the pyramid
+    if the requested distance step is sufficiently large. In this case,
+    the coarsest pyramid level with a resolution not larger than the
+    distance step is sampled instead of the full-resolution data, and
+    only the remaining smoothing (to the distance step) is applied along
+    the path. Otherwise, the full-resolution terrain data is sampled with
+    a third of the tile resolution and smoothed to the distance step
+    afterwards, which is much slower for long paths.
+
+    Parameters
+    ----------
+    levels : tuple of int, optional
+        Down-sampling factors with respect to the tile resolution
+        (default: (3, 9, 27), i.e., 9", 27", and 81" for 3" tiles)
+    overwrite : bool, optional
+        If False, existing pyramid tiles are not computed again.
+        (default: False)
+
+    Returns
+    -------
+    pyramid_dir : str
+        Directory of the pyramid.
+
+    Notes
+    -----
+    If the SRTM directory is modified (e.g., tiles are downloaded), the
+    pyramid should be re-built (missing pyramid tiles are computed on the
+    fly, if needed, but this is slow). Pyramid tiles are stored as
+    little-endian int16 numpy (".npy") files.
+    '''
+
+    levels = tuple(sorted(set(int(f) for f in levels)))
+    if len(levels) == 0 or levels[0] < 2:
+        raise ValueError('Pyramid levels must be integers larger than 1.')
+
+    srtm_dir = SrtmConf.srtm_dir
+    tile_size = _check_consistent_tile_sizes(srtm_dir)
+    hgt_res = 90. * 1200 / (tile_size - 1)
+    pyramid_dir = _pyramid_dir(srtm_dir)
+    tile_names = _get_tile_index(srtm_dir).tile_names()
+
+    for factor in levels:
+
+        level_dir = os.path.join(pyramid_dir, 'L{:d}'.format(factor))
+        os.makedirs(level_dir, exist_ok=True)
+
+        for tile_name in tile_names:
+
+            fname = os.path.join(level_dir, tile_name[:-4] + '.npy')
+            if os.path.exists(fname) and not overwrite:
+                continue
+
+            ilon, ilat = _extract_hgt_coords(tile_name)
+            level_tile = _make_pyramid_tile(ilon, ilat, factor)
+            # write atomically, another process may read the file
+            tmp_name = fname + '.{:d}.tmp'.format(os.getpid())
+            with open(tmp_name, 'wb') as f:
+                np.save(f, level_tile.astype('<i2'))
+            os.replace(tmp_name, fname)
+
+    manifest = os.path.join(pyramid_dir, _PYRAMID_MANIFEST)
+    with open(manifest, 'w') as f:
+        json.dump({
+            'levels': levels, 'tile_size': tile_size, 'hgt_res': hgt_res
+            }, f)
+
+    # the file stamp may not change, if the manifest is rewritten quickly
+    _PYRAMID_INFOS.pop(manifest, None)
+    _TILE_CACHE.clear()
+
+    return pyramid_dir
+
+
+# parsed manifests, with the (mtime, size) stamp of the file
+_PYRAMID_INFOS = {}
+
+
+def _pyramid_info(srtm_dir=None):
+    # returns None, if there is no pyramid
+
+    manifest = os.path.join(_pyramid_dir(srtm_dir), _PYRAMID_MANIFEST)
+    try:
+        stat = os.stat(manifest)
+    except OSError:
+        _PYRAMID_INFOS.pop(manifest, None)
+        return None
+
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    cached = _PYRAMID_INFOS.get(manifest, None)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    try:
+        with open(manifest, 'r') as f:
+            info = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    _PYRAMID_INFOS[manifest] = (stamp, info)
+
+    return info
+
+
+def _pyramid_level(step):
+    '''
+    Coarsest pyramid level (factor) with resolution <= step [m].
+
+    Returns None, if the pyramid is disabled, doesn't exist, or no level
+    is suitable.
+    '''
+
+    if not SrtmConf.pyramid or SrtmConf.mosaic is not None:
+        return None
+
+    info = _pyramid_info()
+    if info is None:
+        return None
+
+    tile_size, hgt_res = info['tile_size'], info['hgt_res']
+    level = None
+    for factor in info['levels']:
+        level_size = _pyramid_tile_size(tile_size, factor)
+        if hgt_res * (tile_size - 1) / (level_size - 1) <= step:
+            level = factor
+
+    return level
+
+
+def _get_pyramid_tile(ilon, ilat, factor):
+
+    tile_name = _hgt_filename(ilon, ilat)
+    fname = os.path.join(
+        _pyramid_dir(), 'L{:d}'.format(factor), tile_name[:-4] + '.npy'
+        )
+
+    try:
+        return np.load(fname, mmap_mode='r')
+    except OSError:
+        pass
+
+    try:
+        get_hgt_file(ilon, ilat)
+    except (TileNotAvailableOnServerError, TileNotAvailableOnDiskError):
+        # zero tile (raises warning, if appropriate)
+        return _get_tile_mmap(ilon, ilat)
+
+    # not part of the pyramid (yet); compute on the fly
+    return _make_pyramid_tile(ilon, ilat, factor)
+
+
+# Mosaic file layout (all little-endian):
+#   - header (see _MOSAIC_HEADER)
+#   - block data, int16, north-up; blocks overlap by one pixel (as
+#     neighboring tiles do); optionally zlib compressed
+#   - tile table (_MOSAIC_TILE), followed by block table (_MOSAIC_BLOCK);
+#     the blocks of each tile are stored consecutively (row-major, with
+#     the south-western block first)
+_MOSAIC_MAGIC = b'PYCRAFMS'
+_MOSAIC_VERSION = 1
+_MOSAIC_HEADER = np.dtype([
+    ('magic', 'S8'), ('version', '<u4'), ('tile_size', '<u4'),
+    ('block_size', '<u4'), ('compression', '<u4'), ('num_tiles', '<u4'),
+    ('reserved', '<u4'), ('index_offset', '<u8'),
+    ])
+_MOSAIC_TILE = np.dtype([
+    ('ilon', '<i2'), ('ilat', '<i2'), ('first_block', '<u4'),
+    ])
+_MOSAIC_BLOCK = np.dtype([('offset', '<u8'), ('nbytes', '<u8')])
+
+
+def _block_bounds(tile_size, block_size, by, bx):
+    # pixel range (inclusive) of block (by, bx); y counts from south
+
+    npix = tile_size - 1
+    y0, x0 = by * block_size, bx * block_size
+    y1, x1 = min(y0 + block_size, npix), min(x0 + block_size, npix)
+
+    return y0, y1, x0, x1
+
+
+def build_srtm_mosaic(filename, block_size=240, compress=False):
+    '''
+    Convert all tiles in the SRTM directory into a single mosaic file.
+
+    The mosaic contains all tiles of the SRTM directory (see
+    `~pycraf.pathprof.SrtmConf`), including sub-directories, and an
+    index. Tiles are split into blocks, which are stored as little-endian
+    int16 data and can optionally be compressed. To use a mosaic instead
+    of the SRTM directory, do::
+
+        SrtmConf.set(mosaic=filename)
+
+    Height queries then only need to read the blocks covering the
+    requested positions from a single (memory-mapped) file.
+
+    Parameters
+    ----------
+    filename : str
+        Output file name. If the file exists, it is overwritten.
+    block_size : int, optional
+        Block size in pixels. If it is larger than the tile size, each
+        tile is stored as a single block. (default: 240, i.e., 5 x 5
+        blocks for 3" tiles)
+    compress : bool, optional
+        If True, compress blocks with zlib (deflate). This saves disk space,
+        but blocks have to be decompressed on each access. Without
+        compression, no data is copied (memory-mapping). (default: False)
+
+    Returns
+    -------
+    num_tiles : int
+        Number of tiles in the mosaic.
+    '''
+
+    block_size = int(block_size)
+    if block_size < 1:
+        raise ValueError('"block_size" must be a positive integer.')
+
+    srtm_dir = SrtmConf.srtm_dir
+    tile_size = _check_consistent_tile_sizes(srtm_dir)
+    npix = tile_size - 1
+    nblocks = -(-npix // block_size)
+    tile_names = _get_tile_index(srtm_dir).tile_names()
+
+    tiles = np.zeros(len(tile_names), dtype=_MOSAIC_TILE)
+    blocks = np.zeros(len(tile_names) * nblocks ** 2, dtype=_MOSAIC_BLOCK)
+
+    # write atomically, another process may read the file
+    tmp_name = filename + '.{:d}.tmp'.format(os.getpid())
+    with open(tmp_name, 'wb') as f:
+
+        f.write(bytes(_MOSAIC_HEADER.itemsize))
+
+        for i, tile_name in enumerate(tile_names):
+
+            ilon, ilat = _extract_hgt_coords(tile_name)
+            # raises IOError for duplicates
+            hgt_file = _get_hgt_diskpath(tile_name)
+
+            tile = np.fromfile(hgt_file, dtype='>i2').reshape(
+                (tile_size, tile_size)
+                ).astype('<i2')
+            tiles[i] = (ilon, ilat, i * nblocks ** 2)
+
+            for by in range(nblocks):
+                for bx in range(nblocks):
+
+                    y0, y1, x0, x1 = _block_bounds(
+                        tile_size, block_size, by, bx
+                        )
+                    data = tile[npix - y1:npix - y0 + 1, x0:x1 + 1].tobytes()
+                    if compress:
+                        data = zlib.compress(data)
+
+                    blocks[i * nblocks ** 2 + by * nblocks + bx] = (
+                        f.tell(), len(data)
+                        )
+                    f.write(data)
+
+        header = np.array([(
+            _MOSAIC_MAGIC, _MOSAIC_VERSION, tile_size, block_size,
+            int(compress), len(tile_names), 0, f.tell(),
+            )], dtype=_MOSAIC_HEADER)
+        f.write(tiles.tobytes())
+        f.write(blocks.tobytes())
+        f.seek(0)
+        f.write(header.tobytes())
+
+    os.replace(tmp_name, filename)
+
+    return len(tile_names)
+
+
+class _MosaicReader(object):
+    '''
+    Read access to a mosaic file (see `build_srtm_mosaic`).
+
+    The file is memory-mapped once. Uncompressed blocks are returned as
+    views into the mapped data (no copy).
+    '''
+
+    def __init__(self, filename):
+
+        self.filename = filename
+        stat = os.stat(filename)
+        self.stamp = (stat.st_mtime_ns, stat.st_size)
+
+        if stat.st_size < _MOSAIC_HEADER.itemsize:
+            raise ValueError('"{}" is not a mosaic file.'.format(filename))
+
+        self._data = data = np.memmap(filename, dtype=np.uint8, mode='r')
+        header = np.frombuffer(
+            data[:_MOSAIC_HEADER.itemsize], dtype=_MOSAIC_HEADER
+            )[0]
+        if header['magic'] != _MOSAIC_MAGIC:
+            raise ValueError('"{}" is not a mosaic file.'.format(filename))
+        if header['version'] != _MOSAIC_VERSION:
+            raise ValueError(
+                'Unsupported mosaic version: {}'.format(header['version'])
+                )
+
+        self.tile_size = int(header['tile_size'])
+        self.block_size = int(header['block_size'])
+        self.compressed = bool(header['compression'])
+        self.nblocks = -(-(self.tile_size - 1) // self.block_size)
+
+        num_tiles = int(header['num_tiles'])
+        offset = int(header['index_offset'])
+        tiles = np.frombuffer(
+            data, dtype=_MOSAIC_TILE, count=num_tiles, offset=offset
+            )
+        offset += tiles.nbytes
+        self._blocks = np.frombuffer(
+            data, dtype=_MOSAIC_BLOCK, count=num_tiles * self.nblocks ** 2,
+            offset=offset,
+            )
+        self._tiles = dict(
+            ((int(t['ilon']), int(t['ilat'])), int(t['first_block']))
+            for t in tiles
+            )
+
+    def has_tile(self, ilon, ilat):
+
+        return (ilon, ilat) in self._tiles
+
+    def block_coords(self, lons, lats):
+        # block indices (by, bx) for given positions
+
+        npix = self.tile_size - 1
+        x = np.clip(np.floor((lons - np.floor(lons)) * npix), 0, npix - 1)
+        y = np.clip(np.floor((lats - np.floor(lats)) * npix), 0, npix - 1)
+
+        return (
+            (y // self.block_size).astype(np.int64),
+            (x // self.block_size).astype(np.int64),
+            )
+
+    def block(self, ilon, ilat, by, bx):
+        '''Block data, north-up (int16, little-endian).'''
+
+        y0, y1, x0, x1 = _block_bounds(
+            self.tile_size, self.block_size, by, bx
+            )
+        shape = (y1 - y0 + 1, x1 - x0 + 1)
+        offset, nbytes = self._blocks[
+            self._tiles[(ilon, ilat)] + by * self.nblocks + bx
+            ]
+        offset, nbytes = int(offset), int(nbytes)
+
+        if self.compressed:
+            buf = zlib.decompress(self._data[offset:offset + nbytes])
+            return np.frombuffer(buf, dtype='<i2').reshape(shape)
+
+        return np.frombuffer(
+            self._data, dtype='<i2', count=nbytes // 2, offset=offset
+            ).reshape(shape)
+
+    def tile(self, ilon, ilat):
+        '''Full tile data, north-up (int16, little-endian).'''
+
+        if self.nblocks == 1:
+            return self.block(ilon, ilat, 0, 0)
+
+        npix = self.tile_size - 1
+        tile = np.empty((self.tile_size, self.tile_size), dtype='<i2')
+        for by in range(self.nblocks):
+            for bx in range(self.nblocks):
+                y0, y1, x0, x1 = _block_bounds(
+                    self.tile_size, self.block_size, by, bx
+                    )
+                tile[npix - y1:npix - y0 + 1, x0:x1 + 1] = self.block(
+                    ilon, ilat, by, bx
+                    )
+
+        return tile
+
+
+_MOSAIC_READERS = {}
+
+
+def _get_mosaic_reader(filename=None):
+
+    if filename is None:
+        filename = SrtmConf.mosaic
+
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        raise ValueError('Mosaic file "{}" not found.'.format(filename))
+
+    reader = _MOSAIC_READERS.get(filename, None)
+    if reader is None or reader.stamp != (stat.st_mtime_ns, stat.st_size):
+        reader = _MOSAIC_READERS[filename] = _MosaicReader(filename)
+
+    return reader
+
+
+def _get_mosaic_tile(ilon, ilat):
+
+    reader = _get_mosaic_reader()
+    if not reader.has_tile(ilon, ilat):
+        # raises TileNotAvailableOnServerError, if applicable
+        _check_availability(ilon, ilat)
+        raise TileNotAvailableOnDiskError(
+            'Tile ({}d, {}d) not found in mosaic {}'.format(
+                ilon, ilat, reader.filename
+                ))
+
+    _set_tile_size(reader.tile_size)
+
+    return reader.tile(ilon, ilat)
+
+
+def _terrain_state():
+    '''
+    Description of the current terrain data source (a tuple of str).
+
+    This contains all `~pycraf.pathprof.SrtmConf` options which influence
+    terrain heights, plus a version stamp of the terrain data itself
+    (the tile index fingerprint, the pyramid manifest, or the mosaic
+    file). It changes, whenever queried heights could change.
+    '''
+
+    def _stamp(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return 'missing'
+        return '{} {}'.format(stat.st_size, stat.st_mtime_ns)
+
+    state = [
+        'download={}'.format(SrtmConf.download),
+        'server={}'.format(SrtmConf.server),
+        'interp={}'.format(SrtmConf.interp),
+        'spline_opts={}'.format(SrtmConf.spline_opts),
+        ]
+
+    if SrtmConf.mosaic is not None:
+        mosaic = os.path.abspath(SrtmConf.mosaic)
+        state += ['mosaic={}'.format(mosaic), _stamp(mosaic)]
+        return tuple(state)
+
+    srtm_dir = os.path.abspath(SrtmConf.srtm_dir)
+    state += [
+        'srtm_dir={}'.format(srtm_dir),
+        _get_tile_index(srtm_dir).fingerprint(),
+        ]
+    if SrtmConf.pyramid:
+        manifest = os.path.join(_pyramid_dir(srtm_dir), _PYRAMID_MANIFEST)
+        state += ['pyramid', _stamp(manifest)]
+
+    return tuple(state)
+
+
+def _tile_buckets(lons, lats, sub_keys=None, num_sub_keys=1):
+    # group positions by tile (single pass, via argsort of a tile key)
+    # returns tile coordinates (ilon, ilat), the processing order and
+    # the tile index (slot) for each processed position
+    # optionally, tiles can be sub-divided (e.g., into blocks), in
+    # which case the sub_keys (for the first position of each group)
+    # are returned in addition
+
+    ilons = np.floor(lons).astype(np.int64)
+    ilats = np.floor(lats).astype(np.int64)
+    keys = (ilats + 90) * 361 + (ilons + 180)
+    if sub_keys is not None:
+        keys = keys * num_sub_keys + sub_keys
+
+    order = np.argsort(keys, kind='mergesort')
+    sorted_keys = keys[order]
+    is_first = np.empty(sorted_keys.size, dtype=bool)
+    is_first[:1] = True
+    np.not_equal(sorted_keys[1:], sorted_keys[:-1], out=is_first[1:])
+    slots = (np.cumsum(is_first) - 1).astype(np.int32)
+
+    first = order[is_first]
+    starts = np.append(np.flatnonzero(is_first), sorted_keys.size)
+
+    results = (
+        ilons[first].astype(np.int32), ilats[first].astype(np.int32),
+        order, slots, starts
+        )
+
+    if sub_keys is not None:
+        results += (sub_keys[first], )
+
+    return results
+
+
+def _sample_mosaic(lons, lats, heights, interp):
+    # sample mosaic blocks with the compiled sampler
+
+    reader = _get_mosaic_reader()
+    by, bx = reader.block_coords(lons, lats)
+    tile_ilons, tile_ilats, order, slots, _, sub_keys = _tile_buckets(
+        lons, lats, sub_keys=by * reader.nblocks + bx,
+        num_sub_keys=reader.nblocks ** 2,
+        )
+
+    npix = np.empty(tile_ilons.size, dtype=np.int32)
+    x_offsets = np.zeros(tile_ilons.size, dtype=np.int32)
+    y_offsets = np.zeros(tile_ilons.size, dtype=np.int32)
+    tiles = []
+    zero_tiles = {}
+    for i, (uilon, uilat, sub_key) in enumerate(
+            zip(tile_ilons, tile_ilats, sub_keys)
+            ):
+
+        if not reader.has_tile(uilon, uilat):
+            if (uilon, uilat) not in zero_tiles:
+                zero_tiles[(uilon, uilat)] = _get_tile_mmap(uilon, uilat)
+            tiles.append(zero_tiles[(uilon, uilat)])
+            npix[i] = tiles[-1].shape[0] - 1
+            continue
+
+        uby, ubx = divmod(int(sub_key), reader.nblocks)
+        tiles.append(_TILE_CACHE.get(
+            ('mosaic', reader.filename, uilon, uilat, uby, ubx),
+            lambda: reader.block(uilon, uilat, uby, ubx),
+            ))
+        npix[i] = reader.tile_size - 1
+        y_offsets[i], _, x_offsets[i], _ = _block_bounds(
+            reader.tile_size, reader.block_size, uby, ubx
+            )
+
+    if len(zero_tiles) < tile_ilons.size:
+        _set_tile_size(reader.tile_size)
+
+    cysrtm.sample_tiles_cython(
+        lons, lats, order, slots, tiles, tile_ilons, tile_ilats,
+        heights, method=interp,
+        npix=npix, x_offsets=x_offsets, y_offsets=y_offsets,
+        )
+
+
+def _srtm_height_data(lons, lats, level=None):
     # angles in deg
+    # if level is given, use the pyramid tiles (with linear interpolation,
+    # unless interp == 'nearest')
 
-    # is there no way around constructing the full lon/lat grid?
     lons_g, lats_g = np.broadcast_arrays(lons, lats)
-    heights = np.empty(lons_g.shape, dtype=np.float32)
-
-    ilons = np.floor(lons).astype(np.int32)
-    ilats = np.floor(lats).astype(np.int32)
+    shape = lons_g.shape
+    lons_g = np.ascontiguousarray(lons_g, dtype=np.float64).ravel()
+    lats_g = np.ascontiguousarray(lats_g, dtype=np.float64).ravel()
+    heights = np.empty(lons_g.size, dtype=np.float64)
 
     interp = SrtmConf.interp
     spl_opts = SrtmConf.spline_opts
 
-    for uilon in np.unique(ilons):
-        for uilat in np.unique(ilats):
+    if SrtmConf.mosaic is not None and interp in ['nearest', 'linear']:
+        # block-wise access
+        _sample_mosaic(lons_g, lats_g, heights, interp)
+        return heights.reshape(shape)
 
-            mask = (ilons == uilon) & (ilats == uilat)
+    tile_ilons, tile_ilats, order, slots, starts = _tile_buckets(
+        lons_g, lats_g
+        )
+
+    if level is not None:
+
+        interp = 'nearest' if interp == 'nearest' else 'linear'
+        tiles = [
+            _TILE_CACHE.get(
+                ('pyramid', uilon, uilat, level),
+                lambda: _MappedTileInterpolator(
+                    uilon, uilat, _get_pyramid_tile(uilon, uilat, level)
+                    ),
+                ).tile
+            for uilon, uilat in zip(tile_ilons, tile_ilats)
+            ]
+        cysrtm.sample_tiles_cython(
+            lons_g, lats_g, order, slots, tiles, tile_ilons, tile_ilats,
+            heights, method=interp
+            )
 
-            if interp in ['nearest', 'linear']:
-                ifunc = get_tile_interpolator(uilon, uilat, interp, None)
-                heights[mask] = ifunc((lons_g[mask], lats_g[mask]))
-            elif interp == 'spline':
-                ifunc = get_tile_interpolator(uilon, uilat, interp, spl_opts)
-                heights[mask] = ifunc(lons_g[mask], lats_g[mask], grid=False)
+    elif interp in ['nearest', 'linear']:
+
+        tiles = [
+            get_tile_interpolator(uilon, uilat, interp, None).tile
+            for uilon, uilat in zip(tile_ilons, tile_ilats)
+            ]
+        cysrtm.sample_tiles_cython(
+            lons_g, lats_g, order, slots, tiles, tile_ilons, tile_ilats,
+            heights, method=interp
+            )
+
+    elif interp == 'spline':
+
+        for uilon, uilat, s, e in zip(
+                tile_ilons, tile_ilats, starts[:-1], starts[1:]
+                ):
+            ifunc = get_tile_interpolator(uilon, uilat, interp, spl_opts)
+            idx = order[s:e]
+            heights[idx] = ifunc(lons_g[idx], lats_g[idx], grid=False)
 
-    return heights
+    return heights.reshape(shape)
 
 
 @utils.ranged_quantity_input(
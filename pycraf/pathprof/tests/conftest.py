@@ -1,2 +1,51 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+
+import os
+import pytest
+import numpy as np
+from astropy import units as apu
+from astropy.utils.misc import NumpyRNGContext
+from ... import pathprof
+from ...pathprof import srtm
+
+
+@pytest.yield_fixture()
+def synthetic_terrain(tmpdir):
+    # writes two small (synthetic) tiles, (6d, 50d) and (7d, 50d), such
+    # that no download is needed; they are used as SRTM data during the
+    # test
+
+    srtm_dir = str(tmpdir.mkdir('srtm'))
+
+    with NumpyRNGContext(0):
+        for ilon in [6, 7]:
+            tile = np.random.randint(0, 500, (121, 121)).astype('>i2')
+            tile.tofile(os.path.join(srtm_dir, srtm._hgt_filename(ilon, 50)))
+
+    with srtm.SrtmConf.set(srtm_dir=srtm_dir):
+
+        # tile resolution is only known after first access
+        srtm.srtm_height_data(6.5 * apu.deg, 50.5 * apu.deg)
+
+        yield srtm_dir
+
+
+@pytest.fixture()
+def synthetic_map_data(synthetic_terrain):
+    # height_map_data on the synthetic terrain; by default, a small map
+    # is computed, other arguments can be given
+
+    def _map_data(
+            map_size_lon=180 * apu.arcsec, map_size_lat=150 * apu.arcsec,
+            **kwargs
+            ):
+
+        kwargs.setdefault('map_resolution', 6 * apu.arcsec)
+
+        return pathprof.height_map_data(
+            6.5 * apu.deg, 50.5 * apu.deg, map_size_lon, map_size_lat,
+            **kwargs
+            )
+
+    return _map_data
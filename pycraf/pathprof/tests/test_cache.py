@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import pytest
+from functools import partial
+import numpy as np
+from numpy.testing import assert_equal
+from astropy import units as apu
+from ... import pathprof
+from ...pathprof import cache, srtm
+
+
+@pytest.fixture()
+def cache_dirs(synthetic_terrain, tmpdir_factory):
+
+    cache_dir = str(tmpdir_factory.mktemp('hprof_cache'))
+
+    return synthetic_terrain, cache_dir
+
+
+def _path_data():
+
+    return pathprof.height_path_data(
+        6.2 * apu.deg, 50.5 * apu.deg, 6.8 * apu.deg, 50.6 * apu.deg,
+        100 * apu.m, zone_t=pathprof.CLUTTER.URBAN,
+        )
+
+
+def _assert_equal_data(data, expected):
+
+    assert sorted(data) == sorted(expected)
+    for key in expected:
+        assert_equal(data[key], expected[key])
+
+
+def test_hprof_cache(cache_dirs, synthetic_map_data):
+
+    srtm_dir, cache_dir = cache_dirs
+    _map_data = partial(synthetic_map_data, zone_r=pathprof.CLUTTER.URBAN)
+
+    expected_map = _map_data()
+    expected_path = _path_data()
+
+    with pathprof.HprofCacheConf.set(cache_dir=cache_dir):
+
+        info = pathprof.hprof_cache_info()
+        for i in range(2):
+            _assert_equal_data(_map_data(), expected_map)
+            _assert_equal_data(_path_data(), expected_path)
+
+        new_info = pathprof.hprof_cache_info()
+        assert new_info.misses - info.misses == 2
+        assert new_info.hits - info.hits == 2
+        assert new_info.entries == 2
+
+        # cached arrays are copy-on-write memory maps
+        hprof_data = _map_data()
+        assert isinstance(hprof_data['height_profs'], np.memmap)
+        assert hprof_data['lon_t'] == expected_map['lon_t']
+        hprof_data['height_profs'][...] = 0
+        _assert_equal_data(_map_data(), expected_map)
+
+        # other inputs or another interpolation => new entries
+        synthetic_map_data()
+        with srtm.SrtmConf.set(interp='nearest'):
+            _path_data()
+        assert pathprof.hprof_cache_info().entries == 4
+
+        # changed terrain data => new entry
+        tile = np.full((121, 121), 100, dtype='>i2')
+        tile.tofile(os.path.join(srtm_dir, srtm._hgt_filename(6, 51)))
+        info = pathprof.hprof_cache_info()
+        _path_data()
+        assert pathprof.hprof_cache_info().misses == info.misses + 1
+
+        # generic paths don't depend on terrain
+        generic_data = pathprof.height_path_data_generic(
+            10 * apu.km, 50 * apu.m, 6 * apu.deg, 50 * apu.deg,
+            )
+        info = pathprof.hprof_cache_info()
+        _assert_equal_data(
+            pathprof.height_path_data_generic(
+                10 * apu.km, 50 * apu.m, 6 * apu.deg, 50 * apu.deg,
+                ),
+            generic_data,
+            )
+        assert pathprof.hprof_cache_info().hits == info.hits + 1
+
+        pathprof.clear_hprof_cache()
+        assert pathprof.hprof_cache_info().entries == 0
+
+    # cache disabled
+    info = pathprof.hprof_cache_info()
+    hprof_data = _map_data()
+    assert not isinstance(hprof_data['height_profs'], np.memmap)
+    assert pathprof.hprof_cache_info()[:2] == info[:2]
+
+
+def test_hprof_cache_eviction(cache_dirs, synthetic_map_data):
+
+    srtm_dir, cache_dir = cache_dirs
+
+    nbytes = sum(a.nbytes for a in _path_data().values() if (
+        isinstance(a, np.ndarray)
+        ))
+
+    with pathprof.HprofCacheConf.set(
+            cache_dir=cache_dir, max_bytes=int(2.5 * nbytes)
+            ):
+
+        for lon_r in [6.7, 6.8, 6.9]:
+            pathprof.height_path_data(
+                6.2 * apu.deg, 50.5 * apu.deg,
+                lon_r * apu.deg, 50.6 * apu.deg,
+                100 * apu.m,
+                )
+
+        info = pathprof.hprof_cache_info()
+        assert info.entries == 2
+        assert info.nbytes <= info.max_bytes
+
+        # entries larger than the limit are not stored
+        synthetic_map_data()
+        assert pathprof.hprof_cache_info().entries == 2
+
+        pathprof.HprofCacheConf.set(max_bytes=nbytes)
+        assert pathprof.hprof_cache_info().entries == 0
+
+
+def test_hprof_cache_terrain_change(cache_dirs):
+
+    srtm_dir, cache_dir = cache_dirs
+
+    def compute():
+        # terrain data changes during the computation
+        tile = np.full((121, 121), 100, dtype='>i2')
+        tile.tofile(os.path.join(srtm_dir, srtm._hgt_filename(6, 51)))
+        srtm.refresh_tile_index(srtm_dir)
+        return {'heights': np.zeros(10)}
+
+    with pathprof.HprofCacheConf.set(cache_dir=cache_dir):
+
+        info = pathprof.hprof_cache_info()
+        cache._cached('test', (1, ), compute)
+        # result is not stored (neither for the old nor the new state)
+        assert pathprof.hprof_cache_info().entries == info.entries
+
+        cache._cached('test', (1, ), lambda: {'heights': np.ones(10)})
+        assert pathprof.hprof_cache_info().entries == info.entries + 1
+
+
+def test_hprof_cache_conf():
+
+    with pytest.raises(ValueError):
+        pathprof.HprofCacheConf.set(cache_dir=1)
+
+    with pytest.raises(ValueError):
+        pathprof.HprofCacheConf.set(max_bytes=-1)
+
+    with pytest.raises(TypeError):
+        cache._cache_key('test', (object(), ), False)
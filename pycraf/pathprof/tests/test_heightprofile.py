@@ -6,6 +6,8 @@
 # from __future__ import print_function
 # from __future__ import unicode_literals
 
+import os
+import json
 import pytest
 from functools import partial
 import numpy as np
@@ -90,3 +92,138 @@ def test_srtm_height_map():
             [322.49667358, 467.42672729, 438.44268799, 335.00000000],
             ]) * apu.m
         )
+
+
+def test_srtm_height_profile_pyramid(tmpdir):
+
+    from ...pathprof import srtm, heightprofile
+
+    # smooth synthetic terrain (121 x 121 pixels, i.e., 900-m resolution)
+    srtm_dir = str(tmpdir)
+    x, y = np.meshgrid(np.linspace(0, 1, 121), np.linspace(1, 0, 121))
+    for ilon in [12, 13]:
+        tile = 1000 + 500 * np.sin(2 * np.pi * (x + ilon) / 0.5) * np.cos(
+            2 * np.pi * y / 0.7
+            )
+        tile.astype('>i2').tofile(
+            os.path.join(srtm_dir, srtm._hgt_filename(ilon, 50))
+            )
+
+    args = (12.1 * apu.deg, 50.1 * apu.deg, 13.9 * apu.deg, 50.9 * apu.deg)
+
+    with srtm.SrtmConf.set(srtm_dir=srtm_dir):
+
+        # no pyramid yet
+        assert srtm._pyramid_level(5000.) is None
+        # tile resolution is only known after first access
+        srtm.srtm_height_data(12.5 * apu.deg, 50.5 * apu.deg)
+        assert_allclose(srtm.SrtmConf.hgt_res, 900.)
+        heights = pathprof.srtm_height_profile(*args, 5 * apu.km)[4]
+
+        # profiles are oversampled at a third of the terrain resolution,
+        # maps (coarse) at a third of the step
+        level, hstep, width = heightprofile._height_sampling(5000.)
+        assert level is None
+        assert_allclose((hstep, width), (300., 5000. / 2.35))
+        level, hstep, width = heightprofile._height_sampling(
+            5000., coarse=True
+            )
+        assert level is None
+        assert_allclose((hstep, width), (5000. / 3., 5000. / 2.35))
+
+        pyramid_dir = pathprof.build_srtm_pyramid(levels=(3, 9))
+        assert sorted(os.listdir(os.path.join(pyramid_dir, 'L9'))) == [
+            'N50E012.npy', 'N50E013.npy'
+            ]
+        level_tile = np.load(os.path.join(pyramid_dir, 'L3', 'N50E012.npy'))
+        assert level_tile.shape == (41, 41)
+        assert level_tile.dtype == np.dtype('<i2')
+
+        # pyramid tiles are not part of the tile index
+        assert srtm._get_tile_index().tile_names() == [
+            'N50E012.hgt', 'N50E013.hgt'
+            ]
+
+        assert srtm._pyramid_level(1000.) is None
+        assert srtm._pyramid_level(2700.) == 3
+        assert srtm._pyramid_level(5000.) == 3
+        assert srtm._pyramid_level(8500.) == 9
+
+        level, hstep, _ = heightprofile._height_sampling(5000.)
+        assert level == 3
+        assert_allclose(hstep, 900.)
+        level, hstep, _ = heightprofile._height_sampling(5000., coarse=True)
+        assert level == 3
+        assert_allclose(hstep, 5000. / 3.)
+
+        # the manifest is only parsed again, if the file changes
+        info = srtm._pyramid_info()
+        assert srtm._pyramid_info() is info
+        manifest = os.path.join(pyramid_dir, srtm._PYRAMID_MANIFEST)
+        with open(manifest, 'w') as f:
+            json.dump(dict(info, levels=[3]), f)
+        stat = os.stat(manifest)
+        os.utime(manifest, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        assert srtm._pyramid_level(8500.) == 3
+        with open(manifest, 'w') as f:
+            json.dump(info, f)
+        assert srtm._pyramid_level(8500.) == 9
+
+        heights_pyr = pathprof.srtm_height_profile(*args, 5 * apu.km)[4]
+        # the pyramid tiles are only smoothed to the level resolution, the
+        # remainder is applied along the path (terrain amplitude is 500 m)
+        assert_quantity_allclose(heights_pyr, heights, atol=10 * apu.m)
+        assert not np.allclose(heights_pyr.value, heights.value)
+
+        with srtm.SrtmConf.set(pyramid=False):
+            assert srtm._pyramid_level(5000.) is None
+            heights2 = pathprof.srtm_height_profile(*args, 5 * apu.km)[4]
+            assert_quantity_allclose(heights2, heights)
+
+        # small steps don't use the pyramid
+        with srtm.SrtmConf.set(interp='nearest'):
+            heights3 = pathprof.srtm_height_profile(*args, 0.5 * apu.km)[4]
+            heights4 = srtm.srtm_height_data(
+                *pathprof.srtm_height_profile(*args, 0.5 * apu.km)[:2]
+                )
+            assert_quantity_allclose(heights3, heights4)
+
+
+@pytest.mark.parametrize('step', [100., 3000.])
+def test_srtm_height_profiles(tmpdir, step):
+
+    from ...pathprof import srtm
+
+    srtm_dir = str(tmpdir)
+    np.random.seed(0)
+    for ilon in [12, 13]:
+        tile = np.random.randint(0, 3000, (121, 121)).astype('>i2')
+        tile.tofile(os.path.join(srtm_dir, srtm._hgt_filename(ilon, 50)))
+
+    lon_t, lat_t = 12.1 * apu.deg, 50.1 * apu.deg
+    # last path has zero length
+    lon_r = np.array([13.9, 12.2, 12.15, 12.1]) * apu.deg
+    lat_r = np.array([[50.9], [50.2]]) * apu.deg
+
+    with srtm.SrtmConf.set(srtm_dir=srtm_dir):
+
+        srtm.srtm_height_data(12.5 * apu.deg, 50.5 * apu.deg)
+
+        results = pathprof.srtm_height_profiles(
+            lon_t, lat_t, lon_r, lat_r, step * apu.m
+            )
+        offsets = results[-1]
+        assert offsets.dtype == np.int64
+        assert offsets.shape == (9, )
+        assert offsets[0] == 0 and offsets[-1] == results[0].size
+
+        lon_r, lat_r = np.broadcast_arrays(lon_r, lat_r, subok=True)
+        for i, (lon, lat) in enumerate(zip(lon_r.flat, lat_r.flat)):
+
+            expected = pathprof.srtm_height_profile(
+                lon_t, lat_t, lon, lat, step * apu.m
+                )
+            sl = slice(offsets[i], offsets[i + 1])
+            for j, (r, e) in enumerate(zip(results, expected)):
+                r = r[i] if j in [2, 5, 6] else r[sl]
+                assert_quantity_allclose(r, e, atol=1.e-6 * e.unit)
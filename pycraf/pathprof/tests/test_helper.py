@@ -86,6 +86,31 @@ class TestHelper:
                 326.14456177, 329.69577705], cnv.dimless),
             )
 
+    def test_deltaN_N0_from_map_compiled(self):
+
+        # the compiled look-up must give the same results as scipy's
+        # bilinear interpolation on the grid
+        from scipy.interpolate import RegularGridInterpolator
+        from ...pathprof import cyprop
+
+        data = cyprop._refract_data
+        grid = (data['lons'][0], data['lats'][::-1, 0])
+
+        with NumpyRNGContext(1):
+            lon = np.random.uniform(-180, 360, 10000)
+            lat = np.random.uniform(-90, 90, 10000)
+        # grid nodes and edges
+        lon = np.concatenate([lon, np.arange(-180, 360.1, 1.5), [-0., 360.]])
+        lat = np.concatenate([lat, np.linspace(-90, 90, 361), [90., -90.]])
+
+        DN, N0 = cyprop._radiomet_data_cython(lon, lat)
+        for res, name in [(DN, 'dn50'), (N0, 'n050')]:
+            interp = RegularGridInterpolator(grid, data[name][::-1].T)
+            assert_equal(res, interp((lon % 360, lat)))
+
+        with pytest.raises(ValueError):
+            cyprop._radiomet_data_cython(0., 91.)
+
     def test_radiomet_data_for_pathcenter(self):
 
         pfunc = pathprof.radiomet_data_for_pathcenter
@@ -781,6 +781,535 @@ class TestPropagation:
         assert np.allclose(d_lr_path, results['d_lr'].value, atol=1.e-6)
 
 
+def test_losses_complete_batch(synthetic_terrain):
+
+    # synthetic height profiles (no SRTM data needed), with different
+    # lengths and parameters for each path
+    np.random.seed(0)
+    lon_t, lat_t = 6.8836 * apu.deg, 50.525 * apu.deg
+    lon_r = np.array([7.3334, 7.1, 6.9]) * apu.deg
+    lat_r = np.array([50.635, 50.6, 50.53]) * apu.deg
+    sizes = [301, 120, 5]
+    offsets = np.concatenate([[0], np.cumsum(sizes)])
+    dists = np.concatenate([np.arange(n) * 0.1 for n in sizes]) * apu.km
+    heights = np.concatenate([
+        200 + 100 * np.random.uniform(size=n) for n in sizes
+        ]) * apu.m
+    bearing = np.array([60., 70., 80.]) * apu.deg
+    backbearing = np.array([-120., -110., -100.]) * apu.deg
+
+    freq = np.array([1., 10., 30.])[:, np.newaxis] * apu.GHz
+    h_tg = np.array([20., 50., 5.]) * apu.m
+    time_percent = np.array([2., 10., 0.1])[:, np.newaxis] * apu.percent
+    zone_r = np.array([
+        pathprof.CLUTTER.UNKNOWN, pathprof.CLUTTER.URBAN,
+        pathprof.CLUTTER.SUBURBAN
+        ])
+
+    kwargs = dict(
+        temperature=290 * apu.K, pressure=980 * apu.hPa,
+        lon_t=lon_t, lat_t=lat_t, h_rg=30 * apu.m, hprof_step=100 * apu.m,
+        G_t=10 * cnv.dBi, zone_t=pathprof.CLUTTER.URBAN,
+        )
+
+    for version in [14, 16]:
+
+        # 3 x 3 combinations of frequency/time percent with 3 paths each
+        results = pathprof.losses_complete_batch(
+            freq=freq, lon_r=lon_r, lat_r=lat_r, h_tg=h_tg,
+            timepercent=time_percent, zone_r=zone_r, version=version,
+            hprof_dists=np.tile(dists, 3),
+            hprof_heights=np.tile(heights, 3),
+            hprof_offsets=np.concatenate([[0], np.cumsum(sizes * 3)]),
+            hprof_bearing=bearing, hprof_backbearing=backbearing,
+            **kwargs
+            )
+        assert results['L_b'].shape == (9, )
+        assert results['path_type'].dtype == np.int32
+
+        for i in range(9):
+            j, k = divmod(i, 3)
+            sl = slice(offsets[k], offsets[k + 1])
+            expected = pathprof.losses_complete(
+                freq=freq[j, 0], lon_r=lon_r[k], lat_r=lat_r[k],
+                h_tg=h_tg[k], timepercent=time_percent[j, 0],
+                zone_r=zone_r[k], version=version,
+                hprof_dists=dists[sl], hprof_heights=heights[sl],
+                hprof_bearing=bearing[k], hprof_backbearing=backbearing[k],
+                **kwargs
+                )
+            for key in expected:
+                assert_quantity_allclose(results[key][i], expected[key][0])
+
+    # profiles must have at least 5 steps
+    with pytest.raises(ValueError):
+        pathprof.losses_complete_batch(
+            freq=freq[0], lon_r=lon_r, lat_r=lat_r, h_tg=h_tg,
+            timepercent=time_percent[0],
+            hprof_dists=dists[:7], hprof_heights=heights[:7],
+            hprof_offsets=np.array([0, 3, 5, 7]),
+            hprof_bearing=bearing, hprof_backbearing=backbearing,
+            **kwargs
+            )
+
+    # profiles from (synthetic) SRTM data
+    results = pathprof.losses_complete_batch(
+        freq=freq[0], lon_r=lon_r, lat_r=lat_r, h_tg=h_tg,
+        timepercent=time_percent[0], **kwargs
+        )
+
+    for k in range(3):
+        expected = pathprof.losses_complete(
+            freq=freq[0], lon_r=lon_r[k], lat_r=lat_r[k], h_tg=h_tg[k],
+            timepercent=time_percent[0], **kwargs
+            )
+        for key in expected:
+            assert_quantity_allclose(results[key][k], expected[key][0])
+
+
+def test_losses_complete_layout():
+
+    # the path geometry is only processed once per unique combination of
+    # frequency, heights, version and clutter zones; results must not
+    # depend on the order of the array axes
+    np.random.seed(2)
+    dists = np.arange(201) * 0.1 * apu.km
+    heights = (200 + 100 * np.random.uniform(size=201)) * apu.m
+
+    freq = np.array([1., 10., 30.]) * apu.GHz
+    time_percent = np.array([0.1, 2., 10., 50.]) * apu.percent
+    h_tg = np.array([5., 50.]) * apu.m
+    zone_r = np.array([
+        pathprof.CLUTTER.UNKNOWN, pathprof.CLUTTER.URBAN,
+        ])
+
+    kwargs = dict(
+        temperature=290 * apu.K, pressure=980 * apu.hPa,
+        lon_t=6.8836 * apu.deg, lat_t=50.525 * apu.deg,
+        lon_r=7.3334 * apu.deg, lat_r=50.635 * apu.deg,
+        h_rg=30 * apu.m, hprof_step=100 * apu.m, G_t=10 * cnv.dBi,
+        hprof_dists=dists, hprof_heights=heights,
+        hprof_bearing=60 * apu.deg, hprof_backbearing=-120 * apu.deg,
+        )
+
+    n = np.newaxis
+    results = pathprof.losses_complete(
+        freq=freq[:, n, n, n], timepercent=time_percent[n, :, n, n],
+        h_tg=h_tg[n, n, :, n], zone_r=zone_r[n, n, n, :], **kwargs
+        )
+    # time percent outermost
+    results_t = pathprof.losses_complete(
+        freq=freq[n, :, n, n], timepercent=time_percent[:, n, n, n],
+        h_tg=h_tg[n, n, n, :], zone_r=zone_r[n, n, :, n], **kwargs
+        )
+
+    for key in results:
+        assert results[key].shape == (3, 4, 2, 2)
+        assert_equal(
+            results_t[key], np.transpose(results[key], (1, 0, 3, 2))
+            )
+
+    for idx in [(0, 0, 0, 0), (1, 3, 0, 1), (2, 1, 1, 1)]:
+        i, j, k, l = idx
+        expected = pathprof.losses_complete(
+            freq=freq[i], timepercent=time_percent[j], h_tg=h_tg[k],
+            zone_r=zone_r[l], **kwargs
+            )
+        for key in expected:
+            assert_equal(results[key][idx], expected[key][0])
+
+
+@pytest.mark.parametrize('version', [14, 16])
+def test_pathprop_raw(version):
+
+    np.random.seed(3)
+    dists = np.arange(201) * 0.1
+    heights = 200 + 100 * np.random.uniform(size=201)
+
+    pprop = pathprof.PathProp(
+        3 * apu.GHz, 290 * apu.K, 1013 * apu.hPa,
+        6.8836 * apu.deg, 50.525 * apu.deg, 7.1 * apu.deg, 50.6 * apu.deg,
+        5 * apu.m, 50 * apu.m, 100 * apu.m, 2 * apu.percent,
+        zone_t=pathprof.CLUTTER.URBAN, version=version,
+        hprof_dists=dists * apu.km, hprof_heights=heights * apu.m,
+        hprof_bearing=60 * apu.deg, hprof_backbearing=-120 * apu.deg,
+        )
+    pprop_raw = pathprof.PathProp.from_raw(
+        3., 290., 1013., 6.8836, 50.525, 7.1, 50.6, 5., 50., 100., 2.,
+        zone_t=pathprof.CLUTTER.URBAN, version=version,
+        hprof_dists=dists, hprof_heights=heights,
+        hprof_bearing=60., hprof_backbearing=-120.,
+        )
+    assert isinstance(pprop_raw, pathprof.PathProp)
+    assert_equal(pprop_raw.raw, pprop.raw)
+    assert str(pprop_raw) == str(pprop)
+
+    # Quantity attributes are created on first access
+    assert 'eps_pt' not in pprop_raw.__dict__
+    assert 'eps_pt' in dir(pprop_raw)
+    assert_equal(pprop_raw.eps_pt.to_value(apu.deg), pprop.raw['eps_pt'])
+    assert 'eps_pt' in pprop_raw.__dict__
+    assert pprop_raw.eps_pt is pprop_raw.eps_pt
+    assert hasattr(pprop_raw, 'zeta_m') == (version == 14)
+    assert not hasattr(pprop_raw, 'foo')
+
+    losses = pathprof.loss_complete(pprop, 10 * cnv.dBi, 20 * cnv.dBi)
+    losses_raw = pathprof.loss_complete_raw(pprop_raw, 10., 20.)
+    assert len(losses_raw) == len(losses) == 7
+    for loss, loss_raw in zip(losses, losses_raw):
+        assert isinstance(loss_raw, float)
+        assert_equal(loss.to_value(cnv.dB), loss_raw)
+
+
+def test_atten_map_fast_cube(synthetic_map_data):
+
+    hprof_data = synthetic_map_data(
+        1800 * apu.arcsec, 1800 * apu.arcsec,
+        map_resolution=120 * apu.arcsec, zone_r=pathprof.CLUTTER.URBAN,
+        )
+
+    freq = np.array([1., 10.])[:, np.newaxis, np.newaxis] * apu.GHz
+    h_rg = np.array([10., 50.])[:, np.newaxis] * apu.m
+    time_percent = np.array([0.1, 2., 50.]) * apu.percent
+
+    for version in [14, 16]:
+
+        results = pathprof.atten_map_fast(
+            freq, 290 * apu.K, 1013 * apu.hPa, 20 * apu.m, h_rg,
+            time_percent, hprof_data, version=version,
+            )
+        map_shape = hprof_data['dist_map'].shape
+        assert results['L_b'].shape == (2, 2, 3) + map_shape
+        assert results['path_type'].shape == (2, 2, 3) + map_shape
+
+        for i, j, k in [(0, 0, 0), (1, 0, 2), (0, 1, 1), (1, 1, 2)]:
+            expected = pathprof.atten_map_fast(
+                freq[i, 0, 0], 290 * apu.K, 1013 * apu.hPa, 20 * apu.m,
+                h_rg[j, 0], time_percent[k], hprof_data, version=version,
+                )
+            for key in expected:
+                assert_quantity_allclose(results[key][i, j, k], expected[key])
+
+        # results don't depend on the order of the parameter sets, even
+        # if the geometry changes from one parameter set to the next
+        results2 = pathprof.atten_map_fast(
+            freq[:, 0, 0], 290 * apu.K, 1013 * apu.hPa, 20 * apu.m,
+            h_rg[:, 0, np.newaxis], time_percent[:, np.newaxis, np.newaxis],
+            hprof_data, version=version,
+            )
+        for key in results:
+            assert_equal(
+                np.moveaxis(results2[key], [0, 2], [2, 0]), results[key]
+                )
+
+
+def test_atten_map_fast_omega(synthetic_map_data):
+
+    # the gaseous attenuation is cached in the kernels; make sure, that
+    # pixels with different omega still get the correct values
+    hprof_data = synthetic_map_data(
+        1800 * apu.arcsec, 1800 * apu.arcsec,
+        map_resolution=120 * apu.arcsec,
+        )
+
+    map_shape = hprof_data['dist_map'].shape
+    np.random.seed(3)
+    omegas = np.array([0., 30., 100.])
+    omega_idx = np.random.randint(0, 3, map_shape)
+    hprof_data['omega_map'] = omegas[omega_idx]
+
+    freq = np.array([1., 22.])[:, np.newaxis] * apu.GHz
+    time_percent = np.array([0.1, 2.]) * apu.percent
+    args = (290 * apu.K, 1013 * apu.hPa, 20 * apu.m, 10 * apu.m)
+
+    results = pathprof.atten_map_fast(
+        freq[1, 0], *args, time_percent[1], hprof_data
+        )
+    cube_results = pathprof.atten_map_fast(
+        freq, *args, time_percent, hprof_data
+        )
+
+    for n, omega in enumerate(omegas):
+
+        mask = omega_idx == n
+        hprof_data['omega_map'] = np.full(map_shape, omega)
+        expected = pathprof.atten_map_fast(
+            freq[1, 0], *args, time_percent[1], hprof_data
+            )
+        for key in expected:
+            assert_quantity_allclose(
+                results[key][mask], expected[key][mask]
+                )
+            assert_quantity_allclose(
+                cube_results[key][1, 1][mask], expected[key][mask]
+                )
+
+
+def test_height_map_data_block(synthetic_map_data, monkeypatch):
+
+    hprof_data = synthetic_map_data()
+
+    for block in [
+            (slice(0, 8), slice(0, 8)),  # corner
+            (slice(10, 20), slice(12, 22)),  # center
+            (slice(3, 6), slice(20, None)),  # edge
+            ]:
+
+        hprof_block = synthetic_map_data(block=block)
+
+        assert_equal(
+            hprof_block['xcoords'], hprof_data['xcoords'][block[1]]
+            )
+        assert_equal(
+            hprof_block['ycoords'], hprof_data['ycoords'][block[0]]
+            )
+        for key in MAP_KEYS:
+            if key == 'path_idx_map':
+                continue
+            assert_equal(hprof_block[key], hprof_data[key][block])
+
+        # all pixels must have the same height profile
+        path_idx = hprof_data['path_idx_map'][block]
+        path_idx_block = hprof_block['path_idx_map']
+        for (i, j), didx in np.ndenumerate(
+                hprof_block['dist_end_idx_map']
+                ):
+            assert_equal(
+                hprof_block['height_profs'][path_idx_block[i, j], :didx],
+                hprof_data['height_profs'][path_idx[i, j], :didx],
+                )
+
+    # the pixel assignment processes the radials in (parallelized)
+    # chunks; results must not depend on the chunk size
+    monkeypatch.setattr(pathprof.cyprop, '_ASSIGN_CHUNK_SAMPLES', 100)
+    hprof_chunked = synthetic_map_data()
+    for key in MAP_KEYS:
+        assert_equal(hprof_chunked[key], hprof_data[key])
+
+    with pytest.raises(ValueError):
+        synthetic_map_data(block=(slice(0, 8, 2), slice(0, 8)))
+
+
+def test_atten_map_tiled(tmpdir, synthetic_map_data):
+
+    map_args = (
+        6.5 * apu.deg, 50.5 * apu.deg, 180 * apu.arcsec, 150 * apu.arcsec
+        )
+    map_kwargs = {
+        'map_resolution': 6 * apu.arcsec, 'zone_r': pathprof.CLUTTER.URBAN
+        }
+    freq = np.array([1., 10.])[:, np.newaxis] * apu.GHz
+    args = (
+        290 * apu.K, 1013 * apu.hPa, 20 * apu.m, 10 * apu.m,
+        np.array([1., 10.]) * apu.percent,
+        )
+
+    hprof_data = synthetic_map_data(**map_kwargs)
+    map_shape = hprof_data['dist_map'].shape
+    expected = pathprof.atten_map_fast(freq, *args, hprof_data)
+
+    # results are written block-wise into memory-mapped files
+    out = {
+        key: np.lib.format.open_memmap(
+            str(tmpdir.join(key + '.npy')), mode='w+',
+            dtype=np.int32 if key == 'path_type' else np.float64,
+            shape=(2, 2) + map_shape,
+            )
+        for key in expected
+        }
+    results = pathprof.atten_map_tiled(
+        freq, *args, *map_args, block_size=7, out=out, **map_kwargs
+        )
+    assert results is out
+    assert_equal(results['xcoords'], hprof_data['xcoords'])
+    assert_equal(results['ycoords'], hprof_data['ycoords'])
+    for key in expected:
+        assert_equal(results[key], np.asarray(expected[key]))
+
+    results = pathprof.atten_map_tiled(
+        freq[0, 0], *args[:-1], args[-1][0], *map_args, block_size=10,
+        **map_kwargs
+        )
+    assert results['L_b'].unit == cnv.dB
+    for key in expected:
+        assert_equal(
+            np.asarray(results[key]), np.asarray(expected[key][0, 0])
+            )
+
+    # reading hprof_data block-wise
+    out = {}
+    results = pathprof.atten_map_fast(
+        freq, *args, hprof_data, out=out, block_size=9
+        )
+    assert results is out
+    for key in expected:
+        assert_equal(results[key], np.asarray(expected[key]))
+
+    results = pathprof.atten_map_fast(freq, *args, hprof_data, block_size=9)
+    assert results['d_lt'].unit == apu.km
+    for key in expected:
+        assert_equal(np.asarray(results[key]), np.asarray(expected[key]))
+
+    with pytest.raises(ValueError):
+        pathprof.atten_map_fast(
+            freq, *args, hprof_data, out={'L_b': np.zeros(map_shape)}
+            )
+
+
+def test_atten_map_fast_outputs(synthetic_map_data):
+
+    hprof_data = synthetic_map_data(zone_r=pathprof.CLUTTER.URBAN)
+
+    for freq in [3 * apu.GHz, np.array([1., 10.]) * apu.GHz]:
+
+        args = (
+            freq, 290 * apu.K, 1013 * apu.hPa, 20 * apu.m, 10 * apu.m,
+            2 * apu.percent, hprof_data,
+            )
+        expected = pathprof.atten_map_fast(*args)
+
+        for outputs in [
+                ['L_b0p'], ['L_bd', 'eps_pr'], ['L_bs', 'd_lt'],
+                ['L_ba', 'path_type'], ['L_b_corr'], ['d_lr', 'path_type'],
+                ]:
+            results = pathprof.atten_map_fast(*args, outputs=outputs)
+            assert sorted(results) == sorted(outputs)
+            for key in outputs:
+                assert_equal(
+                    np.asarray(results[key]), np.asarray(expected[key])
+                    )
+
+        results = pathprof.atten_map_fast(*args, dtype=np.float32)
+        assert sorted(results) == sorted(expected)
+        assert_equal(results['path_type'], expected['path_type'])
+        for key in expected:
+            if key == 'path_type':
+                continue
+            assert results[key].dtype == np.float32
+            assert results[key].unit == expected[key].unit
+            assert_equal(
+                results[key].value, expected[key].value.astype(np.float32)
+                )
+
+    out = {}
+    results = pathprof.atten_map_fast(
+        *args, out=out, outputs=['L_b', 'path_type'], dtype=np.float32
+        )
+    assert sorted(out) == ['L_b', 'path_type']
+    assert out['L_b'].dtype == np.float32
+    assert_equal(out['L_b'], expected['L_b'].value.astype(np.float32))
+    assert_equal(out['path_type'], expected['path_type'])
+
+    path_data = pathprof.height_path_data_generic(
+        5 * apu.km, 50 * apu.m, 6 * apu.deg, 50 * apu.deg,
+        )
+    args = (
+        3 * apu.GHz, 290 * apu.K, 1013 * apu.hPa, 20 * apu.m, 10 * apu.m,
+        2 * apu.percent, path_data,
+        )
+    expected = pathprof.atten_path_fast(*args)
+    results = pathprof.atten_path_fast(
+        *args, outputs=['L_bd', 'eps_pt'], dtype=np.float32
+        )
+    assert sorted(results) == ['L_bd', 'eps_pt']
+    for key in results:
+        assert_equal(
+            results[key].value, expected[key].value.astype(np.float32)
+            )
+
+    with pytest.raises(ValueError):
+        pathprof.atten_map_fast(*args[:-1], hprof_data, outputs=['L_x'])
+
+    with pytest.raises(ValueError):
+        pathprof.atten_path_fast(*args, dtype=np.int32)
+
+
+@pytest.mark.parametrize('version', [14, 16])
+def test_atten_path_fast_synthetic(version):
+
+    # atten_path_fast processes all prefixes of the profile with the help
+    # of an index; results must be the same as for the individual paths
+    np.random.seed(4)
+    hprof_data = pathprof.height_path_data_generic(
+        10 * apu.km, 50 * apu.m, 6 * apu.deg, 50 * apu.deg,
+        )
+    size = len(hprof_data['distances'])
+    heights = np.cumsum(np.random.normal(0, 5, size)) + 200
+    heights[size // 3:size // 3 + 5] += 150
+    hprof_data['heights'] = heights
+    hprof_data['delta_N'] = np.linspace(30., 60., size)
+
+    for h_tg, h_rg in [(10, 10), (5, 500)]:
+
+        expected = {}
+        for idx in range(6, size, 9):
+            pprop = pathprof.PathProp(
+                3 * apu.GHz, 290 * apu.K, 1013 * apu.hPa,
+                6 * apu.deg, 50 * apu.deg, 6.1 * apu.deg, 50 * apu.deg,
+                h_tg * apu.m, h_rg * apu.m, 50 * apu.m, 2 * apu.percent,
+                version=version,
+                d_tm=hprof_data['d_tm'][idx] * apu.km,
+                d_lm=hprof_data['d_lm'][idx] * apu.km,
+                hprof_dists=hprof_data['distances'][:idx + 1] * apu.km,
+                hprof_heights=heights[:idx + 1] * apu.m,
+                hprof_bearing=0 * apu.deg, hprof_backbearing=0 * apu.deg,
+                delta_N=hprof_data['delta_N'][idx] * cnv.dimless / apu.km,
+                N0=hprof_data['N0'][idx] * cnv.dimless,
+                )
+            hprof_data['beta0'][idx] = pprop.beta0.value
+            expected[idx] = (
+                pathprof.loss_complete(pprop)[:5] +
+                (pprop.eps_pt, pprop.eps_pr, pprop.d_lt, pprop.d_lr)
+                )
+
+        results = pathprof.atten_path_fast(
+            3 * apu.GHz, 290 * apu.K, 1013 * apu.hPa,
+            h_tg * apu.m, h_rg * apu.m, 2 * apu.percent,
+            hprof_data, version=version,
+            )
+
+        keys = [
+            'L_b0p', 'L_bd', 'L_bs', 'L_ba', 'L_b',
+            'eps_pt', 'eps_pr', 'd_lt', 'd_lr',
+            ]
+        for idx in expected:
+            for key, val in zip(keys, expected[idx]):
+                assert_quantity_allclose(
+                    results[key][idx], val, rtol=1.e-12
+                    )
+
+
+def test_diffraction_no_receiver_side_edge():
+
+    # regression test: with P.452-14, _diffraction_helper_v14 didn't
+    # return anything, if the principal edge was the last point before
+    # the receiver (i.e., if there was no receiver-side secondary edge)
+    dists = np.linspace(0., 20., 201)
+    heights = np.zeros_like(dists)
+    heights[-2] = 300.
+
+    pprop = pathprof.PathProp(
+        1 * apu.GHz, 290 * apu.K, 1013 * apu.hPa,
+        6 * apu.deg, 50 * apu.deg, 6.2 * apu.deg, 50 * apu.deg,
+        10 * apu.m, 10 * apu.m, 50 * apu.m, 2 * apu.percent,
+        version=14,
+        d_tm=20 * apu.km, d_lm=20 * apu.km,
+        hprof_dists=dists * apu.km, hprof_heights=heights * apu.m,
+        hprof_bearing=0 * apu.deg, hprof_backbearing=0 * apu.deg,
+        delta_N=38 * cnv.dimless / apu.km, N0=324 * cnv.dimless,
+        )
+
+    assert pprop.i_m50 == len(dists) - 2
+    assert_quantity_allclose(pprop.d_m50, dists[-2] * apu.km)
+    assert_quantity_allclose(pprop.h_m50, heights[-2] * apu.m)
+    assert pprop.i_r50 == -1
+    assert pprop.nu_r50.value == -1.
+    assert pprop.nu_rbeta.value == -1.
+
+    L_bd = pathprof.loss_complete(pprop)[1]
+    assert np.isfinite(L_bd.value) and L_bd.value > 0
+
+
 def test_clutter_correction():
 
     # args_list = [
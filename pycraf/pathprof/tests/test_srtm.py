@@ -2,6 +2,10 @@
 # -*- coding: utf-8 -*-
 
 import os
+import io
+import threading
+from zipfile import ZipFile
+from http.server import HTTPServer, BaseHTTPRequestHandler
 import pytest
 import numpy as np
 from numpy.testing import assert_equal, assert_allclose
@@ -14,6 +18,19 @@ from ...utils import check_astro_quantities
 TOL_KWARGS = {'atol': 1.e-4, 'rtol': 1.e-4}
 
 
+@pytest.fixture()
+def synthetic_srtm_dir(tmpdir):
+    # writes a small (synthetic) tile, such that no download is needed
+
+    ilon, ilat, tile_size = 12, 50, 121
+    np.random.seed(0)
+    data = np.random.randint(0, 3000, (tile_size, tile_size)).astype('>i2')
+    data[5, 7] = data[60, 61] = -32768  # voids
+    data.tofile(str(tmpdir.join(srtm._hgt_filename(ilon, ilat))))
+
+    return str(tmpdir), ilon, ilat, data
+
+
 class TestSrtmConf:
 
     def setup(self):
@@ -301,6 +318,178 @@ def test_get_hgt_diskpath(srtm_temp_dir):
         os.remove(os.path.join(srtm_temp_dir, 'd2', 'foo.hgt'))
 
 
+def test_tile_index(synthetic_srtm_dir, monkeypatch):
+
+    srtm_dir, ilon, ilat, data = synthetic_srtm_dir
+    tile_name = srtm._hgt_filename(ilon, ilat)
+
+    with srtm.SrtmConf.set(srtm_dir=srtm_dir):
+
+        tile_index = srtm._get_tile_index()
+        entry, = tile_index.lookup(tile_name)
+        assert entry.path == os.path.join(srtm_dir, tile_name)
+        assert entry.size == 121 * 121 * 2
+        assert entry.tile_size == 121
+        assert_allclose(entry.hgt_res, 900.)
+
+        # look-ups must not re-scan the directory
+        def _no_walk(*args, **kwargs):
+            raise AssertionError('os.walk called')
+
+        with monkeypatch.context() as m:
+            m.setattr(srtm.os, 'walk', _no_walk)
+            assert srtm.get_hgt_file(ilon, ilat) == entry.path
+            assert srtm._get_hgt_diskpath('N51E012.hgt') is None
+            srtm.get_tile_data(ilon, ilat)
+
+        # new files (also in sub-directories) are detected
+        os.makedirs(os.path.join(srtm_dir, 'sub'))
+        sub_path = os.path.join(srtm_dir, 'sub', 'N51E012.hgt')
+        data.tofile(sub_path)
+        srtm.refresh_tile_index()
+        assert srtm._get_hgt_diskpath('N51E012.hgt') == sub_path
+
+        # tiles with different size
+        np.zeros((5, 5), dtype='>i2').tofile(
+            os.path.join(srtm_dir, 'sub', 'N52E012.hgt')
+            )
+        srtm.refresh_tile_index()
+        with pytest.raises(srtm.TilesSizeError):
+            srtm.get_tile_data(ilon, ilat)
+
+    with pytest.raises(srtm.TilesSizeError):
+        with srtm.SrtmConf.set(srtm_dir=srtm_dir):
+            pass
+
+
+@pytest.fixture()
+def local_tile_server(monkeypatch):
+    # local stand-in for the download servers; serves zip files (from
+    # memory) and counts the requests per file
+
+    files, requests = {}, {}
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            path = self.path.lstrip('/')
+            requests[path] = requests.get(path, 0) + 1
+            if path not in files:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(files[path])))
+            self.end_headers()
+            self.wfile.write(files[path])
+
+        def log_message(self, *args):
+            pass
+
+    httpd = HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+
+    url = 'http://127.0.0.1:{:d}/'.format(httpd.server_address[1])
+    monkeypatch.setitem(srtm._SERVER_URLS, 'nasa_v2.1', url + 'nasa/')
+    monkeypatch.setitem(srtm._SERVER_URLS, 'viewpano', url + 'pano/')
+
+    def add_zip(path, tiles):
+        buf = io.BytesIO()
+        with ZipFile(buf, 'w') as zf:
+            for name, data in tiles.items():
+                zf.writestr(name, data.tobytes())
+        files[path] = buf.getvalue()
+
+    yield add_zip, requests
+
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_download_tiles(tmpdir, local_tile_server):
+
+    add_zip, requests = local_tile_server
+    srtm_dir = str(tmpdir)
+    data = np.arange(121 * 121, dtype='>i2').reshape((121, 121))
+
+    # viewpano: several tiles per zip file (in a sub-directory)
+    add_zip('pano/G32.zip', {
+        'G32/' + srtm._hgt_filename(ilon, 24): (data + ilon).astype('>i2')
+        for ilon in range(6, 9)
+        })
+
+    with srtm.SrtmConf.set(srtm_dir=srtm_dir, server='viewpano'):
+
+        tiles = srtm.download_tiles(
+            6 * apu.deg, 8.5 * apu.deg, 24 * apu.deg, 24.5 * apu.deg,
+            )
+        assert tiles == [(6, 24), (7, 24), (8, 24)]
+        assert requests == {'pano/G32.zip': 1}
+        for ilon in range(6, 9):
+            assert srtm.get_hgt_file(ilon, 24) == os.path.join(
+                srtm_dir, 'G32', srtm._hgt_filename(ilon, 24)
+                )
+            assert_equal(srtm._get_tile_mmap(ilon, 24), data + ilon)
+
+        # no leftovers (temporary or lock files)
+        assert sorted(os.listdir(srtm_dir)) == ['G32']
+        assert len(os.listdir(os.path.join(srtm_dir, 'G32'))) == 3
+
+        # present tiles are not downloaded again; (-24, -1) is not
+        # available on the server
+        assert srtm._download_tiles([(6, 24), (8, 24), (-24, -1)]) == []
+        assert requests == {'pano/G32.zip': 1}
+
+    # nasa: one tile per zip file; concurrent calls (e.g., from several
+    # processes) fetch each zip file only once
+    for ilon in range(10, 14):
+        tile_name = srtm._hgt_filename(ilon, 50)
+        add_zip('nasa/Eurasia/' + tile_name + '.zip', {tile_name: data})
+
+    with srtm.SrtmConf.set(srtm_dir=srtm_dir, server='nasa_v2.1'):
+
+        tiles = [(ilon, 50) for ilon in range(10, 14)]
+        threads = [
+            threading.Thread(target=srtm._download_tiles, args=(tiles, 2))
+            for _ in range(3)
+            ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        for ilon in range(10, 14):
+            tile_name = srtm._hgt_filename(ilon, 50)
+            assert requests['nasa/Eurasia/' + tile_name + '.zip'] == 1
+            assert_equal(srtm._get_tile_mmap(ilon, 50), data)
+
+        # download='always' replaces the file (atomically)
+        tile_name = srtm._hgt_filename(12, 50)
+        with srtm.SrtmConf.set(download='always'):
+            srtm.get_hgt_file(12, 50)
+        assert requests['nasa/Eurasia/' + tile_name + '.zip'] == 2
+
+        # likewise for on-demand downloads (download='missing')
+        tile_name = srtm._hgt_filename(10, 51)
+        add_zip('nasa/Eurasia/' + tile_name + '.zip', {tile_name: data})
+        with srtm.SrtmConf.set(download='missing'):
+            threads = [
+                threading.Thread(target=srtm._download, args=(10, 51))
+                for _ in range(3)
+                ]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        assert requests['nasa/Eurasia/' + tile_name + '.zip'] == 1
+
+        # download errors (here: HTTP 404) are propagated
+        with pytest.raises(IOError):
+            srtm._download_tiles([(14, 50)], overwrite=True)
+
+        assert srtm._hgt_filename(14, 50) not in os.listdir(srtm_dir)
+
+
 @remote_data(source='any')
 def test_get_hgt_file_download_never(srtm_temp_dir):
 
@@ -428,6 +617,216 @@ def test_get_tile_warning(srtm_temp_dir):
         assert_allclose(tile, np.zeros((5, 5), dtype=np.float32))
 
 
+def test_get_tile_data_synthetic(synthetic_srtm_dir):
+
+    srtm_dir, ilon, ilat, data = synthetic_srtm_dir
+
+    with srtm.SrtmConf.set(srtm_dir=srtm_dir):
+
+        lons, lats, tile = srtm.get_tile_data(ilon, ilat)
+
+        assert srtm.SrtmConf.tile_size == 121
+        assert_allclose(srtm.SrtmConf.hgt_res, 900.)
+        assert tile.dtype == np.float32
+        assert_allclose(lons[[0, 60, 120], 0], [12., 12.5, 13.])
+        assert_allclose(lats[0, [0, 60, 120]], [50., 50.5, 51.])
+
+        # north-up on disk, but tile is flipped
+        assert_equal(np.isnan(tile), (data == -32768)[::-1])
+        mask = ~np.isnan(tile)
+        assert_equal(tile[mask], data[::-1][mask])
+
+        # tile memory-mapped (read-only) without copy
+        mtile = srtm._get_tile_mmap(ilon, ilat)
+        assert isinstance(mtile, np.memmap)
+        assert not mtile.flags.writeable
+        assert_equal(mtile, data)
+
+
+@pytest.mark.parametrize('interp', ['nearest', 'linear'])
+def test_mapped_tile_interpolator(synthetic_srtm_dir, interp):
+
+    from scipy.interpolate import RegularGridInterpolator
+
+    srtm_dir, ilon, ilat, data = synthetic_srtm_dir
+
+    with srtm.SrtmConf.set(srtm_dir=srtm_dir, interp=interp):
+
+        lons_g, lats_g, tile = srtm.get_tile_data(ilon, ilat)
+        ref_func = RegularGridInterpolator(
+            (lons_g[:, 0], lats_g[0]), np.nan_to_num(tile).T, method=interp
+            )
+
+        np.random.seed(1)
+        lons = np.random.uniform(ilon, ilon + 1, 1000)
+        lats = np.random.uniform(ilat, ilat + 1, 1000)
+        # also check pixel positions and tile corners (but avoid ties)
+        lons[:4] = ilon + np.array([0, 0.5, 60 / 120, 119.4 / 120])
+        lats[:4] = ilat + np.array([0, 0.5, 55 / 120, 119.75 / 120])
+
+        ifunc = srtm.get_tile_interpolator(ilon, ilat, interp, None)
+        assert isinstance(ifunc, srtm._MappedTileInterpolator)
+        assert_allclose(ifunc((lons, lats)), ref_func((lons, lats)))
+
+        heights = srtm._srtm_height_data(lons, lats)
+        assert heights.dtype == np.float64
+        assert_allclose(heights, ref_func((lons, lats)))
+
+
+@pytest.mark.parametrize('interp', ['nearest', 'linear', 'spline'])
+def test_srtm_height_data_multi_tile(synthetic_srtm_dir, interp):
+
+    srtm_dir, ilon, ilat, data = synthetic_srtm_dir
+    # add neighboring tile; tile (13, 51) is missing on disk and
+    # (28, 35) is not available on the server (both are zero)
+    data[::-1].tofile(os.path.join(srtm_dir, srtm._hgt_filename(13, 50)))
+
+    np.random.seed(2)
+    lons = np.random.uniform(12, 14, 2000)
+    lats = np.random.uniform(50, 52, 2000)
+    lons[:100] = np.random.uniform(28, 29, 100)
+    lats[:100] = np.random.uniform(35, 36, 100)
+
+    with srtm.SrtmConf.set(srtm_dir=srtm_dir, interp=interp):
+
+        with pytest.warns(srtm.TileNotAvailableOnDiskWarning):
+            heights = srtm._srtm_height_data(lons, lats)
+
+        spl_opts = srtm.SrtmConf.spline_opts if interp == 'spline' else None
+        expected = np.empty_like(heights)
+        for i, (lon, lat) in enumerate(zip(lons, lats)):
+            ifunc = srtm.get_tile_interpolator(
+                int(lon), int(lat), interp, spl_opts
+                )
+            if interp == 'spline':
+                expected[i] = ifunc(lon, lat, grid=False)
+            else:
+                expected[i] = ifunc((lon, lat))
+
+        assert_allclose(heights, expected)
+        assert_equal(heights[:100], 0.)
+        assert_equal(heights[(lons >= 13) & (lats >= 51)], 0.)
+        if interp != 'spline':  # splines can overshoot
+            assert np.all(heights[(lons < 13) & (lats < 51)] > 0.)
+
+        heights2 = srtm._srtm_height_data(
+            lons.reshape((50, 40)), lats.reshape((50, 40))
+            )
+        assert heights2.shape == (50, 40)
+        assert_equal(heights2.flatten(), heights)
+
+
+def test_tile_cache(synthetic_srtm_dir):
+
+    srtm_dir, ilon, ilat, data = synthetic_srtm_dir
+    data.tofile(os.path.join(srtm_dir, srtm._hgt_filename(13, 50)))
+    nbytes = data.nbytes
+
+    with pytest.raises(ValueError):
+        with srtm.SrtmConf.set(cache_bytes=-1):
+            pass
+
+    with srtm.SrtmConf.set(srtm_dir=srtm_dir, cache_bytes=nbytes):
+
+        info = srtm.tile_cache_info()
+        assert info.tiles == 0 and info.nbytes == 0
+        assert info.max_bytes == nbytes
+
+        srtm._srtm_height_data(np.array([12.5, 12.6]), np.array([50.5, 50.6]))
+        srtm._srtm_height_data(np.array([12.5, 12.6]), np.array([50.5, 50.6]))
+        info2 = srtm.tile_cache_info()
+        assert info2.misses == info.misses + 1
+        assert info2.hits == info.hits + 1
+        assert info2.tiles == 1 and info2.nbytes == nbytes
+
+        # second tile will evict the first one
+        srtm._srtm_height_data(np.array([13.5]), np.array([50.5]))
+        info3 = srtm.tile_cache_info()
+        assert info3.evictions == info2.evictions + 1
+        assert info3.tiles == 1 and info3.nbytes == nbytes
+
+        with pytest.warns(UserWarning, match='Tile cache too small.*'):
+            tiles = srtm.prefetch_tiles(
+                12.5 * apu.deg, 13.5 * apu.deg,
+                50.1 * apu.deg, 50.2 * apu.deg
+                )
+        assert tiles == [(12, 50), (13, 50)]
+
+        with srtm.SrtmConf.set(cache_bytes=2 * nbytes):
+            tiles = srtm.prefetch_tiles(
+                12.5 * apu.deg, 13.5 * apu.deg,
+                50.1 * apu.deg, 50.2 * apu.deg
+                )
+            assert srtm.tile_cache_info().tiles == 2
+            assert set(k[:2] for k in srtm._TILE_CACHE.keys()) == set(tiles)
+
+        # shrinking the cache evicts tiles
+        assert srtm.tile_cache_info().tiles == 1
+
+        srtm.clear_tile_cache()
+        assert srtm.tile_cache_info().tiles == 0
+
+    # anti-meridian
+    with srtm.SrtmConf.set(srtm_dir=srtm_dir):
+        tiles = srtm.prefetch_tiles(
+            179.5 * apu.deg, -179.5 * apu.deg, -0.5 * apu.deg, 0.5 * apu.deg
+            )
+        assert tiles == [(179, -1), (-180, -1), (179, 0), (-180, 0)]
+
+
+@pytest.mark.parametrize('compress', [False, True])
+@pytest.mark.parametrize('interp', ['nearest', 'linear', 'spline'])
+def test_srtm_mosaic(synthetic_srtm_dir, tmpdir_factory, compress, interp):
+
+    srtm_dir, ilon, ilat, data = synthetic_srtm_dir
+    data[::-1].tofile(os.path.join(srtm_dir, srtm._hgt_filename(13, 50)))
+    mosaic = str(tmpdir_factory.mktemp('mosaic').join('srtm.mosaic'))
+
+    np.random.seed(3)
+    lons = np.random.uniform(12, 14, 2000)
+    lats = np.random.uniform(50, 51, 2000)
+    lons[:100] = np.random.uniform(28, 29, 100)
+    lats[:100] = np.random.uniform(35, 36, 100)
+    # block boundaries
+    pix = np.array([0, 0.5, 49.5, 50, 50.5, 99.5, 100, 100.5, 119.5, 119.9])
+    lons[100:110] = 12 + pix / 120
+    lats[100:110] = 50 + pix[::-1] / 120
+
+    with srtm.SrtmConf.set(srtm_dir=srtm_dir, interp=interp):
+
+        # 121 pixels: block size doesn't divide tile size
+        num_tiles = srtm.build_srtm_mosaic(
+            mosaic, block_size=50, compress=compress
+            )
+        assert num_tiles == 2
+
+        expected = srtm._srtm_height_data(lons, lats)
+        expected_tile = srtm.get_tile_data(ilon, ilat)[2]
+
+    with srtm.SrtmConf.set(srtm_dir='/nonexistent', mosaic=mosaic):
+
+        assert_equal(srtm.get_tile_data(ilon, ilat)[2], expected_tile)
+        assert srtm.SrtmConf.tile_size == 121
+
+        with srtm.SrtmConf.set(interp=interp):
+            heights = srtm._srtm_height_data(lons, lats)
+
+        assert_allclose(heights, expected)
+
+        with pytest.warns(srtm.TileNotAvailableOnDiskWarning):
+            srtm.get_tile_data(12, 51)
+
+    with pytest.raises(ValueError):
+        with srtm.SrtmConf.set(mosaic=os.path.join(srtm_dir, 'foo')):
+            pass
+
+    with pytest.raises(ValueError):
+        with srtm.SrtmConf.set(
+                mosaic=os.path.join(srtm_dir, srtm._hgt_filename(13, 50))
+                ):
+            pass
+
+
 @remote_data(source='any')
 def test_srtm_height_data_linear(srtm_temp_dir):
 
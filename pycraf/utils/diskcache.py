@@ -0,0 +1,360 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Helpers for simple on-disk caches of dictionaries of arrays and scalars
+(used, e.g., by `~pycraf.pathprof.HprofCacheConf` and
+`~pycraf.atm.AtmCacheConf`, which are derived from `CacheConf`).
+
+Each cache entry is a directory (named after the hash of all inputs) with
+a "meta.json" file (scalar values and total size) and one ".npy" file per
+array. Entries are written to a temporary directory first and renamed
+afterwards, such that several processes can safely share a cache
+directory. Arrays are loaded as (copy-on-write) memory maps, such that
+processes that work with the same entry share the physical memory.
+'''
+
+from __future__ import (
+    absolute_import, unicode_literals, division, print_function
+    )
+
+import os
+import json
+import shutil
+import numbers
+import tempfile
+import hashlib
+import threading
+import numpy as np
+from .multistate import MultiState
+
+
+__all__ = []
+
+
+META_NAME = 'meta.json'
+TMP_PREFIX = '.tmp-'
+
+
+class CacheConf(MultiState):
+    '''
+    Base class of the cache configurations (global states).
+
+    The cache is disabled, if `cache_dir` is None. The total size of the
+    cache is limited to `max_bytes`. Sub-classes need to define the
+    `_attributes` and their default values (as for all
+    `~pycraf.utils.MultiState` classes).
+    '''
+
+    _attributes = ('cache_dir', 'max_bytes')
+
+    cache_dir = None
+    max_bytes = 4 * 1024 ** 3
+
+    @classmethod
+    def validate(cls, **kwargs):
+        '''
+        This checks, if the provided inputs are allowed:
+
+        - `cache_dir`:  None or str (None disables the cache)
+        - `max_bytes`:  int (maximum size of the cache in bytes)
+
+        '''
+
+        for k, v in kwargs.items():
+
+            if k == 'cache_dir':
+                if v is not None and not isinstance(v, str):
+                    raise ValueError(
+                        '"cache_dir" option must be None or a string.'
+                        )
+
+            if k == 'max_bytes':
+                if not isinstance(v, int) or isinstance(v, bool) or v < 0:
+                    raise ValueError(
+                        '"max_bytes" option must be a non-negative int.'
+                        )
+
+        return kwargs
+
+    @classmethod
+    def hook(cls, **kwargs):
+
+        # apply a new size limit immediately
+        cache_dir = kwargs.get('cache_dir', cls.cache_dir)
+        if 'max_bytes' in kwargs and cache_dir is not None:
+            evict(cache_dir, kwargs['max_bytes'])
+
+    @classmethod
+    def __repr__(cls):
+        return '<{} dir: {}, max_bytes: {}>'.format(
+            cls.__name__, cls.cache_dir, cls.max_bytes
+            )
+
+    @classmethod
+    def __str__(cls):
+        return '{}\n  directory: {}\n  max_bytes: {}'.format(
+            cls.__name__, cls.cache_dir, cls.max_bytes
+            )
+
+
+class CacheStats(object):
+    '''
+    Thread-safe counter of cache hits and misses.
+    '''
+
+    def __init__(self):
+
+        self._lock = threading.Lock()
+        self._counts = {'hits': 0, 'misses': 0}
+
+    def count(self, name):
+
+        with self._lock:
+            self._counts[name] += 1
+
+    @property
+    def hits(self):
+
+        with self._lock:
+            return self._counts['hits']
+
+    @property
+    def misses(self):
+
+        with self._lock:
+            return self._counts['misses']
+
+
+def hash_update(md5, obj):
+    '''
+    Feed a (nested) function argument into the hash.
+    '''
+
+    if isinstance(obj, np.ndarray):
+        obj = np.ascontiguousarray(obj)
+        md5.update('array {} {}:'.format(
+            obj.dtype.str, obj.shape
+            ).encode('utf-8'))
+        md5.update(obj.tobytes())
+    elif isinstance(obj, (tuple, list)):
+        md5.update('seq {}:'.format(len(obj)).encode('utf-8'))
+        for item in obj:
+            hash_update(md5, item)
+    elif isinstance(obj, slice):
+        hash_update(md5, ('slice', obj.start, obj.stop, obj.step))
+    elif isinstance(obj, bool) or obj is None or isinstance(obj, str):
+        md5.update('{!r};'.format(obj).encode('utf-8'))
+    elif isinstance(obj, numbers.Integral):
+        # also handles enums and numpy integers
+        md5.update('int {!r};'.format(int(obj)).encode('utf-8'))
+    elif isinstance(obj, numbers.Real):
+        md5.update('float {!r};'.format(float(obj)).encode('utf-8'))
+    else:
+        raise TypeError(
+            'Cannot hash argument of type {}'.format(type(obj))
+            )
+
+
+def make_key(*parts):
+    '''
+    Hash of all parts (see `hash_update`), used as the name of an entry.
+    '''
+
+    md5 = hashlib.md5()
+    for part in parts:
+        hash_update(md5, part)
+
+    return md5.hexdigest()
+
+
+def entries(cache_dir):
+    '''
+    List of (mtime, nbytes, path) of all cache entries.
+    '''
+
+    result = []
+    try:
+        names = os.listdir(cache_dir)
+    except OSError:
+        return result
+
+    for name in names:
+        if name.startswith('.'):
+            continue
+
+        path = os.path.join(cache_dir, name)
+        try:
+            mtime = os.stat(path).st_mtime
+            with open(os.path.join(path, META_NAME), 'r') as f:
+                nbytes = json.load(f)['nbytes']
+        except (OSError, ValueError, KeyError):
+            continue
+
+        result.append((mtime, nbytes, path))
+
+    return result
+
+
+def load(path):
+
+    with open(os.path.join(path, META_NAME), 'r') as f:
+        meta = json.load(f)
+
+    data = dict(meta['scalars'])
+    for name in meta['arrays']:
+        fname = os.path.join(path, name + '.npy')
+        try:
+            data[name] = np.load(fname, mmap_mode='c')
+        except ValueError:
+            # empty arrays can't be memory-mapped
+            data[name] = np.load(fname)
+
+    # mark as recently used
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+
+    return data
+
+
+def store(path, data, max_bytes):
+
+    scalars, arrays = {}, {}
+    for name, value in data.items():
+        if isinstance(value, np.generic):
+            value = value.item()
+        if isinstance(value, numbers.Integral):
+            # e.g., enums
+            value = int(value)
+
+        if value is None or isinstance(value, (numbers.Number, str)):
+            scalars[name] = value
+        else:
+            arrays[name] = np.asarray(value)
+
+    nbytes = sum(a.nbytes for a in arrays.values())
+    if nbytes > max_bytes:
+        return
+
+    cache_dir = os.path.dirname(path)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(prefix=TMP_PREFIX, dir=cache_dir)
+
+    try:
+        for name, value in arrays.items():
+            np.save(os.path.join(tmp_path, name + '.npy'), value)
+
+        with open(os.path.join(tmp_path, META_NAME), 'w') as f:
+            json.dump({
+                'scalars': scalars,
+                'arrays': sorted(arrays),
+                'nbytes': nbytes,
+                }, f)
+
+        # atomic; fails, if another process stored the entry meanwhile
+        os.rename(tmp_path, path)
+    except OSError:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        return
+
+    evict(cache_dir, max_bytes, keep=path)
+
+
+def evict(cache_dir, max_bytes, keep=None):
+    '''
+    Remove least recently used entries until the cache fits.
+    '''
+
+    _entries = sorted(entries(cache_dir))
+    total = sum(nbytes for _, nbytes, _ in _entries)
+
+    for _, nbytes, path in _entries:
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+
+        shutil.rmtree(path, ignore_errors=True)
+        total -= nbytes
+
+
+def cached(cache_dir, max_bytes, key, compute, stats, key_func=None):
+    '''
+    Return the cache entry `key` or store the result of `compute()`
+    (a dict), if it doesn't exist yet.
+
+    If `key_func` is given, the key is computed again (with `key_func()`)
+    after `compute()`. The result is only stored if the key didn't change
+    during the computation (e.g., because the input data were modified).
+    '''
+
+    path = os.path.join(cache_dir, key)
+
+    try:
+        data = load(path)
+    except (OSError, ValueError, KeyError):
+        pass
+    else:
+        stats.count('hits')
+        return data
+
+    stats.count('misses')
+    data = compute()
+    if key_func is None or key_func() == key:
+        store(path, data, max_bytes)
+
+    return data
+
+
+def clear(cache_dir):
+    '''
+    Remove all entries from the cache directory.
+    '''
+
+    for _, _, path in entries(cache_dir):
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def conf_cached(conf, key_func, compute, stats, check_key=False):
+    '''
+    Return the cached result of `compute()` (a dict) for the key
+    `key_func()`, if the cache configured by `conf` (a `CacheConf`) is
+    enabled. If `check_key` is True, the result is only stored if the
+    key didn't change during `compute()` (see `cached`).
+    '''
+
+    if conf.cache_dir is None:
+        return compute()
+
+    return cached(
+        conf.cache_dir, conf.max_bytes, key_func(), compute, stats,
+        key_func=key_func if check_key else None,
+        )
+
+
+def conf_info(conf, stats, info_type):
+    '''
+    Cache statistics as `info_type` (a namedtuple with the fields hits,
+    misses, entries, nbytes, and max_bytes).
+    '''
+
+    _entries = []
+    if conf.cache_dir is not None:
+        _entries = entries(conf.cache_dir)
+
+    return info_type(
+        stats.hits, stats.misses,
+        len(_entries), sum(nbytes for _, nbytes, _ in _entries),
+        conf.max_bytes,
+        )
+
+
+def conf_clear(conf):
+    '''
+    Remove all entries from the cache directory of `conf` (if enabled).
+    '''
+
+    if conf.cache_dir is not None:
+        clear(conf.cache_dir)